@@ -0,0 +1,99 @@
+# coding=utf-8
+# Copyright 2020 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Micro-benchmark of splitting downloaded chunks into lines.
+
+Compares the bytes copied per input byte and the run time of the carry-over
+buffer of the GCS hook with the previous splitter, which concatenated every
+chunk to the buffer and split it with bytes.splitlines.
+
+Usage Example (from the src directory):
+  python -m benchmarks.line_splitter_benchmark --size_mb=200 --chunk_kb=4096
+"""
+
+import argparse
+import json
+import time
+from typing import Iterator, List, Tuple
+
+from plugins.pipeline_plugins.utils import line_splitter
+
+
+def _make_chunks(size: int, chunk_size: int) -> List[bytes]:
+  """Makes newline-delimited JSON content, cut into download chunks."""
+  line = json.dumps({'client_id': '12345.67890', 'event': 'purchase',
+                     'value': 123.45}).encode() + b'\n'
+  content = line * (size // len(line))
+  return [content[i:i + chunk_size] for i in range(0, len(content), chunk_size)]
+
+
+def _split_with_concatenation(chunks: List[bytes]) -> Tuple[int, int]:
+  """Splits chunks like the previous splitter, counting the copied bytes."""
+  num_lines = 0
+  bytes_copied = 0
+  buffer = b''
+  for chunk in chunks:
+    buffer += chunk
+    bytes_copied += len(buffer)
+    if buffer.startswith(b'\n'):
+      buffer = buffer[1:]
+      bytes_copied += len(buffer)
+
+    lines = buffer.splitlines()
+    bytes_copied += sum(len(line) for line in lines)
+    buffer = lines.pop() if not buffer.endswith(b'\n') and lines else b''
+    num_lines += len(lines)
+  return num_lines + bool(buffer), bytes_copied
+
+
+def _split_with_line_splitter(chunks: List[bytes]) -> Tuple[int, int]:
+  """Splits chunks with the line splitter, counting the copied bytes."""
+  num_lines = 0
+  splitter = line_splitter.LineSplitter()
+  for chunk in chunks:
+    lines, _ = splitter.split(chunk)
+    num_lines += len(lines)
+  lines, _ = splitter.flush()
+  return num_lines + len(lines), splitter.bytes_copied
+
+
+def _run(chunks: List[bytes]) -> Iterator[Tuple[str, int, float, float]]:
+  """Runs every splitter, generating its name and measurements."""
+  size = sum(len(chunk) for chunk in chunks)
+  for name, split in (('concatenate+splitlines', _split_with_concatenation),
+                      ('line_splitter', _split_with_line_splitter)):
+    start_time = time.perf_counter()
+    num_lines, bytes_copied = split(chunks)
+    seconds = time.perf_counter() - start_time
+    yield name, num_lines, bytes_copied / size, size / seconds / 1024 / 1024
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--size_mb', type=int, default=100,
+                      help='Size of the content to split in MB.')
+  parser.add_argument('--chunk_kb', type=int, default=8 * 1024,
+                      help='Size of the download chunks in KB.')
+  args = parser.parse_args()
+
+  chunks = _make_chunks(args.size_mb * 1024 * 1024, args.chunk_kb * 1024)
+  print(f'{"splitter":<24}{"lines":>12}{"copied/byte":>14}{"MB/s":>10}')
+  for name, num_lines, copied_per_byte, throughput in _run(chunks):
+    print(f'{name:<24}{num_lines:>12}{copied_per_byte:>14.3f}'
+          f'{throughput:>10.1f}')
+
+
+if __name__ == '__main__':
+  main()
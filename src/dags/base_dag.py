@@ -18,7 +18,7 @@
 import abc
 import datetime
 import logging
-from typing import Any, Optional
+from typing import Any, Dict, Optional
 
 from airflow import utils
 from airflow.exceptions import AirflowException
@@ -65,6 +65,106 @@ _MONITORING_BQ_CONN_ID = 'bigquery_default'
 # events will be resent to the same output resource.
 _DAG_IS_RETRY = True
 
+# Whether or not the data connector tasks should read, send and monitor blobs
+# concurrently as stages of a pipeline, and how many blobs can be buffered
+# between two stages.
+_DAG_ENABLE_PIPELINE = False
+_DAG_PIPELINE_QUEUE_DEPTH = 2
+
+# Max number of blobs the data connector tasks send to the output at the same
+# time. Monitoring logs are still written in input order.
+_DAG_MAX_INFLIGHT_BLOBS = 1
+
+# Number of shards the input of the DAG is split into. Every shard gets its own
+# retry and run tasks, so shards can be processed by different workers.
+_DAG_NUM_SHARDS = 1
+
+# Number of work units the input of the DAG is split into. If positive, the
+# shard tasks act as workers that claim work units from a shared work queue
+# instead of reading a fixed shard. The work queue is stored in the SQLite
+# database at _DAG_WORK_QUEUE_PATH, or in the monitoring dataset if empty.
+_DAG_NUM_WORK_UNITS = 0
+_DAG_WORK_QUEUE_PATH = ''
+
+# Number of processes the data connector tasks parse the input in. 0 parses the
+# input in the task process.
+_DAG_PARSE_PROCESSES = 0
+
+# Whether or not the data connector tasks adjust the number of rows per blob to
+# the observed throughput of the output.
+_DAG_ADAPTIVE_PAGE_SIZE = False
+
+# Number of full output batches the data connector tasks coalesce the events of
+# consecutive blobs into. 0 sends every blob on its own.
+_DAG_COALESCE_BATCHES = 0
+
+# Max estimated bytes of the blobs the data connector tasks hold in memory
+# before spilling them to local temp files. 0 disables the budget.
+_DAG_MAX_MEMORY_BYTES = 0
+
+# Max number of rows and bytes of consecutive small Cloud Storage objects the
+# data connector tasks pack into one blob. 0 reads every object as a blob.
+_DAG_GCS_COALESCE_MAX_ROWS = 0
+_DAG_GCS_COALESCE_MAX_BYTES = 0
+
+# Number of rows per blob of Cloud Storage objects parsed while they are
+# downloaded. 0 reads every object as a whole.
+_DAG_GCS_STREAM_BLOB_ROWS = 0
+
+# Number of byte ranges of a Cloud Storage object downloaded at the same time.
+_DAG_GCS_DOWNLOAD_WORKERS = 1
+
+# Number of Cloud Storage objects read at the same time, largest first.
+_DAG_GCS_OBJECT_WORKERS = 1
+
+# Size in bytes of the byte ranges Cloud Storage objects are downloaded in.
+_DAG_GCS_CHUNK_SIZE = 100 * 1024 * 1024
+
+# Comma separated names of the columns read from Parquet and Avro objects in
+# Cloud Storage. Empty reads all columns.
+_DAG_GCS_COLUMNS = ''
+
+# JSON object of CSV column names in Cloud Storage objects to the type the
+# column is converted to. Empty keeps all fields as strings.
+_DAG_GCS_CSV_SCHEMA = ''
+
+# Dot separated keys of the objects leading to the array of events of
+# JSON_ARRAY objects in Cloud Storage. Empty reads the top-level array.
+_DAG_GCS_JSON_ARRAY_PATH = ''
+
+# Comma separated globs of the names of the Cloud Storage objects to read,
+# relative to the prefix. Empty reads all objects.
+_DAG_GCS_NAME_GLOBS = ''
+
+# Whether or not Cloud Storage objects are listed from the name of the last
+# processed object on. Only for prefixes where objects are added in name order.
+_DAG_GCS_LIST_FROM_LAST_PROCESSED = 0
+
+# Max number of streams BigQuery tables are read in with the BigQuery Storage
+# Read API, and the format the rows are encoded in. 0 reads the tables page by
+# page with tabledata.list.
+_DAG_BQ_READ_STREAMS = 0
+_DAG_BQ_READ_FORMAT = 'ARROW'
+
+# Number of tabledata.list page requests of BigQuery tables in flight at the
+# same time, and the max number of pages fetched ahead. 0 fetches as many pages
+# ahead as requests are in flight.
+_DAG_BQ_PREFETCH_PAGES = 1
+_DAG_BQ_PREFETCH_MAX_PAGES = 0
+
+# Comma separated names of BigQuery columns kept as strings instead of being
+# converted by their type. Empty converts all columns.
+_DAG_BQ_STRING_FIELDS = ''
+
+# Cloud Storage URI BigQuery tables are extracted under by an extract job, to
+# be streamed from Cloud Storage. Empty reads the tables directly.
+_DAG_BQ_EXTRACT_GCS_URI = ''
+
+# Monotonically increasing column BigQuery tables are read incrementally by,
+# only reading the rows after the watermark of the last run. Empty reads the
+# whole tables.
+_DAG_BQ_WATERMARK_COLUMN = ''
+
 # Whether or not the DAG should include a main run. This option can be used
 # should the user want to skip the main run and only run the retry operation.
 _DAG_IS_RUN = True
@@ -119,6 +219,76 @@ class BaseDag(abc.ABC):
     monitoring_dataset: Dataset id of the monitoring table.
     monitoring_table: Table name of the monitoring table.
     monitoring_bq_conn_id: BigQuery connection ID for the monitoring table.
+    dag_enable_pipeline: Whether or not the data connector tasks should run
+                         reading, sending and monitoring concurrently.
+    dag_pipeline_queue_depth: Max number of blobs buffered between two
+                              pipeline stages.
+    dag_max_inflight_blobs: Max number of blobs sent to the output at the same
+                            time.
+    dag_num_shards: Number of shards the input is split into. One retry task
+                    and one run task are created per shard.
+    shard_index: Index of the shard the tasks are currently created for.
+    dag_num_work_units: Number of work units the tasks claim from a shared work
+                        queue. 0 disables the work queue.
+    dag_work_queue_path: Path of the SQLite work queue database. If empty, the
+                         work queue is stored in the monitoring dataset.
+    dag_parse_processes: Number of processes the input is parsed in. 0 parses
+                         the input in the task process.
+    dag_adaptive_page_size: Whether or not the number of rows per blob adapts
+                            to the observed throughput of the output.
+    dag_coalesce_batches: Number of full output batches to coalesce the events
+                          of consecutive blobs into. 0 to disable.
+    dag_max_memory_bytes: Max estimated bytes of blobs held in memory before
+                          spilling them to disk. 0 to disable. Large Cloud
+                          Storage objects must also be streamed with
+                          dag_gcs_stream_blob_rows.
+    dag_gcs_coalesce_max_rows: Max number of rows of consecutive small Cloud
+                               Storage objects packed into one blob. 0 to
+                               disable.
+    dag_gcs_coalesce_max_bytes: Max number of bytes of consecutive small Cloud
+                                Storage objects packed into one blob. 0 to
+                                disable.
+    dag_gcs_stream_blob_rows: Number of rows per blob of Cloud Storage objects
+                              parsed while they are downloaded. 0 reads every
+                              object as a whole.
+    dag_gcs_download_workers: Number of byte ranges of a Cloud Storage object
+                              downloaded at the same time.
+    dag_gcs_object_workers: Number of Cloud Storage objects read at the same
+                            time.
+    dag_gcs_chunk_size: Size in bytes of the byte ranges Cloud Storage objects
+                        are downloaded in.
+    dag_gcs_columns: Comma separated names of the columns read from Parquet and
+                     Avro objects. Empty reads all columns.
+    dag_gcs_csv_schema: JSON object of CSV column names to the type the column
+                        is converted to. Empty keeps all fields as strings.
+    dag_gcs_json_array_path: Dot separated keys leading to the array of events
+                             of JSON_ARRAY objects. Empty reads the top-level
+                             array.
+    dag_gcs_name_globs: Comma separated globs of the names of the Cloud Storage
+                        objects to read. Empty reads all objects.
+    dag_gcs_list_from_last_processed: Whether or not Cloud Storage objects are
+                                      listed from the name of the last
+                                      processed object on.
+    dag_bq_read_streams: Max number of streams BigQuery tables are read in with
+                         the BigQuery Storage Read API. 0 to disable.
+                         Runs after a failed run resume the streams of its
+                         read session, unless the session expired.
+    dag_bq_read_format: Format the rows of the read streams are encoded in,
+                        ARROW or AVRO.
+    dag_bq_prefetch_pages: Number of tabledata.list page requests in flight at
+                           the same time.
+    dag_bq_prefetch_max_pages: Max number of tabledata.list pages fetched ahead
+                               of the page being sent.
+    dag_bq_string_fields: Comma separated names of BigQuery columns kept as
+                          strings. Empty converts all columns.
+    dag_bq_extract_gcs_uri: Cloud Storage URI BigQuery tables are extracted
+                            under before they are read. Empty reads the tables
+                            directly.
+    dag_bq_watermark_column: Increasing column BigQuery tables are read
+                             incrementally by. Rows must be added in the order
+                             of the column, as rows added with a value up to
+                             the last value read are never read. Empty reads
+                             the whole tables.
   """
 
   def __init__(self, dag_name: str)  -> None:
@@ -167,6 +337,92 @@ class BaseDag(abc.ABC):
     self.monitoring_bq_conn_id = variable.Variable.get('monitoring_bq_conn_id',
                                                        _MONITORING_BQ_CONN_ID)
 
+    self.dag_enable_pipeline = bool(
+        int(
+            variable.Variable.get(f'{self.dag_name}_enable_pipeline',
+                                  _DAG_ENABLE_PIPELINE)))
+    self.dag_pipeline_queue_depth = int(
+        variable.Variable.get(f'{self.dag_name}_pipeline_queue_depth',
+                              _DAG_PIPELINE_QUEUE_DEPTH))
+    self.dag_max_inflight_blobs = int(
+        variable.Variable.get(f'{self.dag_name}_max_inflight_blobs',
+                              _DAG_MAX_INFLIGHT_BLOBS))
+
+    self.dag_num_shards = int(
+        variable.Variable.get(f'{self.dag_name}_num_shards', _DAG_NUM_SHARDS))
+    self.shard_index = 0
+
+    self.dag_num_work_units = int(
+        variable.Variable.get(f'{self.dag_name}_num_work_units',
+                              _DAG_NUM_WORK_UNITS))
+    self.dag_work_queue_path = variable.Variable.get(
+        f'{self.dag_name}_work_queue_path', _DAG_WORK_QUEUE_PATH)
+
+    self.dag_parse_processes = int(
+        variable.Variable.get(f'{self.dag_name}_parse_processes',
+                              _DAG_PARSE_PROCESSES))
+
+    self.dag_adaptive_page_size = bool(
+        int(
+            variable.Variable.get(f'{self.dag_name}_adaptive_page_size',
+                                  _DAG_ADAPTIVE_PAGE_SIZE)))
+
+    self.dag_coalesce_batches = int(
+        variable.Variable.get(f'{self.dag_name}_coalesce_batches',
+                              _DAG_COALESCE_BATCHES))
+
+    self.dag_max_memory_bytes = int(
+        variable.Variable.get(f'{self.dag_name}_max_memory_bytes',
+                              _DAG_MAX_MEMORY_BYTES))
+
+    self.dag_gcs_coalesce_max_rows = int(
+        variable.Variable.get(f'{self.dag_name}_gcs_coalesce_max_rows',
+                              _DAG_GCS_COALESCE_MAX_ROWS))
+    self.dag_gcs_coalesce_max_bytes = int(
+        variable.Variable.get(f'{self.dag_name}_gcs_coalesce_max_bytes',
+                              _DAG_GCS_COALESCE_MAX_BYTES))
+    self.dag_gcs_stream_blob_rows = int(
+        variable.Variable.get(f'{self.dag_name}_gcs_stream_blob_rows',
+                              _DAG_GCS_STREAM_BLOB_ROWS))
+    self.dag_gcs_download_workers = int(
+        variable.Variable.get(f'{self.dag_name}_gcs_download_workers',
+                              _DAG_GCS_DOWNLOAD_WORKERS))
+    self.dag_gcs_object_workers = int(
+        variable.Variable.get(f'{self.dag_name}_gcs_object_workers',
+                              _DAG_GCS_OBJECT_WORKERS))
+    self.dag_gcs_chunk_size = int(
+        variable.Variable.get(f'{self.dag_name}_gcs_chunk_size',
+                              _DAG_GCS_CHUNK_SIZE))
+    self.dag_gcs_columns = variable.Variable.get(
+        f'{self.dag_name}_gcs_columns', _DAG_GCS_COLUMNS)
+    self.dag_gcs_csv_schema = variable.Variable.get(
+        f'{self.dag_name}_gcs_csv_schema', _DAG_GCS_CSV_SCHEMA)
+    self.dag_gcs_json_array_path = variable.Variable.get(
+        f'{self.dag_name}_gcs_json_array_path', _DAG_GCS_JSON_ARRAY_PATH)
+    self.dag_gcs_name_globs = variable.Variable.get(
+        f'{self.dag_name}_gcs_name_globs', _DAG_GCS_NAME_GLOBS)
+    self.dag_gcs_list_from_last_processed = int(
+        variable.Variable.get(f'{self.dag_name}_gcs_list_from_last_processed',
+                              _DAG_GCS_LIST_FROM_LAST_PROCESSED))
+
+    self.dag_bq_read_streams = int(
+        variable.Variable.get(f'{self.dag_name}_bq_read_streams',
+                              _DAG_BQ_READ_STREAMS))
+    self.dag_bq_read_format = variable.Variable.get(
+        f'{self.dag_name}_bq_read_format', _DAG_BQ_READ_FORMAT)
+    self.dag_bq_prefetch_pages = int(
+        variable.Variable.get(f'{self.dag_name}_bq_prefetch_pages',
+                              _DAG_BQ_PREFETCH_PAGES))
+    self.dag_bq_prefetch_max_pages = int(
+        variable.Variable.get(f'{self.dag_name}_bq_prefetch_max_pages',
+                              _DAG_BQ_PREFETCH_MAX_PAGES))
+    self.dag_bq_string_fields = variable.Variable.get(
+        f'{self.dag_name}_bq_string_fields', _DAG_BQ_STRING_FIELDS)
+    self.dag_bq_extract_gcs_uri = variable.Variable.get(
+        f'{self.dag_name}_bq_extract_gcs_uri', _DAG_BQ_EXTRACT_GCS_URI)
+    self.dag_bq_watermark_column = variable.Variable.get(
+        f'{self.dag_name}_bq_watermark_column', _DAG_BQ_WATERMARK_COLUMN)
+
   def _initialize_dag(self) -> dag.DAG:
     """Initializes an Airflow DAG with appropriate default args.
 
@@ -251,6 +507,10 @@ class BaseDag(abc.ABC):
   def create_dag(self) -> dag.DAG:
     """Creates the DAG.
 
+    When the input is split into several shards, a retry task and a run task
+    are created for every shard, and the tasks of one shard only depend on each
+    other.
+
     Returns:
       Airflow DAG instance.
     """
@@ -258,21 +518,88 @@ class BaseDag(abc.ABC):
     main_dag = self._initialize_dag()
 
     try:
-      if self.dag_is_retry:
-        retry_task = self._try_create_task(main_dag=main_dag, is_retry=True)
-      if self.dag_is_run:
-        run_task = self._try_create_task(main_dag=main_dag, is_retry=False)
+      if self.dag_num_shards < 1:
+        raise errors.DAGError(msg='Number of shards must be positive.')
+
+      cleanup_task = None
+      for shard_index in range(self.dag_num_shards):
+        self.shard_index = shard_index
         if self.dag_is_retry:
-          run_task.set_upstream(retry_task)
-        if self.dag_enable_monitoring_cleanup:
-          cleanup_task = self._create_cleanup_task(main_dag=main_dag)
-          run_task.set_upstream(cleanup_task)
+          retry_task = self._try_create_task(main_dag=main_dag, is_retry=True)
+        if self.dag_is_run:
+          run_task = self._try_create_task(main_dag=main_dag, is_retry=False)
+          if self.dag_is_retry:
+            run_task.set_upstream(retry_task)
+          if self.dag_enable_monitoring_cleanup:
+            if cleanup_task is None:
+              cleanup_task = self._create_cleanup_task(main_dag=main_dag)
+            run_task.set_upstream(cleanup_task)
     except errors.DAGError as error:
       main_dag = self._initialize_dag()
       create_error_report_task(error_report_dag=main_dag, error=error)
+    finally:
+      self.shard_index = 0
 
     return main_dag
 
+  def get_pipeline_params(self) -> Dict[str, Any]:
+    """Gets the data connector operator params that tune the data transfer.
+
+    The params include the shard of the input the task is created for.
+
+    Returns:
+      A dict of keyword arguments for DataConnectorOperator.
+    """
+    return {
+        'enable_pipeline': self.dag_enable_pipeline,
+        'pipeline_queue_depth': self.dag_pipeline_queue_depth,
+        'max_inflight_blobs': self.dag_max_inflight_blobs,
+        'shard_index': self.shard_index,
+        'num_shards': self.dag_num_shards,
+        'num_work_units': self.dag_num_work_units,
+        'work_queue_path': self.dag_work_queue_path,
+        'parse_processes': self.dag_parse_processes,
+        'adaptive_page_size': self.dag_adaptive_page_size,
+        'coalesce_batches': self.dag_coalesce_batches,
+        'max_memory_bytes': self.dag_max_memory_bytes,
+    }
+
+  def get_gcs_params(self) -> Dict[str, Any]:
+    """Gets the Cloud Storage input hook params that tune reading the input.
+
+    Returns:
+      A dict of keyword arguments for the Cloud Storage input hook.
+    """
+    return {
+        'gcs_coalesce_max_rows': self.dag_gcs_coalesce_max_rows,
+        'gcs_coalesce_max_bytes': self.dag_gcs_coalesce_max_bytes,
+        'gcs_stream_blob_rows': self.dag_gcs_stream_blob_rows,
+        'gcs_download_workers': self.dag_gcs_download_workers,
+        'gcs_object_workers': self.dag_gcs_object_workers,
+        'gcs_chunk_size': self.dag_gcs_chunk_size,
+        'gcs_columns': self.dag_gcs_columns,
+        'gcs_csv_schema': self.dag_gcs_csv_schema,
+        'gcs_json_array_path': self.dag_gcs_json_array_path,
+        'gcs_name_globs': self.dag_gcs_name_globs,
+        'gcs_list_from_last_processed': self.dag_gcs_list_from_last_processed,
+    }
+
+  def get_bq_params(self) -> Dict[str, Any]:
+    """Gets the BigQuery input hook params that tune reading the input.
+
+    Returns:
+      A dict of keyword arguments for the BigQuery input hook.
+    """
+    return {
+        'bq_read_streams': self.dag_bq_read_streams,
+        'bq_read_format': self.dag_bq_read_format,
+        'bq_prefetch_pages': self.dag_bq_prefetch_pages,
+        'bq_prefetch_max_pages': self.dag_bq_prefetch_max_pages,
+        'bq_string_fields': self.dag_bq_string_fields,
+        'bq_extract_gcs_uri': self.dag_bq_extract_gcs_uri,
+        'bq_watermark_column': self.dag_bq_watermark_column,
+    }
+
   def get_task_id(self, task_name: str, is_retry: bool) -> str:
     """Gets task_id by task type.
 
@@ -281,8 +608,11 @@ class BaseDag(abc.ABC):
       is_retry: Whether or not the operator should include a retry task.
 
     Returns:
-      Task id.
+      Task id. Includes the shard index when the input is split into shards.
     """
+    if self.dag_num_shards > 1:
+      task_name = f'{task_name}_shard_{self.shard_index}'
+
     if is_retry:
       return task_name + '_retry_task'
     else:
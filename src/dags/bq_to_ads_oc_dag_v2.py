@@ -66,6 +66,8 @@ class BigQueryToAdsOCDagV2(base_dag.BaseDag):
         monitoring_dataset=self.monitoring_dataset,
         monitoring_table=self.monitoring_table,
         monitoring_bq_conn_id=self.monitoring_bq_conn_id,
+        **self.get_pipeline_params(),
+        **self.get_bq_params(),
         bq_conn_id=_BQ_CONN_ID,
         bq_dataset_id=self.get_variable_value(_DAG_NAME, 'bq_dataset_id'),
         bq_table_id=self.get_variable_value(_DAG_NAME, 'bq_table_id'),
@@ -68,6 +68,8 @@ class GCSToAdsCMDagV2(base_dag.BaseDag):
         monitoring_dataset=self.monitoring_dataset,
         monitoring_table=self.monitoring_table,
         monitoring_bq_conn_id=self.monitoring_bq_conn_id,
+        **self.get_pipeline_params(),
+        **self.get_gcs_params(),
         gcs_bucket=self.get_variable_value(
             _DAG_NAME, 'gcs_bucket_name', fallback_value=''),
         gcs_content_type=self.get_variable_value(
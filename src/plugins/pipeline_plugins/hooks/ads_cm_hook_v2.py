@@ -18,7 +18,7 @@
 For customer match details refer to
 https://developers.google.com/google-ads/api/docs/remarketing/audience-types/customer-match
 """
-from typing import Any, Dict, Generator, List, Tuple
+from typing import Any, Dict, Generator, List, Optional, Tuple
 
 from plugins.pipeline_plugins.hooks import ads_hook_v2
 from plugins.pipeline_plugins.hooks import output_hook_interface
@@ -26,6 +26,11 @@ from plugins.pipeline_plugins.utils import blob as blob_lib
 from plugins.pipeline_plugins.utils import errors
 from plugins.pipeline_plugins.utils import type_alias
 
+# Max number of user identifier operations in one request to the Google Ads API.
+# Every batch is uploaded as its own offline user data job, so the events of a
+# customer are only split when a blob holds more of them.
+_MAX_OPERATIONS_PER_REQUEST = 100000
+
 
 class GoogleAdsCustomerMatchHook(
     ads_hook_v2.GoogleAdsHook, output_hook_interface.OutputHookInterface):
@@ -114,6 +119,14 @@ class GoogleAdsCustomerMatchHook(
 
     return blob
 
+  def get_max_batch_size(self) -> Optional[int]:
+    """Retrieves the max number of events sent in one request to the output.
+
+    Returns:
+      The max number of events per request.
+    """
+    return _MAX_OPERATIONS_PER_REQUEST
+
   def _validate_init_params(
       self, user_list_name: str,
       membership_lifespan: int,
@@ -170,6 +183,10 @@ class GoogleAdsCustomerMatchHook(
   ) -> Generator[Tuple[str, List[type_alias.Payload]], None, None]:
     """Creates a batch of events that grouped by a customer_id.
 
+    Coalesced blobs can hold more events of a customer than fit in a request,
+    so the events of a customer are split into batches of at most
+    _MAX_OPERATIONS_PER_REQUEST events.
+
     Args:
       events: Customer match user list to send.
 
@@ -181,4 +198,6 @@ class GoogleAdsCustomerMatchHook(
       customer_id = event[ads_hook_v2.CUSTOMER_ID]
       batches.setdefault(customer_id, []).append((index, event))
     for customer_id in batches:
-      yield customer_id, batches[customer_id]
+      batch = batches[customer_id]
+      for i in range(0, len(batch), _MAX_OPERATIONS_PER_REQUEST):
+        yield customer_id, batch[i : i + _MAX_OPERATIONS_PER_REQUEST]
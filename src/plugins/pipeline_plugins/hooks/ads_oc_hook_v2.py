@@ -15,7 +15,7 @@
 
 """Custom Hook for sending offline click conversions to Google Ads."""
 
-from typing import Any, Dict, List, Tuple, Generator
+from typing import Any, Dict, List, Optional, Tuple, Generator
 
 from plugins.pipeline_plugins.hooks import ads_hook_v2
 from plugins.pipeline_plugins.hooks import output_hook_interface
@@ -23,6 +23,9 @@ from plugins.pipeline_plugins.utils import blob as blob_lib
 from plugins.pipeline_plugins.utils import errors
 from plugins.pipeline_plugins.utils import type_alias
 
+# Max number of click conversions in one upload request to the Google Ads API.
+_MAX_CONVERSIONS_PER_REQUEST = 2000
+
 
 class GoogleAdsOfflineConversionsHook(
     ads_hook_v2.GoogleAdsHook, output_hook_interface.OutputHookInterface):
@@ -71,12 +74,22 @@ class GoogleAdsOfflineConversionsHook(
 
     return blob
 
+  def get_max_batch_size(self) -> Optional[int]:
+    """Retrieves the max number of events sent in one request to the output.
+
+    Returns:
+      The max number of events per request.
+    """
+    return _MAX_CONVERSIONS_PER_REQUEST
+
   def _generate_batches(
       self,
       events: List[Dict[str, Any]]
   ) -> Generator[Tuple[str, List[type_alias.Payload]], None, None]:
     """Creates a batch of events grouped by a customer_id.
 
+    Batches of a customer_id are split to fit into one upload request.
+
     Args:
       events: Offline click conversion events to send.
 
@@ -88,4 +101,7 @@ class GoogleAdsOfflineConversionsHook(
       customer_id = event[ads_hook_v2.CUSTOMER_ID]
       batches.setdefault(customer_id, []).append((index, event))
     for customer_id in batches:
-      yield customer_id, batches[customer_id]
+      for i in range(0, len(batches[customer_id]),
+                     _MAX_CONVERSIONS_PER_REQUEST):
+        yield customer_id, batches[customer_id][
+            i:i + _MAX_CONVERSIONS_PER_REQUEST]
@@ -15,20 +15,487 @@
 
 """Custom BigQuery hook to generate BigQuery table pages as blobs."""
 
-from typing import Any, Dict, Generator, List, Optional, Tuple
+import base64
+import concurrent.futures
+import datetime
+import decimal
+import functools
+import io
+import json
+import threading
+import time
+from typing import (Any, Callable, Dict, Generator, Iterable, List, Optional,
+                    Tuple)
+import uuid
 
 from airflow.contrib.hooks import bigquery_hook
+from google.api_core import exceptions as api_exceptions
 from googleapiclient import errors as googleapiclient_errors
+import pyarrow
 
+try:
+  # pylint: disable=g-import-not-at-top
+  from google.cloud import bigquery_storage
+except ImportError:
+  bigquery_storage = None
+
+try:
+  import fastavro  # pylint: disable=g-import-not-at-top
+except ImportError:
+  fastavro = None
+
+from plugins.pipeline_plugins.hooks import gcs_hook
 from plugins.pipeline_plugins.hooks import input_hook_interface
 from plugins.pipeline_plugins.utils import blob
 from plugins.pipeline_plugins.utils import errors
+from plugins.pipeline_plugins.utils import pipeline_utils
 from plugins.pipeline_plugins.utils import retry_utils
+from plugins.pipeline_plugins.utils import shard_utils
+from plugins.pipeline_plugins.utils import shared_memory_transport
 
 _DEFAULT_PAGE_SIZE = 1000
+
+# Number of rows of a page serialized to estimate the payload size of the page.
+_PAYLOAD_SAMPLE_ROWS = 10
 _PLATFORM = 'BigQuery'
 _BASE_BQ_HOOK_PARAMS = ('delegate_to', 'use_legacy_sql', 'location')
 
+# Formats the BigQuery Storage Read API can encode the rows of streams in.
+_READ_FORMATS = ('ARROW', 'AVRO')
+_TIME_UNITS_PER_SECOND = {'s': 1, 'ms': 10**3, 'us': 10**6, 'ns': 10**9}
+
+# The blobs of read streams are monitored at the URL of the table, '#', this
+# prefix and the name of the stream, with their offset in the stream as
+# position.
+_READ_SESSION_LOCATION = 'read-session/'
+
+_GCS_URI_PREFIX = 'gs://'
+# Tables are extracted to compressed Avro objects with logical types, so the
+# cells keep their types.
+_EXTRACT_JOB_CONFIGURATION = {'destinationFormat': 'AVRO',
+                              'compression': 'DEFLATE',
+                              'useAvroLogicalTypes': True}
+_EXTRACT_OBJECT_PATTERN = 'part-*.avro'
+# Object written next to the extracted objects once the extract job is done,
+# so the objects of a failed job are never read. It holds the id of the
+# extraction.
+_EXTRACT_DONE_OBJECT = '_SUCCESS'
+# The blobs of extracted tables are monitored at the URL of the table, '#',
+# this prefix and the id of the extraction, so the processed row ranges of an
+# extraction are never applied to the rows of another one.
+_EXTRACT_LOCATION = 'extract/'
+# The blobs of tables read incrementally are monitored at the URL of the table,
+# '#', this prefix, the watermark the rows are read after, '/' and the
+# destination table of the query of the rows, with positions in the
+# destination table.
+_WATERMARK_LOCATION = 'after-watermark/'
+# Query parameter types of the legacy type names of table schemas.
+_QUERY_PARAMETER_TYPES = {'INTEGER': 'INT64', 'FLOAT': 'FLOAT64',
+                          'BOOLEAN': 'BOOL'}
+
+
+def _query_parameter(name: str, parameter_type: str,
+                     value: str) -> Dict[str, Any]:
+  """Returns a named query parameter of a standard SQL query.
+
+  Args:
+    name: Name of the parameter.
+    parameter_type: Standard SQL type of the parameter.
+    value: String representation of the value of the parameter.
+  """
+  return {'name': name,
+          'parameterType': {'type': parameter_type},
+          'parameterValue': {'value': value}}
+
+
+def _parse_bool(bq_str: str) -> bool:
+  """Parses the string of a BOOLEAN cell."""
+  lowered = bq_str.lower()
+  if lowered not in ('true', 'false'):
+    raise ValueError("{} must have value 'true' or 'false'".format(bq_str))
+  return lowered == 'true'
+
+
+# Converters of the string cells of tabledata rows by column type. Cells of the
+# other types, like STRING, NUMERIC, BIGNUMERIC, DATE, DATETIME, TIME and BYTES,
+# are kept as the strings tabledata returns. Events must stay JSON serializable,
+# as failed events are stored as JSON in monitoring, so Decimal and date values
+# don't fit, and floats would round NUMERIC values. The read streams of the
+# Storage Read API are converted to the same strings, so events look the same
+# whichever API the table is read with.
+_CELL_CONVERTERS = {
+    'BOOLEAN': _parse_bool,
+    'BOOL': _parse_bool,
+    'INTEGER': int,
+    'INT64': int,
+    'FLOAT': float,
+    'FLOAT64': float,
+    'TIMESTAMP': float,
+}
+_RECORD_TYPES = ('RECORD', 'STRUCT')
+
+# A compiled schema: the name of every field, and the converter of its cells,
+# or None for cells that are kept as they are.
+_CompiledSchema = List[Tuple[str, Optional[Callable[[Any], Any]]]]
+
+
+def _convert_cell(converter: Optional[Callable[[Any], Any]], value: Any) -> Any:
+  """Converts a cell value with a compiled converter. None stays None."""
+  if value is None or converter is None:
+    return value
+  return converter(value)
+
+
+def _convert_record(fields: _CompiledSchema, value: Dict[str, Any]
+                    ) -> Dict[str, Any]:
+  """Converts the value of a RECORD cell to a map of its fields."""
+  return {name: _convert_cell(converter, cell['v'])
+          for (name, converter), cell in zip(fields, value['f'])}
+
+
+def _convert_repeated(converter: Optional[Callable[[Any], Any]],
+                      value: List[Dict[str, Any]]) -> List[Any]:
+  """Converts the value of a REPEATED cell to a list of its items."""
+  return [_convert_cell(converter, item['v']) for item in value]
+
+
+def _compile_field_converter(
+    field: Dict[str, Any]) -> Optional[Callable[[Any], Any]]:
+  """Compiles the converter of the cells of a schema field.
+
+  Args:
+    field: The schema field.
+
+  Returns:
+    The converter of the non-null cells of the field, or None if the cells are
+    kept as they are.
+  """
+  if field['type'] in _RECORD_TYPES:
+    converter = functools.partial(
+        _convert_record, _compile_schema(field.get('fields', [])))
+  else:
+    converter = _CELL_CONVERTERS.get(field['type'])
+  if field.get('mode') == 'REPEATED':
+    return functools.partial(_convert_repeated, converter)
+  return converter
+
+
+def _compile_schema(fields: List[Dict[str, Any]],
+                    string_fields: Tuple[str, ...] = ()) -> _CompiledSchema:
+  """Compiles a table schema into the converters of its fields.
+
+  Args:
+    fields: The fields of the schema.
+    string_fields: Names of top-level fields that are kept as the strings
+      tabledata returns. Only applies to fields that are neither records nor
+      repeated.
+
+  Returns:
+    The name and the converter of every field.
+  """
+  compiled = []
+  for field in fields:
+    if (field['name'] in string_fields and
+        field['type'] not in _RECORD_TYPES and
+        field.get('mode') != 'REPEATED'):
+      compiled.append((field['name'], None))
+    else:
+      compiled.append((field['name'], _compile_field_converter(field)))
+  return compiled
+
+
+def _query_results_to_maps_list(
+    query_results: Dict[str, Any],
+    string_fields: Tuple[str, ...] = (),
+    compiled: Optional[_CompiledSchema] = None) -> List[Dict[str, Any]]:
+  """Converts table rows query results of BigQuery to list of maps.
+
+  The cells are converted column by column with the compiled schema. Records
+  are converted to nested maps, and repeated fields to lists.
+
+  Defined at module level, so it can be run in a process pool.
+
+  Args:
+    query_results: Raw query result.
+    string_fields: Names of top-level fields that are kept as strings. Only
+      used when the schema is compiled from the query results.
+    compiled: The compiled schema of the rows, or None to compile the schema
+      of the query results.
+
+  Returns:
+    data: Table rows in the format of list of maps.
+  """
+  if compiled is None:
+    compiled = _compile_schema(query_results['schema']['fields'],
+                               string_fields)
+  rows = query_results.get('rows', [])
+  if not rows or not compiled:
+    return [{} for _ in rows]
+
+  columns = []
+  for (_, converter), cells in zip(compiled,
+                                   zip(*(row['f'] for row in rows))):
+    values = [cell['v'] for cell in cells]
+    if converter is not None:
+      values = [None if value is None else converter(value)
+                for value in values]
+    columns.append(values)
+  names = [name for name, _ in compiled]
+  return [dict(zip(names, row_values)) for row_values in zip(*columns)]
+
+
+def _to_json_value(value: Any) -> Any:
+  """Converts a value decoded from a read stream to the type of tabledata rows.
+
+  Timestamps are converted to seconds since the epoch, like the TIMESTAMP cells
+  of tabledata rows. Other date and time values are converted to ISO strings,
+  numerics to decimal strings and bytes to base64 strings, which is how
+  tabledata returns them. Structs and arrays are converted recursively.
+
+  Args:
+    value: The decoded value.
+
+  Returns:
+    The converted value.
+  """
+  if isinstance(value, datetime.datetime):
+    if value.tzinfo is not None:
+      return value.timestamp()
+    return value.isoformat()
+  elif isinstance(value, (datetime.date, datetime.time)):
+    return value.isoformat()
+  elif isinstance(value, decimal.Decimal):
+    return format(value.normalize(), 'f')
+  elif isinstance(value, bytes):
+    return base64.b64encode(value).decode('ascii')
+  elif isinstance(value, dict):
+    return {key: _to_json_value(item) for key, item in value.items()}
+  elif isinstance(value, list):
+    return [_to_json_value(item) for item in value]
+  else:
+    return value
+
+
+def _arrow_column_to_values(column: pyarrow.Array) -> List[Any]:
+  """Converts an Arrow column to the values of tabledata rows.
+
+  Columns of numbers, booleans and strings are taken as they are, and
+  timestamps are converted column-wise, so only the other columns are
+  converted value by value.
+
+  Args:
+    column: The Arrow column.
+
+  Returns:
+    The converted values of the column.
+  """
+  column_type = column.type
+  if pyarrow.types.is_timestamp(column_type) and column_type.tz is not None:
+    units_per_second = _TIME_UNITS_PER_SECOND[column_type.unit]
+    return [None if value is None else value / units_per_second
+            for value in column.cast(pyarrow.int64()).to_pylist()]
+
+  values = column.to_pylist()
+  if (pyarrow.types.is_integer(column_type) or
+      pyarrow.types.is_floating(column_type) or
+      pyarrow.types.is_boolean(column_type) or
+      pyarrow.types.is_string(column_type)):
+    return values
+  return [_to_json_value(value) for value in values]
+
+
+def _decode_arrow_rows(response: Any,
+                       schema: pyarrow.Schema) -> List[Dict[str, Any]]:
+  """Decodes the Arrow record batch of a ReadRows response into rows.
+
+  Args:
+    response: The ReadRowsResponse of a read stream.
+    schema: The Arrow schema of the read session.
+
+  Returns:
+    The rows of the record batch as maps.
+  """
+  record_batch = pyarrow.ipc.read_record_batch(
+      pyarrow.py_buffer(response.arrow_record_batch.serialized_record_batch),
+      schema)
+  columns = [_arrow_column_to_values(column)
+             for column in record_batch.columns]
+  return [dict(zip(schema.names, row)) for row in zip(*columns)]
+
+
+def _decode_avro_rows(response: Any,
+                      schema: Dict[str, Any]) -> List[Dict[str, Any]]:
+  """Decodes the Avro rows of a ReadRows response.
+
+  Args:
+    response: The ReadRowsResponse of a read stream.
+    schema: The parsed Avro schema of the read session.
+
+  Returns:
+    The rows as maps.
+  """
+  rows_buffer = io.BytesIO(response.avro_rows.serialized_binary_rows)
+  return [_to_json_value(fastavro.schemaless_reader(rows_buffer, schema))
+          for _ in range(response.row_count)]
+
+
+def _get_resumable_read_session(
+    processed_blobs_generator: Iterable[Tuple[str, str, str]],
+    location_prefix: str
+) -> Optional[Tuple[List[str], Optional[float], Dict[str, int]]]:
+  """Gets the unfinished read session to resume the streams of, if any.
+
+  Every blob of a stream is stored with a JSON checkpoint of its end row in
+  the stream. The first blob of every stream also holds the names of all the
+  streams of the session and the time the session expires, and the last blob
+  of a session marks the session as done.
+
+  Args:
+    processed_blobs_generator: Tuples of (location, position, info) of the
+      processed blobs of the read streams of the table.
+    location_prefix: The prefix of the locations, followed by the name of the
+      stream.
+
+  Returns:
+    A tuple of the names of the streams of the latest unfinished session that
+    didn't expire, its expire time in seconds since the epoch, and the offset
+    to resume every processed stream at, or None if there is no such session.
+  """
+  sessions = {}
+  for location, _, info in processed_blobs_generator:
+    try:
+      checkpoint = json.loads(info)
+    except (TypeError, ValueError):
+      continue
+    if (not isinstance(checkpoint, dict) or
+        not location.startswith(location_prefix)):
+      continue
+
+    stream_name = location[len(location_prefix):]
+    session = sessions.setdefault(stream_name.rpartition('/streams/')[0], {
+        'streams': None, 'expire_time': None, 'done': False, 'offsets': {}})
+    offsets = session['offsets']
+    offsets[stream_name] = max(offsets.get(stream_name, 0),
+                               checkpoint.get('end_row', 0))
+    if 'streams' in checkpoint:
+      session['streams'] = checkpoint['streams']
+      session['expire_time'] = checkpoint.get('expire_time')
+    session['done'] = session['done'] or checkpoint.get('session_done', False)
+
+  now = time.time()
+  resumable = [session for session in sessions.values()
+               if session['streams'] and not session['done'] and
+               (session['expire_time'] is None or
+                session['expire_time'] > now)]
+  if not resumable:
+    return None
+  latest = max(resumable, key=lambda session: session['expire_time'] or 0)
+  return latest['streams'], latest['expire_time'], latest['offsets']
+
+
+def _get_processed_ranges(
+    processed_blobs_generator: Iterable[Tuple[str, str, str]],
+    location: str) -> List[Tuple[int, int]]:
+  """Gets the processed row ranges of a location, in the order of positions.
+
+  Args:
+    processed_blobs_generator: Tuples of (location, position, info) of
+      processed blobs, where info is the number of rows of the blob, or a JSON
+      object with the number of rows.
+    location: The location to get the processed ranges of.
+
+  Returns:
+    Tuples of (position, num_rows) of the processed blobs of the location.
+  """
+  ranges = []
+  for blob_location, position, info in processed_blobs_generator:
+    if blob_location != location:
+      continue
+    try:
+      num_rows = json.loads(info)
+      if isinstance(num_rows, dict):
+        num_rows = num_rows['num_rows']
+      ranges.append((int(position), int(num_rows)))
+    except (KeyError, TypeError, ValueError):
+      continue
+  return sorted(ranges)
+
+
+def _get_shard_segment_ends(processed_blobs: Iterable[Tuple[str, str, str]],
+                            total_rows: int, num_shards: int) -> List[int]:
+  """Gets the total numbers of rows the shard boundaries are computed from.
+
+  Every blob of a shard records the total number of rows its boundaries were
+  computed from, so the shards keep their rows while rows are appended to the
+  table. Rows appended after the largest recorded total are split into shards
+  on their own.
+
+  Args:
+    processed_blobs: Tuples of (location, position, info) of the processed
+      blobs of all shards of the table.
+    total_rows: The current total number of rows of the table.
+    num_shards: Total number of shards the table is split into.
+
+  Returns:
+    The ascending totals, ending with the current total unless it is smaller
+    than a recorded total.
+  """
+  segment_ends = set()
+  for location, _, info in processed_blobs:
+    if not shard_utils.is_location_of_num_shards(location, num_shards):
+      continue
+    try:
+      checkpoint = json.loads(info)
+    except (TypeError, ValueError):
+      continue
+    if isinstance(checkpoint, dict) and checkpoint.get('total_rows'):
+      segment_ends.add(int(checkpoint['total_rows']))
+  if not segment_ends or total_rows > max(segment_ends):
+    segment_ends.add(total_rows)
+  return sorted(segment_ends)
+
+
+def _estimate_payload_bytes(rows: List[Dict[str, Any]]) -> int:
+  """Estimates the serialized size of the rows of a page from a sample.
+
+  Args:
+    rows: The raw rows of a page.
+
+  Returns:
+    The estimated size in bytes of the rows.
+  """
+  sample = rows[:_PAYLOAD_SAMPLE_ROWS]
+  if not sample:
+    return 0
+  return len(json.dumps(sample)) * len(rows) // len(sample)
+
+
+def _page_to_blob(
+    location: str,
+    compiled: _CompiledSchema,
+    page: Tuple[Optional[Dict[str, Any]], int, int]) -> Optional[blob.Blob]:
+  """Converts a raw table page to event blob.
+
+  Defined at module level, so it can be run in a process pool. The compiled
+  schema only holds module level functions, so it can be pickled.
+
+  Args:
+    location: The url of the table the page was read from.
+    compiled: The compiled schema of the table.
+    page: Tuple of (query_results, start_index, num_rows) of the page.
+
+  Returns:
+    blob: Event blob containing event list and status. None if the page had no
+    query results.
+  """
+  query_results, start_index, num_rows = page
+  if query_results is None:
+    return None
+
+  events = _query_results_to_maps_list(query_results, compiled=compiled)
+  return blob.Blob(events=events, location=location, position=start_index,
+                   num_rows=num_rows)
+
 
 class BigQueryHook(
     bigquery_hook.BigQueryHook, input_hook_interface.InputHookInterface):
@@ -38,7 +505,28 @@ class BigQueryHook(
     dataset_id: Unique name of the dataset.
     table_id: Unique location within the dataset.
     selected_fields: Subset of fields to return.
+    string_fields: Names of fields that tabledata rows keep as strings.
+    read_streams: Max number of streams the table is read in with the BigQuery
+      Storage Read API. 0 reads the table page by page with tabledata.list.
+    read_format: Format the rows of the read streams are encoded in, ARROW or
+      AVRO.
+    prefetch_pages: Number of tabledata.list page requests in flight at the
+      same time.
+    prefetch_max_pages: Max number of pages requested or fetched ahead of the
+      page being consumed.
+    extract_gcs_uri: Cloud Storage URI the table is extracted under before it
+      is read, or None to read the table directly.
+    watermark_column: Strictly increasing column the table is read
+      incrementally by, or None to read the whole table.
+    watermark: Value of the watermark column the rows are read after, or None
+      to read all rows.
+    next_watermark: Max value of the watermark column of the rows read, or
+      None if no rows were read.
+    shard_index: Zero based index of the row range shard to read.
+    num_shards: Total number of row range shards the table is split into.
     url: URL of data, formatted as 'bq://{project_id}.{dataset_id}.{table.id}'.
+      Sharded reads append the shard to the URL to keep separate monitoring
+      logs per shard.
   """
 
   def __init__(self,
@@ -46,6 +534,15 @@ class BigQueryHook(
                bq_dataset_id: str,
                bq_table_id: str,
                bq_selected_fields: Optional[str] = None,
+               bq_string_fields: Optional[str] = None,
+               bq_read_streams: int = 0,
+               bq_read_format: str = 'ARROW',
+               bq_prefetch_pages: int = 1,
+               bq_prefetch_max_pages: int = 0,
+               bq_extract_gcs_uri: Optional[str] = None,
+               bq_watermark_column: Optional[str] = None,
+               shard_index: int = 0,
+               num_shards: int = 1,
                **kwargs) -> None:
     """Initializes the generator of a specified BigQuery table.
 
@@ -54,7 +551,40 @@ class BigQueryHook(
       bq_dataset_id: Dataset id of the target table.
       bq_table_id: Table name of the target table.
       bq_selected_fields: Subset of fields to return. Example: 'f_1,f_2'.
+      bq_string_fields: Comma separated names of fields that tabledata rows
+        keep as strings instead of converting them by their type, for fields
+        the output hook sends as strings anyway. Example: 'f_1,f_2'.
+      bq_read_streams: Max number of streams the table is read in with the
+        BigQuery Storage Read API. 0 reads the table page by page with
+        tabledata.list. Sharded reads always use tabledata.list.
+      bq_read_format: Format the rows of the read streams are encoded in, ARROW
+        or AVRO.
+      bq_prefetch_pages: Number of tabledata.list page requests in flight at
+        the same time. 1 requests every page once the previous page was
+        consumed.
+      bq_prefetch_max_pages: Max number of pages requested or fetched ahead of
+        the page being consumed. Raised to bq_prefetch_pages if smaller.
+      bq_extract_gcs_uri: If set, the table is extracted by an extract job to
+        compressed Avro objects under a folder of this Cloud Storage URI named
+        after the table, for example 'gs://bucket/exports', and the objects
+        are streamed with the Cloud Storage hook. Other gcs_ arguments are
+        passed to the Cloud Storage hook. The objects are kept for the runs
+        after a failed transfer, and deleted once the transfer completed, so
+        the URI must not be shared by DAGs reading the same table.
+      bq_watermark_column: If set, the table is read incrementally by this
+        increasing column, such as an ingestion timestamp or a sequence id.
+        Only the rows after the watermark set by set_watermark are read, by a
+        parameterized query that also prunes the partitions of tables
+        partitioned by the column. Rows must be added in the order of the
+        column: rows added later with a value up to the max value read by a
+        run, even an equal one, are never read.
+      shard_index: Zero based index of the row range shard to read.
+      num_shards: Total number of row range shards the table is split into.
       **kwargs: Other arguments to pass through to Airflow's BigQueryHook.
+
+    Raises:
+      DataInConnectorValueError: If the shard configuration, the read options,
+        the extract options or the watermark options are invalid.
     """
     init_params_dict = {}
     for param in _BASE_BQ_HOOK_PARAMS:
@@ -65,8 +595,120 @@ class BigQueryHook(
     self.dataset_id = bq_dataset_id
     self.table_id = bq_table_id
     self.selected_fields = bq_selected_fields
-    self.url = 'bq://{}.{}.{}'.format(
-        self._get_field('project'), self.dataset_id, self.table_id)
+    self.string_fields = tuple(
+        field.strip() for field in (bq_string_fields or '').split(',')
+        if field.strip())
+    # The schema of the table, for pages of tabledata without one.
+    self._table_schema = None
+    self.read_streams = bq_read_streams
+    self.read_format = bq_read_format.upper()
+    self.prefetch_pages = max(bq_prefetch_pages, 1)
+    self.prefetch_max_pages = max(bq_prefetch_max_pages, self.prefetch_pages)
+    self._validate_read_options()
+    self.extract_gcs_uri = bq_extract_gcs_uri or None
+    self._gcs_kwargs = {key: value for key, value in kwargs.items()
+                        if key.startswith('gcs_')}
+    # The Cloud Storage hook reading the extracted objects of this run, or
+    # None if the table was not extracted.
+    self._extract_hook = None
+    self._validate_extract_options()
+    self.watermark_column = bq_watermark_column or None
+    self.watermark = None
+    self.next_watermark = None
+    # The dataset and table id of the query results the rows after the
+    # watermark are read from, or None to read the table itself.
+    self._read_table = None
+    self._validate_watermark_options()
+    self.set_shard(shard_index, num_shards)
+
+  def _validate_watermark_options(self) -> None:
+    """Validates the options of reading the table incrementally.
+
+    Raises:
+      DataInConnectorValueError: If the watermark options are invalid.
+    """
+    if self.watermark_column and (self.read_streams or self.extract_gcs_uri):
+      raise errors.DataInConnectorValueError(
+          'Tables read incrementally by a watermark column are read with '
+          'tabledata.list, not with read streams or extracted to Cloud '
+          'Storage.',
+          errors.ErrorNameIDMap.BQ_HOOK_ERROR_INVALID_WATERMARK_OPTIONS)
+
+  def _validate_extract_options(self) -> None:
+    """Validates the options of extracting the table to Cloud Storage.
+
+    Raises:
+      DataInConnectorValueError: If the extract options are invalid.
+    """
+    if self.extract_gcs_uri is None:
+      return
+    if (not self.extract_gcs_uri.startswith(_GCS_URI_PREFIX) or
+        not self.extract_gcs_uri[len(_GCS_URI_PREFIX):].strip('/')):
+      raise errors.DataInConnectorValueError(
+          'The extract URI must be a Cloud Storage URI like gs://bucket/path.',
+          errors.ErrorNameIDMap.BQ_HOOK_ERROR_INVALID_EXTRACT_OPTIONS)
+    if self.read_streams:
+      raise errors.DataInConnectorValueError(
+          'Tables are either extracted to Cloud Storage or read with read '
+          'streams.',
+          errors.ErrorNameIDMap.BQ_HOOK_ERROR_INVALID_EXTRACT_OPTIONS)
+    if fastavro is None:
+      raise errors.DataInConnectorValueError(
+          'Reading extracted tables requires the fastavro package.',
+          errors.ErrorNameIDMap.BQ_HOOK_ERROR_INVALID_EXTRACT_OPTIONS)
+
+  def _validate_read_options(self) -> None:
+    """Validates the options of reading with the BigQuery Storage Read API.
+
+    Raises:
+      DataInConnectorValueError: If the read options are invalid, or the
+        packages they require are not installed.
+    """
+    if self.read_streams < 0:
+      raise errors.DataInConnectorValueError(
+          'The number of read streams must not be negative.',
+          errors.ErrorNameIDMap.BQ_HOOK_ERROR_INVALID_READ_OPTIONS)
+    if not self.read_streams:
+      return
+    if bigquery_storage is None:
+      raise errors.DataInConnectorValueError(
+          'Reading with read streams requires the '
+          'google-cloud-bigquery-storage package.',
+          errors.ErrorNameIDMap.BQ_HOOK_ERROR_INVALID_READ_OPTIONS)
+    if self.read_format not in _READ_FORMATS:
+      raise errors.DataInConnectorValueError(
+          'Invalid read format. The supported formats are: %s.' %
+          ', '.join(_READ_FORMATS),
+          errors.ErrorNameIDMap.BQ_HOOK_ERROR_INVALID_READ_OPTIONS)
+    if self.read_format == 'AVRO' and fastavro is None:
+      raise errors.DataInConnectorValueError(
+          'Reading Avro read streams requires the fastavro package.',
+          errors.ErrorNameIDMap.BQ_HOOK_ERROR_INVALID_READ_OPTIONS)
+
+  def set_shard(self, shard_index: int, num_shards: int) -> None:
+    """Sets the row range shard of the table to read.
+
+    Args:
+      shard_index: Zero based index of the row range shard to read.
+      num_shards: Total number of row range shards the table is split into.
+
+    Raises:
+      DataInConnectorValueError: If the shard configuration is invalid, or the
+        table is read incrementally and split into more than one shard.
+    """
+    shard_utils.validate_shard(shard_index, num_shards)
+    if self.watermark_column and num_shards != 1:
+      raise errors.DataInConnectorValueError(
+          'Tables read incrementally by a watermark column can\'t be split '
+          'into shards.',
+          errors.ErrorNameIDMap.BQ_HOOK_ERROR_INVALID_WATERMARK_OPTIONS)
+
+    self.shard_index = shard_index
+    self.num_shards = num_shards
+    self.url = shard_utils.get_shard_location(
+        'bq://{}.{}.{}'.format(
+            self._get_field('project'), self.dataset_id, self.table_id),
+        shard_index, num_shards)
 
   def get_location(self):
     """Retrieves the full url of the BigQuery data source.
@@ -76,70 +718,63 @@ class BigQueryHook(
     """
     return self.url
 
-  def _str_to_bq_type(self, bq_str: str, bq_type: str) -> Any:
-    """Casts BigQuery string row data to the appropriate BigQuery data type.
+  def get_monitored_location_prefix(self) -> Optional[str]:
+    """Retrieves the prefix of the locations of the blobs of the table.
 
-    Args:
-      bq_str: String data to be cast to target type.
-      bq_type: Target data type, e.g. BOOLEAN, INTEGER, FLOAT, TIMESTAMP.
+    Returns:
+      The prefix of the locations the blobs of every shard, of every read
+      stream, of every extraction of the table, or of every query of the rows
+      after the watermark are monitored at, or None if the whole table is read
+      with tabledata.list.
+    """
+    if self.num_shards != 1:
+      return shard_utils.get_shard_location_prefix(self.url.partition('#')[0])
+    if self.watermark_column:
+      return f'{self.url}#{_WATERMARK_LOCATION}{self.watermark or ""}/'
+    if self.read_streams:
+      return f'{self.url}#{_READ_SESSION_LOCATION}'
+    if self.extract_gcs_uri:
+      return f'{self.url}#{_EXTRACT_LOCATION}'
+    return None
+
+  def is_incremental(self) -> bool:
+    """Returns whether the table is read incrementally by a watermark column.
 
     Returns:
-      Typed data cast from string. None when input data is None.
+      True if a watermark column is set, otherwise False.
     """
-    if bq_str is None:
-      return None
-    elif bq_type == 'BOOLEAN':
-      if bq_str.lower() not in ['true', 'false']:
-        raise ValueError("{} must have value 'true' or 'false'".format(
-            bq_str))
-      return bq_str.lower() == 'true'
-    elif bq_type == 'INTEGER':
-      return int(bq_str)
-    elif bq_type == 'FLOAT' or bq_type == 'TIMESTAMP':
-      return float(bq_str)
-    else:
-      return bq_str
+    return self.watermark_column is not None
 
-  def _query_results_to_blob(self, query_results: Dict[str, Any],
-                             start_index: int, num_rows: int) -> blob.Blob:
-    """Converts query results of BigQuery to event blob.
+  def set_watermark(self, watermark: Optional[str]) -> None:
+    """Sets the value of the watermark column to read the rows after.
 
     Args:
-      query_results: Raw query results.
-      start_index: Start index of BigQuery table rows.
-      num_rows: Number of rows processed.
+      watermark: The watermark, or None to read all rows.
+    """
+    self.watermark = watermark
+
+  def get_next_watermark(self) -> Optional[str]:
+    """Retrieves the max value of the watermark column of the rows read.
 
     Returns:
-      blob: Event blob containing event list and status.
+      The watermark to read the rows of the next run after, or None if no rows
+      were read.
     """
-    if query_results is None:
-      return None
+    return self.next_watermark
 
-    events = self._query_results_to_maps_list(query_results)
-    return blob.Blob(events=events, location=self.url, position=start_index,
-                     num_rows=num_rows)
-
-  def _query_results_to_maps_list(
-      self, query_results: Dict[str, Any]) -> List[Dict[str, Any]]:
-    """Converts table rows query results of BigQuery to list of maps.
+  def _get_table_schema(
+      self, bq_cursor: bigquery_hook.BigQueryCursor) -> Dict[str, Any]:
+    """Gets the schema of the table, and caches it.
 
     Args:
-      query_results: Raw query result.
+      bq_cursor: BigQuery Cursor instance.
 
     Returns:
-      data: Table rows in the format of list of maps.
-    """
-    fields = [field['name'] for field in query_results['schema']['fields']]
-    col_types = [field['type'] for field in query_results['schema']['fields']]
-    rows = query_results.get('rows', [])
-    batch_data = []
-    for row in rows:
-      values = [cell['v'] for cell in row['f']]
-      typed_values = [self._str_to_bq_type(value, type)
-                      for value, type in zip(values, col_types)]
-      data = dict(zip(fields, typed_values))
-      batch_data.append(data)
-    return batch_data
+      The schema of the table.
+    """
+    if self._table_schema is None:
+      self._table_schema = bq_cursor.get_schema(self.dataset_id, self.table_id)
+    return self._table_schema
 
   @retry_utils.logged_retry_on_retriable_http_error
   def _get_tabledata_with_retries(self, bq_cursor: bigquery_hook.BigQueryCursor,
@@ -156,17 +791,140 @@ class BigQueryHook(
     Returns:
       query_results: Map containing the requested rows.
     """
+    dataset_id, table_id = self._read_table or (self.dataset_id,
+                                                self.table_id)
     query_results = bq_cursor.get_tabledata(
-        dataset_id=self.dataset_id,
-        table_id=self.table_id,
+        dataset_id=dataset_id,
+        table_id=table_id,
         max_results=max_results,
         start_index=start_index,
         selected_fields=self.selected_fields)
     if query_results and not query_results.get('schema'):
-      query_results['schema'] = bq_cursor.get_schema(self.dataset_id,
-                                                     self.table_id)
+      query_results['schema'] = self._get_table_schema(bq_cursor)
     return query_results
 
+  def _get_resumable_watermark_read(
+      self, bq_cursor: bigquery_hook.BigQueryCursor,
+      processed_blobs: Iterable[Tuple[str, str, str]]
+  ) -> Optional[Tuple[Tuple[str, str], str]]:
+    """Gets the query results a failed run read after the same watermark.
+
+    Args:
+      bq_cursor: BigQuery Cursor instance.
+      processed_blobs: Tuples of (location, position, info) of the processed
+        blobs of the queries of the rows after the watermark.
+
+    Returns:
+      A tuple of the destination table of the query, as (dataset_id,
+      table_id), and the max value of the watermark column in it, or None if
+      no such destination table exists anymore.
+    """
+    location_prefix = self.get_monitored_location_prefix()
+    next_watermarks = {}
+    for location, _, info in processed_blobs:
+      table = location[len(location_prefix):]
+      if not location.startswith(location_prefix) or '/' in table:
+        continue
+      try:
+        checkpoint = json.loads(info)
+      except (TypeError, ValueError):
+        continue
+      if isinstance(checkpoint, dict) and 'next_watermark' in checkpoint:
+        next_watermarks[table] = checkpoint['next_watermark']
+
+    for table, next_watermark in sorted(next_watermarks.items()):
+      dataset_id, _, table_id = table.partition('.')
+      try:
+        bq_cursor.service.tables().get(
+            projectId=bq_cursor.project_id, datasetId=dataset_id,
+            tableId=table_id).execute(num_retries=bq_cursor.num_retries)
+      except googleapiclient_errors.HttpError as error:
+        # Anonymous destination tables expire after about a day.
+        if error.resp.status == 404:
+          continue
+        raise
+      return (dataset_id, table_id), next_watermark
+    return None
+
+  def _query_rows_after_watermark(
+      self, bq_cursor: bigquery_hook.BigQueryCursor,
+      processed_blobs: Iterable[Tuple[str, str, str]] = ()) -> bool:
+    """Queries the rows after the watermark, to read them with tabledata.list.
+
+    The current max of the watermark column is queried first, so rows added
+    while the rows are read are left to the next run. The rows up to it are
+    then queried, and read from the anonymous destination table of the query,
+    which keeps the rows in the same order. A run after a failed run reads the
+    destination table of the failed run again while it exists, so the
+    processed row ranges are the same rows.
+
+    Args:
+      bq_cursor: BigQuery Cursor instance.
+      processed_blobs: Tuples of (location, position, info) of the processed
+        blobs of the queries of the rows after the watermark.
+
+    Returns:
+      True if there are rows after the watermark, otherwise False.
+
+    Raises:
+      DataInConnectorValueError: If the watermark column is not a column of the
+        table.
+    """
+    field_types = {field['name']: field['type']
+                   for field in self._get_table_schema(bq_cursor)['fields']}
+    if self.watermark_column not in field_types:
+      raise errors.DataInConnectorValueError(
+          f'The watermark column {self.watermark_column} is not a column of '
+          f'{self.url}.',
+          errors.ErrorNameIDMap.BQ_HOOK_ERROR_INVALID_WATERMARK_OPTIONS)
+    field_type = field_types[self.watermark_column]
+    parameter_type = _QUERY_PARAMETER_TYPES.get(field_type, field_type)
+    column = f'`{self.watermark_column}`'
+    table = f'`{bq_cursor.project_id}.{self.dataset_id}.{self.table_id}`'
+
+    self.next_watermark = None
+    self._read_table = None
+    resumable_read = self._get_resumable_watermark_read(bq_cursor,
+                                                        processed_blobs)
+    if resumable_read is not None:
+      self._read_table, self.next_watermark = resumable_read
+      return True
+
+    conditions = []
+    query_params = []
+    if self.watermark is not None:
+      conditions.append(f'{column} > @watermark')
+      query_params.append(
+          _query_parameter('watermark', parameter_type, self.watermark))
+    where = ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+
+    bq_cursor.flush_results()
+    bq_cursor.job_id = bq_cursor.run_query(
+        sql=f'SELECT CAST(MAX({column}) AS STRING) FROM {table}{where}',
+        use_legacy_sql=False, query_params=query_params)
+    row = bq_cursor.fetchone()
+    bq_cursor.flush_results()
+    if row is None or row[0] is None:
+      return False
+
+    conditions.append(f'{column} <= @next_watermark')
+    job_id = bq_cursor.run_query(
+        sql=f'SELECT * FROM {table} WHERE {" AND ".join(conditions)}',
+        use_legacy_sql=False,
+        query_params=query_params + [
+            _query_parameter('next_watermark', parameter_type, row[0])])
+
+    job_request = {'projectId': bq_cursor.project_id, 'jobId': job_id}
+    if bq_cursor.location:
+      job_request['location'] = bq_cursor.location
+    job = bq_cursor.service.jobs().get(**job_request).execute(
+        num_retries=bq_cursor.num_retries)
+    destination_table = job['configuration']['query']['destinationTable']
+    self._read_table = (destination_table['datasetId'],
+                        destination_table['tableId'])
+    self.next_watermark = row[0]
+    return True
+
   def list_tables(self, dataset_id: Optional[str] = None,
                   prefix: str = '') -> List[str]:
     """Lists table ids in specified dataset filtered by specified prefix.
@@ -235,23 +993,55 @@ class BigQueryHook(
   ) -> Generator[blob.Blob, None, None]:
     """Generates pages of specified BigQuery table as blobs.
 
+    Only the rows of the shard set by set_shard are read. The rows of a shard
+    are kept while rows are appended to the table, see
+    _get_shard_segment_ends. With read streams,
+    unsharded tables are read with the BigQuery Storage Read API instead, and
+    with an extract URI, they are extracted to Cloud Storage and read from
+    there. With a watermark column, only the rows after the watermark are
+    read, and the positions of the blobs are positions in the destination
+    table of the query of the rows after the watermark.
+
     Args:
       processed_blobs_generator: A generator that provides the processed blob
-        information that helps skip read ranges.
+        information that helps skip read ranges. With shards, read streams, an
+        extract URI or a watermark column, a generator of (location, position,
+        info) tuples of the locations under get_monitored_location_prefix.
 
     Yields:
       blob: A blob object containing events from a page with length of
-      _DEFAULT_PAGE_SIZE from the specified BigQuery table.
+      _DEFAULT_PAGE_SIZE, or the size given by the page size controller, from
+      the specified BigQuery table.
 
     Raises:
       DataInConnectorError: Raised when BigQuery table data cannot be accessed.
     """
+    # Row ranges of shards are positions in the order of tabledata.list, which
+    # the streams of separate read sessions don't follow.
+    if self.read_streams and self.num_shards == 1:
+      yield from self._generate_read_session_blobs(processed_blobs_generator)
+      return
+    if self.extract_gcs_uri and self.num_shards == 1:
+      yield from self._generate_extracted_blobs(processed_blobs_generator)
+      return
+
     start_index = 0
     total_rows = -1
     bq_cursor = self.get_conn().cursor()
+    location = self.url
+    checkpoint = None
 
     # Get the first row to ensure the accessibility.
     try:
+      if self.watermark_column:
+        processed_blobs = list(processed_blobs_generator or ())
+        if not self._query_rows_after_watermark(bq_cursor, processed_blobs):
+          return
+        location = '{}{}.{}'.format(self.get_monitored_location_prefix(),
+                                    *self._read_table)
+        processed_blobs_generator = iter(_get_processed_ranges(
+            processed_blobs, location))
+        checkpoint = {'next_watermark': self.next_watermark}
       query_results = self._get_tabledata_with_retries(bq_cursor=bq_cursor,
                                                        start_index=start_index,
                                                        max_results=1)
@@ -272,12 +1062,126 @@ class BigQueryHook(
             error_num=errors.ErrorNameIDMap
             .RETRIABLE_BQ_HOOK_ERROR_NO_TOTAL_ROWS)
 
+    if self.num_shards == 1:
+      pages = self._generate_pages(bq_cursor, 0, total_rows,
+                                   processed_blobs_generator)
+    else:
+      processed_blobs = list(processed_blobs_generator or ())
+      segment_ends = _get_shard_segment_ends(processed_blobs, total_rows,
+                                             self.num_shards)
+      checkpoint = {'total_rows': segment_ends[-1]}
+      pages = self._generate_shard_pages(
+          bq_cursor, segment_ends,
+          _get_processed_ranges(processed_blobs, self.url))
+
+    # The schema is compiled once for all pages. With a parse executor, pages
+    # are converted in the executor while the next pages are fetched, and
+    # handed back through shared memory.
+    page_to_blob = functools.partial(
+        _page_to_blob, location,
+        _compile_schema(query_results['schema']['fields'], self.string_fields))
+    if self.parse_executor is None:
+      page_blobs = map(page_to_blob, pages)
+    else:
+      page_blobs = shared_memory_transport.map_in_order(
+          self.parse_executor, page_to_blob, pages, self.parse_max_pending)
+    for page_blob in page_blobs:
+      if page_blob is not None and checkpoint is not None:
+        page_blob.checkpoint = dict(checkpoint)
+      yield page_blob
+
+  def _generate_pages(
+      self, bq_cursor: bigquery_hook.BigQueryCursor,
+      start_index: int, end_of_range: int,
+      processed_blobs_generator: Optional[Generator[Tuple[str, str], None,
+                                                    None]]
+  ) -> Generator[Tuple[Dict[str, Any], int, int], None, None]:
+    """Generates the raw pages of a row range that were not processed yet.
+
+    With prefetch_pages > 1 the pages are fetched on a thread pool, ahead of
+    the page being consumed, and still generated in order.
+
+    Args:
+      bq_cursor: BigQuery Cursor instance.
+      start_index: Zero based index of the first row to read.
+      end_of_range: Index of the row after the last row to read.
+      processed_blobs_generator: A generator that provides the processed blob
+        information that helps skip read ranges.
+
+    Yields:
+      Tuples of (query_results, start_index, num_rows) of every page. Pages
+      that failed to load are skipped.
+    """
+    page_ranges = self._generate_page_ranges(start_index, end_of_range,
+                                             processed_blobs_generator)
+    if self.prefetch_pages > 1:
+      # The connection of a cursor is not thread-safe, so every thread of the
+      # pool fetches with a cursor of its own.
+      thread_cursors = threading.local()
+
+      def fetch_page(page_range: Tuple[int, int]):
+        if not hasattr(thread_cursors, 'cursor'):
+          thread_cursors.cursor = self.get_conn().cursor()
+        return self._fetch_page(thread_cursors.cursor, page_range)
+
+      with concurrent.futures.ThreadPoolExecutor(
+          max_workers=self.prefetch_pages) as executor:
+        yield from self._record_pages(pipeline_utils.map_in_order(
+            executor, fetch_page, page_ranges, self.prefetch_max_pages))
+    else:
+      yield from self._record_pages(
+          self._fetch_page(bq_cursor, page_range)
+          for page_range in page_ranges)
+
+  def _generate_shard_pages(
+      self, bq_cursor: bigquery_hook.BigQueryCursor,
+      segment_ends: List[int], processed_ranges: List[Tuple[int, int]]
+  ) -> Generator[Tuple[Dict[str, Any], int, int], None, None]:
+    """Generates the raw pages of the shard that were not processed yet.
+
+    Args:
+      bq_cursor: BigQuery Cursor instance.
+      segment_ends: Ascending total numbers of rows of the table the shard
+        boundaries are computed from.
+      processed_ranges: The (position, num_rows) tuples of the processed blobs
+        of the shard, in the order of positions.
+
+    Yields:
+      Tuples of (query_results, start_index, num_rows) of every page.
+    """
+    for start_index, end_of_range in shard_utils.get_shard_row_ranges(
+        segment_ends, self.shard_index, self.num_shards):
+      yield from self._generate_pages(
+          bq_cursor, start_index, end_of_range,
+          iter([(position, num_rows) for position, num_rows in processed_ranges
+                if start_index <= position < end_of_range]))
+
+  def _generate_page_ranges(
+      self, start_index: int, end_of_range: int,
+      processed_blobs_generator: Optional[Generator[Tuple[str, str], None,
+                                                    None]]
+  ) -> Generator[Tuple[int, int], None, None]:
+    """Generates the row ranges of the pages that were not processed yet.
+
+    The size of every page is taken from the page size controller when the
+    range of the page is generated.
+
+    Args:
+      start_index: Zero based index of the first row to read.
+      end_of_range: Index of the row after the last row to read.
+      processed_blobs_generator: A generator that provides the processed blob
+        information that helps skip read ranges.
+
+    Yields:
+      Tuples of (start_index, num_rows) of every page.
+    """
     processed_start, processed_end = self._get_next_range(
         processed_blobs_generator)
 
-    # Get the pages of the requested table.
-    while start_index < total_rows:
-      num_rows = min(total_rows - start_index, _DEFAULT_PAGE_SIZE)
+    while start_index < end_of_range:
+      page_size = (self.page_size_controller.page_size
+                   if self.page_size_controller else _DEFAULT_PAGE_SIZE)
+      num_rows = min(end_of_range - start_index, page_size)
       end_index = start_index + num_rows
 
       if processed_start != -1 and processed_start < end_index:
@@ -288,12 +1192,447 @@ class BigQueryHook(
               processed_blobs_generator)
           continue
 
-      try:
-        query_results = self._get_tabledata_with_retries(
-            bq_cursor=bq_cursor, start_index=start_index, max_results=num_rows)
-      except googleapiclient_errors.HttpError:
-        pass
-      else:
-        yield self._query_results_to_blob(query_results, start_index, num_rows)
-      finally:
-        start_index = start_index + num_rows
+      yield start_index, num_rows
+      start_index = start_index + num_rows
+
+  def _fetch_page(
+      self, bq_cursor: bigquery_hook.BigQueryCursor,
+      page_range: Tuple[int, int]
+  ) -> Optional[Tuple[Dict[str, Any], int, int]]:
+    """Fetches the raw page of a row range.
+
+    Args:
+      bq_cursor: BigQuery Cursor instance.
+      page_range: Tuple of (start_index, num_rows) of the page.
+
+    Returns:
+      Tuple of (query_results, start_index, num_rows) of the page, or None if
+      the page failed to load.
+    """
+    start_index, num_rows = page_range
+    try:
+      query_results = self._get_tabledata_with_retries(
+          bq_cursor=bq_cursor, start_index=start_index, max_results=num_rows)
+    except googleapiclient_errors.HttpError:
+      return None
+    return query_results, start_index, num_rows
+
+  def _record_pages(
+      self, pages: Iterable[Optional[Tuple[Dict[str, Any], int, int]]]
+  ) -> Generator[Tuple[Dict[str, Any], int, int], None, None]:
+    """Records the payload of fetched pages, and skips failed pages.
+
+    Args:
+      pages: The fetched pages, None for pages that failed to load.
+
+    Yields:
+      The pages that loaded.
+    """
+    for page in pages:
+      if page is None:
+        continue
+      query_results = page[0]
+      if self.page_size_controller and query_results:
+        rows = query_results.get('rows', [])
+        self.page_size_controller.record_payload(
+            len(rows), _estimate_payload_bytes(rows))
+      yield page
+
+  def _get_read_client(self) -> 'bigquery_storage.BigQueryReadClient':
+    """Creates a client of the BigQuery Storage Read API.
+
+    Returns:
+      The client, authorized with the credentials of the connection.
+    """
+    return bigquery_storage.BigQueryReadClient(
+        credentials=self._get_credentials())
+
+  def _create_read_session(
+      self, client: 'bigquery_storage.BigQueryReadClient'
+  ) -> 'bigquery_storage.types.ReadSession':
+    """Creates a read session of the table with up to read_streams streams.
+
+    Args:
+      client: The BigQuery Storage Read API client.
+
+    Returns:
+      The read session.
+
+    Raises:
+      DataInConnectorError: Raised when the read session cannot be created.
+    """
+    project = self._get_field('project')
+    selected_fields = ([field.strip() for field in
+                        self.selected_fields.split(',')]
+                       if self.selected_fields else [])
+    read_session = bigquery_storage.types.ReadSession(
+        table='projects/{}/datasets/{}/tables/{}'.format(
+            project, self.dataset_id, self.table_id),
+        data_format=bigquery_storage.types.DataFormat[self.read_format],
+        read_options=bigquery_storage.types.ReadSession.TableReadOptions(
+            selected_fields=selected_fields))
+    try:
+      return client.create_read_session(
+          parent='projects/{}'.format(project), read_session=read_session,
+          max_stream_count=self.read_streams)
+    except api_exceptions.GoogleAPICallError as error:
+      raise errors.DataInConnectorError(
+          error=error, msg=str(error),
+          error_num=errors.ErrorNameIDMap.RETRIABLE_BQ_HOOK_ERROR_HTTP_ERROR)
+
+  def _get_rows_decoder(
+      self, session: 'bigquery_storage.types.ReadSession'
+  ) -> Callable[[Any], List[Dict[str, Any]]]:
+    """Gets the function decoding the ReadRows responses of a read session.
+
+    Args:
+      session: The read session.
+
+    Returns:
+      A function decoding a ReadRows response into rows.
+    """
+    if self.read_format == 'AVRO':
+      return functools.partial(
+          _decode_avro_rows,
+          schema=fastavro.parse_schema(json.loads(session.avro_schema.schema)))
+    return functools.partial(
+        _decode_arrow_rows,
+        schema=pyarrow.ipc.read_schema(
+            pyarrow.py_buffer(session.arrow_schema.serialized_schema)))
+
+  def _generate_stream_rows(
+      self, client: 'bigquery_storage.BigQueryReadClient', stream_name: str,
+      decode: Callable[[Any], List[Dict[str, Any]]], offset: int = 0
+  ) -> Generator[List[Dict[str, Any]], None, None]:
+    """Generates the decoded rows of every ReadRows response of a stream.
+
+    Args:
+      client: The BigQuery Storage Read API client.
+      stream_name: The name of the read stream.
+      decode: The function decoding a ReadRows response into rows.
+      offset: Index of the row of the stream to read from.
+
+    Yields:
+      The rows of every response.
+
+    Raises:
+      DataInConnectorError: Raised when the stream cannot be read.
+    """
+    try:
+      for response in client.read_rows(stream_name, offset):
+        yield decode(response)
+    except api_exceptions.GoogleAPICallError as error:
+      raise errors.DataInConnectorError(
+          error=error, msg=str(error),
+          error_num=errors.ErrorNameIDMap.RETRIABLE_BQ_HOOK_ERROR_HTTP_ERROR)
+
+  def _generate_stream_blobs(
+      self, client: 'bigquery_storage.BigQueryReadClient', stream_name: str,
+      decode: Callable[[Any], List[Dict[str, Any]]], offset: int
+  ) -> Generator[blob.Blob, None, None]:
+    """Generates the rows of a read stream as blobs, from a row offset on.
+
+    Args:
+      client: The BigQuery Storage Read API client.
+      stream_name: The name of the read stream.
+      decode: The function decoding a ReadRows response into rows.
+      offset: Index of the row of the stream to read from.
+
+    Yields:
+      Blobs of the rows, located at the stream, with the index of their first
+      row in the stream as position and a checkpoint of their end row.
+
+    Raises:
+      DataInConnectorError: Raised when the stream cannot be read.
+    """
+    location = self.get_monitored_location_prefix() + stream_name
+    rows_batches = self._generate_stream_rows(client, stream_name, decode,
+                                              offset)
+    for rows, position in self._generate_read_pages(rows_batches, None,
+                                                    offset):
+      yield blob.Blob(events=rows, location=location, position=position,
+                      num_rows=len(rows),
+                      checkpoint={'end_row': position + len(rows)})
+
+  def _generate_read_session_blobs(
+      self,
+      processed_blobs_generator: Optional[Generator[Tuple[str, str, str], None,
+                                                    None]]
+  ) -> Generator[blob.Blob, None, None]:
+    """Generates the rows of the table read with a read session as blobs.
+
+    The streams of the session are read concurrently, and the blobs of the
+    streams are interleaved round robin. Every stream is monitored at a
+    location of its own, with positions of the rows in the stream. The server
+    chooses the streams of every session, so a run after a failed run resumes
+    the streams of the unfinished session after their processed rows, as long
+    as the session didn't expire. Other runs read the whole table in a new
+    session.
+
+    Args:
+      processed_blobs_generator: A generator of (location, position, info)
+        tuples of the processed blobs of the read streams of the table.
+
+    Yields:
+      Blobs of the rows that were not processed yet, with up to
+      _DEFAULT_PAGE_SIZE rows, or the size given by the page size controller.
+
+    Raises:
+      DataInConnectorError: Raised when the table cannot be read.
+    """
+    client = self._get_read_client()
+    # The session is also created when the streams of an unfinished session
+    # are resumed, for the schema of the rows.
+    session = self._create_read_session(client)
+    decode = self._get_rows_decoder(session)
+    stream_names = [stream.name for stream in session.streams]
+    expire_time = (session.expire_time.timestamp()
+                   if session.expire_time else None)
+    offsets = {}
+    if processed_blobs_generator is not None:
+      resumable_session = _get_resumable_read_session(
+          processed_blobs_generator, self.get_monitored_location_prefix())
+      if resumable_session is not None:
+        stream_names, expire_time, offsets = resumable_session
+
+    stream_blobs = pipeline_utils.interleave_concurrently(
+        [self._generate_stream_blobs(client, stream_name, decode,
+                                     offsets.get(stream_name, 0))
+         for stream_name in stream_names])
+    started_locations = set()
+    last_blob = None
+    for stream_blob in stream_blobs:
+      if self.page_size_controller:
+        self.page_size_controller.record_payload(
+            stream_blob.num_rows, _estimate_payload_bytes(stream_blob.events))
+      if stream_blob.location not in started_locations:
+        started_locations.add(stream_blob.location)
+        stream_blob.checkpoint.update(streams=stream_names,
+                                      expire_time=expire_time)
+      # The last blob is held back to mark the session as done.
+      if last_blob is not None:
+        yield last_blob
+      last_blob = stream_blob
+    if last_blob is not None:
+      last_blob.checkpoint['session_done'] = True
+      yield last_blob
+
+  def _generate_read_pages(
+      self, rows_batches: Iterable[List[Dict[str, Any]]],
+      processed_blobs_generator: Optional[Generator[Tuple[str, str], None,
+                                                    None]],
+      start_position: int = 0
+  ) -> Generator[Tuple[List[Dict[str, Any]], int], None, None]:
+    """Cuts batches of rows into pages, skipping the processed row ranges.
+
+    Args:
+      rows_batches: The batches of rows, in the order of their positions.
+      processed_blobs_generator: A generator that provides the processed blob
+        information that helps skip read ranges.
+      start_position: Position of the first row of the batches.
+
+    Yields:
+      Tuples of (rows, position) of every page.
+    """
+    processed_start, processed_end = self._get_next_range(
+        processed_blobs_generator)
+    page = []
+    page_size = _DEFAULT_PAGE_SIZE
+    page_position = start_position
+    position = start_position
+    for rows in rows_batches:
+      index = 0
+      while index < len(rows):
+        if processed_start != -1 and position >= processed_end:
+          processed_start, processed_end = self._get_next_range(
+              processed_blobs_generator)
+          continue
+
+        if processed_start != -1 and position >= processed_start:
+          if page:
+            yield page, page_position
+            page = []
+          num_rows = min(processed_end - position, len(rows) - index)
+          index += num_rows
+          position += num_rows
+          page_position = position
+          continue
+
+        # The size of a page is fixed when it is started, as the controller
+        # can shrink it while the page is filled.
+        if not page:
+          page_size = (self.page_size_controller.page_size
+                       if self.page_size_controller else _DEFAULT_PAGE_SIZE)
+        num_rows = min(page_size - len(page), len(rows) - index)
+        if processed_start != -1:
+          num_rows = min(num_rows, processed_start - position)
+        page.extend(rows[index:index + num_rows])
+        index += num_rows
+        position += num_rows
+        if len(page) >= page_size:
+          yield page, page_position
+          page = []
+          page_position = position
+
+    if page:
+      yield page, page_position
+
+  def _get_extract_folder_uri(self) -> str:
+    """Returns the Cloud Storage URI of the folder the table is extracted to.
+
+    The folder is the same for every run, so a run after a failed transfer
+    reads the same extracted objects.
+    """
+    return '{}/{}.{}'.format(self.extract_gcs_uri.rstrip('/'),
+                             self.dataset_id, self.table_id)
+
+  def _extract_table(self, bq_cursor: bigquery_hook.BigQueryCursor,
+                     folder_uri: str) -> None:
+    """Extracts the table to a folder of Cloud Storage.
+
+    Waits until the extract job is done.
+
+    Args:
+      bq_cursor: BigQuery Cursor instance.
+      folder_uri: The Cloud Storage URI of the folder to extract the table to.
+
+    Raises:
+      DataInConnectorError: Raised when the extract job failed.
+    """
+    configuration = {'extract': {
+        'sourceTable': {'projectId': self._get_field('project'),
+                        'datasetId': self.dataset_id,
+                        'tableId': self.table_id},
+        'destinationUris': [f'{folder_uri}/{_EXTRACT_OBJECT_PATTERN}'],
+        **_EXTRACT_JOB_CONFIGURATION}}
+    try:
+      bq_cursor.run_with_configuration(configuration)
+    # Airflow raises bare exceptions for failed jobs.
+    except Exception as error:  # pylint: disable=broad-except
+      raise errors.DataInConnectorError(
+          error=error, msg=str(error),
+          error_num=errors.ErrorNameIDMap.BQ_HOOK_ERROR_EXTRACT_JOB_FAILED)
+
+  def _get_extract_hook(self,
+                        folder_uri: str) -> gcs_hook.GoogleCloudStorageHook:
+    """Creates the Cloud Storage hook streaming the extracted objects.
+
+    The hook reads with the connection of this hook, and only reads the
+    extracted objects of the folder. Objects that fail to be read fail the
+    transfer, as skipping them would shift the positions of the next rows.
+
+    Args:
+      folder_uri: The Cloud Storage URI of the extracted objects.
+
+    Returns:
+      The Cloud Storage hook.
+    """
+    bucket, _, prefix = folder_uri[len(_GCS_URI_PREFIX):].partition('/')
+    gcs_kwargs = {'gcs_stream_blob_rows': _DEFAULT_PAGE_SIZE,
+                  **self._gcs_kwargs,
+                  'gcs_bucket': bucket,
+                  'gcs_prefix': prefix + '/',
+                  'gcs_content_type': gcs_hook.BlobContentTypes.AVRO.name,
+                  'gcs_name_globs': _EXTRACT_OBJECT_PATTERN,
+                  'gcs_skip_failed_objects': False,
+                  'gcs_conn_id': self.gcp_conn_id,
+                  'gcs_delegate_to': self.delegate_to}
+    return gcs_hook.GoogleCloudStorageHook(**gcs_kwargs)
+
+  def _delete_extracted_objects(self) -> None:
+    """Deletes the objects of the extract folder, if the table was extracted.
+
+    Raises:
+      DataInConnectorError: Raised when the objects cannot be deleted.
+    """
+    if self._extract_hook is None:
+      return
+    bucket = self._extract_hook.get_conn().bucket(self._extract_hook.bucket)
+    try:
+      for listed_object in bucket.list_blobs(prefix=self._extract_hook.prefix):
+        listed_object.delete()
+    except api_exceptions.GoogleAPICallError as error:
+      raise errors.DataInConnectorError(
+          error=error, msg=str(error),
+          error_num=errors.ErrorNameIDMap.RETRIABLE_GCS_HOOK_ERROR_HTTP_ERROR)
+
+  def _prepare_extracted_objects(self) -> str:
+    """Extracts the table, unless an earlier run extracted it completely.
+
+    The objects of an extract job that didn't finish are deleted before the
+    table is extracted again.
+
+    Returns:
+      The id of the extraction of the extracted objects.
+
+    Raises:
+      DataInConnectorError: Raised when the table cannot be extracted.
+    """
+    folder_uri = self._get_extract_folder_uri()
+    self._extract_hook = self._get_extract_hook(folder_uri)
+    bucket = self._extract_hook.get_conn().bucket(self._extract_hook.bucket)
+    done_name = self._extract_hook.prefix + _EXTRACT_DONE_OBJECT
+    try:
+      done_object = bucket.get_blob(done_name)
+      if done_object is not None:
+        return done_object.download_as_bytes().decode('utf-8')
+      self._delete_extracted_objects()
+      self._extract_table(self.get_conn().cursor(), folder_uri)
+      extract_id = uuid.uuid4().hex
+      bucket.blob(done_name).upload_from_string(extract_id)
+      return extract_id
+    except api_exceptions.GoogleAPICallError as error:
+      raise errors.DataInConnectorError(
+          error=error, msg=str(error),
+          error_num=errors.ErrorNameIDMap.RETRIABLE_GCS_HOOK_ERROR_HTTP_ERROR)
+
+  def complete_transfer(self) -> None:
+    """Deletes the extracted objects once all their rows were transferred.
+
+    Raises:
+      DataInConnectorError: Raised when the objects cannot be deleted.
+    """
+    self._delete_extracted_objects()
+    self._extract_hook = None
+
+  def _generate_extracted_blobs(
+      self,
+      processed_blobs_generator: Optional[Generator[Tuple[str, str, str], None,
+                                                    None]]
+  ) -> Generator[blob.Blob, None, None]:
+    """Generates the rows of the table extracted to Cloud Storage as blobs.
+
+    Positions are the indexes of the rows in the order the Cloud Storage hook
+    reads the extracted objects in, and the blobs are located at the
+    extraction. The extracted objects are kept until complete_transfer is
+    called, so a run after a failed transfer reads the same objects and skips
+    the processed rows of the same extraction.
+
+    Args:
+      processed_blobs_generator: A generator of (location, position, info)
+        tuples of the processed blobs of the extractions of the table.
+
+    Yields:
+      Blobs of the rows that were not processed yet, with up to
+      _DEFAULT_PAGE_SIZE rows, or the size given by the page size controller.
+
+    Raises:
+      DataInConnectorError: Raised when the table cannot be extracted.
+    """
+    location = self.get_monitored_location_prefix() + (
+        self._prepare_extracted_objects())
+    processed_ranges = None
+    if processed_blobs_generator is not None:
+      processed_ranges = iter(_get_processed_ranges(processed_blobs_generator,
+                                                    location))
+    rows_batches = (
+        [_to_json_value(event) for event in extracted_blob.events]
+        for extracted_blob in self._extract_hook.events_blobs_generator())
+
+    for rows, position in self._generate_read_pages(rows_batches,
+                                                    processed_ranges):
+      if self.page_size_controller:
+        self.page_size_controller.record_payload(
+            len(rows), _estimate_payload_bytes(rows))
+      yield blob.Blob(events=rows, location=location, position=position,
+                      num_rows=len(rows))
@@ -32,7 +32,7 @@ CMHook: Generates, validates and sends the conversion data to the API.
 
 import re
 import time
-from typing import Any, Dict, Generator, List, Tuple
+from typing import Any, Callable, Dict, Generator, List, Optional, Tuple
 
 from gps_building_blocks.cloud.utils import cloud_auth
 from plugins.pipeline_plugins.hooks import output_hook_interface
@@ -146,6 +146,15 @@ class PayloadBuilder(object):
     return conversion
 
 
+def _is_valid_event(event: Dict[str, Any]) -> bool:
+  """Checks if a payload can be generated for the event."""
+  try:
+    PayloadBuilder().generate_single_payload(event)
+  except errors.DataOutConnectorInvalidPayloadError:
+    return False
+  return True
+
+
 class CampaignManagerHook(output_hook_interface.OutputHookInterface):
   """Custom hook for Campaign Manager API."""
 
@@ -353,3 +362,19 @@ class CampaignManagerHook(output_hook_interface.OutputHookInterface):
                               event[1].value)
 
     return blb
+
+  def get_max_batch_size(self) -> Optional[int]:
+    """Retrieves the max number of events sent in one request to the output.
+
+    Returns:
+      The max number of events per request.
+    """
+    return _CONVERSION_BATCH_MAX_SIZE
+
+  def get_event_validator(self) -> Optional[Callable[[Dict[str, Any]], bool]]:
+    """Retrieves the function checking if send_events would send an event.
+
+    Returns:
+      The event validator, rejecting the events without a valid payload.
+    """
+    return _is_valid_event
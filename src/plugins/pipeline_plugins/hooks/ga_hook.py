@@ -16,10 +16,11 @@
 """Custom Hook for Google Analytics."""
 
 import enum
+import functools
 import re
 import sys
 import time
-from typing import Any, Dict, List, Optional, Tuple, Generator
+from typing import Any, Callable, Dict, List, Optional, Tuple, Generator
 import urllib.parse
 import urllib.request
 
@@ -202,6 +203,41 @@ class PayloadBuilder(object):
     return payload_str
 
 
+def _prepare_events_to_send(
+    tracking_id: str, base_params: Dict[str, Any], hit_type: HitTypes,
+    events: List[Dict[str, Any]]
+) -> Tuple[List[Tuple[int, Dict[str, Any], str]],
+           List[Tuple[int, errors.ErrorNameIDMap]]]:
+  """Prepares index-event tuples to keep order while sending.
+
+  Args:
+    tracking_id: The GA tracking id of the payloads.
+    base_params: The params shared by the payloads of all events.
+    hit_type: The type of hit to send per HitTypes.
+    events: Events to prepare for sending.
+
+  Returns:
+    A list of index-event tuples for the valid events, and a list of
+    index-error for the invalid events.
+  """
+  valid_events = []
+  invalid_indices_and_errors = []
+
+  builder = PayloadBuilder(tracking_id)
+
+  for i, event in enumerate(events):
+    try:
+      event_payload = builder.generate_single_payload(hit_type, event,
+                                                      base_params)
+    except (errors.DataOutConnectorInvalidPayloadError,
+            errors.DataOutConnectorValueError) as error:
+      invalid_indices_and_errors.append((i, error.error_num))
+    else:
+      valid_events.append((i, event, event_payload))
+
+  return valid_events, invalid_indices_and_errors
+
+
 class GoogleAnalyticsHook(output_hook_interface.OutputHookInterface):
   """Custom hook for GA via Measurement Protocol API."""
 
@@ -336,22 +372,8 @@ class GoogleAnalyticsHook(output_hook_interface.OutputHookInterface):
       A list of index-event tuples for the valid events, and a list of
       index-error for the invalid events.
     """
-    valid_events = []
-    invalid_indices_and_errors = []
-
-    builder = PayloadBuilder(self.tracking_id)
-
-    for i, event in enumerate(events):
-      try:
-        event_payload = builder.generate_single_payload(hit_type, event,
-                                                        self.base_params)
-      except (errors.DataOutConnectorInvalidPayloadError,
-              errors.DataOutConnectorValueError) as error:
-        invalid_indices_and_errors.append((i, error.error_num))
-      else:
-        valid_events.append((i, event, event_payload))
-
-    return valid_events, invalid_indices_and_errors
+    return _prepare_events_to_send(self.tracking_id, self.base_params,
+                                   hit_type, events)
 
   def send_hit(self, payload: str, user_agent: str = '',
                send_type: SendTypes = SendTypes.SINGLE) -> None:
@@ -391,8 +413,13 @@ class GoogleAnalyticsHook(output_hook_interface.OutputHookInterface):
       A blob containing updated data about any failing events or reports.
 
     """
-    valid_events, invalid_indices_and_errors = \
-        self._validate_and_prepare_events_to_send(blb.events, HitTypes.EVENT)
+    if blb.payloads is not None:
+      valid_events, invalid_indices_and_errors = blb.payloads
+      invalid_indices_and_errors = list(invalid_indices_and_errors)
+    else:
+      valid_events, invalid_indices_and_errors = (
+          self._validate_and_prepare_events_to_send(blb.events,
+                                                    HitTypes.EVENT))
 
     batches = self._batch_generator(valid_events)
 
@@ -409,3 +436,21 @@ class GoogleAnalyticsHook(output_hook_interface.OutputHookInterface):
                               event[1].value)
 
     return blb
+
+  def get_max_batch_size(self) -> Optional[int]:
+    """Retrieves the max number of events sent in one request to the output.
+
+    Returns:
+      The max number of events per request.
+    """
+    return _BATCH_MAX_BATCH_LENGTH
+
+  def get_payload_builder(
+      self) -> Optional[Callable[[List[Dict[str, Any]]], Any]]:
+    """Retrieves the function building the payloads of the events of a blob.
+
+    Returns:
+      The payload builder, building the hits of the events.
+    """
+    return functools.partial(_prepare_events_to_send, self.tracking_id,
+                             self.base_params, HitTypes.EVENT)
@@ -15,30 +15,599 @@
 
 """Custom GCS Hook for generating blobs from GCS."""
 
+import csv
 import enum
+import fnmatch
+import functools
 import io
+import itertools
 import json
+import re
+import zlib
 
-from typing import Any, Dict, Generator, List, Optional, Tuple
+from typing import (Any, Callable, Dict, Generator, Iterable, List, Optional,
+                    Tuple)
 from airflow.contrib.hooks import gcs_hook
+from google.api_core import exceptions as api_exceptions
 from google.api_core.exceptions import NotFound
-from googleapiclient import errors as googleapiclient_errors
+import pyarrow
+from pyarrow import parquet
+import requests
+
+try:
+  import fastavro  # pylint: disable=g-import-not-at-top
+except ImportError:
+  fastavro = None
+
+try:
+  import zstandard  # pylint: disable=g-import-not-at-top
+except ImportError:
+  zstandard = None
 
 from plugins.pipeline_plugins.hooks import input_hook_interface
 from plugins.pipeline_plugins.utils import blob
+from plugins.pipeline_plugins.utils import blob_batching
 from plugins.pipeline_plugins.utils import errors
+from plugins.pipeline_plugins.utils import json_array_splitter
+from plugins.pipeline_plugins.utils import line_splitter
+from plugins.pipeline_plugins.utils import pipeline_utils
+from plugins.pipeline_plugins.utils import retry_utils
+from plugins.pipeline_plugins.utils import shard_utils
+from plugins.pipeline_plugins.utils import shared_memory_transport
 
 _PLATFORM = 'GCS'
 _START_POSITION_IN_BLOB = 0
+# The connection of Airflow's GoogleCloudStorageHook used by default.
+_DEFAULT_CONN_ID = 'google_cloud_default'
 
 # The default size in bytes (100MB) of each download chunk.
 # The value is from googleapiclient http package.
 _DEFAULT_CHUNK_SIZE = 100 * 1024 * 1024
 
+# The size in bytes of the download chunks of the header line of CSV blobs.
+_CSV_HEADER_CHUNK_SIZE = 64 * 1024
+
+# Number of events of a blob parsed together in one task of a parse executor.
+_PARSE_CHUNK_SIZE = 10000
+
+# Compressions of blobs, detected from the Content-Encoding of the blob or the
+# extension of the blob name.
+_GZIP = 'gzip'
+_ZSTD = 'zstd'
+_COMPRESSION_BY_EXTENSION = {'.gz': _GZIP, '.gzip': _GZIP,
+                             '.zst': _ZSTD, '.zstd': _ZSTD}
+
+# Size in bytes of the compressed input decompressed at a time.
+_DECOMPRESS_INPUT_SIZE = 1024 * 1024
+
+# Max size in bytes of a decompressed gzip chunk. Input that would decompress
+# to more is left in the unconsumed tail of the decompressor.
+_DECOMPRESS_OUTPUT_SIZE = 1024 * 1024
+
+# Size in bytes of the compressed zstd input decompressed at a time. zstandard
+# decompressors have no output limit, and a zstd block of a few bytes can
+# decompress to 128 KiB, so this bounds the decompressed chunks to 16 MiB.
+_ZSTD_DECOMPRESS_INPUT_SIZE = 512
+
+# Window bits of zlib that accept a gzip header.
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+_DECOMPRESSION_ERRORS = ((zlib.error,) if zstandard is None else
+                         (zlib.error, zstandard.ZstdError))
+
+# Number of rows decoded at a time from columnar blobs, if blobs are not
+# streamed in blobs of stream_blob_rows rows.
+_COLUMNAR_BATCH_ROWS = 65536
+
+# Characters of globs matching a variable part of object names.
+_GLOB_SPECIAL_CHARACTERS = re.compile(r'[*?\[]')
+
+# Metadata of the listed objects. Listing pages hold up to 1000 objects.
+_LISTED_OBJECT_FIELDS = 'items(name,size,generation),nextPageToken'
+
+
+def _parse_events_as_json(parsable_events: List[bytes]
+                          ) -> List[Dict[Any, Any]]:
+  """Parses a list of events as JSON.
+
+  Defined at module level, so it can be run in a process pool.
+
+  Args:
+    parsable_events: Bytes events to parse.
+
+  Returns:
+    A list of events formatted as JSON.
+
+  Raises:
+    DataInConnectorBlobParseError: When parsing the blob was unsuccessful.
+  """
+  try:
+    return [json.loads(event.decode('utf-8')) for event in parsable_events]
+  except (json.JSONDecodeError, UnicodeDecodeError) as error:
+    raise errors.DataInConnectorBlobParseError(
+        error=error, msg='Failed to parse the blob as JSON.',
+        error_num=errors.ErrorNameIDMap.GCS_HOOK_ERROR_BAD_JSON_FORMAT_BLOB)
+
+
+def _parse_csv_bool(value: str) -> bool:
+  """Parses a CSV field as a boolean.
+
+  Args:
+    value: The field.
+
+  Returns:
+    The boolean value of the field.
+
+  Raises:
+    ValueError: If the field is not a boolean.
+  """
+  lower_value = value.lower()
+  if lower_value in ('true', '1'):
+    return True
+  if lower_value in ('false', '0'):
+    return False
+  raise ValueError(f'Invalid boolean value: {value}')
+
+
+# Converters of the types of the CSV column type schema, by type name. Aliases
+# follow the BigQuery type names.
+_CSV_COLUMN_CONVERTERS = {
+    'STRING': str,
+    'INTEGER': int,
+    'INT64': int,
+    'FLOAT': float,
+    'FLOAT64': float,
+    'BOOLEAN': _parse_csv_bool,
+    'BOOL': _parse_csv_bool,
+}
+
+
+def _parse_csv_schema(csv_schema: str) -> Optional[Dict[str, str]]:
+  """Parses the column type schema of CSV blobs.
+
+  Args:
+    csv_schema: A JSON object of column names to type names, for example
+      '{"conversionValue": "FLOAT", "quantity": "INTEGER"}'. Type names are
+      the keys of _CSV_COLUMN_CONVERTERS, in any case.
+
+  Returns:
+    A dict of column names to upper case type names, or None if the schema is
+    empty.
+
+  Raises:
+    DataInConnectorValueError: If the schema is invalid.
+  """
+  if not csv_schema:
+    return None
+  try:
+    column_types = json.loads(csv_schema)
+  except json.JSONDecodeError:
+    column_types = None
+  if not isinstance(column_types, dict) or not all(
+      str(type_name).upper() in _CSV_COLUMN_CONVERTERS
+      for type_name in column_types.values()):
+    raise errors.DataInConnectorValueError(
+        'Invalid CSV column type schema. Expected a JSON object of column '
+        'names to one of the types: %s.' % ', '.join(_CSV_COLUMN_CONVERTERS),
+        errors.ErrorNameIDMap.GCS_HOOK_ERROR_INVALID_CSV_SCHEMA)
+  return {column: type_name.upper()
+          for column, type_name in column_types.items()}
+
+
+def _parse_events_as_csv(fields: List[str], parsable_events: List[bytes],
+                         column_types: Optional[Dict[str, str]] = None
+                         ) -> List[Dict[Any, Any]]:
+  """Parses a list of events as CSV.
+
+  Events are parsed with the csv module, so quoted fields can hold commas,
+  quotes and line breaks. The columns of column_types are converted column by
+  column, and empty fields of these columns become None.
+
+  Defined at module level, so it can be run in a process pool.
+
+  Args:
+    fields: The field names from the header line of the blob.
+    parsable_events: Bytes events to parse, without the header line.
+    column_types: Type names of the columns to convert, by column name.
+
+  Returns:
+    A list of events formatted as CSV.
+
+  Raises:
+    DataInConnectorBlobParseError: When parsing the blob was unsuccessful.
+  """
+  try:
+    rows = list(csv.reader(
+        [event.decode('utf-8') for event in parsable_events]))
+  except (csv.Error, UnicodeDecodeError) as error:
+    raise errors.DataInConnectorBlobParseError(
+        error=error, msg='Failed to parse the blob as CSV',
+        error_num=errors.ErrorNameIDMap.GCS_HOOK_ERROR_BAD_CSV_FORMAT_BLOB)
+  if not all(len(row) == len(fields) for row in rows):
+    raise errors.DataInConnectorBlobParseError(
+        msg='Failed to parse CSV, not all lines have same length.',
+        error_num=errors.ErrorNameIDMap
+        .GCS_HOOK_ERROR_DIFFERENT_ROW_LENGTH_IN_CSV_BLOB)
+
+  typed_columns = [(index, _CSV_COLUMN_CONVERTERS[column_types[field]])
+                   for index, field in enumerate(fields)
+                   if column_types and field in column_types]
+  if not typed_columns or not rows:
+    return [dict(zip(fields, row)) for row in rows]
+
+  columns = list(zip(*rows))
+  for index, converter in typed_columns:
+    try:
+      columns[index] = [converter(value) if value else None
+                        for value in columns[index]]
+    except ValueError as error:
+      raise errors.DataInConnectorBlobParseError(
+          error=error, msg=f'Failed to convert CSV column {fields[index]}.',
+          error_num=errors.ErrorNameIDMap.GCS_HOOK_ERROR_BAD_CSV_FORMAT_BLOB)
+  return [dict(zip(fields, values)) for values in zip(*columns)]
+
+
+def _parse_csv_header(header_line: bytes) -> List[str]:
+  """Parses the header line of a CSV blob.
+
+  Args:
+    header_line: The first line of the blob.
+
+  Returns:
+    The field names.
+
+  Raises:
+    DataInConnectorBlobParseError: When parsing the header was unsuccessful.
+  """
+  try:
+    return next(csv.reader([header_line.decode('utf-8')]), [])
+  except (csv.Error, UnicodeDecodeError) as error:
+    raise errors.DataInConnectorBlobParseError(
+        error=error, msg='Failed to parse the blob as CSV',
+        error_num=errors.ErrorNameIDMap.GCS_HOOK_ERROR_BAD_CSV_FORMAT_BLOB)
+
+
+def _is_retriable_download_error(error: Exception) -> bool:
+  """Checks if a byte range download failed with a transient error.
+
+  Args:
+    error: The error raised by the download.
+
+  Returns:
+    True if the range can be downloaded again, otherwise False.
+  """
+  return isinstance(error, (api_exceptions.TooManyRequests,
+                            api_exceptions.ServerError,
+                            requests.exceptions.ConnectionError))
+
+
+def _download_byte_range(file_blob: Any, byte_range: Tuple[int, int]) -> bytes:
+  """Downloads a byte range of a blob.
+
+  Args:
+    file_blob: The Cloud Storage blob to download.
+    byte_range: The offsets of the first and last byte to download.
+
+  Returns:
+    The downloaded bytes.
+
+  Raises:
+    DataInConnectorError: When the blob doesn't exist anymore.
+  """
+  outio = io.BytesIO()
+  try:
+    # Compressed blobs are decompressed by the hook, so byte ranges refer to
+    # the stored bytes.
+    file_blob.download_to_file(outio, start=byte_range[0], end=byte_range[1],
+                               raw_download=True)
+  except NotFound as error:
+    raise errors.DataInConnectorError(
+        error=error, msg='Failed to download the blob.',
+        error_num=errors.ErrorNameIDMap.GCS_HOOK_ERROR_MISSING_BLOB)
+  return outio.getvalue()
+
+
+def _get_compression(blob_name: str,
+                     content_encoding: Optional[str]) -> Optional[str]:
+  """Detects the compression of a blob.
+
+  Args:
+    blob_name: The name of the blob.
+    content_encoding: The Content-Encoding metadata of the blob.
+
+  Returns:
+    The compression of the blob, or None if the blob is not compressed.
+  """
+  if content_encoding in (_GZIP, _ZSTD):
+    return content_encoding
+  for extension, compression in _COMPRESSION_BY_EXTENSION.items():
+    if blob_name.endswith(extension):
+      return compression
+  return None
+
+
+def _new_decompressor(compression: str) -> Any:
+  """Creates a streaming decompressor.
+
+  Args:
+    compression: The compression of the blob.
+
+  Returns:
+    A decompressor with a decompress method, and eof and unused_data
+    attributes.
+
+  Raises:
+    DataInConnectorValueError: If the zstandard package is not installed.
+  """
+  if compression == _GZIP:
+    return zlib.decompressobj(wbits=_GZIP_WBITS)
+  if zstandard is None:
+    raise errors.DataInConnectorValueError(
+        'Reading zstd compressed blobs requires the zstandard package.',
+        errors.ErrorNameIDMap.GCS_HOOK_ERROR_UNSUPPORTED_COMPRESSION)
+  return zstandard.ZstdDecompressor().decompressobj()
+
+
+def _decompress_chunks(chunks: Iterable[bytes],
+                       compression: str) -> Generator[bytes, None, None]:
+  """Decompresses the chunks of a compressed blob while they are downloaded.
+
+  The size of the decompressed chunks is bounded, so highly compressed input
+  doesn't have to fit in memory at once. Blobs of several concatenated gzip
+  members or zstd frames are decompressed whole.
+
+  Args:
+    chunks: The compressed chunks of the blob.
+    compression: The compression of the blob.
+
+  Yields:
+    The decompressed chunks.
+
+  Raises:
+    DataInConnectorBlobParseError: When the blob can't be decompressed.
+    DataInConnectorValueError: When the blob ends in the middle of a gzip
+      member or zstd frame.
+  """
+  input_size = (_DECOMPRESS_INPUT_SIZE if compression == _GZIP
+                else _ZSTD_DECOMPRESS_INPUT_SIZE)
+  decompressor = _new_decompressor(compression)
+  # Whether the current member or frame got input and didn't end yet.
+  is_pending = False
+  try:
+    for chunk in chunks:
+      for i in range(0, len(chunk), input_size):
+        data = chunk[i:i + input_size]
+        while data:
+          is_pending = True
+          if compression == _GZIP:
+            decompressed = decompressor.decompress(data,
+                                                   _DECOMPRESS_OUTPUT_SIZE)
+            data = decompressor.unconsumed_tail
+          else:
+            decompressed = decompressor.decompress(data)
+            data = b''
+          if decompressed:
+            yield decompressed
+          if decompressor.eof:
+            data = decompressor.unused_data
+            decompressor = _new_decompressor(compression)
+            is_pending = False
+  except _DECOMPRESSION_ERRORS as error:
+    raise errors.DataInConnectorBlobParseError(
+        error=error, msg='Failed to decompress the blob.',
+        error_num=errors.ErrorNameIDMap.GCS_HOOK_ERROR_BAD_COMPRESSED_BLOB)
+  if is_pending:
+    raise errors.DataInConnectorValueError(
+        'The compressed blob is truncated.',
+        errors.ErrorNameIDMap.GCS_HOOK_ERROR_BAD_COMPRESSED_BLOB)
+
+
+def _skip_bytes(chunks: Iterable[bytes],
+                num_bytes: int) -> Generator[bytes, None, None]:
+  """Skips the first bytes of a stream of chunks.
+
+  Args:
+    chunks: The chunks.
+    num_bytes: The number of bytes to skip.
+
+  Yields:
+    The chunks after the skipped bytes.
+  """
+  for chunk in chunks:
+    if num_bytes >= len(chunk):
+      num_bytes -= len(chunk)
+      continue
+    yield chunk[num_bytes:] if num_bytes else chunk
+    num_bytes = 0
+
+
+def _record_batch_to_events(record_batch: pyarrow.RecordBatch
+                            ) -> List[Dict[str, Any]]:
+  """Converts a columnar record batch to events.
+
+  Args:
+    record_batch: The record batch.
+
+  Returns:
+    A list of events, one per row of the batch.
+  """
+  columns = record_batch.to_pydict()
+  names = list(columns)
+  return [dict(zip(names, row)) for row in zip(*columns.values())]
+
+
+class _ChunksReader(io.RawIOBase):
+  """Reads a stream of chunks as a file object.
+
+  Attributes:
+    bytes_read: Number of bytes read from the chunks.
+  """
+
+  def __init__(self, chunks: Iterable[bytes]) -> None:
+    super().__init__()
+    self.bytes_read = 0
+    self._chunks = iter(chunks)
+    self._chunk = b''
+    self._chunk_position = 0
+
+  def readable(self) -> bool:
+    return True
+
+  def readinto(self, buffer: Any) -> int:
+    while self._chunk_position >= len(self._chunk):
+      self._chunk = next(self._chunks, None)
+      if self._chunk is None:
+        self._chunk = b''
+        return 0
+      self._chunk_position = 0
+
+    num_bytes = min(len(buffer), len(self._chunk) - self._chunk_position)
+    buffer[:num_bytes] = self._chunk[self._chunk_position:
+                                     self._chunk_position + num_bytes]
+    self._chunk_position += num_bytes
+    self.bytes_read += num_bytes
+    return num_bytes
+
+
+class _RangeReader(io.RawIOBase):
+  """Reads a blob as a seekable file object of byte range downloads.
+
+  Every read downloads only the requested byte range of the blob.
+  """
+
+  def __init__(self, download_range: Callable[[Tuple[int, int]], bytes],
+               size: int) -> None:
+    super().__init__()
+    self._download_range = download_range
+    self._size = size
+    self._position = 0
+
+  def readable(self) -> bool:
+    return True
+
+  def seekable(self) -> bool:
+    return True
+
+  def tell(self) -> int:
+    return self._position
+
+  def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+    if whence == io.SEEK_CUR:
+      offset += self._position
+    elif whence == io.SEEK_END:
+      offset += self._size
+    self._position = max(offset, 0)
+    return self._position
+
+  def readinto(self, buffer: Any) -> int:
+    if self._position >= self._size or not len(buffer):
+      return 0
+    end = min(self._position + len(buffer), self._size) - 1
+    data = self._download_range((self._position, end))
+    buffer[:len(data)] = data
+    self._position += len(data)
+    return len(data)
+
+
+def _get_resume_offsets(
+    processed_blobs_generator: Iterable[Tuple[str, str, str]]
+) -> Dict[Tuple[str, Optional[int]], Optional[Tuple[int, int]]]:
+  """Gets the offsets to resume every processed object generation at.
+
+  Blobs of whole objects are stored with their number of rows as info, or with
+  a JSON checkpoint of the generation of the object, which marks the object as
+  processed. Streamed blobs are stored with a JSON checkpoint, and the object
+  is resumed after the last checkpoint with an end byte offset, or an end row
+  for columnar objects. Blobs stored without a generation apply to every
+  generation of the object.
+
+  Args:
+    processed_blobs_generator: Tuples of (location, position, info) of the
+      processed blobs.
+
+  Returns:
+    A dict from the (location, generation) of every processed object to a
+    tuple of (start_line, start_byte) to resume at, or None if the object was
+    processed completely. The generation is None for blobs stored without one.
+  """
+  resume_offsets = {}
+  for location, position, info in processed_blobs_generator:
+    try:
+      checkpoint = json.loads(info)
+    except (TypeError, ValueError):
+      continue
+
+    if not isinstance(checkpoint, dict):
+      resume_offsets[(location, None)] = None
+      continue
+    key = (location, checkpoint.get('generation'))
+    if 'end_byte' in checkpoint or 'end_row' in checkpoint:
+      previous_offsets = resume_offsets.get(key, (0, 0))
+      end_line = int(position) + checkpoint['num_rows']
+      if previous_offsets is not None and end_line >= previous_offsets[0]:
+        resume_offsets[key] = (end_line, checkpoint.get('end_byte', 0))
+    elif 'generation' in checkpoint:
+      resume_offsets[key] = None
+  return resume_offsets
+
+
+def _get_object_resume_offsets(
+    resume_offsets: Dict[Tuple[str, Optional[int]], Optional[Tuple[int, int]]],
+    location: str, generation: Optional[int]) -> Optional[Tuple[int, int]]:
+  """Gets the offsets to resume an object generation at.
+
+  Args:
+    resume_offsets: The resume offsets by (location, generation).
+    location: The location of the object.
+    generation: The listed generation of the object.
+
+  Returns:
+    A tuple of (start_line, start_byte) to resume at, or None if the object was
+    processed completely.
+  """
+  if (location, generation) in resume_offsets:
+    return resume_offsets[(location, generation)]
+  return resume_offsets.get((location, None), (0, 0))
+
+
+def _get_listing_prefixes(prefix: str, name_globs: List[str]) -> List[str]:
+  """Gets the prefixes to list the objects matching name globs in.
+
+  Every glob is listed from the literal start of the glob, so a glob of date
+  partitions like 'dt=2021-05-*' only lists its partitions. Prefixes starting
+  with another prefix are dropped, so no object is listed twice, and the
+  objects of the prefixes are listed in the order of their names.
+
+  Args:
+    prefix: The prefix of the hook.
+    name_globs: Globs of the object names relative to the prefix.
+
+  Returns:
+    The sorted prefixes to list.
+  """
+  if not name_globs:
+    return [prefix]
+  glob_prefixes = sorted({prefix + _GLOB_SPECIAL_CHARACTERS.split(glob)[0]
+                          for glob in name_globs})
+  listing_prefixes = []
+  for glob_prefix in glob_prefixes:
+    if not listing_prefixes or not glob_prefix.startswith(
+        listing_prefixes[-1]):
+      listing_prefixes.append(glob_prefix)
+  return listing_prefixes
+
 
 class BlobContentTypes(enum.Enum):
   JSON = enum.auto()
   CSV = enum.auto()
+  PARQUET = enum.auto()
+  AVRO = enum.auto()
+  JSON_ARRAY = enum.auto()
+
+
+# Content types decoded in columnar batches instead of lines.
+_COLUMNAR_CONTENT_TYPES = (BlobContentTypes.PARQUET.name,
+                           BlobContentTypes.AVRO.name)
 
 
 class GoogleCloudStorageHook(gcs_hook.GoogleCloudStorageHook,
@@ -48,7 +617,8 @@ class GoogleCloudStorageHook(gcs_hook.GoogleCloudStorageHook,
   Used for chunked download of blobs, and blob generation.
 
   The Blobs must satisfy the following conditions:
-    - Content is formatted as newline-delimited events.
+    - Content is formatted as newline-delimited events, as a JSON array of
+      events, or as Parquet or Avro.
     - Content is formatted as UTF-8.
     - Content is validly formatted as one of the types in BlobContentTypes.
     - The first line in a CSV blob is the fields labels
@@ -57,11 +627,52 @@ class GoogleCloudStorageHook(gcs_hook.GoogleCloudStorageHook,
       bucket: Unique name of the bucket holding the target blob.
       prefix: The path to a location within the bucket.
       content_type: Blob's content type described by BlobContentTypes.
+      shard_index: Zero based index of the object name shard to read.
+      num_shards: Total number of object name shards the prefix is split into.
+      coalesce_max_rows: If positive, consecutive small objects are packed into
+        one blob of up to this many rows.
+      coalesce_max_bytes: If positive, consecutive small objects are packed
+        into one blob of up to this many bytes of object content.
+      stream_blob_rows: If positive, objects are parsed while they are
+        downloaded and read in blobs of this many rows.
+      download_workers: Number of byte ranges of an object downloaded at the
+        same time.
+      object_workers: Number of objects downloaded and parsed at the same
+        time.
+      chunk_size: Size in bytes of the byte ranges objects are downloaded in.
+      columns: Names of the columns read from Parquet and Avro objects, or None
+        to read all columns.
+      csv_column_types: Type names of the CSV columns converted while parsing,
+        by column name, or None to keep all fields as strings.
+      json_array_path: Keys of the objects leading to the array of events of
+        JSON_ARRAY objects. The array is the top-level value if empty.
+      name_globs: Globs of the names of the objects to read, relative to the
+        prefix. All objects are read if empty.
+      list_from_last_processed: Whether objects are listed from the name of
+        the last processed object on.
+      skip_failed_objects: Whether objects that fail to be read are skipped
+        instead of failing the transfer.
   """
 
   def __init__(self, gcs_bucket: str,
                gcs_content_type: str,
                gcs_prefix: str,
+               shard_index: int = 0,
+               num_shards: int = 1,
+               gcs_coalesce_max_rows: int = 0,
+               gcs_coalesce_max_bytes: int = 0,
+               gcs_stream_blob_rows: int = 0,
+               gcs_download_workers: int = 1,
+               gcs_object_workers: int = 1,
+               gcs_chunk_size: int = _DEFAULT_CHUNK_SIZE,
+               gcs_columns: str = '',
+               gcs_csv_schema: str = '',
+               gcs_json_array_path: str = '',
+               gcs_name_globs: str = '',
+               gcs_list_from_last_processed: bool = False,
+               gcs_skip_failed_objects: bool = True,
+               gcs_conn_id: str = _DEFAULT_CONN_ID,
+               gcs_delegate_to: Optional[str] = None,
                **kwargs) -> None:
     """Initiates GoogleCloudStorageHook.
 
@@ -69,6 +680,44 @@ class GoogleCloudStorageHook(gcs_hook.GoogleCloudStorageHook,
       gcs_bucket: Unique name of the bucket holding the target blob.
       gcs_content_type: Blob's content type described by BlobContentTypes.
       gcs_prefix: The path to a location within the bucket.
+      shard_index: Zero based index of the object name shard to read.
+      num_shards: Total number of object name shards the prefix is split into.
+      gcs_coalesce_max_rows: If positive, consecutive small objects are packed
+        into one blob of up to this many rows.
+      gcs_coalesce_max_bytes: If positive, consecutive small objects are packed
+        into one blob of up to this many bytes of object content.
+      gcs_stream_blob_rows: If positive, objects are parsed while they are
+        downloaded and read in blobs of this many rows, with the position of
+        their first row in the object. Blobs adapt their size to the page size
+        controller if one is set.
+      gcs_download_workers: Number of byte ranges of an object downloaded at
+        the same time. Every range in flight holds up to a download chunk in
+        memory.
+      gcs_object_workers: Number of objects downloaded and parsed at the same
+        time in threads, largest objects first. Every object in flight buffers
+        up to two of its blobs in memory.
+      gcs_chunk_size: Size in bytes of the byte ranges objects are downloaded
+        in.
+      gcs_columns: Comma separated names of the columns read from Parquet and
+        Avro objects. All columns are read if empty.
+      gcs_csv_schema: JSON object of CSV column names to the type the column
+        is converted to, one of STRING, INTEGER, FLOAT and BOOLEAN. Columns
+        not in the schema are kept as strings.
+      gcs_json_array_path: Dot separated keys of the objects leading to the
+        array of events of JSON_ARRAY objects, for example 'data.rows'. The
+        array is the top-level value if empty.
+      gcs_name_globs: Comma separated globs of the names of the objects to
+        read, relative to the prefix, for example 'dt=2021-05-*/*.json'. Only
+        the literal start of every glob is listed. All objects are read if
+        empty.
+      gcs_list_from_last_processed: Whether objects are listed from the name
+        of the last processed object on, for prefixes where new objects are
+        added in the order of their names. Objects before it that failed to
+        be read are not retried.
+      gcs_skip_failed_objects: Whether objects that fail to download or parse
+        are skipped. Otherwise the error is raised, and the transfer fails.
+      gcs_conn_id: Connection id passed to airflow's GoogleCloudStorageHook.
+      gcs_delegate_to: The account to impersonate, if any.
       **kwargs: Other optional arguments.
     """
     self._verify_content_type(gcs_content_type)
@@ -76,14 +725,55 @@ class GoogleCloudStorageHook(gcs_hook.GoogleCloudStorageHook,
     self.bucket = gcs_bucket
     self.content_type = gcs_content_type
     self.prefix = gcs_prefix
+    self.coalesce_max_rows = gcs_coalesce_max_rows
+    self.coalesce_max_bytes = gcs_coalesce_max_bytes
+    self.stream_blob_rows = gcs_stream_blob_rows
+    self.download_workers = gcs_download_workers
+    self.object_workers = gcs_object_workers
+    self.chunk_size = gcs_chunk_size
+    self.columns = [column.strip() for column in gcs_columns.split(',')
+                    if column.strip()] or None
+    self.csv_column_types = _parse_csv_schema(gcs_csv_schema)
+    self.json_array_path = [key for key in gcs_json_array_path.split('.')
+                            if key]
+    self.name_globs = [glob.strip() for glob in gcs_name_globs.split(',')
+                       if glob.strip()]
+    self.list_from_last_processed = bool(gcs_list_from_last_processed)
+    self.skip_failed_objects = bool(gcs_skip_failed_objects)
+    self.set_shard(shard_index, num_shards)
 
-    super().__init__()
+    super().__init__(google_cloud_storage_conn_id=gcs_conn_id,
+                     delegate_to=gcs_delegate_to)
+
+  def set_shard(self, shard_index: int, num_shards: int) -> None:
+    """Sets the object name shard of the prefix to read.
+
+    Args:
+      shard_index: Zero based index of the object name shard to read.
+      num_shards: Total number of object name shards the prefix is split into.
+
+    Raises:
+      DataInConnectorValueError: If the shard configuration is invalid.
+    """
+    shard_utils.validate_shard(shard_index, num_shards)
+
+    self.shard_index = shard_index
+    self.num_shards = num_shards
 
   def get_location(self):
     """Retrieves the full url of the bucket from the GCS data source.
 
     Returns:
-      The full url of the bucket
+      The full url of the bucket, including the shard if the prefix is sharded.
+    """
+    return shard_utils.get_shard_location(
+        f'gs://{self.bucket}/{self.prefix}', self.shard_index, self.num_shards)
+
+  def get_monitored_location_prefix(self) -> Optional[str]:
+    """Retrieves the prefix of the locations of the objects of the prefix.
+
+    Returns:
+      The url of the prefix, without the shard.
     """
     return f'gs://{self.bucket}/{self.prefix}'
 
@@ -104,25 +794,66 @@ class GoogleCloudStorageHook(gcs_hook.GoogleCloudStorageHook,
           ', '.join([name for name, item in BlobContentTypes.__members__.items(
               )]),
           errors.ErrorNameIDMap.GCS_HOOK_ERROR_INVALID_BLOB_CONTENT_TYPE)
+    if content_type == BlobContentTypes.AVRO.name and fastavro is None:
+      raise errors.DataInConnectorValueError(
+          'Reading Avro blobs requires the fastavro package.',
+          errors.ErrorNameIDMap.GCS_HOOK_ERROR_INVALID_BLOB_CONTENT_TYPE)
 
-  def _gcs_blob_chunk_generator(self, blob_name: str
+  def _gcs_blob_chunk_generator(self, blob_name: str,
+                                start_byte: int = 0,
+                                chunk_size: Optional[int] = None
                                ) -> Generator[bytes, None, None]:
     """Downloads and generates chunks from given blob.
 
     The base GoogleCloudStorageHook only allows downloading an entire file.
     To enable handling large files this class provides a chunk-wise download of
-    bytes within the blob.
+    bytes within the blob. With several download workers, the byte ranges of
+    the chunks are downloaded at the same time, and generated in the order of
+    the blob. A range that fails with a transient error is downloaded again on
+    its own.
+
+    Blobs compressed with gzip or zstd, by their Content-Encoding or the
+    extension of their name, are decompressed while they are downloaded.
 
     Args:
       blob_name: Unique location within the bucket for the target blob.
+      start_byte: Offset of the first byte to download. Nothing is downloaded
+        if the offset is at the end of the blob. The offset of a compressed
+        blob is an offset in the decompressed content, the blob is downloaded
+        from its start.
+      chunk_size: Size of the download chunks. Defaults to the chunk size of
+        the hook.
 
     Yields:
       Chunks of the given blob, formatted as bytes.
 
     Raises:
       DataInConnectorError: When download failed.
+      DataInConnectorBlobParseError: When decompressing the blob failed.
+    """
+    file_blob = self._get_file_blob(blob_name)
+    compression = _get_compression(blob_name, file_blob.content_encoding)
+    if compression is not None:
+      chunk_generator = self._generate_downloaded_chunks(file_blob, 0,
+                                                         chunk_size)
+      yield from _skip_bytes(_decompress_chunks(chunk_generator, compression),
+                             start_byte)
+    else:
+      yield from self._generate_downloaded_chunks(file_blob, start_byte,
+                                                  chunk_size)
+
+  def _get_file_blob(self, blob_name: str) -> Any:
+    """Gets the Cloud Storage blob to download.
+
+    Args:
+      blob_name: Unique location within the bucket for the target blob.
+
+    Returns:
+      The Cloud Storage blob with its metadata.
+
+    Raises:
+      DataInConnectorError: When the blob doesn't exist.
     """
-    outio = io.BytesIO()
     try:
       bucket = self.get_conn().bucket(self.bucket)
       file_blob = bucket.get_blob(blob_name)
@@ -135,119 +866,291 @@ class GoogleCloudStorageHook(gcs_hook.GoogleCloudStorageHook,
       raise errors.DataInConnectorError(
           msg='Failed to download the blob.',
           error_num=errors.ErrorNameIDMap.GCS_HOOK_ERROR_MISSING_BLOB)
+    return file_blob
 
-    chunks = int(file_blob.size / _DEFAULT_CHUNK_SIZE) + 1
-    for i in range(0, chunks):
-      outio.truncate(0)
-      outio.seek(0)
+  def _generate_downloaded_chunks(
+      self, file_blob: Any, start_byte: int,
+      chunk_size: Optional[int]) -> Generator[bytes, None, None]:
+    """Downloads the byte ranges of a blob.
 
-      start = i * (_DEFAULT_CHUNK_SIZE + 1)
-      end = i * (_DEFAULT_CHUNK_SIZE + 1) + _DEFAULT_CHUNK_SIZE
-      if end > file_blob.size:
-        end = file_blob.size
+    Args:
+      file_blob: The Cloud Storage blob to download.
+      start_byte: Offset of the first byte to download.
+      chunk_size: Size of the download chunks. Defaults to the chunk size of
+        the hook.
 
-      try:
-        file_blob.download_to_file(outio, start=start, end=end)
-      except NotFound as error:
-        raise errors.DataInConnectorError(
-            error=error, msg='Failed to download the blob.',
-            error_num=errors.ErrorNameIDMap.GCS_HOOK_ERROR_MISSING_BLOB)
+    Yields:
+      The stored bytes of the blob, chunk by chunk.
+
+    Raises:
+      DataInConnectorError: When download failed.
+    """
+    if chunk_size is None:
+      chunk_size = self.chunk_size
+    # Ranges are inclusive, so every range holds chunk_size + 1 bytes.
+    byte_ranges = [(start, min(start + chunk_size, file_blob.size - 1))
+                   for start in range(start_byte, file_blob.size,
+                                      chunk_size + 1)]
+    chunks = len(byte_ranges)
 
+    download_range = retry_utils.logged_retry_on_retriable_exception(
+        functools.partial(_download_byte_range, file_blob),
+        _is_retriable_download_error)
+    if self.download_workers > 1 and chunks > 1:
+      chunk_generator = pipeline_utils.run_concurrently_in_order(
+          download_range, byte_ranges, self.download_workers)
+    else:
+      chunk_generator = map(download_range, byte_ranges)
+
+    for i, chunk in enumerate(chunk_generator):
       self.log.debug('Blob loading: {}%'.format(int(i / chunks * 100)))
-      yield outio.getvalue()
+      yield chunk
+
+  def _parse_events_by_content_type(
+      self, parsable_events: List[bytes],
+      csv_fields: Optional[List[str]] = None) -> List[Dict[Any, Any]]:
+    """Parses a list of events as content_type.
 
-  def _parse_events_as_json(self, parsable_events: List[bytes]
-                           ) -> List[Dict[Any, Any]]:
-    """Parses a list of events as JSON.
+    If a parse executor is set, large lists are split into chunks of
+    _PARSE_CHUNK_SIZE events which are parsed in the executor. The parsed
+    chunks are handed back through shared memory.
 
     Args:
       parsable_events: Bytes events to parse.
+      csv_fields: The field names of CSV events. If None, the first event is
+        the header line of the blob.
 
     Returns:
-      A list of events formatted as JSON.
+      A list of events formatted as content_type.
 
     Raises:
       DataInConnectorBlobParseError: When parsing the blob was unsuccessful.
     """
-    try:
-      return [json.loads(event.decode('utf-8')) for event in parsable_events]
-    except (json.JSONDecodeError, UnicodeDecodeError) as error:
-      raise errors.DataInConnectorBlobParseError(
-          error=error, msg='Failed to parse the blob as JSON.',
-          error_num=errors.ErrorNameIDMap.GCS_HOOK_ERROR_BAD_JSON_FORMAT_BLOB)
+    if not parsable_events:
+      return []
+    if self.content_type == BlobContentTypes.CSV.name:
+      if csv_fields is None:
+        csv_fields = _parse_csv_header(parsable_events[0])
+        parsable_events = parsable_events[1:]
+      parse_events = functools.partial(_parse_events_as_csv, csv_fields,
+                                       column_types=self.csv_column_types)
+    else:
+      parse_events = _parse_events_as_json
 
-  def _parse_events_as_csv(self, parsable_events: List[bytes]
-                          ) -> List[Dict[Any, Any]]:
-    """Parses a list of events as CSV.
+    if (self.parse_executor is None or
+        len(parsable_events) <= _PARSE_CHUNK_SIZE):
+      return parse_events(parsable_events)
+
+    chunks = (parsable_events[i:i + _PARSE_CHUNK_SIZE]
+              for i in range(0, len(parsable_events), _PARSE_CHUNK_SIZE))
+    events = []
+    for chunk_events in shared_memory_transport.map_in_order(
+        self.parse_executor, parse_events, chunks, self.parse_max_pending):
+      events.extend(chunk_events)
+    return events
+
+  def get_blob_events(self, blob_name: str) -> List[Dict[Any, Any]]:
+    """Gets blob's contents.
 
     Args:
-      parsable_events: Bytes events to parse.
+      blob_name: The location and file name of the blob in the bucket.
 
     Returns:
-      A list of events formatted as CSV.
+      A list of events formatted as content_type.
+    """
+    return self._parse_events_by_content_type(self._get_blob_lines(blob_name))
+
+  def _get_blob_lines(self, blob_name: str) -> List[bytes]:
+    """Gets blob's contents as lines.
+
+    Args:
+      blob_name: The location and file name of the blob in the bucket.
+
+    Returns:
+      A list of the unparsed lines of the blob.
+    """
+    events: List[bytes] = []
+    for chunk_lines in self._generate_blob_lines(blob_name):
+      events.extend(chunk_lines)
+    return events
+
+  def _generate_blob_lines(self, blob_name: str
+                          ) -> Generator[List[bytes], None, None]:
+    """Downloads a blob and generates its complete lines chunk by chunk.
+
+    Args:
+      blob_name: The location and file name of the blob in the bucket.
+
+    Yields:
+      Lists of the unparsed complete lines of every downloaded chunk.
+    """
+    for lines, _ in self._generate_blob_lines_with_offsets(blob_name):
+      yield lines
+
+  def _generate_blob_lines_with_offsets(
+      self, blob_name: str, start_byte: int = 0
+  ) -> Generator[Tuple[List[bytes], List[int]], None, None]:
+    """Downloads a blob from an offset and generates its lines chunk by chunk.
+
+    Every chunk is split on its own, only the partial last line of a chunk is
+    carried over to the next chunk. The lines of CSV records with quoted line
+    breaks are joined, and generated as one line. JSON_ARRAY objects are split
+    into the elements of their array instead of lines.
+
+    Args:
+      blob_name: The location and file name of the blob in the bucket.
+      start_byte: Offset of the first line to download.
+
+    Yields:
+      Tuples of the unparsed complete lines of every downloaded chunk, and the
+      offsets in the blob after every line.
+    """
+    if self.content_type == BlobContentTypes.JSON_ARRAY.name:
+      yield from self._generate_json_array_elements_with_offsets(blob_name,
+                                                                 start_byte)
+      return
+
+    splitter = line_splitter.LineSplitter(start_offset=start_byte)
+    joiner = None
+    if self.content_type == BlobContentTypes.CSV.name:
+      joiner = line_splitter.QuotedRecordJoiner()
+
+    for chunk in self._gcs_blob_chunk_generator(blob_name=blob_name,
+                                                start_byte=start_byte):
+      lines, end_offsets = splitter.split(chunk)
+      if joiner is not None:
+        lines, end_offsets = joiner.join(lines, end_offsets)
+      if lines:
+        yield lines, end_offsets
+
+    lines, end_offsets = splitter.flush()
+    if joiner is not None:
+      lines, end_offsets = joiner.join(lines, end_offsets)
+      flushed_lines, flushed_end_offsets = joiner.flush()
+      lines += flushed_lines
+      end_offsets += flushed_end_offsets
+    if lines:
+      yield lines, end_offsets
+
+  def _generate_json_array_elements_with_offsets(
+      self, blob_name: str, start_byte: int = 0
+  ) -> Generator[Tuple[List[bytes], List[int]], None, None]:
+    """Downloads a JSON array and generates its elements chunk by chunk.
+
+    Only the partial last element of a chunk is carried over to the next chunk,
+    and the rest of the object is not downloaded once the array is closed.
+
+    Args:
+      blob_name: The location and file name of the blob in the bucket.
+      start_byte: Offset after the element to resume the array at.
+
+    Yields:
+      Tuples of the unparsed complete elements of every downloaded chunk, and
+      the offsets in the blob after every element.
 
     Raises:
-      DataInConnectorBlobParseError: When parsing the blob was unsuccessful.
+      DataInConnectorBlobParseError: When the blob has no complete JSON array
+        at the path.
     """
+    splitter = json_array_splitter.JsonArraySplitter(
+        path=self.json_array_path, start_offset=start_byte)
     try:
-      fields = parsable_events[0].decode('utf-8').split(',')
-      events = [dict(zip(fields, event.decode('utf-8').split(',')))
-                for event in parsable_events[1:]]
-    except (ValueError, UnicodeDecodeError) as error:
-      raise errors.DataInConnectorBlobParseError(
-          error=error, msg='Failed to parse the blob as CSV',
-          error_num=errors.ErrorNameIDMap.GCS_HOOK_ERROR_BAD_CSV_FORMAT_BLOB)
-    if not all(len(event) == len(fields) for event in events):
+      for chunk in self._gcs_blob_chunk_generator(blob_name=blob_name,
+                                                  start_byte=start_byte):
+        elements, end_offsets = splitter.split(chunk)
+        if elements:
+          yield elements, end_offsets
+        if splitter.closed:
+          break
+      splitter.flush()
+    except ValueError as error:
       raise errors.DataInConnectorBlobParseError(
-          msg='Failed to parse CSV, not all lines have same length.',
-          error_num=errors.ErrorNameIDMap
-          .GCS_HOOK_ERROR_DIFFERENT_ROW_LENGTH_IN_CSV_BLOB)
-    return events
+          error=error, msg='Failed to parse the blob as a JSON array.',
+          error_num=errors.ErrorNameIDMap.GCS_HOOK_ERROR_BAD_JSON_FORMAT_BLOB)
 
-  def _parse_events_by_content_type(self, parsable_events: List[bytes]
-                                   ) -> List[Dict[Any, Any]]:
-    """Parses a list of events as content_type.
+  def _read_csv_header(self, blob_name: str) -> List[str]:
+    """Reads the header line of a CSV blob without downloading the blob.
 
     Args:
-      parsable_events: Bytes events to parse.
+      blob_name: The location and file name of the blob in the bucket.
 
     Returns:
-      A list of events formatted as content_type.
+      The field names.
     """
-    if not parsable_events:
-      return []
-    if self.content_type == BlobContentTypes.CSV.name:
-      return self._parse_events_as_csv(parsable_events)
-    else:
-      return self._parse_events_as_json(parsable_events)
+    header = b''
+    for chunk in self._gcs_blob_chunk_generator(
+        blob_name=blob_name, chunk_size=_CSV_HEADER_CHUNK_SIZE):
+      header += chunk
+      if b'\n' in header:
+        break
+    return _parse_csv_header(header.splitlines()[0] if header else b'')
 
-  def get_blob_events(self, blob_name: str) -> List[Dict[Any, Any]]:
-    """Gets blob's contents.
+  def _generate_streamed_blobs(
+      self, blob_name: str, start_line: int = 0, start_byte: int = 0
+  ) -> Generator[Tuple[blob.Blob, int], None, None]:
+    """Generates the blobs of an object while it is downloaded.
+
+    Every blob holds stream_blob_rows events, or the page size of the page size
+    controller if one is set. The position of a blob is the index of its first
+    event in the object, not counting the header line of CSV objects. Every
+    blob has a checkpoint of the byte offset after its last line, so the object
+    can be resumed after it. Only the lines of the current download chunk are
+    held in memory.
 
     Args:
       blob_name: The location and file name of the blob in the bucket.
+      start_line: Index of the event to resume the object at.
+      start_byte: Offset of the line of the event to resume the object at.
 
-    Returns:
-      A list of events formatted as content_type.
+    Yields:
+      Tuples of (blob, num_bytes) of the object, where num_bytes is the size of
+      the lines of the blob.
+
+    Raises:
+      DataInConnectorBlobParseError: When parsing the blob was unsuccessful.
     """
-    events: List[bytes] = []
-    buffer: bytes = b''
+    url = f'gs://{self.bucket}/{blob_name}'
+    is_csv = self.content_type == BlobContentTypes.CSV.name
+    csv_fields = None
+    if is_csv and start_byte > 0:
+      csv_fields = self._read_csv_header(blob_name)
+    pending_lines: List[bytes] = []
+    pending_end_offsets: List[int] = []
+    position = start_line
+    blob_start_byte = start_byte
 
-    blob_chunks_generator = self._gcs_blob_chunk_generator(blob_name=blob_name)
-    for chunk in blob_chunks_generator:
-      buffer += chunk
-      if buffer.startswith(b'\n'):
-        buffer = buffer[1:]
+    def make_blob(num_rows: int) -> Tuple[blob.Blob, int]:
+      events = self._parse_events_by_content_type(pending_lines[:num_rows],
+                                                  csv_fields)
+      end_byte = (pending_end_offsets[num_rows - 1] if num_rows
+                  else blob_start_byte)
+      return (blob.Blob(events=events, location=url, position=position,
+                        checkpoint={'end_byte': end_byte}),
+              end_byte - blob_start_byte)
 
-      events.extend(buffer.splitlines())
-      # Last event might be incomplete. In this case we save the last line back
-      # into the buffer
-      buffer = events.pop() if not buffer.endswith(b'\n') and events else b''
+    for chunk_lines, chunk_end_offsets in (
+        self._generate_blob_lines_with_offsets(blob_name, start_byte)):
+      if is_csv and csv_fields is None:
+        csv_fields = _parse_csv_header(chunk_lines[0])
+        chunk_lines = chunk_lines[1:]
+        blob_start_byte = chunk_end_offsets[0]
+        chunk_end_offsets = chunk_end_offsets[1:]
+      pending_lines.extend(chunk_lines)
+      pending_end_offsets.extend(chunk_end_offsets)
 
-    if buffer:
-      events.append(buffer)
+      num_rows = (self.page_size_controller.page_size
+                  if self.page_size_controller else self.stream_blob_rows)
+      while len(pending_lines) >= num_rows:
+        object_blob, num_bytes = make_blob(num_rows)
+        yield object_blob, num_bytes
+        blob_start_byte = pending_end_offsets[num_rows - 1]
+        del pending_lines[:num_rows]
+        del pending_end_offsets[:num_rows]
+        position += num_rows
 
-    return self._parse_events_by_content_type(events)
+    if pending_lines or (position == _START_POSITION_IN_BLOB and
+                         start_byte == 0):
+      yield make_blob(len(pending_lines))
 
   def events_blobs_generator(
       self,
@@ -256,36 +1159,389 @@ class GoogleCloudStorageHook(gcs_hook.GoogleCloudStorageHook,
   ) -> Generator[blob.Blob, None, None]:
     """Generates all blobs from the bucket's prefix location.
 
+    Only the blobs of the shard set by set_shard, and of objects matching the
+    name globs, are read. Object generations that were processed completely
+    are skipped, so overwritten objects are read again. Streamed objects are
+    resumed after their last processed blob. Objects are read while they are
+    listed, unless objects are read largest first.
+
     Args:
-      processed_blobs_generator: A generator that provides the processed blob
-        information that helps skip read ranges.
+      processed_blobs_generator: A generator of (location, position, info)
+        tuples of the processed blobs of all objects under the prefix.
 
     Yields:
       A generator that generates Blob objects from blob contents within a
       prefix location in the bucket.
 
     Raises:
-      DataInConnectorError: When listing blob in bucket returns a HttpError.
+      DataInConnectorError: When listing the objects of the bucket failed.
+    """
+    resume_offsets = {}
+    start_offset = None
+    if processed_blobs_generator is not None:
+      resume_offsets = _get_resume_offsets(processed_blobs_generator)
+      if self.list_from_last_processed:
+        start_offset = self._get_last_processed_name(resume_offsets)
+
+    objects = self._generate_unprocessed_objects(
+        self._generate_listed_objects(start_offset), resume_offsets)
+    if self.object_workers > 1:
+      objects = sorted(objects, key=lambda listed: listed[0].size or 0,
+                       reverse=True)
+
+    object_blobs = self._generate_object_blobs(objects)
+    if self.coalesce_max_rows > 0 or self.coalesce_max_bytes > 0:
+      yield from self._coalesce_object_blobs(object_blobs)
+    else:
+      for object_blob, _ in object_blobs:
+        yield object_blob
+
+  def _get_last_processed_name(
+      self,
+      resume_offsets: Dict[Tuple[str, Optional[int]], Optional[Tuple[int, int]]]
+  ) -> Optional[str]:
+    """Gets the name of the last processed object of the shard.
+
+    Only objects of the shard set by set_shard count, as the other shards, or
+    work units, progress on their own.
+
+    Args:
+      resume_offsets: The resume offsets by (location, generation).
+
+    Returns:
+      The largest name of the processed objects of the shard, or None if no
+      object of the shard was processed.
+    """
+    bucket_url = f'gs://{self.bucket}/'
+    names = (location[len(bucket_url):] for location, _ in resume_offsets
+             if location.startswith(bucket_url))
+    return max((name for name in names
+                if self.num_shards <= 1 or shard_utils.is_name_in_shard(
+                    name, self.shard_index, self.num_shards)), default=None)
+
+  def _generate_listed_objects(
+      self, start_offset: Optional[str] = None
+  ) -> Generator[Any, None, None]:
+    """Lists the objects of the prefix page by page.
+
+    Args:
+      start_offset: The name of the first object to list, or None to list all
+        objects.
+
+    Yields:
+      The listed objects matching the name globs, in the order of their names.
+
+    Raises:
+      DataInConnectorError: When listing the objects failed.
+    """
+    bucket = self.get_conn().bucket(self.bucket)
+    for listing_prefix in _get_listing_prefixes(self.prefix, self.name_globs):
+      try:
+        for listed_object in bucket.list_blobs(prefix=listing_prefix,
+                                               start_offset=start_offset,
+                                               fields=_LISTED_OBJECT_FIELDS):
+          if not self.name_globs or any(
+              fnmatch.fnmatchcase(listed_object.name[len(self.prefix):], glob)
+              for glob in self.name_globs):
+            yield listed_object
+      except api_exceptions.GoogleAPICallError as error:
+        raise errors.DataInConnectorError(
+            error=error, msg='Failed to get list of blobs from bucket.',
+            error_num=errors.ErrorNameIDMap.RETRIABLE_GCS_HOOK_ERROR_HTTP_ERROR)
+
+  def _generate_unprocessed_objects(
+      self, listed_objects: Iterable[Any],
+      resume_offsets: Dict[Tuple[str, Optional[int]], Optional[Tuple[int, int]]]
+  ) -> Generator[Tuple[Any, Tuple[int, int]], None, None]:
+    """Filters the listed objects to read.
+
+    Args:
+      listed_objects: The listed objects.
+      resume_offsets: The resume offsets by (location, generation).
+
+    Yields:
+      Tuples of the objects of the shard that were not processed completely,
+      and the (start_line, start_byte) offsets to read them from.
     """
+    for listed_object in listed_objects:
+      blob_name = listed_object.name
+      if blob_name.endswith('/') or (
+          self.num_shards > 1 and not shard_utils.is_name_in_shard(
+              blob_name, self.shard_index, self.num_shards)):
+        continue
+      offsets = _get_object_resume_offsets(
+          resume_offsets, f'gs://{self.bucket}/{blob_name}',
+          listed_object.generation)
+      if offsets is not None:
+        yield listed_object, offsets
+
+  def _generate_object_blobs(
+      self, objects: Iterable[Tuple[Any, Tuple[int, int]]]
+  ) -> Generator[Tuple[blob.Blob, int], None, None]:
+    """Generates the blobs of every object.
+
+    An object is read as one blob, or as several blobs if objects are streamed.
+    With several object workers, the objects are read in threads sharing the
+    connection of the hook, and the blobs of every object are generated
+    together in the order of the objects. Every object in flight is read into
+    a bounded queue, so streamed objects are never held in memory as a whole.
+
+    Args:
+      objects: Tuples of the listed objects to read, and the
+        (start_line, start_byte) offsets to resume streamed objects at.
+        Objects read as a whole are always read from the start.
+
+    Yields:
+      Tuples of (blob, num_bytes) of the objects, where num_bytes is the size
+      of the content of the blob.
+    """
+    if self.object_workers <= 1:
+      for listed_object, offsets in objects:
+        yield from self._generate_blobs_of_object(listed_object, offsets)
+      return
+
+    # Creates the connection before the workers share it.
+    self.get_conn()
+    yield from pipeline_utils.chain_concurrently(
+        (self._generate_blobs_of_object(listed_object, offsets)
+         for listed_object, offsets in objects), self.object_workers)
+
+  def _generate_blobs_of_object(
+      self, listed_object: Any, offsets: Tuple[int, int]
+  ) -> Generator[Tuple[blob.Blob, int], None, None]:
+    """Generates the blobs of an object.
+
+    Objects that fail to download or parse are skipped, unless failed objects
+    are not skipped. Streamed objects are skipped from the failing blob on. The
+    checkpoint of every blob holds the
+    listed generation of the object, so the object is read again once it is
+    overwritten.
+
+    Args:
+      listed_object: The listed object to read.
+      offsets: The (start_line, start_byte) offsets to resume streamed objects
+        at.
+
+    Yields:
+      Tuples of (blob, num_bytes) of the object.
+
+    Raises:
+      DataInConnectorError: When the object failed to download or parse, and
+        failed objects are not skipped.
+    """
+    blob_name = listed_object.name
+    start_line, start_byte = offsets
     try:
-      blob_names = self.list(bucket=self.bucket, prefix=self.prefix)
-    except googleapiclient_errors.HttpError as error:
-      raise errors.DataInConnectorError(
-          error=error, msg='Failed to get list of blobs from bucket.',
-          error_num=errors.ErrorNameIDMap.RETRIABLE_GCS_HOOK_ERROR_HTTP_ERROR)
+      if self.content_type in _COLUMNAR_CONTENT_TYPES:
+        object_blobs = self._generate_columnar_blobs(blob_name, start_line)
+      elif self.stream_blob_rows > 0:
+        object_blobs = self._generate_streamed_blobs(blob_name, start_line,
+                                                     start_byte)
+      else:
+        object_blobs = iter([self._read_object_blob(blob_name)])
 
-    if processed_blobs_generator is not None:
-      for processed_file, _ in processed_blobs_generator:
-        if processed_file in blob_names:
-          blob_names.remove(processed_file)
-
-    for blob_name in blob_names:
-      url = f'gs://{self.bucket}/{blob_name}'
-      if not blob_name.endswith('/'):
-        try:
-          events = self.get_blob_events(blob_name)
-          yield blob.Blob(events=events, location=url,
-                          position=_START_POSITION_IN_BLOB)
-        except (errors.DataInConnectorBlobParseError,
-                errors.DataInConnectorError) as error:
-          continue
+      for object_blob, num_bytes in object_blobs:
+        if listed_object.generation is not None:
+          object_blob.checkpoint = {**(object_blob.checkpoint or {}),
+                                    'generation': listed_object.generation}
+        yield object_blob, num_bytes
+    except (errors.DataInConnectorBlobParseError,
+            errors.DataInConnectorError):
+      if not self.skip_failed_objects:
+        raise
+      return
+
+  def _generate_columnar_blobs(
+      self, blob_name: str, start_line: int = 0
+  ) -> Generator[Tuple[blob.Blob, int], None, None]:
+    """Generates the blobs of a Parquet or Avro object.
+
+    The object is decoded in columnar batches, and only the columns of the hook
+    are read. If objects are streamed, the object is read in blobs of
+    stream_blob_rows rows with a checkpoint of their end row, otherwise in one
+    blob.
+
+    Args:
+      blob_name: The location and file name of the blob in the bucket.
+      start_line: Index of the row to resume the object at.
+
+    Yields:
+      Tuples of (blob, num_bytes) of the object, where num_bytes is the size
+      of the decoded batches of the blob.
+
+    Raises:
+      DataInConnectorBlobParseError: When decoding the blob was unsuccessful.
+    """
+    url = f'gs://{self.bucket}/{blob_name}'
+    stream_rows = self.stream_blob_rows if self.stream_blob_rows > 0 else None
+    if self.content_type == BlobContentTypes.PARQUET.name:
+      batches = self._generate_parquet_batches(blob_name,
+                                               stream_rows or
+                                               _COLUMNAR_BATCH_ROWS)
+    else:
+      batches = self._generate_avro_batches(blob_name,
+                                            stream_rows or _COLUMNAR_BATCH_ROWS)
+
+    pending_events = []
+    pending_bytes = 0
+    position = start_line
+    num_rows_read = 0
+
+    def make_blob(num_rows: int) -> Tuple[blob.Blob, int]:
+      checkpoint = (None if stream_rows is None else
+                    {'end_row': position + num_rows})
+      return (blob.Blob(events=pending_events[:num_rows], location=url,
+                        position=position, checkpoint=checkpoint),
+              pending_bytes)
+
+    for events, num_bytes in batches:
+      num_rows_read += len(events)
+      if num_rows_read <= start_line:
+        continue
+      if num_rows_read - len(events) < start_line:
+        events = events[start_line - num_rows_read:]
+      pending_events.extend(events)
+      pending_bytes += num_bytes
+
+      while stream_rows is not None and len(pending_events) >= stream_rows:
+        yield make_blob(stream_rows)
+        del pending_events[:stream_rows]
+        pending_bytes = 0
+        position += stream_rows
+
+    if pending_events or (position == _START_POSITION_IN_BLOB and
+                          start_line == 0):
+      yield make_blob(len(pending_events))
+
+  def _generate_parquet_batches(
+      self, blob_name: str, batch_rows: int
+  ) -> Generator[Tuple[List[Dict[str, Any]], int], None, None]:
+    """Decodes a Parquet object in batches of rows.
+
+    Parquet metadata is at the end of the object, so the object is read as a
+    seekable file of byte range downloads: the footer is read first, and then
+    the column chunks of one row group at a time. Compressed objects can't be
+    read by range, and are downloaded completely before they are decoded.
+
+    Args:
+      blob_name: The location and file name of the blob in the bucket.
+      batch_rows: Max number of rows of a batch.
+
+    Yields:
+      Tuples of the events of every batch, and the size of the decoded batch.
+
+    Raises:
+      DataInConnectorBlobParseError: When decoding the blob was unsuccessful.
+    """
+    file_blob = self._get_file_blob(blob_name)
+    if _get_compression(blob_name, file_blob.content_encoding) is not None:
+      source = pyarrow.BufferReader(b''.join(
+          self._gcs_blob_chunk_generator(blob_name=blob_name)))
+    else:
+      source = _RangeReader(
+          retry_utils.logged_retry_on_retriable_exception(
+              functools.partial(_download_byte_range, file_blob),
+              _is_retriable_download_error), file_blob.size)
+    try:
+      parquet_file = parquet.ParquetFile(source)
+      for record_batch in parquet_file.iter_batches(batch_size=batch_rows,
+                                                    columns=self.columns):
+        yield _record_batch_to_events(record_batch), record_batch.nbytes
+    except (pyarrow.ArrowException, OSError) as error:
+      raise errors.DataInConnectorBlobParseError(
+          error=error, msg='Failed to parse the blob as Parquet.',
+          error_num=errors.ErrorNameIDMap
+          .GCS_HOOK_ERROR_BAD_PARQUET_FORMAT_BLOB)
+
+  def _generate_avro_batches(
+      self, blob_name: str, batch_rows: int
+  ) -> Generator[Tuple[List[Dict[str, Any]], int], None, None]:
+    """Decodes an Avro object in batches of rows while it is downloaded.
+
+    Args:
+      blob_name: The location and file name of the blob in the bucket.
+      batch_rows: Max number of rows of a batch.
+
+    Yields:
+      Tuples of the events of every batch, and the size of the encoded rows of
+      the batch.
+
+    Raises:
+      DataInConnectorBlobParseError: When decoding the blob was unsuccessful.
+    """
+    reader = _ChunksReader(self._gcs_blob_chunk_generator(blob_name=blob_name))
+    try:
+      records = fastavro.reader(io.BufferedReader(reader))
+      while True:
+        bytes_read = reader.bytes_read
+        events = list(itertools.islice(records, batch_rows))
+        if not events:
+          return
+        if self.columns:
+          events = [{column: event.get(column) for column in self.columns}
+                    for event in events]
+        yield events, reader.bytes_read - bytes_read
+    except (ValueError, EOFError) as error:
+      raise errors.DataInConnectorBlobParseError(
+          error=error, msg='Failed to parse the blob as Avro.',
+          error_num=errors.ErrorNameIDMap.GCS_HOOK_ERROR_BAD_AVRO_FORMAT_BLOB)
+
+  def _read_object_blob(self, blob_name: str) -> Tuple[blob.Blob, int]:
+    """Reads a whole object as one blob.
+
+    Args:
+      blob_name: The location and file name of the blob in the bucket.
+
+    Returns:
+      A tuple of (blob, num_bytes) of the object. The size of the content of
+      the object is only measured when coalescing by bytes, and 0 otherwise.
+    """
+    if self.coalesce_max_bytes > 0:
+      lines = self._get_blob_lines(blob_name)
+      events = self._parse_events_by_content_type(lines)
+      num_bytes = sum(len(line) + 1 for line in lines)
+    else:
+      events = self.get_blob_events(blob_name)
+      num_bytes = 0
+    return (blob.Blob(events=events, location=f'gs://{self.bucket}/{blob_name}',
+                      position=_START_POSITION_IN_BLOB), num_bytes)
+
+  def _coalesce_object_blobs(
+      self, object_blobs: Iterable[Tuple[blob.Blob, int]]
+  ) -> Generator[blob.Blob, None, None]:
+    """Packs the blobs of consecutive small objects into coalesced blobs.
+
+    Objects are added to a coalesced blob until the next object would take it
+    above coalesce_max_rows rows or coalesce_max_bytes bytes. Every object stays
+    a piece of its own, so it is monitored with its own location.
+
+    Args:
+      object_blobs: Tuples of (blob, num_bytes) of the objects.
+
+    Yields:
+      Coalesced blobs, or the blob of the object if it is packed alone.
+    """
+    max_rows = self.coalesce_max_rows or float('inf')
+    max_bytes = self.coalesce_max_bytes or float('inf')
+
+    def pack(pieces: List[blob.Blob]) -> blob.Blob:
+      if len(pieces) == 1:
+        return pieces[0]
+      return blob_batching.CoalescedBlob(pieces)
+
+    pieces = []
+    num_rows = 0
+    num_bytes = 0
+    for object_blob, object_bytes in object_blobs:
+      if pieces and (num_rows + object_blob.num_rows > max_rows or
+                     num_bytes + object_bytes > max_bytes):
+        yield pack(pieces)
+        pieces = []
+        num_rows = 0
+        num_bytes = 0
+      pieces.append(object_blob)
+      num_rows += object_blob.num_rows
+      num_bytes += object_bytes
+
+    if pieces:
+      yield pack(pieces)
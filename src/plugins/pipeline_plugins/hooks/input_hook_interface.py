@@ -17,15 +17,30 @@
 """
 
 import abc
+import concurrent.futures
 from typing import Generator, Optional, Tuple
 
 from airflow.hooks import base_hook
 
+from plugins.pipeline_plugins.utils import adaptive_sizing
 from plugins.pipeline_plugins.utils import blob
+from plugins.pipeline_plugins.utils import errors
 
 
 class InputHookInterface(abc.ABC, base_hook.BaseHook):
-  """An abstract interface class for input hooks."""
+  """An abstract interface class for input hooks.
+
+  Attributes:
+    parse_executor: Optional process pool to parse the input in, so parsing
+      doesn't compete with the network I/O of the hook for the GIL.
+    parse_max_pending: Max number of parse tasks submitted to the executor at
+      the same time.
+    page_size_controller: Optional controller of the number of rows per blob.
+  """
+
+  parse_executor: Optional[concurrent.futures.Executor] = None
+  parse_max_pending = 1
+  page_size_controller: Optional[adaptive_sizing.PageSizeController] = None
 
   @abc.abstractmethod
   def events_blobs_generator(
@@ -66,3 +81,101 @@ class InputHookInterface(abc.ABC, base_hook.BaseHook):
     Returns:
       The location of the input source.
     """
+
+  def set_shard(self, shard_index: int, num_shards: int) -> None:
+    """Sets the shard of the input source to read.
+
+    Input sources that can't be split into shards only accept a single shard.
+
+    Args:
+      shard_index: Zero based index of the shard to read.
+      num_shards: Total number of shards the input source is split into.
+
+    Raises:
+      DataInConnectorValueError: If the input source can't read the shard.
+    """
+    if num_shards != 1 or shard_index != 0:
+      raise errors.DataInConnectorValueError(
+          f'{type(self).__name__} can\'t be split into shards.',
+          errors.ErrorNameIDMap.INPUT_HOOK_ERROR_INVALID_SHARD)
+
+  def set_parse_executor(
+      self, executor: Optional[concurrent.futures.Executor],
+      max_pending: int = 1) -> None:
+    """Sets the executor CPU-bound parsing of the input is submitted to.
+
+    Input sources that don't support parsing in an executor ignore it. The
+    parse functions submitted to the executor and their arguments are
+    picklable, so the executor can be a process pool. Parsed results are
+    pickled into shared memory rather than sent through the pipe of the
+    executor.
+
+    Args:
+      executor: The executor, or None to parse in the calling thread.
+      max_pending: Max number of parse tasks submitted at the same time.
+    """
+    self.parse_executor = executor
+    self.parse_max_pending = max_pending
+
+  def get_monitored_location_prefix(self) -> Optional[str]:
+    """Retrieves the prefix of the blob locations monitored for this input.
+
+    Input sources that monitor every object under their location with the
+    object's own location return the common prefix, so the processed blobs of
+    all objects can be looked up. Other sources return None and are monitored
+    by their location.
+
+    Returns:
+      The location prefix, or None.
+    """
+    return None
+
+  def is_incremental(self) -> bool:
+    """Returns whether the input source is read incrementally by a watermark.
+
+    Incremental input sources only read the events after the watermark set by
+    set_watermark, so they don't need the processed blobs of earlier runs to
+    skip events. Their watermark is stored for their location.
+
+    Returns:
+      True if the input source is read incrementally, otherwise False.
+    """
+    return False
+
+  def set_watermark(self, watermark: Optional[str]) -> None:
+    """Sets the high-watermark of the last run to read the events after.
+
+    Input sources that are not read incrementally ignore the watermark.
+
+    Args:
+      watermark: The watermark, or None to read all events.
+    """
+
+  def get_next_watermark(self) -> Optional[str]:
+    """Retrieves the high-watermark of the events read by this run.
+
+    Returns:
+      The watermark to read the events of the next run after, or None if no
+      events were read.
+    """
+    return None
+
+  def complete_transfer(self) -> None:
+    """Called once all the blobs of a transfer were sent and monitored.
+
+    Input sources that keep data for the runs after a failed transfer, like
+    the extracted objects of a table, remove it. Other input sources ignore
+    it.
+    """
+
+  def set_page_size_controller(
+      self,
+      controller: Optional[adaptive_sizing.PageSizeController]) -> None:
+    """Sets the controller of the number of rows read per blob.
+
+    Input sources that read fixed sized blobs ignore the controller.
+
+    Args:
+      controller: The controller, or None to read blobs of the default size.
+    """
+    self.page_size_controller = controller
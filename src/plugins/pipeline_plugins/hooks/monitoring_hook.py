@@ -34,11 +34,16 @@ class MonitoringEntityMap(enum.Enum):
   BLOB = -2
   REPORT = -3
   RETRY = -4
+  WATERMARK = -5
 
 _DEFAULT_PAGE_SIZE = 1000
 
 _BASE_BQ_HOOK_PARAMS = ('delegate_to', 'use_legacy_sql', 'location')
 
+# Alias of the monitoring table rows are deleted from by cleanups, so the
+# conditions of a cleanup can refer to the deleted row in subqueries.
+_CLEANUP_TABLE_ALIAS = 'monitoring'
+
 _LOG_SCHEMA_FIELDS = [
     {'name': 'dag_name', 'type': 'STRING', 'mode': 'REQUIRED'},
     {'name': 'timestamp', 'type': 'TIMESTAMP', 'mode': 'REQUIRED'},
@@ -214,7 +219,8 @@ class MonitoringHook(
                  location: str,
                  position: int,
                  num_rows: int,
-                 timestamp: Optional[str] = None) -> None:
+                 timestamp: Optional[str] = None,
+                 checkpoint: Optional[Dict[str, Any]] = None) -> None:
     """Stores all blobs log-item into monitoring DB.
 
     Args:
@@ -224,16 +230,24 @@ class MonitoringHook(
         Google Cloud Storage blob file.
       num_rows: Number of rows read in blob starting from start_id.
       timestamp: The log timestamp. If None, current timestamp will be used.
+      checkpoint: Resume state of the source after the blob. If set, the info
+        is stored as a JSON object of num_rows and the checkpoint, otherwise
+        as num_rows.
     """
     if timestamp is None:
       timestamp = _generate_zone_aware_timestamp()
 
+    if checkpoint is None:
+      info = str(num_rows)
+    else:
+      info = json.dumps({'num_rows': num_rows, **checkpoint})
+
     row = self._values_to_row(dag_name=dag_name,
                               timestamp=timestamp,
                               type_id=MonitoringEntityMap.BLOB.value,
                               location=location,
                               position=str(position),
-                              info=str(num_rows))
+                              info=info)
     try:
       self._store_monitoring_items_with_retries([row])
     except exceptions.AirflowException as error:
@@ -306,12 +320,67 @@ class MonitoringHook(
       raise errors.MonitoringAppendLogError(error=error,
                                             msg='Failed to insert retry row')
 
+  def store_watermark(self,
+                      dag_name: str,
+                      location: str,
+                      watermark: str,
+                      timestamp: Optional[str] = None) -> None:
+    """Stores the high-watermark of an incremental input into monitoring DB.
+
+    The watermark is stored in a single row, so it's either committed as a
+    whole or not at all.
+
+    Args:
+      dag_name: Airflow DAG ID that is associated with the current monitoring.
+      location: The run input resource location URL.
+      watermark: The watermark the next run reads the input after.
+      timestamp: The log timestamp. If None, current timestamp will be used.
+    """
+    if timestamp is None:
+      timestamp = _generate_zone_aware_timestamp()
+
+    row = self._values_to_row(dag_name=dag_name,
+                              timestamp=timestamp,
+                              type_id=MonitoringEntityMap.WATERMARK.value,
+                              location=location,
+                              position='',
+                              info=watermark)
+    try:
+      self._store_monitoring_items_with_retries([row])
+    except exceptions.AirflowException as error:
+      raise errors.MonitoringAppendLogError(
+          error=error, msg='Failed to insert watermark row')
+
+  def get_watermark(self) -> Optional[str]:
+    """Retrieves the last stored high-watermark of the input location.
+
+    Returns:
+      The watermark, or None if no watermark was stored yet.
+    """
+    sql = ('SELECT `info` '
+           f'FROM `{self.dataset_id}`.`{self.table_id}` '
+           'WHERE `dag_name`=%(dag_name)s '
+           ' AND `location`=%(location)s '
+           ' AND `type_id`=%(type_id)s '
+           'ORDER BY `timestamp` DESC '
+           'LIMIT 1')
+    bq_cursor = self.get_conn().cursor()
+    bq_cursor.execute(
+        sql, {
+            'dag_name': self.dag_name,
+            'location': self.input_location,
+            'type_id': MonitoringEntityMap.WATERMARK.value
+        })
+
+    row = bq_cursor.fetchone()
+    return None if row is None else row[0]
+
   def generate_processed_blobs_ranges(
       self) -> Generator[Tuple[Any, Any], None, None]:
     """Generates tuples of processed blobs from monitoring DB.
 
     Generates tuples of (position, info) for each blob with the same dag_id and
-    location.
+    location, ordered by the numeric value of the position.
 
     Yields:
       Tuples of (position, info) of processed events id ranges.
@@ -321,7 +390,7 @@ class MonitoringHook(
            'WHERE `dag_name`=%(dag_name)s '
            ' AND `location`=%(location)s '
            ' AND `type_id`=%(type_id)s '
-           'ORDER BY `position`')
+           'ORDER BY SAFE_CAST(`position` AS INT64)')
     bq_cursor = self.get_conn().cursor()
     bq_cursor.execute(
         sql, {
@@ -335,6 +404,39 @@ class MonitoringHook(
       yield row[0], row[1]
       row = bq_cursor.fetchone()
 
+  def generate_processed_blobs_checkpoints(
+      self, location_prefix: str) -> Generator[Tuple[Any, Any, Any], None,
+                                               None]:
+    """Generates the processed blobs of all locations under a prefix.
+
+    Used for inputs that monitor every object with the object's location.
+
+    Args:
+      location_prefix: The prefix of the locations of the blobs.
+
+    Yields:
+      Tuples of (location, position, info) of processed blobs, ordered by
+      location and position.
+    """
+    sql = ('SELECT `location`, `position`, `info` '
+           f'FROM `{self.dataset_id}`.`{self.table_id}` '
+           'WHERE `dag_name`=%(dag_name)s '
+           ' AND STARTS_WITH(`location`, %(location_prefix)s) '
+           ' AND `type_id`=%(type_id)s '
+           'ORDER BY `location`, `position`')
+    bq_cursor = self.get_conn().cursor()
+    bq_cursor.execute(
+        sql, {
+            'dag_name': self.dag_name,
+            'location_prefix': location_prefix,
+            'type_id': MonitoringEntityMap.BLOB.value
+        })
+
+    row = bq_cursor.fetchone()
+    while row is not None:
+      yield row[0], row[1], row[2]
+      row = bq_cursor.fetchone()
+
   def events_blobs_generator(self) -> Generator[blob.Blob, None, None]:  # pytype: disable=signature-mismatch  # overriding-parameter-count-checks
     """Generates blobs of retriable failed events stored in monitoring.
 
@@ -345,7 +447,8 @@ class MonitoringHook(
 
     Yields:
       A blob object containing events from a page with length of
-      _DEFAULT_PAGE_SIZE from the monitoring table.
+      _DEFAULT_PAGE_SIZE, or the size given by the page size controller, from
+      the monitoring table.
     """
     sql = (
         'SELECT `info` '
@@ -384,7 +487,9 @@ class MonitoringHook(
       events.append(json.loads(row[0]))
       i += 1
 
-      if i == _DEFAULT_PAGE_SIZE:
+      page_size = (self.page_size_controller.page_size
+                   if self.page_size_controller else _DEFAULT_PAGE_SIZE)
+      if i >= page_size:
         yield blob.Blob(events, self.url)
         i = 0
         events = []
@@ -397,6 +502,10 @@ class MonitoringHook(
   def cleanup_by_days_to_live(self, days_to_live: int) -> None:
     """Removes data older than days_to_live from the monitoring table.
 
+    The newest watermark of every DAG and location is kept, however old it is,
+    so an incremental input isn't read again from its start after a period
+    without new events.
+
     Args:
       days_to_live: The number of days data can live before being
       removed. Must be at least 1.
@@ -414,8 +523,17 @@ class MonitoringHook(
     cutoff_timestamp = (datetime.datetime.utcnow() - datetime.timedelta(
         days=days_to_live)).isoformat() + 'Z'
 
-    cleanup_condition = '`timestamp`<%(cutoff_timestamp)s'
-    params = {'cutoff_timestamp': cutoff_timestamp}
+    cleanup_condition = (
+        '`timestamp`<%(cutoff_timestamp)s AND '
+        '(`type_id`!=%(watermark_type_id)s OR EXISTS('
+        'SELECT 1 '
+        f'FROM `{self.dataset_id}.{self.table_id}` AS newer '
+        'WHERE newer.`type_id`=%(watermark_type_id)s '
+        f' AND newer.`dag_name`={_CLEANUP_TABLE_ALIAS}.`dag_name` '
+        f' AND newer.`location`={_CLEANUP_TABLE_ALIAS}.`location` '
+        f' AND newer.`timestamp`>{_CLEANUP_TABLE_ALIAS}.`timestamp`))')
+    params = {'cutoff_timestamp': cutoff_timestamp,
+              'watermark_type_id': MonitoringEntityMap.WATERMARK.value}
 
     try:
       self._cleanup_monitoring_items_with_retries(cleanup_condition, params)
@@ -448,6 +566,7 @@ class MonitoringHook(
 
     sql = (f'DELETE '
            f'FROM `{self.dataset_id}.{self.table_id}` '
+           f'AS {_CLEANUP_TABLE_ALIAS} '
            f'{where_condition}')
 
     bq_cursor = self.get_conn().cursor()
@@ -17,6 +17,7 @@
 """
 
 import abc
+from typing import Any, Callable, Dict, List, Optional
 
 from airflow.hooks import base_hook
 
@@ -48,3 +49,39 @@ class OutputHookInterface(abc.ABC, base_hook.BaseHook):
     Returns:
       The input blob updated with information about the sending status.
     """
+
+  def get_max_batch_size(self) -> Optional[int]:
+    """Retrieves the max number of events sent in one request to the output.
+
+    Used to size the blobs read from the input, so that blobs split into full
+    batches.
+
+    Returns:
+      The max number of events per request, or None if events aren't batched.
+    """
+    return None
+
+  def get_payload_builder(
+      self) -> Optional[Callable[[List[Dict[str, Any]]], Any]]:
+    """Retrieves the function building the payloads of the events of a blob.
+
+    Output hooks building their payloads with CPU-bound Python return a
+    picklable function of the events, so the operator can build the payloads
+    of the next blobs in a process pool while blobs are sent. send_events uses
+    the payloads set on the blob, if any.
+
+    Returns:
+      The payload builder, or None if payloads are only built by send_events.
+    """
+    return None
+
+  def get_event_validator(self) -> Optional[Callable[[Dict[str, Any]], bool]]:
+    """Retrieves the function checking if send_events would send an event.
+
+    Used to coalesce blobs into batches of valid events, so events dropped by
+    validation don't leave the batches sent short.
+
+    Returns:
+      The event validator, or None if all events are sent.
+    """
+    return None
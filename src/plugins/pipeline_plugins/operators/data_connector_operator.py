@@ -15,13 +15,31 @@
 
 """Data Connector Operator to send data from input source to output source."""
 
-from typing import Any, List, Dict, Optional
+import collections
+import concurrent.futures
+import functools
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+import uuid
 
 from airflow import models
 
 from plugins.pipeline_plugins.hooks import monitoring_hook as monitoring
+from plugins.pipeline_plugins.utils import adaptive_sizing
+from plugins.pipeline_plugins.utils import blob
+from plugins.pipeline_plugins.utils import blob_batching
 from plugins.pipeline_plugins.utils import errors
 from plugins.pipeline_plugins.utils import hook_factory
+from plugins.pipeline_plugins.utils import memory_budget
+from plugins.pipeline_plugins.utils import pipeline_utils
+from plugins.pipeline_plugins.utils import work_queue
+
+_DEFAULT_WORK_LEASE_SECONDS = 600
 
 
 class DataConnectorOperator(models.BaseOperator):
@@ -37,6 +55,16 @@ class DataConnectorOperator(models.BaseOperator):
                return_report: bool = False,
                enable_monitoring: bool = True,
                is_retry: bool = False,
+               enable_pipeline: bool = False,
+               pipeline_queue_depth: int = pipeline_utils.DEFAULT_QUEUE_DEPTH,
+               max_inflight_blobs: int = 1,
+               num_work_units: int = 0,
+               work_queue_path: str = '',
+               work_lease_seconds: int = _DEFAULT_WORK_LEASE_SECONDS,
+               parse_processes: int = 0,
+               adaptive_page_size: bool = False,
+               coalesce_batches: int = 0,
+               max_memory_bytes: int = 0,
                **kwargs) -> None:
     """Initiates the DataConnectorOperator.
 
@@ -53,6 +81,37 @@ class DataConnectorOperator(models.BaseOperator):
           stored in Storage to allow for retry of failed events.
       is_retry: If true, the operator will draw failed events from monitoring
           log and will send them to the output hook.
+      enable_pipeline: If enabled, reading from the input hook, sending to the
+          output hook and writing to monitoring run concurrently as stages of
+          a pipeline instead of one blob after the other.
+      pipeline_queue_depth: Max number of blobs buffered between two pipeline
+          stages.
+      max_inflight_blobs: Max number of blobs sent to the output hook at the
+          same time. Each sending thread uses its own output hook instance.
+          Blobs are still monitored in input order, each after it was sent.
+      num_work_units: If positive, the input is split into this many work
+          units which are claimed from a work queue shared by all operators of
+          the DAG run, instead of reading a fixed shard of the input.
+      work_queue_path: Path of a SQLite database holding the work queue. If
+          empty, the work queue is stored in the monitoring dataset.
+      work_lease_seconds: Number of seconds a claimed work unit stays leased
+          to this operator without progress before another operator may claim
+          it.
+      parse_processes: If positive, the input hook parses its input in a pool
+          of this many processes, while this process keeps reading from the
+          input and sending to the output. Output hooks with a payload builder
+          build the payloads of the blobs in the pool too.
+      adaptive_page_size: If enabled, the number of rows per blob is adjusted
+          during the run to the observed send throughput, the input response
+          size and the batch size of the output hook.
+      coalesce_batches: If positive and the output hook sends events in
+          batches, the events of consecutive blobs are coalesced into blobs of
+          this many full batches before sending. Failed events are still
+          monitored with the position of their input blob.
+      max_memory_bytes: If positive, blobs waiting to be sent or monitored are
+          spilled to local temp files once their estimated bytes exceed this
+          budget. Sent blobs release their events in this mode. Large objects
+          must also be streamed in blobs by the input hook.
       **kwargs: Other arguments to pass through to the operator or hooks.
     """
     super().__init__(*args, **kwargs)
@@ -60,9 +119,27 @@ class DataConnectorOperator(models.BaseOperator):
     self.dag_name = dag_name
     self.input_hook = hook_factory.get_input_hook(input_hook, **kwargs)
     self.output_hook = hook_factory.get_output_hook(output_hook, **kwargs)
+    self.output_hook_type = output_hook
+    self.output_hook_kwargs = {
+        key: value for key, value in kwargs.items() if key != 'dag'}
     self.return_report = return_report
     self.enable_monitoring = enable_monitoring
     self.is_retry = is_retry
+    self.enable_pipeline = enable_pipeline
+    self.pipeline_queue_depth = pipeline_queue_depth
+    self.max_inflight_blobs = max_inflight_blobs
+    self.num_work_units = num_work_units
+    self.work_queue_path = work_queue_path
+    self.work_lease_seconds = work_lease_seconds
+    self.parse_processes = parse_processes
+    self.parse_executor = None
+    self.adaptive_page_size = adaptive_page_size
+    self.coalesce_batches = coalesce_batches
+    self.max_memory_bytes = max_memory_bytes
+    self.memory_budget = None
+    self.page_size_controller = None
+    self.monitoring_dataset = monitoring_dataset
+    self.monitoring_table = monitoring_table
 
     if enable_monitoring and not all([monitoring_dataset,
                                       monitoring_table,
@@ -72,6 +149,12 @@ class DataConnectorOperator(models.BaseOperator):
                'enabled.'),
           error_num=errors.ErrorNameIDMap.MONITORING_HOOK_INVALID_VARIABLES)
 
+    if num_work_units > 0 and not (work_queue_path or enable_monitoring):
+      raise errors.MonitoringValueError(
+          msg=('Work units need a work queue path or enabled monitoring to '
+               'store the work queue.'),
+          error_num=errors.ErrorNameIDMap.MONITORING_HOOK_INVALID_VARIABLES)
+
     self.monitor = monitoring.MonitoringHook(
         bq_conn_id=monitoring_bq_conn_id,
         enable_monitoring=enable_monitoring,
@@ -80,40 +163,359 @@ class DataConnectorOperator(models.BaseOperator):
         monitoring_table=monitoring_table,
         location=self.input_hook.get_location())
 
-  def execute(self, context: Dict[str, Any]) -> Optional[List[Any]]:
-    """Executes this Operator.
+  def _send_events(self, output_hook: Any, blb: Any) -> Any:
+    """Sends a blob to an output hook and records the send throughput.
 
-    Retrieves all blobs with from input_hook and sends them to output_hook.
-    Updates Storage with each blob's status upon success or failure.
+    A coalesced blob is split back into its pieces after sending. With a
+    memory budget, the blob is taken out of the budget to send it, and the
+    sent blob is admitted again without its events.
 
     Args:
-      context: Unused.
+      output_hook: The output hook to send the blob with.
+      blb: The blob to send, or its spilled handle with a memory budget.
 
     Returns:
-      A list of tuples of any data returned from output_hook if return_report
-      flag is set to True.
+      The sent blob, or its spilled handle with a memory budget.
+    """
+    if self.memory_budget is not None:
+      blb = self.memory_budget.take(blb)
+
+    start_time = time.monotonic()
+    sent_blob = output_hook.send_events(blb)
+    if self.page_size_controller is not None:
+      self.page_size_controller.record_send(blb.num_rows,
+                                            time.monotonic() - start_time)
+
+    if isinstance(blb, blob_batching.CoalescedBlob):
+      blb.split(sent_blob)
+      sent_blob = blb
+
+    if self.memory_budget is not None:
+      for sent_piece in [sent_blob, *blob_batching.flatten_pieces([sent_blob])]:
+        sent_piece.events = []
+      return self.memory_budget.admit(sent_blob)
+    return sent_blob
+
+  def _send_blobs_concurrently(
+      self, blobs_to_send: Iterable[blob.Blob]) -> Iterator[blob.Blob]:
+    """Sends up to max_inflight_blobs blobs to output hooks at the same time.
+
+    Output hooks hold connections that are not safe to share between threads,
+    so every sending thread creates an output hook of its own.
+
+    Args:
+      blobs_to_send: The blobs to send.
+
+    Returns:
+      An iterator over the sent blobs, in the order of blobs_to_send.
     """
+    thread_hooks = threading.local()
+
+    def send_events(blb: blob.Blob) -> blob.Blob:
+      if not hasattr(thread_hooks, 'output_hook'):
+        thread_hooks.output_hook = hook_factory.get_output_hook(
+            self.output_hook_type, **self.output_hook_kwargs)
+      return self._send_events(thread_hooks.output_hook, blb)
+
+    return pipeline_utils.run_concurrently_in_order(
+        send_events, blobs_to_send, max_workers=self.max_inflight_blobs)
+
+  def _send_blobs(
+      self, blob_generator: Iterable[Optional[blob.Blob]]
+  ) -> Iterator[blob.Blob]:
+    """Sends all blobs to output_hook.
+
+    When the pipeline is enabled, the input hook is read in one thread and the
+    output hook is called in another thread, while the caller consumes the sent
+    blobs. When max_inflight_blobs is above 1, several blobs are sent at the
+    same time. The sent blobs are generated in the input order in all modes,
+    so the monitoring records keep the same order as in a serial run, and a
+    blob is never monitored before all the blobs preceding it were sent.
+
+    Coalesced blobs, from the input hook or from coalesce_batches, are
+    monitored by the pieces of the input blobs they hold. With a memory budget,
+    blobs waiting in the pipeline may be spilled to disk.
+
+    Args:
+      blob_generator: A generator of blobs to send. None items are skipped.
+
+    Returns:
+      An iterator over the sent blobs.
+    """
+    blobs_to_send = (blb for blb in blob_generator if blb)
+
+    batch_size = (self.output_hook.get_max_batch_size()
+                  if self.coalesce_batches > 0 else None)
+    if batch_size:
+      blobs_to_send = blob_batching.coalesce_blobs(
+          blobs_to_send, batch_size=batch_size,
+          max_batches=self.coalesce_batches,
+          is_valid_event=self.output_hook.get_event_validator())
+
+    payload_builder = self.output_hook.get_payload_builder()
+    if self.parse_executor is not None and payload_builder is not None:
+      blobs_to_send = self._build_payloads(payload_builder, blobs_to_send)
+
+    if self.memory_budget is None:
+      return blob_batching.flatten_pieces(
+          self._send_blobs_in_order(blobs_to_send))
+
+    sent_blobs = self._send_blobs_in_order(
+        map(self.memory_budget.admit, blobs_to_send))
+    return blob_batching.flatten_pieces(
+        map(self.memory_budget.take, sent_blobs))
+
+  def _build_payloads(
+      self, payload_builder: Callable[[List[Dict[str, Any]]], Any],
+      blobs_to_build: Iterable[blob.Blob]) -> Iterator[blob.Blob]:
+    """Builds the output payloads of blobs in the parse process pool.
+
+    Only the events of the blobs are handed to the pool, while the blobs wait
+    in this process for their payloads.
+
+    Args:
+      payload_builder: The picklable payload builder of the output hook.
+      blobs_to_build: The blobs to build the payloads of.
+
+    Yields:
+      The blobs with their payloads, in order.
+    """
+    waiting_blobs = collections.deque()
+
+    def generate_events() -> Iterator[List[Dict[str, Any]]]:
+      for blb in blobs_to_build:
+        waiting_blobs.append(blb)
+        yield blb.events
+
+    for payloads in pipeline_utils.map_in_order(
+        self.parse_executor, payload_builder, generate_events(),
+        self.parse_processes):
+      blb = waiting_blobs.popleft()
+      blb.payloads = payloads
+      yield blb
+
+  def _send_blobs_in_order(
+      self, blobs_to_send: Iterable[blob.Blob]) -> Iterator[blob.Blob]:
+    """Sends blobs to output_hook, serially, pipelined or concurrently.
+
+    Args:
+      blobs_to_send: The blobs to send.
+
+    Returns:
+      An iterator over the sent blobs, in the order of blobs_to_send.
+    """
+    if self.max_inflight_blobs > 1:
+      if self.enable_pipeline:
+        blobs_to_send = pipeline_utils.run_pipelined_stages(
+            blobs_to_send, stages=[], queue_depth=self.pipeline_queue_depth)
+      return self._send_blobs_concurrently(blobs_to_send)
+
+    send_events = functools.partial(self._send_events, self.output_hook)
+    if self.enable_pipeline:
+      return pipeline_utils.run_pipelined_stages(
+          blobs_to_send,
+          stages=[send_events],
+          queue_depth=self.pipeline_queue_depth)
+
+    return (send_events(blb) for blb in blobs_to_send)
+
+  def _transfer_blobs(
+      self, keep_alive: Optional[Callable[[], bool]] = None) -> List[Any]:
+    """Sends all blobs of the input location and monitors them.
+
+    Incremental inputs are read after the watermark stored by the last run,
+    and the new watermark is only stored once all blobs were sent and
+    monitored, so a run after a failed run reads after the same watermark,
+    skipping the blobs the failed run monitored. The input hook is told when
+    all blobs of the input were transferred.
+
+    Args:
+      keep_alive: Called after every monitored blob. The transfer stops early
+          when it returns False.
+
+    Returns:
+      A list of the reports of all sent blobs.
+    """
+    is_incremental = (not self.is_retry and self.enable_monitoring and
+                      self.input_hook.is_incremental())
     if self.is_retry:
       blob_generator = self.monitor.events_blobs_generator()
     else:
-      processed_blobs_generator = self.monitor.generate_processed_blobs_ranges()
+      # The monitored locations of incremental inputs depend on the watermark.
+      if is_incremental:
+        self.input_hook.set_watermark(self.monitor.get_watermark())
+      location_prefix = self.input_hook.get_monitored_location_prefix()
+      if location_prefix is None:
+        processed_blobs_generator = (
+            self.monitor.generate_processed_blobs_ranges())
+      else:
+        processed_blobs_generator = (
+            self.monitor.generate_processed_blobs_checkpoints(location_prefix))
       blob_generator = self.input_hook.events_blobs_generator(
           processed_blobs_generator=processed_blobs_generator)
 
     reports = []
-    for blb in blob_generator:
-      if blb:
-        blb = self.output_hook.send_events(blb)
-        reports.append(blb.reports)
+    for blb in self._send_blobs(blob_generator):
+      reports.append(blb.reports)
 
-        if self.enable_monitoring:
-          self.monitor.store_blob(dag_name=self.dag_name,
+      if self.enable_monitoring:
+        self.monitor.store_blob(dag_name=self.dag_name,
+                                location=blb.location,
+                                position=blb.position,
+                                num_rows=blb.num_rows,
+                                checkpoint=blb.checkpoint)
+        self.monitor.store_events(dag_name=self.dag_name,
                                   location=blb.location,
-                                  position=blb.position,
-                                  num_rows=blb.num_rows)
-          self.monitor.store_events(dag_name=self.dag_name,
-                                    location=blb.location,
-                                    id_event_error_tuple_list=blb.failed_events)
+                                  id_event_error_tuple_list=blb.failed_events)
+
+      if keep_alive is not None and not keep_alive():
+        break
+    else:
+      if is_incremental:
+        self._store_next_watermark()
+      if not self.is_retry:
+        self.input_hook.complete_transfer()
+
+    return reports
+
+  def _store_next_watermark(self) -> None:
+    """Stores the watermark of the events the input read, if it read any."""
+    next_watermark = self.input_hook.get_next_watermark()
+    if next_watermark is not None:
+      self.monitor.store_watermark(dag_name=self.dag_name,
+                                   location=self.input_hook.get_location(),
+                                   watermark=next_watermark)
+
+  def _get_work_queue(self) -> work_queue.WorkQueue:
+    """Gets the work queue shared by the operators of the DAG.
+
+    Returns:
+      A SQLite work queue if a work queue path is set, otherwise a BigQuery
+      work queue next to the monitoring table.
+    """
+    if self.work_queue_path:
+      return work_queue.SqliteWorkQueue(self.work_queue_path)
+    return work_queue.BigQueryWorkQueue(
+        bq_hook=self.monitor, dataset_id=self.monitoring_dataset,
+        table_id=f'{self.monitoring_table}_work_units')
+
+  def _transfer_work_units(self, context: Dict[str, Any]) -> List[Any]:
+    """Claims work units from the work queue and transfers them until none left.
+
+    Every operator of a DAG run plans the same work units, so the first one
+    writes the plan and the others only join it. The lease of a unit is renewed
+    in the background while it is transferred. A unit is only marked as done
+    after all of its blobs were monitored, so units of crashed operators are
+    claimed again once their lease expires, and resume from monitoring.
+
+    Args:
+      context: Airflow context holding the run_id of the DAG run.
+
+    Returns:
+      A list of the reports of all sent blobs.
+    """
+    queue = self._get_work_queue()
+    run_id = f'{self.dag_name}/{context.get("run_id", "")}'
+    if self.is_retry:
+      run_id += '/retry'
+    worker_id = f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}'
+    queue.plan_units(run_id, self.num_work_units)
+
+    reports = []
+    unit_id = queue.claim_unit(run_id, worker_id, self.work_lease_seconds)
+    while unit_id is not None:
+      self.input_hook.set_shard(unit_id, self.num_work_units)
+      self.monitor.input_location = self.input_hook.get_location()
+      with work_queue.WorkUnitLease(queue, run_id, unit_id, worker_id,
+                                    self.work_lease_seconds) as lease:
+        reports.extend(self._transfer_blobs(keep_alive=lease.keep_alive))
+
+      if lease.is_lost:
+        logging.warning('Lease of work unit %s of run %s was taken over by '
+                        'another worker.', unit_id, run_id)
+      else:
+        queue.complete_unit(run_id, unit_id)
+      unit_id = queue.claim_unit(run_id, worker_id, self.work_lease_seconds)
+
+    return reports
+
+  def _transfer(self, context: Dict[str, Any]) -> List[Any]:
+    """Transfers the input, split into work units if configured.
+
+    Args:
+      context: Airflow context holding the run_id of the DAG run.
+
+    Returns:
+      A list of the reports of all sent blobs.
+    """
+    if self.num_work_units > 0:
+      return self._transfer_work_units(context)
+    return self._transfer_blobs()
+
+  def _report_memory_budget(self) -> None:
+    """Logs and monitors the peak resident event bytes of the run."""
+    logging.info('Peak resident event bytes: %d. Spilled blobs: %d.',
+                 self.memory_budget.peak_bytes,
+                 self.memory_budget.num_spilled_blobs)
+    if self.enable_monitoring:
+      self.monitor.store_run(
+          dag_name=self.dag_name, location=self.input_hook.get_location(),
+          json_report_1=json.dumps({
+              'peak_resident_event_bytes': self.memory_budget.peak_bytes,
+              'num_spilled_blobs': self.memory_budget.num_spilled_blobs}))
+    self.memory_budget = None
+
+  def execute(self, context: Dict[str, Any]) -> Optional[List[Any]]:
+    """Executes this Operator.
+
+    Retrieves all blobs with from input_hook and sends them to output_hook.
+    Updates Storage with each blob's status upon success or failure.
+
+    Args:
+      context: The Airflow context. Only used to identify the DAG run when the
+        input is split into work units.
+
+    Returns:
+      A list of tuples of any data returned from output_hook if return_report
+      flag is set to True.
+    """
+    if self.adaptive_page_size:
+      self.page_size_controller = adaptive_sizing.PageSizeController(
+          batch_size=self.output_hook.get_max_batch_size())
+      self.input_hook.set_page_size_controller(self.page_size_controller)
+      self.monitor.set_page_size_controller(self.page_size_controller)
+
+    if self.max_memory_bytes > 0:
+      self.memory_budget = memory_budget.MemoryBudget(self.max_memory_bytes)
+
+    try:
+      if self.parse_processes > 0:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.parse_processes) as parse_executor:
+          self.input_hook.set_parse_executor(
+              parse_executor, max_pending=self.parse_processes)
+          self.parse_executor = parse_executor
+          try:
+            reports = self._transfer(context)
+          finally:
+            self.input_hook.set_parse_executor(None)
+            self.parse_executor = None
+      else:
+        reports = self._transfer(context)
+    finally:
+      # Spill files of blobs that were never sent are removed on failure too.
+      if self.memory_budget:
+        self.memory_budget.close()
+
+    if self.memory_budget:
+      self._report_memory_budget()
+
+    if self.page_size_controller:
+      logging.info('Finished with a page size of %d rows.',
+                   self.page_size_controller.page_size)
+      self.input_hook.set_page_size_controller(None)
+      self.monitor.set_page_size_controller(None)
+      self.page_size_controller = None
 
     if self.return_report:
       return reports
@@ -0,0 +1,133 @@
+# coding=utf-8
+# Copyright 2020 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Adaptive page size controller for reading input in blobs.
+
+Small pages cause many round trips to the input and the output, while large
+pages cause memory spikes and coarse retries. The controller starts from a
+default page size and adjusts it during a run:
+ - Towards the page size the output hook sends in target_send_seconds, based
+   on the observed send throughput.
+ - Never above the page size whose input response fits in max_payload_bytes,
+   based on the observed bytes per row.
+ - To a multiple of the batch size of the output hook, so no blob ends with a
+   small partial batch.
+
+Usage Example:
+  controller = adaptive_sizing.PageSizeController(batch_size=20)
+  page = read_page(controller.page_size)
+  controller.record_payload(num_rows=len(page), num_bytes=page_bytes)
+  controller.record_send(num_rows=len(page), seconds=send_seconds)
+"""
+
+import threading
+from typing import Optional
+
+DEFAULT_PAGE_SIZE = 1000
+_MIN_PAGE_SIZE = 10
+_MAX_PAGE_SIZE = 50000
+
+# Seconds the output hook should spend sending one blob.
+_TARGET_SEND_SECONDS = 10.0
+
+# BigQuery tabledata.list responses are capped at about 10MB. Keep headroom for
+# the response envelope.
+_MAX_PAYLOAD_BYTES = 8 * 1024 * 1024
+
+# Max factor the page size changes by after a single send, which damps the
+# reaction to a single slow or fast send.
+_MAX_CHANGE_FACTOR = 2.0
+
+
+class PageSizeController(object):
+  """Adjusts the page size of a run to the observed throughput.
+
+  The controller is thread-safe, so several sending threads can record their
+  sends concurrently.
+  """
+
+  def __init__(self,
+               initial_page_size: int = DEFAULT_PAGE_SIZE,
+               min_page_size: int = _MIN_PAGE_SIZE,
+               max_page_size: int = _MAX_PAGE_SIZE,
+               batch_size: Optional[int] = None,
+               target_send_seconds: float = _TARGET_SEND_SECONDS,
+               max_payload_bytes: int = _MAX_PAYLOAD_BYTES) -> None:
+    """Initiates the PageSizeController.
+
+    Args:
+      initial_page_size: Page size of the first page of the run.
+      min_page_size: Smallest page size.
+      max_page_size: Largest page size.
+      batch_size: Max number of events the output hook sends in one request.
+        None if the output hook has no batches.
+      target_send_seconds: Seconds the output hook should spend sending a page.
+      max_payload_bytes: Max bytes of the input response of a page.
+
+    Raises:
+      ValueError: Raised if the page size bounds are invalid.
+    """
+    if not 0 < min_page_size <= initial_page_size <= max_page_size:
+      raise ValueError('Page sizes must be positive and min_page_size <= '
+                       'initial_page_size <= max_page_size.')
+
+    self.min_page_size = min_page_size
+    self.max_page_size = max_page_size
+    self.batch_size = batch_size
+    self.target_send_seconds = target_send_seconds
+    self.max_payload_bytes = max_payload_bytes
+    self._target_page_size = float(initial_page_size)
+    self._payload_page_size = max_page_size
+    self._lock = threading.Lock()
+
+  @property
+  def page_size(self) -> int:
+    """The number of rows to read in the next page."""
+    with self._lock:
+      page_size = min(int(self._target_page_size), self._payload_page_size)
+    page_size = max(self.min_page_size, min(page_size, self.max_page_size))
+
+    if self.batch_size and page_size > self.batch_size:
+      page_size -= page_size % self.batch_size
+    return page_size
+
+  def record_payload(self, num_rows: int, num_bytes: int) -> None:
+    """Records the size of the input response of a page.
+
+    Args:
+      num_rows: Number of rows in the response.
+      num_bytes: Size of the response in bytes.
+    """
+    if num_rows <= 0 or num_bytes <= 0:
+      return
+    with self._lock:
+      self._payload_page_size = max(
+          1, int(self.max_payload_bytes / (num_bytes / num_rows)))
+
+  def record_send(self, num_rows: int, seconds: float) -> None:
+    """Records how long the output hook took to send a page.
+
+    Args:
+      num_rows: Number of rows sent.
+      seconds: Time the send took.
+    """
+    if num_rows <= 0 or seconds <= 0:
+      return
+    ideal_page_size = num_rows / seconds * self.target_send_seconds
+    with self._lock:
+      self._target_page_size = min(
+          max(ideal_page_size, self._target_page_size / _MAX_CHANGE_FACTOR),
+          self._target_page_size * _MAX_CHANGE_FACTOR,
+          float(self.max_page_size))
@@ -41,6 +41,11 @@ class Blob(object):
          - error: The errors.MonitoringIDsMap error ID.
     num_rows: Number of events in blob. Defaults to length of events list.
     reports: any additional optional information about the blob.
+    checkpoint: Optional resume state of the source after the blob, e.g. the
+        byte offset after the last line of the blob in a file. Stored with
+        the blob in monitoring.
+    payloads: The payloads of the events built by the payload builder of the
+        output hook ahead of sending, or None to build them while sending.
   """
 
   def __init__(self,
@@ -50,7 +55,8 @@ class Blob(object):
                failed_events: Optional[List[Tuple[int, Dict[str, Any],
                                                   int]]] = None,
                position: int = 0,
-               num_rows: Optional[int] = None) -> None:
+               num_rows: Optional[int] = None,
+               checkpoint: Optional[Dict[str, Any]] = None) -> None:
     """Initiates Blob with events and location metadata."""
     self.events = events
     self.location = location
@@ -58,6 +64,8 @@ class Blob(object):
     self.num_rows = num_rows if num_rows is not None else len(events)
     self.failed_events = failed_events if failed_events else list()
     self.reports = reports if reports else list()
+    self.checkpoint = checkpoint
+    self.payloads = None
 
   def append_failed_events(
       self, failed_events: List[Tuple[int, Dict[str, Any], int]]) -> None:
@@ -0,0 +1,251 @@
+# coding=utf-8
+# Copyright 2020 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Coalesces the events of several blobs into full output batches.
+
+Output hooks send the events of every blob in batches, so a blob with a few
+events less than the batch size ends with a small partial batch, and hooks that
+create a job per blob create many small jobs. The coalescer buffers the events
+of consecutive blobs, and generates coalesced blobs holding full batches.
+
+A coalesced blob remembers the pieces of the input blobs it holds. Once sent,
+it is split back into the pieces, and the failed events are mapped back to the
+location and position of their input blob, so every piece is monitored like a
+blob of its own.
+
+Output hooks drop the events they fail to validate from their batches. Given
+the validator of the output hook, the coalescer only counts the valid events
+towards full batches, so dropped events don't leave the batches short.
+
+Usage Example:
+  for coalesced_blob in blob_batching.coalesce_blobs(blobs, batch_size=1000):
+    sent_blob = output_hook.send_events(coalesced_blob)
+    for piece in coalesced_blob.split(sent_blob):
+      monitor(piece)
+"""
+
+import bisect
+import collections
+import time
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List
+from typing import Optional
+
+from plugins.pipeline_plugins.utils import blob
+
+# Max seconds buffered events wait for a batch to fill up.
+_DEFAULT_MAX_WAIT_SECONDS = 60.0
+
+
+class CoalescedBlob(blob.Blob):
+  """A blob holding the events of pieces of several input blobs.
+
+  The events are numbered from position 0, so output hooks report the failed
+  events by their index in the coalesced blob.
+
+  Attributes:
+    pieces: The pieces of the input blobs, in the order of their events.
+  """
+
+  def __init__(self, pieces: List[blob.Blob]) -> None:
+    """Initiates CoalescedBlob with the pieces of the input blobs."""
+    events = []
+    self._offsets = []
+    for piece in pieces:
+      self._offsets.append(len(events))
+      events.extend(piece.events)
+    super().__init__(events=events, location=pieces[0].location)
+    self.pieces = pieces
+
+  def split(self, sent_blob: blob.Blob) -> List[blob.Blob]:
+    """Splits a sent coalesced blob back into the pieces of the input blobs.
+
+    Failed events are moved to the piece holding them, with the id the event
+    has in its input blob. Reports of the output hook can't be attributed to
+    single events, so they are attached to the last piece.
+
+    Args:
+      sent_blob: The blob returned by the output hook for this blob.
+
+    Returns:
+      The pieces, with their failed events and reports.
+    """
+    for index, event, error_num in sent_blob.failed_events:
+      piece_index = bisect.bisect_right(self._offsets, index) - 1
+      # Skip over pieces without events starting at the same offset.
+      while len(self.pieces[piece_index].events) <= (
+          index - self._offsets[piece_index]):
+        piece_index -= 1
+      piece = self.pieces[piece_index]
+      piece.append_failed_event(
+          piece.position + index - self._offsets[piece_index], event,
+          error_num)
+
+    self.pieces[-1].extend_reports(sent_blob.reports)
+    return self.pieces
+
+
+def flatten_pieces(blobs: Iterable[blob.Blob]) -> Iterator[blob.Blob]:
+  """Generates the pieces of coalesced blobs, and other blobs as they are.
+
+  Args:
+    blobs: The blobs to flatten.
+
+  Yields:
+    The blobs, with coalesced blobs replaced by their pieces.
+  """
+  for blb in blobs:
+    if isinstance(blb, CoalescedBlob):
+      yield from blb.pieces
+    else:
+      yield blb
+
+
+class _BlobBuffer(object):
+  """Buffers blobs and cuts the buffered events into coalesced blobs.
+
+  Attributes:
+    pieces: The buffered blobs, in order.
+    num_events: The number of buffered events counting towards batches.
+    oldest_time: Monotonic time the oldest buffered event was buffered at.
+  """
+
+  def __init__(
+      self,
+      is_valid_event: Optional[Callable[[Dict[str, Any]], bool]] = None
+  ) -> None:
+    self.pieces: Deque[blob.Blob] = collections.deque()
+    self.num_events = 0
+    self.oldest_time = None
+    self._is_valid_event = is_valid_event
+    self._piece_num_events: Deque[int] = collections.deque()
+
+  def _count_events(self, events: List[Dict[str, Any]]) -> int:
+    if self._is_valid_event is None:
+      return len(events)
+    return sum(1 for event in events if self._is_valid_event(event))
+
+  def _get_split_index(self, events: List[Dict[str, Any]], room: int) -> int:
+    """Returns the index after the first room counted events."""
+    if self._is_valid_event is None:
+      return room
+    for index, event in enumerate(events):
+      if self._is_valid_event(event):
+        room -= 1
+        if not room:
+          return index + 1
+    return len(events)
+
+  def append(self, blb: blob.Blob) -> None:
+    if not self.pieces:
+      self.oldest_time = time.monotonic()
+    self.pieces.append(blb)
+    num_events = self._count_events(blb.events)
+    self._piece_num_events.append(num_events)
+    self.num_events += num_events
+
+  def pop(self, num_events: int) -> CoalescedBlob:
+    """Pops the first num_events buffered events as a coalesced blob.
+
+    Input blobs are split when they don't fit. The head of a split blob gets an
+    empty checkpoint, as the resume state after it is unknown. Blobs without
+    events counting towards batches following the last popped event are popped
+    too, so they are monitored early.
+
+    Args:
+      num_events: The number of events counting towards batches to pop.
+
+    Returns:
+      The coalesced blob.
+    """
+    pieces = []
+    popped_events = 0
+    while self.pieces and (popped_events < num_events or
+                           not self._piece_num_events[0]):
+      piece = self.pieces.popleft()
+      piece_num_events = self._piece_num_events.popleft()
+      room = num_events - popped_events
+      if piece_num_events > room:
+        split_index = self._get_split_index(piece.events, room)
+        tail = blob.Blob(events=piece.events[split_index:],
+                         location=piece.location,
+                         position=piece.position + split_index,
+                         num_rows=piece.num_rows - split_index,
+                         checkpoint=piece.checkpoint)
+        piece = blob.Blob(
+            events=piece.events[:split_index], location=piece.location,
+            position=piece.position, num_rows=split_index,
+            failed_events=piece.failed_events,
+            checkpoint=None if piece.checkpoint is None else {})
+        self.pieces.appendleft(tail)
+        self._piece_num_events.appendleft(piece_num_events - room)
+        piece_num_events = room
+      pieces.append(piece)
+      popped_events += piece_num_events
+
+    self.num_events -= popped_events
+    self.oldest_time = time.monotonic() if self.pieces else None
+    return CoalescedBlob(pieces)
+
+  def waited_seconds(self) -> float:
+    if self.oldest_time is None:
+      return 0.0
+    return time.monotonic() - self.oldest_time
+
+
+def coalesce_blobs(
+    blobs: Iterable[blob.Blob],
+    batch_size: int,
+    max_batches: int = 1,
+    max_wait_seconds: float = _DEFAULT_MAX_WAIT_SECONDS,
+    is_valid_event: Optional[Callable[[Dict[str, Any]], bool]] = None
+) -> Iterator[CoalescedBlob]:
+  """Coalesces the events of consecutive blobs into full output batches.
+
+  A coalesced blob is generated as soon as max_batches full batches are
+  buffered. When no coalesced blob was generated for max_wait_seconds since
+  events were buffered, all buffered events are generated, so a slow input
+  doesn't hold back events forever. The remaining events are generated once
+  the input is exhausted. Blobs that are already coalesced are coalesced
+  again by their pieces.
+
+  Args:
+    blobs: The blobs to coalesce.
+    batch_size: Max number of events the output hook sends in one request.
+    max_batches: Number of full batches in a coalesced blob.
+    max_wait_seconds: Max seconds events wait in the buffer. The time is
+      checked whenever a new blob arrives.
+    is_valid_event: The event validator of the output hook, or None if the
+      output hook sends all events. Only valid events count towards batches.
+
+  Yields:
+    The coalesced blobs, holding the events in the order of the input blobs.
+
+  Raises:
+    ValueError: Raised if batch_size or max_batches is not positive.
+  """
+  if batch_size <= 0 or max_batches <= 0:
+    raise ValueError('batch_size and max_batches must be positive.')
+  max_events = batch_size * max_batches
+
+  buffer = _BlobBuffer(is_valid_event)
+  for blb in flatten_pieces(blobs):
+    buffer.append(blb)
+    while buffer.num_events >= max_events:
+      yield buffer.pop(max_events)
+    if buffer.waited_seconds() >= max_wait_seconds:
+      yield buffer.pop(buffer.num_events)
+
+  if buffer.pieces:
+    yield buffer.pop(buffer.num_events)
@@ -92,6 +92,17 @@ _ERROR_ID_DESCRIPTION_MAP = immutabledict.immutabledict({
     99: 'Error in sending event to Google Analytics 4. event params items contain invalid value.',
     100: 'Error in sending event to Google Analytics 4. payload is missing in event.',
     101: 'Error in sending event to Google Ads API. Bad format of Ads credential YAML.',
+    102: 'Error in loading events. Invalid input shard configuration.',
+    103: 'Error in distributing work units. The work queue is not accessible.',
+    104: 'Error in loading events from Google Cloud Storage. Failed to decompress the blob.',
+    105: 'Error in loading events from Google Cloud Storage. Unsupported blob compression.',
+    106: 'Error in loading events from Google Cloud Storage. Failed to parse the blob as Parquet.',
+    107: 'Error in loading events from Google Cloud Storage. Failed to parse the blob as Avro.',
+    108: 'Error in loading events from Google Cloud Storage. Invalid CSV column type schema.',
+    109: 'Error in loading events from BigQuery. Invalid Storage Read API options.',
+    110: 'Error in loading events from BigQuery. Invalid Cloud Storage extract options.',
+    111: 'Error in loading events from BigQuery. The extract job to Cloud Storage failed.',
+    112: 'Error in loading events from BigQuery. Invalid watermark options.',
 })
 
 
@@ -167,6 +178,17 @@ class ErrorNameIDMap(enum.Enum):
   GA4_HOOK_ERROR_VALUE_INVALID_EVENTS_PARAMS_ITEMS = 99
   GA4_HOOK_ERROR_MISSING_PAYLOAD_IN_EVENT = 100
   ADS_HOOK_ERROR_BAD_YAML_FORMAT = 101
+  INPUT_HOOK_ERROR_INVALID_SHARD = 102
+  WORK_QUEUE_ERROR_NOT_ACCESSIBLE = 103
+  GCS_HOOK_ERROR_BAD_COMPRESSED_BLOB = 104
+  GCS_HOOK_ERROR_UNSUPPORTED_COMPRESSION = 105
+  GCS_HOOK_ERROR_BAD_PARQUET_FORMAT_BLOB = 106
+  GCS_HOOK_ERROR_BAD_AVRO_FORMAT_BLOB = 107
+  GCS_HOOK_ERROR_INVALID_CSV_SCHEMA = 108
+  BQ_HOOK_ERROR_INVALID_READ_OPTIONS = 109
+  BQ_HOOK_ERROR_INVALID_EXTRACT_OPTIONS = 110
+  BQ_HOOK_ERROR_EXTRACT_JOB_FAILED = 111
+  BQ_HOOK_ERROR_INVALID_WATERMARK_OPTIONS = 112
 
 
 class Error(Exception):
@@ -225,6 +247,11 @@ class MonitoringCleanupError(MonitoringError):
   """Raised when an error occurs during monitoring table cleanup."""
 
 
+# Work queue related errors
+class WorkQueueError(Error):
+  """Raised when the work queue of a connector run returns an error."""
+
+
 # Data in connector related errors
 class DataInConnectorError(Error):
   """Raised when an input data source connector returns an error."""
@@ -0,0 +1,315 @@
+# coding=utf-8
+# Copyright 2020 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Splits a stream of downloaded chunks of a JSON array into its elements.
+
+The splitter scans the structural characters of the JSON content, and cuts the
+bytes of every element of the array out of the chunks, so the elements are
+parsed like the lines of newline-delimited JSON. Only the bytes of the element
+spanning the end of a chunk are carried over to the next chunk, so the memory
+used depends on the size of an element, not of the array.
+
+The array is either the top-level value, or the value at a path of object keys,
+for example the array of {"data": {"rows": [...]}} at the path
+['data', 'rows']. Content after the end of the array is ignored.
+
+Usage Example:
+  splitter = json_array_splitter.JsonArraySplitter(path=['data'])
+  for chunk in chunks:
+    elements, end_offsets = splitter.split(chunk)
+    parse(elements)
+    if splitter.closed:
+      break
+  elements, end_offsets = splitter.flush()
+  parse(elements)
+"""
+
+import json
+import re
+from typing import List, Optional, Sequence, Tuple
+
+# Complete strings, or the characters of the JSON structure outside of strings.
+# A quote alone starts a string that doesn't end in the chunk.
+_TOKEN_PATTERN = re.compile(
+    rb'"[^"\\]*(?:\\.[^"\\]*)*"|["\[\]{},:]', re.DOTALL)
+# The content inside the array up to the next bracket or comma outside of
+# strings, which is the last character of the match. A quote as the last
+# character starts a string, if no bracket or comma follows in the chunk.
+_ELEMENT_TOKEN_PATTERN = re.compile(
+    rb'[^"\[\]{},]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"\[\]{},]*)*["\[\]{},]',
+    re.DOTALL)
+# The rest of a string continued from the previous chunk.
+_STRING_END_PATTERN = re.compile(rb'[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+_NON_WHITESPACE_PATTERN = re.compile(rb'\S')
+_BACKSLASH = b'\\'
+
+_QUOTE = ord('"')
+_OPEN_OBJECT = ord('{')
+_OPEN_ARRAY = ord('[')
+_CLOSE_OBJECT = ord('}')
+_CLOSE_ARRAY = ord(']')
+_COMMA = ord(',')
+
+
+class JsonArraySplitter(object):
+  """Splits the chunks of a JSON array into the bytes of its elements.
+
+  Attributes:
+    closed: Whether the end of the array was split.
+  """
+
+  def __init__(self, path: Sequence[str] = (), start_offset: int = 0) -> None:
+    """Initiates JsonArraySplitter.
+
+    Args:
+      path: Keys of the objects leading to the array. The array is the
+        top-level value if empty.
+      start_offset: Offset of the first chunk in its object. A positive offset
+        is the end offset of an element, so the chunks start inside the array.
+    """
+    self.closed = False
+    self._path = list(path)
+    # Offset of the start of the current chunk in the object.
+    self._offset = start_offset
+    # The open containers, and the last key read in every open object before
+    # the array.
+    self._containers: List[int] = []
+    self._keys: List[Optional[str]] = []
+    self._expect_key = False
+    # Whether a string continues in the next chunk, and if its last character
+    # escapes the first character of the next chunk.
+    self._in_string = False
+    self._escaped = False
+    # Pieces of the key being read, if the key can lead to the array.
+    self._key_pieces: Optional[List[bytes]] = None
+    # Number of open containers inside the array, including the array.
+    self._array_depth: Optional[int] = None
+    # Pieces of the element spanning the end of the previous chunks.
+    self._element_pieces: List[bytes] = []
+    self._is_empty = True
+
+    if start_offset > 0:
+      self._containers = [_OPEN_ARRAY]
+      self._array_depth = 1
+      self._is_empty = False
+
+  def split(self, chunk: bytes) -> Tuple[List[bytes], List[int]]:
+    """Splits the complete elements of a chunk.
+
+    The partial last element is kept, and completed by the next chunk.
+
+    Args:
+      chunk: The next chunk of the object.
+
+    Returns:
+      A tuple of the complete elements, and the offsets in the object after
+      every element, not including the comma after it.
+
+    Raises:
+      ValueError: If the content is not a JSON array at the path.
+    """
+    elements = []
+    end_offsets = []
+    if self.closed:
+      self._offset += len(chunk)
+      return elements, end_offsets
+    if self._is_empty and _NON_WHITESPACE_PATTERN.search(chunk):
+      self._is_empty = False
+
+    element_start = 0
+    position = 0
+    if self._in_string:
+      position = self._continue_string(chunk)
+      if self._in_string:
+        return self._carry_over(chunk, element_start, elements, end_offsets)
+    if self._array_depth is None:
+      position = self._find_array(chunk, position)
+      if position is None:
+        return self._carry_over(chunk, element_start, elements, end_offsets)
+      element_start = position
+
+    for match in _ELEMENT_TOKEN_PATTERN.finditer(chunk, position):
+      token_start = match.end() - 1
+      character = chunk[token_start]
+      if character == _QUOTE:
+        # The pattern backtracks to the quote of a complete string only when
+        # no bracket or comma follows in the chunk.
+        if _STRING_END_PATTERN.match(chunk, token_start + 1) is None:
+          self._start_string(chunk, token_start)
+        break
+      if character in (_OPEN_OBJECT, _OPEN_ARRAY):
+        self._containers.append(character)
+      elif len(self._containers) == self._array_depth:
+        self._add_element(chunk[element_start:token_start],
+                          self._offset + token_start, elements, end_offsets)
+        element_start = match.end()
+        if character != _COMMA:
+          self.closed = True
+          self._offset += len(chunk)
+          return elements, end_offsets
+      elif character != _COMMA:
+        self._containers.pop()
+
+    return self._carry_over(chunk, element_start, elements, end_offsets)
+
+  def flush(self) -> Tuple[List[bytes], List[int]]:
+    """Checks that the array was split completely.
+
+    Content without any JSON value has no elements.
+
+    Returns:
+      Empty lists, as the elements of a complete array are all split.
+
+    Raises:
+      ValueError: If the content has no complete JSON array at the path.
+    """
+    if not self.closed and not self._is_empty:
+      if self._array_depth is None:
+        raise ValueError('No JSON array found at the path.')
+      raise ValueError('The JSON array is not closed.')
+    return [], []
+
+  def _find_array(self, chunk: bytes, position: int) -> Optional[int]:
+    """Reads the chunk up to the start of the array.
+
+    Args:
+      chunk: The current chunk.
+      position: Index in the chunk to read from.
+
+    Returns:
+      Index after the start of the array in the chunk, or None if the array
+      doesn't start in the chunk.
+
+    Raises:
+      ValueError: If the value at the path is not an array.
+    """
+    for match in _TOKEN_PATTERN.finditer(chunk, position):
+      character = chunk[match.start()]
+      if character == _QUOTE:
+        if match.end() - match.start() == 1:
+          self._start_string(chunk, match.start())
+          return None
+        if self._can_be_key():
+          self._keys[-1] = json.loads(match.group())
+      elif character in (_OPEN_OBJECT, _OPEN_ARRAY):
+        if self._is_at_path():
+          if character != _OPEN_ARRAY:
+            raise ValueError('The value at the path is not a JSON array.')
+          self._containers.append(character)
+          self._array_depth = len(self._containers)
+          return match.end()
+        self._containers.append(character)
+        self._keys.append(None)
+        self._expect_key = character == _OPEN_OBJECT
+      elif character in (_CLOSE_OBJECT, _CLOSE_ARRAY):
+        if not self._containers:
+          raise ValueError('Unexpected end of a JSON container.')
+        self._containers.pop()
+        self._keys.pop()
+        self._expect_key = False
+      elif character == _COMMA:
+        self._expect_key = (bool(self._containers) and
+                            self._containers[-1] == _OPEN_OBJECT)
+      else:
+        self._expect_key = False
+    return None
+
+  def _can_be_key(self) -> bool:
+    """Checks if the next string is a key of an object leading to the array."""
+    return (self._array_depth is None and self._expect_key and
+            len(self._containers) <= len(self._path))
+
+  def _start_string(self, chunk: bytes, start: int) -> None:
+    """Starts a string that doesn't end in the chunk.
+
+    Args:
+      chunk: The current chunk.
+      start: Index of the quote starting the string in the chunk.
+    """
+    self._in_string = True
+    rest = chunk[start + 1:]
+    # Pairs of backslashes escape each other, an odd one escapes the next byte.
+    self._escaped = bool((len(rest) - len(rest.rstrip(_BACKSLASH))) % 2)
+    if self._can_be_key():
+      self._key_pieces = [chunk[start:]]
+
+  def _continue_string(self, chunk: bytes) -> int:
+    """Reads the rest of a string continued from the previous chunk.
+
+    Args:
+      chunk: The current chunk.
+
+    Returns:
+      Index after the end of the string in the chunk, or the size of the chunk
+      if the string continues in the next chunk.
+    """
+    position = 0
+    if self._escaped:
+      if not chunk:
+        return 0
+      position = 1
+      self._escaped = False
+    match = _STRING_END_PATTERN.match(chunk, position)
+    if match is None:
+      self._escaped = bool(
+          (len(chunk) - position - len(chunk[position:].rstrip(_BACKSLASH)))
+          % 2)
+      if self._key_pieces is not None:
+        self._key_pieces.append(chunk)
+      return len(chunk)
+
+    self._in_string = False
+    if self._key_pieces is not None:
+      self._key_pieces.append(chunk[:match.end()])
+      self._keys[-1] = json.loads(b''.join(self._key_pieces))
+      self._key_pieces = None
+    return match.end()
+
+  def _carry_over(self, chunk: bytes, element_start: int,
+                  elements: List[bytes], end_offsets: List[int]
+                  ) -> Tuple[List[bytes], List[int]]:
+    """Carries the partial last element of the chunk over to the next chunk.
+
+    Args:
+      chunk: The current chunk.
+      element_start: Index of the start of the partial last element.
+      elements: The complete elements of the chunk.
+      end_offsets: The offsets after the complete elements.
+
+    Returns:
+      The complete elements and their end offsets.
+    """
+    if self._array_depth is not None:
+      self._element_pieces.append(chunk[element_start:])
+    self._offset += len(chunk)
+    return elements, end_offsets
+
+  def _is_at_path(self) -> bool:
+    """Checks if the next value is the value at the path of the array."""
+    return (len(self._containers) == len(self._path) and
+            all(container == _OPEN_OBJECT for container in self._containers)
+            and self._keys == self._path)
+
+  def _add_element(self, last_piece: bytes, end_offset: int,
+                   elements: List[bytes], end_offsets: List[int]) -> None:
+    """Adds the element ending with last_piece, unless it is blank."""
+    if self._element_pieces:
+      self._element_pieces.append(last_piece)
+      last_piece = b''.join(self._element_pieces)
+      self._element_pieces = []
+    element = last_piece.strip()
+    if element:
+      elements.append(element)
+      end_offsets.append(end_offset)
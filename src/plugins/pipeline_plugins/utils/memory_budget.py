@@ -0,0 +1,210 @@
+# coding=utf-8
+# Copyright 2020 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Memory budget for the blobs a data connector holds in flight.
+
+Blobs wait in memory between reading and sending, and between sending and
+monitoring. The budget estimates the bytes of the events and failed events of
+every blob it admits. Blobs that would take the resident bytes over the budget
+are spilled to a local temp file, and only loaded back when they are taken out
+of the budget. Blobs are only bounded once the input hook generated them, so
+large objects must be read in blobs, for example with gcs_stream_blob_rows,
+which input hooks stream without holding the objects as a whole.
+
+Usage Example:
+  budget = memory_budget.MemoryBudget(max_bytes=512 * 1024 * 1024)
+  try:
+    item = budget.admit(blb)
+    ...
+    blb = budget.take(item)
+  finally:
+    budget.close()
+  logging.info('Peak bytes: %d', budget.peak_bytes)
+"""
+
+import gzip
+import json
+import os
+import pickle
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Union
+
+from plugins.pipeline_plugins.utils import blob
+
+# Number of events serialized to estimate the bytes of all events of a blob.
+_SAMPLE_SIZE = 10
+
+# Spill files are written for throughput, not for the best compression.
+_SPILL_COMPRESS_LEVEL = 1
+
+
+def _estimate_events_bytes(events: List[Any]) -> int:
+  """Estimates the serialized size of a list of events from a sample.
+
+  Args:
+    events: The events.
+
+  Returns:
+    The estimated size in bytes of the events.
+  """
+  sample = events[:_SAMPLE_SIZE]
+  if not sample:
+    return 0
+  return len(json.dumps(sample, default=str)) * len(events) // len(sample)
+
+
+def estimate_blob_bytes(blb: blob.Blob) -> int:
+  """Estimates the bytes of the events and failed events of a blob.
+
+  Args:
+    blb: The blob.
+
+  Returns:
+    The estimated size in bytes.
+  """
+  failed_events = [event for _, event, _ in blb.failed_events]
+  return (_estimate_events_bytes(blb.events) +
+          _estimate_events_bytes(failed_events))
+
+
+class SpilledBlob(object):
+  """Handle of a blob spilled to a local file.
+
+  Attributes:
+    path: Path of the spill file.
+    num_bytes: Estimated bytes of the blob once loaded.
+  """
+
+  def __init__(self, path: str, num_bytes: int) -> None:
+    self.path = path
+    self.num_bytes = num_bytes
+
+  def load(self) -> blob.Blob:
+    """Loads the blob and removes the spill file.
+
+    Returns:
+      The spilled blob.
+    """
+    try:
+      with gzip.open(self.path, 'rb') as spill_file:
+        return pickle.load(spill_file)
+    finally:
+      os.remove(self.path)
+
+
+class MemoryBudget(object):
+  """Keeps the bytes of the blobs held in memory under a budget.
+
+  The budget is thread-safe, so blobs can be admitted and taken by different
+  threads of a pipeline.
+
+  Attributes:
+    max_bytes: Max estimated bytes of the admitted blobs held in memory.
+    resident_bytes: Estimated bytes of the admitted blobs held in memory.
+    peak_bytes: Max estimated bytes of blobs held in memory at the same time,
+      including spilled blobs while they are loaded back.
+    num_spilled_blobs: Number of blobs spilled to disk.
+  """
+
+  def __init__(self, max_bytes: int, spill_dir: Optional[str] = None) -> None:
+    """Initiates the MemoryBudget.
+
+    Args:
+      max_bytes: Max estimated bytes of the admitted blobs held in memory.
+      spill_dir: Directory to create the spill files in. Defaults to the
+        system temp directory.
+    """
+    self.max_bytes = max_bytes
+    self.resident_bytes = 0
+    self.peak_bytes = 0
+    self.num_spilled_blobs = 0
+    self._spill_dir = spill_dir
+    self._temp_dir = None
+    self._blob_bytes: Dict[int, int] = {}
+    self._lock = threading.Lock()
+
+  def admit(self, blb: blob.Blob) -> Union[blob.Blob, SpilledBlob]:
+    """Admits a blob to the budget, spilling it if the budget is exhausted.
+
+    A blob is kept in memory if no other blob is resident, so a single blob
+    larger than the budget doesn't make a round trip to the disk.
+
+    Args:
+      blb: The blob to admit.
+
+    Returns:
+      The blob, or the handle of the spilled blob.
+    """
+    num_bytes = estimate_blob_bytes(blb)
+    with self._lock:
+      if (self.resident_bytes == 0 or
+          self.resident_bytes + num_bytes <= self.max_bytes):
+        self.resident_bytes += num_bytes
+        self.peak_bytes = max(self.peak_bytes, self.resident_bytes)
+        self._blob_bytes[id(blb)] = num_bytes
+        return blb
+      self.num_spilled_blobs += 1
+
+    return self._spill(blb, num_bytes)
+
+  def take(self, item: Union[blob.Blob, SpilledBlob]) -> blob.Blob:
+    """Takes a blob out of the budget, loading it back if it was spilled.
+
+    Args:
+      item: The blob or the handle returned by admit.
+
+    Returns:
+      The blob.
+    """
+    if isinstance(item, SpilledBlob):
+      with self._lock:
+        self.peak_bytes = max(self.peak_bytes,
+                              self.resident_bytes + item.num_bytes)
+      return item.load()
+
+    with self._lock:
+      self.resident_bytes -= self._blob_bytes.pop(id(item), 0)
+    return item
+
+  def close(self) -> None:
+    """Removes the spill files of blobs that were never taken."""
+    with self._lock:
+      if self._temp_dir is not None:
+        self._temp_dir.cleanup()
+        self._temp_dir = None
+
+  def _spill(self, blb: blob.Blob, num_bytes: int) -> SpilledBlob:
+    """Writes a blob to a new spill file.
+
+    Args:
+      blb: The blob to spill.
+      num_bytes: The estimated bytes of the blob.
+
+    Returns:
+      The handle of the spilled blob.
+    """
+    with self._lock:
+      if self._temp_dir is None:
+        self._temp_dir = tempfile.TemporaryDirectory(dir=self._spill_dir,
+                                                     prefix='tcrm_spill_')
+      temp_dir_name = self._temp_dir.name
+
+    spill_fd, path = tempfile.mkstemp(dir=temp_dir_name, suffix='.pkl.gz')
+    with os.fdopen(spill_fd, 'wb') as raw_file:
+      with gzip.GzipFile(fileobj=raw_file, mode='wb',
+                         compresslevel=_SPILL_COMPRESS_LEVEL) as spill_file:
+        pickle.dump(blb, spill_file, protocol=pickle.HIGHEST_PROTOCOL)
+    return SpilledBlob(path, num_bytes)
@@ -0,0 +1,398 @@
+# coding=utf-8
+# Copyright 2020 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Pipelining utility for overlapping the stages of a data transfer.
+
+Each stage runs in its own thread and the stages are connected by bounded
+FIFO queues, so a slow network call in one stage does not block the other
+stages. Items leave the pipeline in the same order they were generated.
+
+Items can also be processed by a pool of threads or processes while still
+leaving in the order they were generated, see run_concurrently_in_order and
+map_in_order. Several sources can be consumed concurrently with
+interleave_concurrently, or chain_concurrently to keep their items together.
+
+Usage Example:
+  def read():
+    for i in range(5):
+      yield i
+
+  for result in pipeline_utils.run_pipelined_stages(
+      read(), stages=[send], queue_depth=2):
+    store(result)
+
+  for result in pipeline_utils.run_concurrently_in_order(
+      send, read(), max_workers=4):
+    store(result)
+"""
+
+import collections
+import concurrent.futures
+import functools
+import queue
+import threading
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence
+
+DEFAULT_QUEUE_DEPTH = 2
+
+# Interval in seconds in which blocked stages check whether the pipeline has
+# been stopped.
+_POLL_INTERVAL_SECONDS = 0.1
+
+
+class _EndOfStream(object):
+  """Marks that the upstream stage has no more items."""
+
+
+class _StageFailure(object):
+  """Carries an error raised in a stage to the consumer of the pipeline."""
+
+  def __init__(self, error: BaseException) -> None:
+    self.error = error
+
+
+_END_OF_STREAM = _EndOfStream()
+
+
+def _put(items_queue: 'queue.Queue[Any]', item: Any,
+         stop_event: threading.Event) -> bool:
+  """Puts an item into a bounded queue unless the pipeline was stopped.
+
+  Args:
+    items_queue: The queue to put the item into.
+    item: The item to put.
+    stop_event: Event that is set once the pipeline consumer stopped.
+
+  Returns:
+    True if the item was put into the queue, False if the pipeline stopped.
+  """
+  while not stop_event.is_set():
+    try:
+      items_queue.put(item, timeout=_POLL_INTERVAL_SECONDS)
+      return True
+    except queue.Full:
+      continue
+  return False
+
+
+def _get(items_queue: 'queue.Queue[Any]', stop_event: threading.Event) -> Any:
+  """Gets an item from a queue unless the pipeline was stopped.
+
+  Args:
+    items_queue: The queue to get the item from.
+    stop_event: Event that is set once the pipeline consumer stopped.
+
+  Returns:
+    The next item, or _END_OF_STREAM if the pipeline stopped.
+  """
+  while not stop_event.is_set():
+    try:
+      return items_queue.get(timeout=_POLL_INTERVAL_SECONDS)
+    except queue.Empty:
+      continue
+  return _END_OF_STREAM
+
+
+def _source_worker(source: Iterable[Any], output_queue: 'queue.Queue[Any]',
+                   stop_event: threading.Event) -> None:
+  """Pulls items from the source iterable into the first queue."""
+  try:
+    for item in source:
+      if not _put(output_queue, item, stop_event):
+        return
+  except Exception as error:  # pylint: disable=broad-except
+    _put(output_queue, _StageFailure(error), stop_event)
+    return
+  _put(output_queue, _END_OF_STREAM, stop_event)
+
+
+def _stage_worker(stage: Callable[[Any], Any],
+                  input_queue: 'queue.Queue[Any]',
+                  output_queue: 'queue.Queue[Any]',
+                  stop_event: threading.Event) -> None:
+  """Applies a stage function to every item of its input queue."""
+  while True:
+    item = _get(input_queue, stop_event)
+    if item is _END_OF_STREAM or isinstance(item, _StageFailure):
+      _put(output_queue, item, stop_event)
+      return
+    try:
+      result = stage(item)
+    except Exception as error:  # pylint: disable=broad-except
+      _put(output_queue, _StageFailure(error), stop_event)
+      return
+    if not _put(output_queue, result, stop_event):
+      return
+
+
+def run_pipelined_stages(
+    source: Iterable[Any],
+    stages: Sequence[Callable[[Any], Any]],
+    queue_depth: int = DEFAULT_QUEUE_DEPTH) -> Iterator[Any]:
+  """Runs the source and the stages concurrently and yields the results.
+
+  The source iterable is consumed in a dedicated thread, and every stage runs
+  in a dedicated thread as well. Each stage is therefore only ever called from
+  one thread, which keeps non thread-safe connections of the stage owners safe.
+  The caller consumes the output of the last stage, which makes the caller the
+  final stage of the pipeline.
+
+  If the source or any of the stages raises an error, the error is re-raised to
+  the caller once all items preceding the failing item were yielded.
+
+  Args:
+    source: Iterable generating the items to process.
+    stages: Functions to apply to every item, in order.
+    queue_depth: Max number of items buffered between two adjacent stages.
+
+  Yields:
+    The results of the last stage, in the order of the source items.
+
+  Raises:
+    ValueError: Raised if queue_depth is smaller than 1.
+  """
+  if queue_depth < 1:
+    raise ValueError('queue_depth must be a positive integer.')
+
+  stop_event = threading.Event()
+  queues: List['queue.Queue[Any]'] = [
+      queue.Queue(maxsize=queue_depth) for _ in range(len(stages) + 1)]
+  threads = [threading.Thread(target=_source_worker,
+                              args=(source, queues[0], stop_event),
+                              daemon=True)]
+  for i, stage in enumerate(stages):
+    threads.append(threading.Thread(
+        target=_stage_worker,
+        args=(stage, queues[i], queues[i + 1], stop_event),
+        daemon=True))
+
+  for thread in threads:
+    thread.start()
+
+  try:
+    while True:
+      item = queues[-1].get()
+      if item is _END_OF_STREAM:
+        return
+      if isinstance(item, _StageFailure):
+        raise item.error
+      yield item
+  finally:
+    stop_event.set()
+    for thread in threads:
+      thread.join()
+
+
+def interleave_concurrently(
+    sources: Sequence[Iterable[Any]],
+    queue_depth: int = DEFAULT_QUEUE_DEPTH) -> Iterator[Any]:
+  """Consumes several sources concurrently and yields their items interleaved.
+
+  Every source is consumed in a dedicated thread into its own bounded queue.
+  The items are yielded round robin, one item of every source that still has
+  items at a time, so the order of the items only depends on the items of the
+  sources, not on how fast the sources are.
+
+  If any of the sources raises an error, the error is re-raised to the caller
+  once it is the turn of the failing source.
+
+  Args:
+    sources: Iterables generating the items to interleave.
+    queue_depth: Max number of items buffered for every source.
+
+  Yields:
+    The items of the sources, round robin.
+
+  Raises:
+    ValueError: Raised if queue_depth is smaller than 1.
+  """
+  if queue_depth < 1:
+    raise ValueError('queue_depth must be a positive integer.')
+
+  stop_event = threading.Event()
+  queues: List['queue.Queue[Any]'] = [
+      queue.Queue(maxsize=queue_depth) for _ in sources]
+  threads = [threading.Thread(target=_source_worker,
+                              args=(source, source_queue, stop_event),
+                              daemon=True)
+             for source, source_queue in zip(sources, queues)]
+
+  for thread in threads:
+    thread.start()
+
+  try:
+    active_queues = collections.deque(queues)
+    while active_queues:
+      source_queue = active_queues.popleft()
+      item = source_queue.get()
+      if item is _END_OF_STREAM:
+        continue
+      if isinstance(item, _StageFailure):
+        raise item.error
+      active_queues.append(source_queue)
+      yield item
+  finally:
+    stop_event.set()
+    for thread in threads:
+      thread.join()
+
+
+def chain_concurrently(
+    sources: Iterable[Iterable[Any]],
+    max_workers: int,
+    queue_depth: int = DEFAULT_QUEUE_DEPTH) -> Iterator[Any]:
+  """Consumes sources concurrently and yields their items source by source.
+
+  Up to max_workers sources are consumed at the same time, every source in a
+  dedicated thread into its own bounded queue, and the next source is started
+  once the items of a source were all yielded. The items are yielded in the
+  order of the sources, and of the items of every source, while at most
+  max_workers * queue_depth items are buffered.
+
+  If any of the sources raises an error, the error is re-raised to the caller
+  once all items preceding the error were yielded.
+
+  Args:
+    sources: Iterable generating the iterables of the items to yield. It is
+      consumed by the caller, the iterables it generates by the threads.
+    max_workers: Max number of sources consumed at the same time.
+    queue_depth: Max number of items buffered for every source.
+
+  Yields:
+    The items of the sources, in order.
+
+  Raises:
+    ValueError: Raised if max_workers or queue_depth is smaller than 1.
+  """
+  if max_workers < 1:
+    raise ValueError('max_workers must be a positive integer.')
+  if queue_depth < 1:
+    raise ValueError('queue_depth must be a positive integer.')
+
+  stop_event = threading.Event()
+  sources = iter(sources)
+  running = collections.deque()
+
+  def start_next_source() -> bool:
+    source = next(sources, _END_OF_STREAM)
+    if source is _END_OF_STREAM:
+      return False
+    source_queue = queue.Queue(maxsize=queue_depth)
+    thread = threading.Thread(target=_source_worker,
+                              args=(source, source_queue, stop_event),
+                              daemon=True)
+    thread.start()
+    running.append((thread, source_queue))
+    return True
+
+  try:
+    while len(running) < max_workers and start_next_source():
+      pass
+    while running:
+      thread, source_queue = running[0]
+      item = source_queue.get()
+      if item is _END_OF_STREAM:
+        running.popleft()
+        thread.join()
+        start_next_source()
+        continue
+      if isinstance(item, _StageFailure):
+        raise item.error
+      yield item
+  finally:
+    stop_event.set()
+    for thread, _ in running:
+      thread.join()
+
+
+def _discard_result(future: concurrent.futures.Future,
+                    on_discard: Callable[[Any], None]) -> None:
+  """Passes the result of a finished future to on_discard, if it succeeded."""
+  if future.exception() is None:
+    on_discard(future.result())
+
+
+def map_in_order(executor: concurrent.futures.Executor,
+                 function: Callable[[Any], Any],
+                 items: Iterable[Any],
+                 max_pending: int,
+                 on_discard: Optional[Callable[[Any], None]] = None
+                 ) -> Iterator[Any]:
+  """Applies a function to items on an executor and yields results in order.
+
+  At most max_pending items are submitted to the executor at any time, so
+  items are only pulled from the iterable as fast as the results are consumed.
+  The executor can be a thread pool or a process pool. For a process pool the
+  function and the items must be picklable.
+
+  Args:
+    executor: The executor to run the function on.
+    function: The function to apply to every item.
+    items: Iterable generating the items to process.
+    max_pending: Max number of items submitted to the executor at the same time.
+    on_discard: Called with every result that is never yielded because the
+      caller stopped consuming, for example to free resources held by it.
+
+  Yields:
+    The results of the function, in the order of the items.
+
+  Raises:
+    ValueError: Raised if max_pending is smaller than 1.
+  """
+  if max_pending < 1:
+    raise ValueError('max_pending must be a positive integer.')
+
+  pending = collections.deque()
+  try:
+    for item in items:
+      pending.append(executor.submit(function, item))
+      if len(pending) >= max_pending:
+        yield pending.popleft().result()
+
+    while pending:
+      yield pending.popleft().result()
+  finally:
+    for future in pending:
+      if not future.cancel() and on_discard is not None:
+        future.add_done_callback(functools.partial(_discard_result,
+                                                   on_discard=on_discard))
+
+
+def run_concurrently_in_order(function: Callable[[Any], Any],
+                              items: Iterable[Any],
+                              max_workers: int) -> Iterator[Any]:
+  """Applies a function to items on a thread pool and yields results in order.
+
+  At most max_workers items are in flight at any time. A result is only
+  yielded once the results of all preceding items were yielded, so the caller
+  never sees the result of an item before all earlier items are finished.
+
+  Args:
+    function: The function to apply to every item. Must be thread-safe.
+    items: Iterable generating the items to process.
+    max_workers: Max number of items processed at the same time.
+
+  Yields:
+    The results of the function, in the order of the items.
+
+  Raises:
+    ValueError: Raised if max_workers is smaller than 1.
+  """
+  if max_workers < 1:
+    raise ValueError('max_workers must be a positive integer.')
+
+  with concurrent.futures.ThreadPoolExecutor(
+      max_workers=max_workers) as executor:
+    yield from map_in_order(executor, function, items, max_workers)
@@ -0,0 +1,145 @@
+# coding=utf-8
+# Copyright 2020 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Utilities to split the input of one connector run into shards.
+
+A shard is identified by its index and the total number of shards. Row based
+sources are split into contiguous row ranges, and object based sources are
+split by a stable hash of the object name, so each shard processes a disjoint
+part of the input and can run as its own Airflow task.
+"""
+
+import zlib
+from typing import List, Sequence, Tuple
+
+from plugins.pipeline_plugins.utils import errors
+
+
+def validate_shard(shard_index: int, num_shards: int) -> None:
+  """Validates the shard index is within the number of shards.
+
+  Args:
+    shard_index: Zero based index of the shard.
+    num_shards: Total number of shards.
+
+  Raises:
+    DataInConnectorValueError: If the shard configuration is invalid.
+  """
+  if num_shards < 1 or not 0 <= shard_index < num_shards:
+    raise errors.DataInConnectorValueError(
+        'Invalid shard %s of %s shards. The number of shards must be positive '
+        'and the shard index must be between 0 and the number of shards - 1.'
+        % (shard_index, num_shards),
+        errors.ErrorNameIDMap.INPUT_HOOK_ERROR_INVALID_SHARD)
+
+
+def get_shard_location(location: str, shard_index: int,
+                       num_shards: int) -> str:
+  """Gets the monitoring location of a shard of the input.
+
+  Args:
+    location: The location of the whole input.
+    shard_index: Zero based index of the shard.
+    num_shards: Total number of shards.
+
+  Returns:
+    The location of the shard, or the input location when it is not sharded.
+  """
+  if num_shards == 1:
+    return location
+  return f'{get_shard_location_prefix(location)}{shard_index}-of-{num_shards}'
+
+
+def get_shard_location_prefix(location: str) -> str:
+  """Gets the prefix of the monitoring locations of all shards of the input.
+
+  Args:
+    location: The location of the whole input.
+
+  Returns:
+    The prefix of the locations of the shards.
+  """
+  return f'{location}#shard-'
+
+
+def is_location_of_num_shards(location: str, num_shards: int) -> bool:
+  """Checks if a shard location is the location of a shard of num_shards.
+
+  Args:
+    location: The location of a shard.
+    num_shards: Total number of shards.
+
+  Returns:
+    True if the location is the location of one of num_shards shards.
+  """
+  return location.rpartition('-of-')[2] == str(num_shards)
+
+
+def get_shard_row_range(total_rows: int, shard_index: int,
+                        num_shards: int) -> Tuple[int, int]:
+  """Gets the row range of a shard of a row based input.
+
+  Args:
+    total_rows: Total number of rows in the input.
+    shard_index: Zero based index of the shard.
+    num_shards: Total number of shards.
+
+  Returns:
+    Tuple of the first row and the row after the last row of the shard.
+  """
+  return (total_rows * shard_index // num_shards,
+          total_rows * (shard_index + 1) // num_shards)
+
+
+def get_shard_row_ranges(segment_ends: Sequence[int], shard_index: int,
+                         num_shards: int) -> List[Tuple[int, int]]:
+  """Gets the row ranges of a shard of a row based input that grew over runs.
+
+  The rows are split into segments ending at the total numbers of rows of the
+  input in earlier runs, and every segment is split into shards on its own,
+  so the rows of a shard stay the same when rows are appended to the input.
+
+  Args:
+    segment_ends: Ascending total numbers of rows the segments end at, the
+      last one being the total number of rows of the input.
+    shard_index: Zero based index of the shard.
+    num_shards: Total number of shards.
+
+  Returns:
+    Tuples of the first row and the row after the last row of every range of
+    the shard.
+  """
+  row_ranges = []
+  segment_start = 0
+  for segment_end in segment_ends:
+    start, end = get_shard_row_range(segment_end - segment_start, shard_index,
+                                     num_shards)
+    row_ranges.append((segment_start + start, segment_start + end))
+    segment_start = segment_end
+  return row_ranges
+
+
+def is_name_in_shard(name: str, shard_index: int, num_shards: int) -> bool:
+  """Checks if an object of an object based input belongs to a shard.
+
+  Args:
+    name: The name of the object.
+    shard_index: Zero based index of the shard.
+    num_shards: Total number of shards.
+
+  Returns:
+    True if the object belongs to the shard.
+  """
+  return zlib.crc32(name.encode('utf-8')) % num_shards == shard_index
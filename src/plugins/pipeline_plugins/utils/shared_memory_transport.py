@@ -0,0 +1,220 @@
+# coding=utf-8
+# Copyright 2020 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Shared memory transport to hand over parsed data between processes.
+
+A producer process pickles a value into a shared memory segment and only
+sends a small handle to the consumer process, instead of sending the whole
+pickled value through the pipe of the executor. The consumer unpickles the
+value straight from the segment and frees the segment.
+
+The transport is not zero-copy: Python objects like the events of a blob can't
+be shared between processes, so the consumer still builds its own copy of the
+value. It saves the copies of the pickled bytes through the pipe, and the
+worker doesn't block on the pipe while the consumer is busy.
+
+Segments are tracked by the multiprocessing resource tracker shared by the
+processes of a pool. The consumer unregisters a segment when it frees it, and
+map_in_order frees the results it never yields. Segments of results that never
+reach the consumer, e.g. because it was killed, are freed by the resource
+tracker once all processes exited.
+
+Blobs are published as a BlobHandle, which carries the location, position and
+num_rows metadata of the blob, so the consumer can route and monitor a blob
+without touching its events.
+
+Usage Example:
+  # In the producer process.
+  handle = shared_memory_transport.publish(blb)
+
+  # In the consumer process.
+  blb = shared_memory_transport.consume(handle)
+"""
+
+import concurrent.futures
+import pickle
+from multiprocessing import resource_tracker
+from multiprocessing import shared_memory
+from typing import Any, Callable, Iterable, Iterator, Optional, Union
+
+from plugins.pipeline_plugins.utils import blob
+from plugins.pipeline_plugins.utils import pipeline_utils
+
+
+class SharedMemoryHandle(object):
+  """Handle of a value published into a shared memory segment.
+
+  Attributes:
+    name: Name of the shared memory segment.
+    size: Size in bytes of the published value.
+  """
+
+  def __init__(self, name: str, size: int) -> None:
+    self.name = name
+    self.size = size
+
+  def load(self) -> Any:
+    """Loads the value and frees the segment.
+
+    Returns:
+      The published value.
+    """
+    segment = shared_memory.SharedMemory(name=self.name)
+    view = segment.buf[:self.size]
+    try:
+      return pickle.loads(view)
+    finally:
+      view.release()
+      segment.close()
+      segment.unlink()
+
+  def discard(self) -> None:
+    """Frees the segment without loading the value."""
+    segment = shared_memory.SharedMemory(name=self.name)
+    segment.close()
+    segment.unlink()
+
+
+class BlobHandle(object):
+  """Handle of a blob whose events were published into shared memory.
+
+  Only the events of the blob are published. Blobs are published right after
+  they were read, so they have no failed events or reports yet.
+
+  Attributes:
+    events_handle: Handle of the published events.
+    location: The specific object location of the events within the source.
+    position: The events starting position within the object.
+    num_rows: Number of events in blob.
+  """
+
+  def __init__(self, events_handle: SharedMemoryHandle, location: str,
+               position: int, num_rows: int) -> None:
+    self.events_handle = events_handle
+    self.location = location
+    self.position = position
+    self.num_rows = num_rows
+
+  def load(self) -> blob.Blob:
+    """Loads the blob and frees the segment of its events.
+
+    Returns:
+      The published blob.
+    """
+    return blob.Blob(events=self.events_handle.load(), location=self.location,
+                     position=self.position, num_rows=self.num_rows)
+
+  def discard(self) -> None:
+    """Frees the segment of the events without loading them."""
+    self.events_handle.discard()
+
+
+Handle = Union[SharedMemoryHandle, BlobHandle]
+
+
+def _publish_value(value: Any) -> SharedMemoryHandle:
+  """Publishes a picklable value into a new shared memory segment.
+
+  Args:
+    value: The value to publish.
+
+  Returns:
+    The handle of the published value.
+  """
+  data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+  segment = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+  segment.buf[:len(data)] = data
+  # The segment stays registered with the resource tracker until the consumer
+  # frees it. The tracker is shared with the consumer process, so it only
+  # removes the segment once both processes exited.
+  segment.close()
+  return SharedMemoryHandle(segment.name, len(data))
+
+
+def publish(value: Any) -> Optional[Handle]:
+  """Publishes a value into shared memory.
+
+  Args:
+    value: The picklable value to publish. Blobs are published as BlobHandle.
+
+  Returns:
+    The handle to pass to the consumer, or None if the value is None.
+  """
+  if value is None:
+    return None
+  if isinstance(value, blob.Blob):
+    return BlobHandle(_publish_value(value.events), location=value.location,
+                      position=value.position, num_rows=value.num_rows)
+  return _publish_value(value)
+
+
+def consume(handle: Optional[Handle]) -> Any:
+  """Loads a published value and frees its shared memory.
+
+  Args:
+    handle: The handle returned by publish.
+
+  Returns:
+    The published value.
+  """
+  if handle is None:
+    return None
+  return handle.load()
+
+
+def _discard(handle: Optional[Handle]) -> None:
+  """Frees the shared memory of a value that won't be consumed."""
+  if handle is not None:
+    handle.discard()
+
+
+class _PublishingFunction(object):
+  """Picklable wrapper publishing the results of a function."""
+
+  def __init__(self, function: Callable[[Any], Any]) -> None:
+    self.function = function
+
+  def __call__(self, item: Any) -> Optional[Handle]:
+    return publish(self.function(item))
+
+
+def map_in_order(executor: concurrent.futures.Executor,
+                 function: Callable[[Any], Any],
+                 items: Iterable[Any],
+                 max_pending: int) -> Iterator[Any]:
+  """Applies a function to items on an executor, transporting results in memory.
+
+  Works like pipeline_utils.map_in_order, except that the results are pickled
+  into shared memory instead of being sent through the pipe of the executor.
+  Results of items that are never consumed, because the caller stopped
+  consuming or an earlier item failed, are freed.
+
+  Args:
+    executor: The executor to run the function on, typically a process pool.
+    function: The picklable function to apply to every item.
+    items: Iterable generating the items to process.
+    max_pending: Max number of items submitted to the executor at the same time.
+
+  Yields:
+    The results of the function, in the order of the items.
+  """
+  # Workers forked after the resource tracker started share it with this
+  # process, instead of starting trackers of their own.
+  resource_tracker.ensure_running()
+  handles = pipeline_utils.map_in_order(
+      executor, _PublishingFunction(function), items, max_pending,
+      on_discard=_discard)
+  for handle in handles:
+    yield consume(handle)
@@ -0,0 +1,446 @@
+# coding=utf-8
+# Copyright 2020 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Lease based work queue to balance connector work units across workers.
+
+A run is planned once by writing all of its work units into a work table.
+Every worker then repeatedly claims a pending unit under a timed lease,
+processes it and marks it as done. A unit whose lease expired, for example
+because its worker crashed, can be claimed again by any other worker, so slow
+or failed workers never leave units behind.
+
+Planning is idempotent, so all workers of a run can plan the run and only the
+first plan is written.
+
+Usage Example:
+  queue = work_queue.SqliteWorkQueue('/tmp/work_units.db')
+  queue.plan_units(run_id, num_units=8)
+  unit_id = queue.claim_unit(run_id, worker_id, lease_seconds=600)
+  while unit_id is not None:
+    process(unit_id)
+    queue.complete_unit(run_id, unit_id)
+    unit_id = queue.claim_unit(run_id, worker_id, lease_seconds=600)
+"""
+
+import abc
+import contextlib
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
+
+from airflow import exceptions
+from airflow.contrib.hooks import bigquery_hook
+
+from plugins.pipeline_plugins.utils import errors
+from plugins.pipeline_plugins.utils import retry_utils
+
+_STATE_PENDING = 'PENDING'
+_STATE_DONE = 'DONE'
+
+# Seconds to wait for a lock on the SQLite database held by another worker.
+_SQLITE_LOCK_TIMEOUT_SECONDS = 30
+
+# Number of times per lease the background thread of a lease checks whether
+# half of the lease elapsed and renews it.
+_LEASE_CHECKS_PER_LEASE = 4
+
+_WORK_TABLE_SCHEMA_FIELDS = [
+    {'name': 'run_id', 'type': 'STRING', 'mode': 'REQUIRED'},
+    {'name': 'unit_id', 'type': 'INTEGER', 'mode': 'REQUIRED'},
+    {'name': 'state', 'type': 'STRING', 'mode': 'REQUIRED'},
+    {'name': 'worker_id', 'type': 'STRING', 'mode': 'NULLABLE'},
+    {'name': 'lease_expiry', 'type': 'TIMESTAMP', 'mode': 'NULLABLE'}]
+
+
+class WorkQueue(abc.ABC):
+  """An abstract interface class for lease based work queues."""
+
+  @abc.abstractmethod
+  def plan_units(self, run_id: str, num_units: int) -> None:
+    """Writes the work units of a run unless the run was already planned.
+
+    Args:
+      run_id: Unique id of the run.
+      num_units: Number of work units of the run, identified by 0..num_units-1.
+    """
+
+  @abc.abstractmethod
+  def claim_unit(self, run_id: str, worker_id: str,
+                 lease_seconds: int) -> Optional[int]:
+    """Claims a pending work unit of a run under a timed lease.
+
+    Pending units that were never claimed and units with an expired lease can
+    be claimed.
+
+    Args:
+      run_id: Unique id of the run.
+      worker_id: Unique id of the claiming worker.
+      lease_seconds: Number of seconds until the lease expires.
+
+    Returns:
+      The id of the claimed unit, or None if no unit is left to claim.
+    """
+
+  @abc.abstractmethod
+  def renew_lease(self, run_id: str, unit_id: int, worker_id: str,
+                  lease_seconds: int) -> bool:
+    """Extends the lease of a claimed work unit.
+
+    Args:
+      run_id: Unique id of the run.
+      unit_id: Id of the claimed unit.
+      worker_id: Unique id of the worker holding the lease.
+      lease_seconds: Number of seconds from now until the lease expires.
+
+    Returns:
+      False if the lease was taken over by another worker, otherwise True.
+    """
+
+  @abc.abstractmethod
+  def complete_unit(self, run_id: str, unit_id: int) -> None:
+    """Marks a work unit as done, so it is never claimed again.
+
+    Args:
+      run_id: Unique id of the run.
+      unit_id: Id of the finished unit.
+    """
+
+
+class SqliteWorkQueue(WorkQueue):
+  """Work queue stored in a local SQLite database.
+
+  All workers of a run must have access to the same database file, so this
+  queue suits single machine deployments and testing.
+  """
+
+  def __init__(self, database_path: str,
+               table_name: str = 'work_units') -> None:
+    """Initiates the SqliteWorkQueue and creates its table if needed.
+
+    Args:
+      database_path: Path of the SQLite database file.
+      table_name: Name of the work units table.
+    """
+    self.database_path = database_path
+    self.table_name = table_name
+
+    with self._transaction() as connection:
+      connection.execute(
+          f'CREATE TABLE IF NOT EXISTS {self.table_name} ('
+          '  run_id TEXT NOT NULL,'
+          '  unit_id INTEGER NOT NULL,'
+          '  state TEXT NOT NULL,'
+          '  worker_id TEXT,'
+          '  lease_expiry REAL,'
+          '  PRIMARY KEY (run_id, unit_id))')
+
+  @contextlib.contextmanager
+  def _transaction(self) -> Iterator[sqlite3.Connection]:
+    """Runs the statements of the context in one write locked transaction.
+
+    Yields:
+      The connection to the database.
+
+    Raises:
+      WorkQueueError: If the database is not accessible.
+    """
+    try:
+      connection = sqlite3.connect(self.database_path,
+                                   timeout=_SQLITE_LOCK_TIMEOUT_SECONDS,
+                                   isolation_level=None)
+    except sqlite3.Error as error:
+      raise errors.WorkQueueError(
+          error=error, msg=f'Failed to open {self.database_path}.',
+          error_num=errors.ErrorNameIDMap.WORK_QUEUE_ERROR_NOT_ACCESSIBLE)
+
+    try:
+      connection.execute('BEGIN IMMEDIATE')
+      yield connection
+      connection.execute('COMMIT')
+    except sqlite3.Error as error:
+      if connection.in_transaction:
+        connection.execute('ROLLBACK')
+      raise errors.WorkQueueError(
+          error=error, msg=f'Failed to update {self.database_path}.',
+          error_num=errors.ErrorNameIDMap.WORK_QUEUE_ERROR_NOT_ACCESSIBLE)
+    finally:
+      connection.close()
+
+  def plan_units(self, run_id: str, num_units: int) -> None:
+    with self._transaction() as connection:
+      connection.executemany(
+          f'INSERT OR IGNORE INTO {self.table_name} (run_id, unit_id, state) '
+          'VALUES (?, ?, ?)',
+          [(run_id, unit_id, _STATE_PENDING) for unit_id in range(num_units)])
+
+  def claim_unit(self, run_id: str, worker_id: str,
+                 lease_seconds: int) -> Optional[int]:
+    now = time.time()
+    with self._transaction() as connection:
+      row = connection.execute(
+          f'SELECT unit_id FROM {self.table_name} '
+          'WHERE run_id = ? AND state = ? '
+          '  AND (lease_expiry IS NULL OR lease_expiry < ?) '
+          'ORDER BY unit_id LIMIT 1',
+          (run_id, _STATE_PENDING, now)).fetchone()
+      if row is None:
+        return None
+      connection.execute(
+          f'UPDATE {self.table_name} SET worker_id = ?, lease_expiry = ? '
+          'WHERE run_id = ? AND unit_id = ?',
+          (worker_id, now + lease_seconds, run_id, row[0]))
+    return row[0]
+
+  def renew_lease(self, run_id: str, unit_id: int, worker_id: str,
+                  lease_seconds: int) -> bool:
+    with self._transaction() as connection:
+      cursor = connection.execute(
+          f'UPDATE {self.table_name} SET lease_expiry = ? '
+          'WHERE run_id = ? AND unit_id = ? AND worker_id = ? AND state = ?',
+          (time.time() + lease_seconds, run_id, unit_id, worker_id,
+           _STATE_PENDING))
+    return cursor.rowcount == 1
+
+  def complete_unit(self, run_id: str, unit_id: int) -> None:
+    with self._transaction() as connection:
+      connection.execute(
+          f'UPDATE {self.table_name} SET state = ?, lease_expiry = NULL '
+          'WHERE run_id = ? AND unit_id = ?',
+          (_STATE_DONE, run_id, unit_id))
+
+
+def _is_concurrent_update_error(error: Exception) -> bool:
+  """Checks if BigQuery aborted a DML statement due to a concurrent update.
+
+  Args:
+    error: The error raised by the statement.
+
+  Returns:
+    True if the statement can be retried.
+  """
+  return (isinstance(error, exceptions.AirflowException) and
+          'concurrent update' in str(error))
+
+
+class BigQueryWorkQueue(WorkQueue):
+  """Work queue stored in a BigQuery table.
+
+  BigQuery serializes DML statements on the same table, so a claim either
+  takes a unit exclusively or is aborted and retried.
+  """
+
+  def __init__(self, bq_hook: bigquery_hook.BigQueryHook,
+               dataset_id: str, table_id: str) -> None:
+    """Initiates the BigQueryWorkQueue and creates its table if needed.
+
+    Args:
+      bq_hook: Hook connecting to BigQuery with standard SQL.
+      dataset_id: Dataset id of the work units table.
+      table_id: Table name of the work units table.
+
+    Raises:
+      WorkQueueError: If the table can't be created.
+    """
+    self.bq_hook = bq_hook
+    self.dataset_id = dataset_id
+    self.table_id = table_id
+
+    bq_cursor = self.bq_hook.get_conn().cursor()
+    if not self.bq_hook.table_exists(project_id=bq_cursor.project_id,
+                                     dataset_id=self.dataset_id,
+                                     table_id=self.table_id):
+      try:
+        bq_cursor.create_empty_table(
+            project_id=bq_cursor.project_id, dataset_id=self.dataset_id,
+            table_id=self.table_id, schema_fields=_WORK_TABLE_SCHEMA_FIELDS)
+      except exceptions.AirflowException as error:
+        raise errors.WorkQueueError(
+            error=error, msg='Can\'t create new table named %s in dataset %s.'
+            % (self.table_id, self.dataset_id),
+            error_num=errors.ErrorNameIDMap.WORK_QUEUE_ERROR_NOT_ACCESSIBLE)
+
+  def _execute(self, sql: str,
+               parameters: Dict[str, Any]) -> bigquery_hook.BigQueryCursor:
+    """Executes a statement, retrying it if a concurrent update aborted it.
+
+    Args:
+      sql: The standard SQL statement.
+      parameters: The parameters of the statement.
+
+    Returns:
+      The cursor that executed the statement.
+
+    Raises:
+      WorkQueueError: If the statement failed.
+    """
+    bq_cursor = self.bq_hook.get_conn().cursor()
+    execute_with_retries = retry_utils.logged_retry_on_retriable_exception(
+        bq_cursor.execute, _is_concurrent_update_error)
+    try:
+      execute_with_retries(sql, parameters)
+    except exceptions.AirflowException as error:
+      raise errors.WorkQueueError(
+          error=error, msg='Failed to update the work units table.',
+          error_num=errors.ErrorNameIDMap.WORK_QUEUE_ERROR_NOT_ACCESSIBLE)
+    return bq_cursor
+
+  def plan_units(self, run_id: str, num_units: int) -> None:
+    self._execute(
+        f'MERGE `{self.dataset_id}`.`{self.table_id}` AS target '
+        'USING (SELECT unit_id '
+        '       FROM UNNEST(GENERATE_ARRAY(0, %(num_units)s - 1)) AS unit_id) '
+        'AS source '
+        'ON target.run_id = %(run_id)s AND target.unit_id = source.unit_id '
+        'WHEN NOT MATCHED THEN '
+        '  INSERT (run_id, unit_id, state) '
+        '  VALUES (%(run_id)s, source.unit_id, %(state)s)',
+        {'run_id': run_id, 'num_units': num_units, 'state': _STATE_PENDING})
+
+  def claim_unit(self, run_id: str, worker_id: str,
+                 lease_seconds: int) -> Optional[int]:
+    self._execute(
+        f'UPDATE `{self.dataset_id}`.`{self.table_id}` '
+        'SET worker_id = %(worker_id)s, '
+        '    lease_expiry = TIMESTAMP_ADD(CURRENT_TIMESTAMP(), '
+        '                                 INTERVAL %(lease_seconds)s SECOND) '
+        'WHERE run_id = %(run_id)s AND unit_id = ('
+        '  SELECT MIN(unit_id) '
+        f'  FROM `{self.dataset_id}`.`{self.table_id}` '
+        '  WHERE run_id = %(run_id)s AND state = %(state)s '
+        '    AND (lease_expiry IS NULL '
+        '         OR lease_expiry < CURRENT_TIMESTAMP()))',
+        {'run_id': run_id, 'worker_id': worker_id,
+         'lease_seconds': lease_seconds, 'state': _STATE_PENDING})
+
+    bq_cursor = self._execute(
+        'SELECT unit_id '
+        f'FROM `{self.dataset_id}`.`{self.table_id}` '
+        'WHERE run_id = %(run_id)s AND worker_id = %(worker_id)s '
+        '  AND state = %(state)s AND lease_expiry > CURRENT_TIMESTAMP() '
+        'ORDER BY unit_id LIMIT 1',
+        {'run_id': run_id, 'worker_id': worker_id, 'state': _STATE_PENDING})
+    row = bq_cursor.fetchone()
+    return int(row[0]) if row is not None else None
+
+  def renew_lease(self, run_id: str, unit_id: int, worker_id: str,
+                  lease_seconds: int) -> bool:
+    parameters = {'run_id': run_id, 'unit_id': unit_id,
+                  'worker_id': worker_id, 'lease_seconds': lease_seconds,
+                  'state': _STATE_PENDING}
+    self._execute(
+        f'UPDATE `{self.dataset_id}`.`{self.table_id}` '
+        'SET lease_expiry = TIMESTAMP_ADD(CURRENT_TIMESTAMP(), '
+        '                                 INTERVAL %(lease_seconds)s SECOND) '
+        'WHERE run_id = %(run_id)s AND unit_id = %(unit_id)s '
+        '  AND worker_id = %(worker_id)s AND state = %(state)s',
+        parameters)
+
+    bq_cursor = self._execute(
+        'SELECT COUNT(*) '
+        f'FROM `{self.dataset_id}`.`{self.table_id}` '
+        'WHERE run_id = %(run_id)s AND unit_id = %(unit_id)s '
+        '  AND worker_id = %(worker_id)s AND state = %(state)s',
+        parameters)
+    row = bq_cursor.fetchone()
+    return row is not None and int(row[0]) == 1
+
+  def complete_unit(self, run_id: str, unit_id: int) -> None:
+    self._execute(
+        f'UPDATE `{self.dataset_id}`.`{self.table_id}` '
+        'SET state = %(state)s, lease_expiry = NULL '
+        'WHERE run_id = %(run_id)s AND unit_id = %(unit_id)s',
+        {'run_id': run_id, 'unit_id': unit_id, 'state': _STATE_DONE})
+
+
+class WorkUnitLease(object):
+  """Keeps the lease of a claimed work unit alive while it is processed.
+
+  Used as a context manager, the lease is renewed by a background thread, so
+  it is kept alive while a blob takes longer than the lease to read or send.
+
+  Usage Example:
+    with work_queue.WorkUnitLease(queue, run_id, unit_id, worker_id,
+                                  lease_seconds=600) as lease:
+      for blb in blobs:
+        if not lease.keep_alive():
+          break
+        send(blb)
+
+  Attributes:
+    unit_id: Id of the claimed unit.
+    is_lost: True once the lease was taken over by another worker, or expired.
+  """
+
+  def __init__(self, queue: WorkQueue, run_id: str, unit_id: int,
+               worker_id: str, lease_seconds: int) -> None:
+    """Initiates the lease of a unit that was just claimed."""
+    self.queue = queue
+    self.run_id = run_id
+    self.unit_id = unit_id
+    self.worker_id = worker_id
+    self.lease_seconds = lease_seconds
+    self.is_lost = False
+    self._renewed_at = time.monotonic()
+    self._lock = threading.Lock()
+    self._stop_event = threading.Event()
+    self._renewal_thread = None
+
+  def __enter__(self) -> 'WorkUnitLease':
+    """Starts renewing the lease in a background thread."""
+    self._renewal_thread = threading.Thread(target=self._renew_in_background,
+                                            daemon=True)
+    self._renewal_thread.start()
+    return self
+
+  def __exit__(self, *unused_exc_info: Any) -> None:
+    """Stops renewing the lease."""
+    self._stop_event.set()
+    if self._renewal_thread is not None:
+      self._renewal_thread.join()
+
+  def _renew_in_background(self) -> None:
+    """Keeps the lease alive until it is stopped or lost."""
+    while not self._stop_event.wait(self.lease_seconds /
+                                    _LEASE_CHECKS_PER_LEASE):
+      try:
+        if not self.keep_alive():
+          return
+      except errors.WorkQueueError as error:
+        logging.warning('Failed to renew the lease of work unit %s of run '
+                        '%s: %s', self.unit_id, self.run_id, error)
+
+  def keep_alive(self) -> bool:
+    """Renews the lease once half of it has elapsed.
+
+    A lease that was not renewed in time is lost, as another worker may have
+    claimed the unit.
+
+    Returns:
+      False if the lease was lost, meaning another worker may own the unit.
+
+    Raises:
+      WorkQueueError: If the lease can't be renewed.
+    """
+    with self._lock:
+      elapsed_seconds = time.monotonic() - self._renewed_at
+      if not self.is_lost and elapsed_seconds >= self.lease_seconds:
+        self.is_lost = True
+      elif not self.is_lost and elapsed_seconds > self.lease_seconds / 2:
+        self.is_lost = not self.queue.renew_lease(
+            self.run_id, self.unit_id, self.worker_id, self.lease_seconds)
+        self._renewed_at = time.monotonic()
+      return not self.is_lost
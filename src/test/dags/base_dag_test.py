@@ -56,6 +56,34 @@ class BaseDagTest(unittest.TestCase):
         f'{self.dag_name}_enable_run_report': '0',
         f'{self.dag_name}_enable_monitoring': '1',
         f'{self.dag_name}_enable_monitoring_cleanup': '1',
+        f'{self.dag_name}_enable_pipeline': '1',
+        f'{self.dag_name}_pipeline_queue_depth': '4',
+        f'{self.dag_name}_max_inflight_blobs': '8',
+        f'{self.dag_name}_num_shards': '1',
+        f'{self.dag_name}_num_work_units': '4',
+        f'{self.dag_name}_work_queue_path': '/tmp/work_units.db',
+        f'{self.dag_name}_parse_processes': '2',
+        f'{self.dag_name}_adaptive_page_size': '1',
+        f'{self.dag_name}_coalesce_batches': '2',
+        f'{self.dag_name}_max_memory_bytes': '1048576',
+        f'{self.dag_name}_gcs_coalesce_max_rows': '0',
+        f'{self.dag_name}_gcs_coalesce_max_bytes': '0',
+        f'{self.dag_name}_gcs_stream_blob_rows': '0',
+        f'{self.dag_name}_gcs_download_workers': '1',
+        f'{self.dag_name}_gcs_object_workers': '1',
+        f'{self.dag_name}_gcs_chunk_size': '104857600',
+        f'{self.dag_name}_gcs_columns': '',
+        f'{self.dag_name}_gcs_csv_schema': '',
+        f'{self.dag_name}_gcs_json_array_path': '',
+        f'{self.dag_name}_gcs_name_globs': '',
+        f'{self.dag_name}_gcs_list_from_last_processed': '0',
+        f'{self.dag_name}_bq_read_streams': '0',
+        f'{self.dag_name}_bq_read_format': 'ARROW',
+        f'{self.dag_name}_bq_prefetch_pages': '1',
+        f'{self.dag_name}_bq_prefetch_max_pages': '0',
+        f'{self.dag_name}_bq_string_fields': '',
+        f'{self.dag_name}_bq_extract_gcs_uri': '',
+        f'{self.dag_name}_bq_watermark_column': '',
         'monitoring_dataset': 'test_monitoring_dataset',
         'monitoring_table': 'test_monitoring_table',
         'monitoring_bq_conn_id': 'test_monitoring_conn',
@@ -100,6 +128,38 @@ class BaseDagTest(unittest.TestCase):
 
     self.assertEqual(self.dag.create_task.call_count, 2)
 
+  def test_create_dag_creates_tasks_per_shard(self):
+    self.airflow_variables[f'{self.dag_name}_num_shards'] = '3'
+    fake_dag = FakeDag(self.dag_name)
+    shard_params = []
+
+    def create_task(main_dag, is_retry):
+      shard_params.append((fake_dag.get_task_id('task', is_retry),
+                           fake_dag.get_pipeline_params()['shard_index']))
+      return mock.MagicMock()
+
+    fake_dag.create_task = mock.MagicMock(side_effect=create_task)
+    fake_dag._create_cleanup_task = mock.MagicMock()
+
+    fake_dag.create_dag()
+
+    self.assertListEqual(shard_params, [
+        ('task_shard_0_retry_task', 0), ('task_shard_0_task', 0),
+        ('task_shard_1_retry_task', 1), ('task_shard_1_task', 1),
+        ('task_shard_2_retry_task', 2), ('task_shard_2_task', 2)])
+    fake_dag._create_cleanup_task.assert_called_once()
+
+  def test_create_dag_failed_due_to_invalid_num_shards(self):
+    self.airflow_variables[f'{self.dag_name}_num_shards'] = '0'
+    fake_dag = FakeDag(self.dag_name)
+    fake_dag.create_task = mock.MagicMock()
+
+    test_dag = fake_dag.create_dag()
+
+    fake_dag.create_task.assert_not_called()
+    self.assertListEqual([task.task_id for task in test_dag.tasks],
+                         ['configuration_error'])
+
   def test_create_dag_failed_due_to_config_error(self):
     self.dag.create_task = mock.MagicMock()
     self.dag.create_task.side_effect = AirflowException()
@@ -120,6 +180,45 @@ class BaseDagTest(unittest.TestCase):
 
     mock_cleanup_task.assert_called_once()
 
+  def test_get_pipeline_params(self):
+    self.assertDictEqual(self.dag.get_pipeline_params(),
+                         {'enable_pipeline': True, 'pipeline_queue_depth': 4,
+                          'max_inflight_blobs': 8, 'shard_index': 0,
+                          'num_shards': 1, 'num_work_units': 4,
+                          'work_queue_path': '/tmp/work_units.db',
+                          'parse_processes': 2,
+                          'adaptive_page_size': True,
+                          'coalesce_batches': 2,
+                          'max_memory_bytes': 1048576})
+
+  def test_get_gcs_params(self):
+    self.airflow_variables[f'{self.dag_name}_gcs_coalesce_max_rows'] = '5000'
+
+    self.assertDictEqual(FakeDag(self.dag_name).get_gcs_params(),
+                         {'gcs_coalesce_max_rows': 5000,
+                          'gcs_coalesce_max_bytes': 0,
+                          'gcs_stream_blob_rows': 0,
+                          'gcs_download_workers': 1,
+                          'gcs_object_workers': 1,
+                          'gcs_chunk_size': 100 * 1024 * 1024,
+                          'gcs_columns': '',
+                          'gcs_csv_schema': '',
+                          'gcs_json_array_path': '',
+                          'gcs_name_globs': '',
+                          'gcs_list_from_last_processed': 0})
+
+  def test_get_bq_params(self):
+    self.airflow_variables[f'{self.dag_name}_bq_read_streams'] = '4'
+
+    self.assertDictEqual(FakeDag(self.dag_name).get_bq_params(),
+                         {'bq_read_streams': 4,
+                          'bq_read_format': 'ARROW',
+                          'bq_prefetch_pages': 1,
+                          'bq_prefetch_max_pages': 0,
+                          'bq_string_fields': '',
+                          'bq_extract_gcs_uri': '',
+                          'bq_watermark_column': ''})
+
   def test_get_variable_value_with_prefix(self):
     expected_val = 'prefix_test_table'
     self.airflow_variables[f'{self.dag_name}_bq_table_id'] = expected_val
@@ -40,6 +40,34 @@ AIRFLOW_VARIABLES = {
     f'{_DAG_NAME}_enable_run_report': False,
     f'{_DAG_NAME}_enable_monitoring': True,
     f'{_DAG_NAME}_enable_monitoring_cleanup': True,
+    f'{_DAG_NAME}_enable_pipeline': False,
+    f'{_DAG_NAME}_pipeline_queue_depth': 2,
+    f'{_DAG_NAME}_max_inflight_blobs': 1,
+    f'{_DAG_NAME}_num_shards': 1,
+    f'{_DAG_NAME}_num_work_units': 0,
+    f'{_DAG_NAME}_work_queue_path': '',
+    f'{_DAG_NAME}_parse_processes': 0,
+    f'{_DAG_NAME}_adaptive_page_size': False,
+    f'{_DAG_NAME}_coalesce_batches': 0,
+    f'{_DAG_NAME}_max_memory_bytes': 0,
+    f'{_DAG_NAME}_gcs_coalesce_max_rows': 0,
+    f'{_DAG_NAME}_gcs_coalesce_max_bytes': 0,
+    f'{_DAG_NAME}_gcs_stream_blob_rows': 0,
+    f'{_DAG_NAME}_gcs_download_workers': 1,
+    f'{_DAG_NAME}_gcs_object_workers': 1,
+    f'{_DAG_NAME}_gcs_chunk_size': 104857600,
+    f'{_DAG_NAME}_gcs_columns': '',
+    f'{_DAG_NAME}_gcs_csv_schema': '',
+    f'{_DAG_NAME}_gcs_json_array_path': '',
+    f'{_DAG_NAME}_gcs_name_globs': '',
+    f'{_DAG_NAME}_gcs_list_from_last_processed': 0,
+    f'{_DAG_NAME}_bq_read_streams': 0,
+    f'{_DAG_NAME}_bq_read_format': 'ARROW',
+    f'{_DAG_NAME}_bq_prefetch_pages': 1,
+    f'{_DAG_NAME}_bq_prefetch_max_pages': 0,
+    f'{_DAG_NAME}_bq_string_fields': '',
+    f'{_DAG_NAME}_bq_extract_gcs_uri': '',
+    f'{_DAG_NAME}_bq_watermark_column': '',
     'monitoring_dataset': 'test_monitoring_dataset',
     'monitoring_table': 'test_monitoring_table',
     'monitoring_bq_conn_id': 'test_monitoring_conn',
@@ -121,6 +121,17 @@ class GoogleAdsCustomerMatchHookTest(unittest.TestCase):
     self.assertTupleEqual(blob.failed_events[0], (2000, _TEST_EVENT, 10))
     self.assertTupleEqual(blob.failed_events[1], (2001, _TEST_EVENT, 10))
 
+  def test_send_events_splits_events_of_customer_at_max_batch_size(self):
+    events = [dict(_TEST_EVENT) for _ in range(5)]
+
+    with mock.patch.object(ads_cm_hook_v2, '_MAX_OPERATIONS_PER_REQUEST', 2):
+      self.test_hook.send_events(blob_lib.Blob(events=events, location=''))
+
+    self.assertListEqual(
+        [[index for index, _ in call[1]['payloads']] for call in
+         self.upload_customer_match_user_list.call_args_list],
+        [[0, 1], [2, 3], [4]])
+
 
 if __name__ == '__main__':
   unittest.main()
@@ -83,6 +83,22 @@ class GoogleAdsOfflineConversionsHookTest(unittest.TestCase):
     blob = self.test_hook.send_events(blob)
     self.assertEqual(1, self.upload_click_conversions.call_count)
     self.assertEqual(len(blob.failed_events), 1)
+  def test_send_events_splits_large_customer_batches(self):
+    events = [dict(_TEST_EVENT)] * 5
+    blob = blob_lib.Blob(events=events, location='')
+
+    with mock.patch.object(ads_oc_hook_v2, '_MAX_CONVERSIONS_PER_REQUEST', 2):
+      blob = self.test_hook.send_events(blob)
+
+    self.assertEqual(3, self.upload_click_conversions.call_count)
+    self.assertListEqual(
+        [len(c[0][1]) for c in self.upload_click_conversions.call_args_list],
+        [2, 2, 1])
+    self.assertEqual(len(blob.failed_events), 0)
+
+  def test_get_max_batch_size(self):
+    self.assertEqual(self.test_hook.get_max_batch_size(),
+                     ads_oc_hook_v2._MAX_CONVERSIONS_PER_REQUEST)
 
 if __name__ == '__main__':
   unittest.main()
@@ -15,14 +15,30 @@
 
 """Tests for plugins.pipeline_plugins.hooks.bq_hook."""
 
+import concurrent.futures
+import datetime
+import decimal
+import io
+import json
 import time
 from typing import Any, Dict, List, Text
 import unittest
 from unittest import mock
 
+from google.cloud import bigquery_storage
+from google.cloud.bigquery_storage_v1.services.big_query_read.transports import grpc as read_transport  # pylint: disable=line-too-long
 from googleapiclient import errors as googleapiclient_errors
+import grpc
+import pyarrow
+
+try:
+  import fastavro  # pylint: disable=g-import-not-at-top
+except ImportError:
+  fastavro = None
 
 from plugins.pipeline_plugins.hooks import bq_hook
+from plugins.pipeline_plugins.utils import blob
+from plugins.pipeline_plugins.utils import adaptive_sizing
 from plugins.pipeline_plugins.utils import errors
 
 
@@ -180,6 +196,107 @@ class MockedBigQueryCursor():
     return {'fields': self.fields}
 
 
+class FakeBigQueryReadServer(object):
+  """Local gRPC server faking the read sessions of the Storage Read API.
+
+  The rows of the table are split into contiguous slices, one per stream, and
+  every stream responds with batches of batch_rows rows.
+  """
+
+  def __init__(self, table: pyarrow.Table, batch_rows: int = 2,
+               avro_schema: Dict[str, Any] = None) -> None:
+    self.table = table
+    self.batch_rows = batch_rows
+    self.avro_schema = avro_schema
+    self.session_requests = []
+    self.read_requests = []
+    self.expire_time = (datetime.datetime.now(datetime.timezone.utc) +
+                        datetime.timedelta(hours=6))
+    self._stream_tables = {}
+    self._server = grpc.server(concurrent.futures.ThreadPoolExecutor(
+        max_workers=8))
+    self._server.add_generic_rpc_handlers([grpc.method_handlers_generic_handler(
+        'google.cloud.bigquery.storage.v1.BigQueryRead', {
+            'CreateReadSession': grpc.unary_unary_rpc_method_handler(
+                self._create_read_session,
+                request_deserializer=(
+                    bigquery_storage.types.CreateReadSessionRequest
+                    .deserialize),
+                response_serializer=(
+                    bigquery_storage.types.ReadSession.serialize)),
+            'ReadRows': grpc.unary_stream_rpc_method_handler(
+                self._read_rows,
+                request_deserializer=(
+                    bigquery_storage.types.ReadRowsRequest.deserialize),
+                response_serializer=(
+                    bigquery_storage.types.ReadRowsResponse.serialize)),
+        })])
+    self._port = self._server.add_insecure_port('localhost:0')
+    self._server.start()
+
+  def stop(self):
+    self._server.stop(None)
+
+  def get_client(self):
+    return bigquery_storage.BigQueryReadClient(
+        transport=read_transport.BigQueryReadGrpcTransport(
+            channel=grpc.insecure_channel(f'localhost:{self._port}')))
+
+  def _create_read_session(self, request, context):
+    self.session_requests.append(request)
+    if '/datasets/missing_dataset/' in request.read_session.table:
+      context.abort(grpc.StatusCode.NOT_FOUND, 'Dataset not found.')
+    table = self.table
+    selected_fields = list(request.read_session.read_options.selected_fields)
+    if selected_fields:
+      table = table.select(selected_fields)
+
+    session = bigquery_storage.types.ReadSession(
+        name=f'projects/p/locations/us/sessions/s{len(self.session_requests)}',
+        expire_time=self.expire_time,
+        table=request.read_session.table,
+        data_format=request.read_session.data_format)
+    if (request.read_session.data_format ==
+        bigquery_storage.types.DataFormat.AVRO):
+      session.avro_schema.schema = json.dumps(self.avro_schema)
+    else:
+      session.arrow_schema.serialized_schema = (
+          table.schema.serialize().to_pybytes())
+
+    num_streams = min(request.max_stream_count, table.num_rows)
+    for index in range(num_streams):
+      name = f'{session.name}/streams/{index}'
+      start = table.num_rows * index // num_streams
+      end = table.num_rows * (index + 1) // num_streams
+      self._stream_tables[name] = table.slice(start, end - start)
+      session.streams.append(bigquery_storage.types.ReadStream(name=name))
+    return session
+
+  def _read_rows(self, request, unused_context):
+    self.read_requests.append(request)
+    stream_table = self._stream_tables[request.read_stream]
+    data_format = (bigquery_storage.types.DataFormat.AVRO
+                   if self.avro_schema else
+                   bigquery_storage.types.DataFormat.ARROW)
+    for start in range(request.offset, stream_table.num_rows,
+                       self.batch_rows):
+      batch = stream_table.slice(start, self.batch_rows).combine_chunks()
+      response = bigquery_storage.types.ReadRowsResponse(
+          row_count=batch.num_rows)
+      if data_format == bigquery_storage.types.DataFormat.AVRO:
+        rows_buffer = io.BytesIO()
+        parsed_schema = fastavro.parse_schema(self.avro_schema)
+        columns = batch.to_pydict()
+        for values in zip(*columns.values()):
+          row = dict(zip(columns, values))
+          fastavro.schemaless_writer(rows_buffer, parsed_schema, row)
+        response.avro_rows.serialized_binary_rows = rows_buffer.getvalue()
+      else:
+        response.arrow_record_batch.serialized_record_batch = (
+            batch.to_batches()[0].serialize().to_pybytes())
+      yield response
+
+
 class BigqueryHookTest(unittest.TestCase):
 
   @mock.patch(MOCK_BQ_HOOK)
@@ -276,6 +393,39 @@ class BigqueryHookTest(unittest.TestCase):
 
     self.assertListEqual(expected, result_list)
 
+  def test_events_blobs_generator_with_parse_executor(self):
+    bq_hook._DEFAULT_PAGE_SIZE = 30
+    expected = [{'a': i, 'b': str(i)} for i in range(100)]
+    fields = [{'name': 'a', 'type': 'INTEGER'},
+              {'name': 'b', 'type': 'STRING'}]
+    self.hook.get_conn().cursor.return_value = MockedBigQueryCursor(
+        data_generator=FakeDataGenerator(expected), fields=fields)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=2) as executor:
+      self.hook.set_parse_executor(executor, max_pending=2)
+      blobs = list(self.hook.events_blobs_generator())
+
+    self.assertListEqual([blb.position for blb in blobs], [0, 30, 60, 90])
+    self.assertListEqual(
+        [event for blb in blobs for event in blb.events], expected)
+
+  def test_events_blobs_generator_with_page_size_controller(self):
+    bq_hook._DEFAULT_PAGE_SIZE = 30
+    expected = [{'a': i, 'b': str(i)} for i in range(100)]
+    fields = [{'name': 'a', 'type': 'INTEGER'},
+              {'name': 'b', 'type': 'STRING'}]
+    self.hook.get_conn().cursor.return_value = MockedBigQueryCursor(
+        data_generator=FakeDataGenerator(expected), fields=fields)
+    controller = adaptive_sizing.PageSizeController(
+        initial_page_size=40, min_page_size=10)
+    self.hook.set_page_size_controller(controller)
+
+    blobs = list(self.hook.events_blobs_generator())
+
+    self.assertListEqual([blb.position for blb in blobs], [0, 40, 80])
+    self.assertListEqual(
+        [event for blb in blobs for event in blb.events], expected)
+
   def test_events_blobs_generator_get_expected_blob_metadata(self):
     expected = [{
         'a': '1',
@@ -337,6 +487,79 @@ class BigqueryHookTest(unittest.TestCase):
     del expected[1]
     self.assertListEqual(expected, result_list)
 
+  def test_events_blobs_generator_reads_only_rows_of_shard(self):
+    bq_hook._DEFAULT_PAGE_SIZE = 30
+    expected = [{'a': i} for i in range(100)]
+    fields = [{'name': 'a', 'type': 'INTEGER'}]
+    with mock.patch(MOCK_BQ_HOOK, return_value=None):
+      shard_hook = bq_hook.BigQueryHook(bq_conn_id='test_conn',
+                                        bq_dataset_id=self.dataset_id,
+                                        bq_table_id=self.table_id,
+                                        shard_index=1,
+                                        num_shards=3)
+    shard_hook.get_conn = mock.MagicMock()
+    shard_hook.get_conn().cursor.return_value = MockedBigQueryCursor(
+        data_generator=FakeDataGenerator(expected), fields=fields)
+
+    blobs = list(shard_hook.events_blobs_generator())
+
+    self.assertListEqual([blb.position for blb in blobs], [33, 63])
+    self.assertListEqual(
+        [event for blb in blobs for event in blb.events], expected[33:66])
+    self.assertTrue(all(blb.checkpoint == {'total_rows': 100}
+                        for blb in blobs))
+
+  def test_events_blobs_generator_keeps_rows_of_shard_of_grown_table(self):
+    bq_hook._DEFAULT_PAGE_SIZE = 30
+    expected = [{'a': i} for i in range(130)]
+    fields = [{'name': 'a', 'type': 'INTEGER'}]
+    with mock.patch(MOCK_BQ_HOOK, return_value=None):
+      shard_hook = bq_hook.BigQueryHook(bq_conn_id='test_conn',
+                                        bq_dataset_id=self.dataset_id,
+                                        bq_table_id=self.table_id,
+                                        shard_index=1,
+                                        num_shards=3)
+    shard_hook.get_conn = mock.MagicMock()
+    shard_hook.get_conn().cursor.return_value = MockedBigQueryCursor(
+        data_generator=FakeDataGenerator(expected), fields=fields)
+    prefix = shard_hook.get_monitored_location_prefix()
+    # The first run read the first blob of the shard when the table had 100
+    # rows. Totals of other numbers of shards don't count.
+    processed_blobs = iter([
+        (prefix + '0-of-3', '0', '{"num_rows": 30, "total_rows": 100}'),
+        (prefix + '1-of-3', '33', '{"num_rows": 30, "total_rows": 100}'),
+        (prefix + '1-of-2', '0', '{"num_rows": 30, "total_rows": 70}')])
+
+    blobs = list(shard_hook.events_blobs_generator(
+        processed_blobs_generator=processed_blobs))
+
+    self.assertListEqual([(blb.position, blb.num_rows) for blb in blobs],
+                         [(63, 3), (110, 10)])
+    self.assertTrue(all(blb.checkpoint == {'total_rows': 130}
+                        for blb in blobs))
+
+  def test_get_location_of_shard(self):
+    with mock.patch(MOCK_BQ_HOOK, return_value=None):
+      shard_hook = bq_hook.BigQueryHook(bq_conn_id='test_conn',
+                                        bq_dataset_id=self.dataset_id,
+                                        bq_table_id=self.table_id,
+                                        shard_index=1,
+                                        num_shards=3)
+
+    self.assertEqual(
+        shard_hook.get_location(),
+        f'bq://{self.project_id}.{self.dataset_id}.{self.table_id}'
+        '#shard-1-of-3')
+
+  def test_init_raises_error_on_invalid_shard(self):
+    with mock.patch(MOCK_BQ_HOOK, return_value=None), self.assertRaises(
+        errors.DataInConnectorValueError):
+      bq_hook.BigQueryHook(bq_conn_id='test_conn',
+                           bq_dataset_id=self.dataset_id,
+                           bq_table_id=self.table_id,
+                           shard_index=3,
+                           num_shards=3)
+
   def test_list_tables_get_expected_output(self):
     expected = ['table1', 'table2', 'table3']
     self.hook.get_conn().cursor.return_value = MockedBigQueryCursor(
@@ -384,6 +607,704 @@ class BigqueryHookTest(unittest.TestCase):
     expected_read_list = expected[0:10] + expected[60:80]
     self.assertListEqual(expected_read_list, result_list)
 
+  def test_events_blobs_generator_prefetches_pages_in_order(self):
+    bq_hook._DEFAULT_PAGE_SIZE = 10
+    expected = [{'a': i} for i in range(100)]
+    cursor = MockedBigQueryCursor(
+        data_generator=FakeDataGenerator(expected),
+        fields=[{'name': 'a', 'type': 'INTEGER'}])
+    inflight = []
+    max_inflight = []
+    get_tabledata = cursor.get_tabledata
+
+    def slow_get_tabledata(*args, **kwargs):
+      inflight.append(None)
+      max_inflight.append(len(inflight))
+      time.sleep(0.05)
+      inflight.pop()
+      return get_tabledata(*args, **kwargs)
+
+    cursor.get_tabledata = slow_get_tabledata
+    self.hook.get_conn().cursor.return_value = cursor
+    self.hook.prefetch_pages = 4
+    self.hook.prefetch_max_pages = 6
+    processed_ranges = iter([('20', '15')])
+
+    blobs = list(self.hook.events_blobs_generator(
+        processed_blobs_generator=processed_ranges))
+
+    self.assertListEqual([blb.position for blb in blobs],
+                         [0, 10, 35, 45, 55, 65, 75, 85, 95])
+    self.assertListEqual([event for blb in blobs for event in blb.events],
+                         expected[:20] + expected[35:])
+    self.assertGreater(max(max_inflight), 1)
+    self.assertLessEqual(max(max_inflight), 4)
+
+  def test_init_raises_prefetch_max_pages_to_prefetch_pages(self):
+    with mock.patch(MOCK_BQ_HOOK, return_value=None):
+      hook = bq_hook.BigQueryHook(bq_conn_id='test_conn',
+                                  bq_dataset_id=self.dataset_id,
+                                  bq_table_id=self.table_id,
+                                  bq_prefetch_pages=4,
+                                  bq_prefetch_max_pages=2)
+
+    self.assertEqual(hook.prefetch_pages, 4)
+    self.assertEqual(hook.prefetch_max_pages, 4)
+
+  def test_events_blobs_generator_fetches_missing_schema_once(self):
+    bq_hook._DEFAULT_PAGE_SIZE = 2
+    cursor = mock.MagicMock()
+    cursor.get_tabledata.side_effect = lambda start_index, **unused: {
+        'totalRows': '4', 'rows': [{'f': [{'v': str(start_index)}]}]}
+    cursor.get_schema.return_value = {
+        'fields': [{'name': 'a', 'type': 'INTEGER'}]}
+    self.hook.get_conn().cursor.return_value = cursor
+
+    events = [event for blb in self.hook.events_blobs_generator()
+              for event in blb.events]
+
+    self.assertListEqual(events, [{'a': 0}, {'a': 2}])
+    cursor.get_schema.assert_called_once_with(self.dataset_id, self.table_id)
+
+  def test_events_blobs_generator_compiles_schema_once(self):
+    bq_hook._DEFAULT_PAGE_SIZE = 30
+    expected = [{'a': i} for i in range(100)]
+    self.hook.get_conn().cursor.return_value = MockedBigQueryCursor(
+        data_generator=FakeDataGenerator(expected),
+        fields=[{'name': 'a', 'type': 'INTEGER'}])
+
+    with mock.patch.object(bq_hook, '_compile_schema', autospec=True,
+                           side_effect=bq_hook._compile_schema) as compile_mock:
+      events = [event for blb in self.hook.events_blobs_generator()
+                for event in blb.events]
+
+    self.assertListEqual(events, expected)
+    compile_mock.assert_called_once()
+
+  def test_events_blobs_generator_keeps_string_fields(self):
+    expected = [{'a': '1', 'b': 2}]
+    fields = [{'name': 'a', 'type': 'INTEGER'},
+              {'name': 'b', 'type': 'INTEGER'}]
+    self.hook.string_fields = ('a',)
+    self.hook.get_conn().cursor.return_value = MockedBigQueryCursor(
+        data_generator=FakeDataGenerator([{'a': 1, 'b': 2}]), fields=fields)
+
+    events = [event for blb in self.hook.events_blobs_generator()
+              for event in blb.events]
+
+    self.assertListEqual(events, expected)
+
+
+class ReadSessionBigQueryHookTest(unittest.TestCase):
+
+  @mock.patch(MOCK_BQ_HOOK)
+  def setUp(self, mocked_hook):
+    super().setUp()
+    mocked_hook.return_value = None
+    bq_hook.BigQueryHook._get_field = mock.MagicMock(
+        return_value='test_project')
+    bq_hook._DEFAULT_PAGE_SIZE = 4
+    self.hook = bq_hook.BigQueryHook(bq_conn_id='test_conn',
+                                     bq_dataset_id='test_dataset',
+                                     bq_table_id='test_table',
+                                     bq_read_streams=3)
+    self.table = pyarrow.table({'a': list(range(10)),
+                                'b': [str(i) for i in range(10)]})
+    self.server = FakeBigQueryReadServer(self.table)
+    self.addCleanup(self.server.stop)
+    self.hook._get_read_client = self.server.get_client
+
+  def test_events_blobs_generator_interleaves_streams(self):
+    bq_hook._DEFAULT_PAGE_SIZE = 2
+
+    blobs = list(self.hook.events_blobs_generator())
+
+    # Streams of rows 0-2, 3-5 and 6-9, responding with two rows at a time.
+    order = [0, 1, 3, 4, 6, 7, 2, 5, 8, 9]
+    prefix = 'bq://test_project.test_dataset.test_table#read-session/'
+    streams = [f'projects/p/locations/us/sessions/s1/streams/{index}'
+               for index in range(3)]
+    self.assertListEqual(
+        [(blb.location, blb.position, blb.num_rows) for blb in blobs],
+        [(prefix + streams[0], 0, 2), (prefix + streams[1], 0, 2),
+         (prefix + streams[2], 0, 2), (prefix + streams[0], 2, 1),
+         (prefix + streams[1], 2, 1), (prefix + streams[2], 2, 2)])
+    self.assertListEqual([event for blb in blobs for event in blb.events],
+                         [{'a': i, 'b': str(i)} for i in order])
+    self.assertListEqual(
+        [blb.checkpoint['end_row'] for blb in blobs], [2, 2, 2, 3, 3, 4])
+    self.assertTrue(all(blb.checkpoint['streams'] == streams
+                        for blb in blobs[:3]))
+    self.assertListEqual(
+        [blb.checkpoint.get('session_done', False) for blb in blobs],
+        [False] * 5 + [True])
+    request = self.server.session_requests[0]
+    self.assertEqual(request.parent, 'projects/test_project')
+    self.assertEqual(request.max_stream_count, 3)
+    self.assertEqual(
+        request.read_session.table,
+        'projects/test_project/datasets/test_dataset/tables/test_table')
+
+  def test_events_blobs_generator_reads_selected_fields(self):
+    self.hook.selected_fields = 'b'
+
+    events = [event for blb in self.hook.events_blobs_generator()
+              for event in blb.events]
+
+    self.assertListEqual(
+        list(self.server.session_requests[0].read_session.read_options
+             .selected_fields), ['b'])
+    self.assertTrue(all(list(event) == ['b'] for event in events))
+
+  def test_generate_read_pages_keeps_page_size_while_controller_shrinks(self):
+    controller = mock.MagicMock()
+    page_sizes = iter([4, 1, 1, 1])
+    type(controller).page_size = mock.PropertyMock(
+        side_effect=lambda: next(page_sizes))
+    self.hook.set_page_size_controller(controller)
+    rows_batches = [[{'a': 0}, {'a': 1}], [{'a': 2}, {'a': 3}], [{'a': 4}]]
+
+    pages = list(self.hook._generate_read_pages(rows_batches, None))
+
+    self.assertListEqual(
+        [(position, [row['a'] for row in rows]) for rows, position in pages],
+        [(0, [0, 1, 2, 3]), (4, [4])])
+
+  def _get_checkpoints(self, blobs):
+    return [(blb.location, str(blb.position),
+             json.dumps({'num_rows': blb.num_rows, **blb.checkpoint}))
+            for blb in blobs]
+
+  def test_get_monitored_location_prefix(self):
+    self.assertEqual(self.hook.get_monitored_location_prefix(),
+                     'bq://test_project.test_dataset.test_table#read-session/')
+    self.hook.set_shard(0, 2)
+    self.assertEqual(self.hook.get_monitored_location_prefix(),
+                     'bq://test_project.test_dataset.test_table#shard-')
+
+  def test_events_blobs_generator_resumes_streams_of_unfinished_session(self):
+    bq_hook._DEFAULT_PAGE_SIZE = 2
+    processed_blobs = list(self.hook.events_blobs_generator())[:4]
+
+    blobs = list(self.hook.events_blobs_generator(
+        processed_blobs_generator=iter(self._get_checkpoints(
+            processed_blobs))))
+
+    self.assertTrue(all('/sessions/s1/' in blb.location for blb in blobs))
+    self.assertListEqual([(blb.position, blb.num_rows) for blb in blobs],
+                         [(2, 1), (2, 2)])
+    self.assertListEqual([event['a'] for blb in blobs for event in blb.events],
+                         [5, 8, 9])
+    self.assertTrue(blobs[-1].checkpoint['session_done'])
+    self.assertCountEqual(
+        [request.offset for request in self.server.read_requests[3:]],
+        [3, 2, 2])
+
+  def test_events_blobs_generator_reads_finished_session_again(self):
+    processed_blobs = list(self.hook.events_blobs_generator())
+
+    blobs = list(self.hook.events_blobs_generator(
+        processed_blobs_generator=iter(self._get_checkpoints(
+            processed_blobs))))
+
+    self.assertTrue(all('/sessions/s2/' in blb.location for blb in blobs))
+    self.assertCountEqual([event['a'] for blb in blobs for event in blb.events],
+                          list(range(10)))
+
+  def test_events_blobs_generator_reads_expired_session_again(self):
+    self.server.expire_time = datetime.datetime(
+        2021, 1, 1, tzinfo=datetime.timezone.utc)
+    processed_blobs = list(self.hook.events_blobs_generator())[:1]
+
+    blobs = list(self.hook.events_blobs_generator(
+        processed_blobs_generator=iter(self._get_checkpoints(
+            processed_blobs))))
+
+    self.assertTrue(all('/sessions/s2/' in blb.location for blb in blobs))
+    self.assertCountEqual([event['a'] for blb in blobs for event in blb.events],
+                          list(range(10)))
+
+  def test_events_blobs_generator_converts_types_like_tabledata(self):
+    timestamp = datetime.datetime(2021, 1, 2, 3, 4, 5,
+                                  tzinfo=datetime.timezone.utc)
+    self.server.table = pyarrow.table({
+        'ts': pyarrow.array([timestamp], pyarrow.timestamp('us', tz='UTC')),
+        'dt': pyarrow.array([datetime.datetime(2021, 1, 2, 3, 4, 5)],
+                            pyarrow.timestamp('us')),
+        'd': pyarrow.array([datetime.date(2021, 1, 2)], pyarrow.date32()),
+        'n': pyarrow.array([decimal.Decimal('1.500000000')],
+                           pyarrow.decimal128(38, 9)),
+        'by': pyarrow.array([b'ab'], pyarrow.binary()),
+        'r': pyarrow.array([{'x': 1, 'y': [decimal.Decimal('2.0')]}],
+                           pyarrow.struct([
+                               ('x', pyarrow.int64()),
+                               ('y', pyarrow.list_(pyarrow.decimal128(3, 1)))
+                           ])),
+    })
+
+    events = [event for blb in self.hook.events_blobs_generator()
+              for event in blb.events]
+
+    self.assertListEqual(events, [{
+        'ts': timestamp.timestamp(),
+        'dt': '2021-01-02T03:04:05',
+        'd': '2021-01-02',
+        'n': '1.5',
+        'by': 'YWI=',
+        'r': {'x': 1, 'y': ['2']},
+    }])
+
+  @unittest.skipIf(fastavro is None, 'fastavro is not installed.')
+  def test_events_blobs_generator_reads_avro_streams(self):
+    self.server.avro_schema = {
+        'type': 'record', 'name': 'Root', 'fields': [
+            {'name': 'a', 'type': ['null', 'long']},
+            {'name': 'b', 'type': ['null', 'string']}]}
+    self.hook.read_format = 'AVRO'
+
+    blobs = list(self.hook.events_blobs_generator())
+
+    self.assertEqual(self.server.session_requests[0].read_session.data_format,
+                     bigquery_storage.types.DataFormat.AVRO)
+    self.assertListEqual([event for blb in blobs for event in blb.events],
+                         [{'a': i, 'b': str(i)} for i in range(10)])
+
+  def test_events_blobs_generator_raises_error_on_failed_session(self):
+    self.hook.dataset_id = 'missing_dataset'
+
+    with self.assertRaises(errors.DataInConnectorError) as error:
+      list(self.hook.events_blobs_generator())
+
+    self.assertEqual(error.exception.error_num,
+                     errors.ErrorNameIDMap.RETRIABLE_BQ_HOOK_ERROR_HTTP_ERROR)
+
+  def test_events_blobs_generator_reads_shards_with_tabledata(self):
+    bq_hook._DEFAULT_PAGE_SIZE = 30
+    expected = [{'a': i} for i in range(100)]
+    with mock.patch(MOCK_BQ_HOOK, return_value=None):
+      shard_hook = bq_hook.BigQueryHook(bq_conn_id='test_conn',
+                                        bq_dataset_id='test_dataset',
+                                        bq_table_id='test_table',
+                                        bq_read_streams=3,
+                                        shard_index=1,
+                                        num_shards=3)
+    shard_hook.get_conn = mock.MagicMock()
+    shard_hook.get_conn().cursor.return_value = MockedBigQueryCursor(
+        data_generator=FakeDataGenerator(expected),
+        fields=[{'name': 'a', 'type': 'INTEGER'}])
+
+    blobs = list(shard_hook.events_blobs_generator())
+
+    self.assertListEqual([blb.position for blb in blobs], [33, 63])
+    self.assertListEqual(self.server.session_requests, [])
+
+  def test_init_raises_error_on_invalid_read_format(self):
+    with mock.patch(MOCK_BQ_HOOK, return_value=None), self.assertRaises(
+        errors.DataInConnectorValueError):
+      bq_hook.BigQueryHook(bq_conn_id='test_conn',
+                           bq_dataset_id='test_dataset',
+                           bq_table_id='test_table',
+                           bq_read_streams=2,
+                           bq_read_format='CSV')
+
+
+@unittest.skipIf(fastavro is None, 'fastavro is not installed.')
+class ExtractBigQueryHookTest(unittest.TestCase):
+
+  @mock.patch(MOCK_BQ_HOOK)
+  def setUp(self, mocked_hook):
+    super().setUp()
+    mocked_hook.return_value = None
+    bq_hook.BigQueryHook._get_field = mock.MagicMock(
+        return_value='test_project')
+    bq_hook._DEFAULT_PAGE_SIZE = 3
+    self.hook = bq_hook.BigQueryHook(bq_conn_id='test_conn',
+                                     bq_dataset_id='test_dataset',
+                                     bq_table_id='test_table',
+                                     bq_extract_gcs_uri='gs://bucket/exports/',
+                                     gcs_download_workers=2)
+    self.hook.gcp_conn_id = 'test_conn'
+    self.hook.delegate_to = None
+    self.hook.get_conn = mock.MagicMock()
+    self.cursor = self.hook.get_conn().cursor()
+
+    # Two extracted objects, streamed in blobs of up to two rows.
+    self.extracted_blobs = [
+        blob.Blob(events=[{'a': 0}, {'a': 1}], location='gs://bucket/o0'),
+        blob.Blob(events=[{'a': 2}], location='gs://bucket/o0', position=2),
+        blob.Blob(events=[{'a': 3}, {'a': 4}], location='gs://bucket/o1'),
+    ]
+    patcher = mock.patch.object(bq_hook.gcs_hook, 'GoogleCloudStorageHook',
+                                autospec=True)
+    self.mocked_gcs_hook = patcher.start()
+    self.addCleanup(patcher.stop)
+    extract_hook = self.mocked_gcs_hook.return_value
+    extract_hook.bucket = 'bucket'
+    extract_hook.prefix = 'exports/test_dataset.test_table/'
+    extract_hook.events_blobs_generator.return_value = (
+        iter(self.extracted_blobs))
+    self.mocked_bucket = extract_hook.get_conn.return_value.bucket.return_value
+    self.mocked_bucket.get_blob.return_value = None
+    self.partial_object = mock.MagicMock()
+    self.mocked_bucket.list_blobs.return_value = [self.partial_object]
+    self.done_object = mock.MagicMock()
+    self.done_object.download_as_bytes.return_value = b'e1'
+    self.location_prefix = (
+        'bq://test_project.test_dataset.test_table#extract/')
+
+  def test_events_blobs_generator_reads_extracted_objects(self):
+    blobs = list(self.hook.events_blobs_generator())
+
+    configuration = self.cursor.run_with_configuration.call_args[0][0]
+    self.assertEqual(
+        configuration['extract']['destinationUris'],
+        ['gs://bucket/exports/test_dataset.test_table/part-*.avro'])
+    self.assertEqual(configuration['extract']['sourceTable'],
+                     {'projectId': 'test_project', 'datasetId': 'test_dataset',
+                      'tableId': 'test_table'})
+    self.assertEqual(configuration['extract']['destinationFormat'], 'AVRO')
+    self.assertTrue(configuration['extract']['useAvroLogicalTypes'])
+    self.mocked_gcs_hook.assert_called_once_with(
+        gcs_bucket='bucket', gcs_prefix='exports/test_dataset.test_table/',
+        gcs_content_type='AVRO', gcs_name_globs='part-*.avro',
+        gcs_skip_failed_objects=False, gcs_stream_blob_rows=3,
+        gcs_download_workers=2, gcs_conn_id='test_conn',
+        gcs_delegate_to=None)
+    self.mocked_bucket.get_blob.assert_called_once_with(
+        'exports/test_dataset.test_table/_SUCCESS')
+    self.partial_object.delete.assert_called_once_with()
+    self.mocked_bucket.blob.assert_called_once_with(
+        'exports/test_dataset.test_table/_SUCCESS')
+    upload = self.mocked_bucket.blob.return_value.upload_from_string
+    upload.assert_called_once()
+    location = self.location_prefix + upload.call_args[0][0]
+    self.assertListEqual(
+        [(blb.location, blb.position, blb.num_rows) for blb in blobs],
+        [(location, 0, 3), (location, 3, 2)])
+    self.assertListEqual([event for blb in blobs for event in blb.events],
+                         [{'a': i} for i in range(5)])
+
+  def test_events_blobs_generator_reuses_completely_extracted_objects(self):
+    self.mocked_bucket.get_blob.return_value = self.done_object
+
+    blobs = list(self.hook.events_blobs_generator(
+        processed_blobs_generator=iter([
+            (self.location_prefix + 'e0', '3', '2'),
+            (self.location_prefix + 'e1', '0', '{"num_rows": 3}')])))
+
+    self.cursor.run_with_configuration.assert_not_called()
+    self.partial_object.delete.assert_not_called()
+    self.assertListEqual(
+        [(blb.location, blb.position, blb.num_rows) for blb in blobs],
+        [(self.location_prefix + 'e1', 3, 2)])
+
+  def test_events_blobs_generator_reads_new_extraction_completely(self):
+    blobs = list(self.hook.events_blobs_generator(
+        processed_blobs_generator=iter([
+            (self.location_prefix + 'e1', '0', '3')])))
+
+    self.cursor.run_with_configuration.assert_called_once()
+    self.assertListEqual([(blb.position, blb.num_rows) for blb in blobs],
+                         [(0, 3), (3, 2)])
+
+  def test_get_monitored_location_prefix(self):
+    self.assertEqual(self.hook.get_monitored_location_prefix(),
+                     self.location_prefix)
+
+  def test_complete_transfer_deletes_extracted_objects(self):
+    list(self.hook.events_blobs_generator())
+    self.partial_object.reset_mock()
+
+    self.hook.complete_transfer()
+    self.hook.complete_transfer()
+
+    self.partial_object.delete.assert_called_once_with()
+
+  def test_events_blobs_generator_reads_with_extract_content_type(self):
+    self.hook._gcs_kwargs['gcs_content_type'] = 'JSON'
+
+    list(self.hook.events_blobs_generator())
+
+    self.assertEqual(
+        self.mocked_gcs_hook.call_args[1]['gcs_content_type'], 'AVRO')
+
+  def test_events_blobs_generator_converts_types_and_skips_ranges(self):
+    timestamp = datetime.datetime(2021, 1, 2, tzinfo=datetime.timezone.utc)
+    self.extracted_blobs[2].events[1] = {'a': 4, 't': timestamp,
+                                         'n': decimal.Decimal('2.50')}
+
+    self.mocked_bucket.get_blob.return_value = self.done_object
+
+    blobs = list(self.hook.events_blobs_generator(
+        processed_blobs_generator=iter([
+            (self.location_prefix + 'e1', '1', '2')])))
+
+    self.assertListEqual([(blb.position, blb.num_rows) for blb in blobs],
+                         [(0, 1), (3, 2)])
+    self.assertListEqual(
+        [event for blb in blobs for event in blb.events],
+        [{'a': 0}, {'a': 3},
+         {'a': 4, 't': timestamp.timestamp(), 'n': '2.5'}])
+
+  def test_events_blobs_generator_raises_error_on_failed_job(self):
+    self.cursor.run_with_configuration.side_effect = Exception('job failed')
+
+    with self.assertRaises(errors.DataInConnectorError) as error:
+      list(self.hook.events_blobs_generator())
+
+    self.assertEqual(error.exception.error_num,
+                     errors.ErrorNameIDMap.BQ_HOOK_ERROR_EXTRACT_JOB_FAILED)
+    self.mocked_bucket.blob.assert_not_called()
+    (self.mocked_gcs_hook.return_value.events_blobs_generator
+     .assert_not_called())
+
+  def test_init_raises_error_on_invalid_extract_uri(self):
+    for uri in ('bucket/exports', 'gs://'):
+      with self.subTest(uri=uri), mock.patch(
+          MOCK_BQ_HOOK, return_value=None), self.assertRaises(
+              errors.DataInConnectorValueError):
+        bq_hook.BigQueryHook(bq_conn_id='test_conn',
+                             bq_dataset_id='test_dataset',
+                             bq_table_id='test_table',
+                             bq_extract_gcs_uri=uri)
+
+
+class WatermarkBigQueryHookTest(unittest.TestCase):
+
+  @mock.patch(MOCK_BQ_HOOK)
+  def setUp(self, mocked_hook):
+    super().setUp()
+    mocked_hook.return_value = None
+    bq_hook.BigQueryHook._get_field = mock.MagicMock(
+        return_value='test_project')
+    bq_hook._DEFAULT_PAGE_SIZE = 2
+    self.hook = bq_hook.BigQueryHook(bq_conn_id='test_conn',
+                                     bq_dataset_id='test_dataset',
+                                     bq_table_id='test_table',
+                                     bq_watermark_column='seq')
+    self.hook.get_conn = mock.MagicMock()
+
+    # The rows of the query results, read from the anonymous table.
+    self.rows = [{'seq': 6, 'a': 'x'}, {'seq': 7, 'a': 'y'},
+                 {'seq': 9, 'a': 'z'}]
+    data_generator = FakeDataGenerator(self.rows)
+    self.cursor = MockedBigQueryCursor(data_generator=data_generator,
+                                       fields=data_generator.fields)
+    self.cursor.location = None
+    self.cursor.num_retries = 5
+    self.cursor.flush_results = mock.MagicMock()
+    self.cursor.run_query = mock.MagicMock(side_effect=['max_job', 'rows_job'])
+    self.cursor.fetchone = mock.MagicMock(return_value=['9'])
+    self.cursor.service = mock.MagicMock()
+    self.cursor.service.jobs().get().execute.return_value = {
+        'configuration': {'query': {'destinationTable': {
+            'projectId': 'test_project', 'datasetId': '_anonymous',
+            'tableId': 'anon_table'}}}}
+    self.hook.get_conn().cursor.return_value = self.cursor
+    self.location_prefix = (
+        'bq://test_project.test_dataset.test_table#after-watermark/5/')
+
+  def test_events_blobs_generator_reads_rows_after_watermark(self):
+    self.hook.set_watermark('5')
+
+    blobs = list(self.hook.events_blobs_generator())
+
+    max_query, rows_query = self.cursor.run_query.call_args_list
+    self.assertEqual(
+        max_query[1]['sql'],
+        'SELECT CAST(MAX(`seq`) AS STRING) '
+        'FROM `test_project.test_dataset.test_table` WHERE `seq` > @watermark')
+    self.assertEqual(
+        rows_query[1]['sql'],
+        'SELECT * FROM `test_project.test_dataset.test_table` '
+        'WHERE `seq` > @watermark AND `seq` <= @next_watermark')
+    self.assertListEqual(
+        rows_query[1]['query_params'],
+        [{'name': 'watermark', 'parameterType': {'type': 'INT64'},
+          'parameterValue': {'value': '5'}},
+         {'name': 'next_watermark', 'parameterType': {'type': 'INT64'},
+          'parameterValue': {'value': '9'}}])
+    self.assertFalse(rows_query[1]['use_legacy_sql'])
+    self.cursor.service.jobs().get.assert_called_with(
+        projectId='test_project', jobId='rows_job')
+    self.assertEqual(self.cursor.table_id, 'anon_table')
+    self.assertListEqual([event for blb in blobs for event in blb.events],
+                         self.rows)
+    location = self.location_prefix + '_anonymous.anon_table'
+    self.assertListEqual([(blb.location, blb.position) for blb in blobs],
+                         [(location, 0), (location, 2)])
+    self.assertTrue(all(blb.checkpoint == {'next_watermark': '9'}
+                        for blb in blobs))
+    self.assertEqual(self.hook.get_next_watermark(), '9')
+
+  def test_events_blobs_generator_resumes_query_results_of_failed_run(self):
+    self.hook.set_watermark('5')
+    processed_blobs = [
+        (self.location_prefix + '_anonymous.anon_table', '0',
+         '{"num_rows": 2, "next_watermark": "8"}')]
+
+    blobs = list(self.hook.events_blobs_generator(
+        processed_blobs_generator=iter(processed_blobs)))
+
+    self.cursor.run_query.assert_not_called()
+    self.cursor.service.tables().get.assert_called_with(
+        projectId='test_project', datasetId='_anonymous',
+        tableId='anon_table')
+    self.assertEqual(self.cursor.table_id, 'anon_table')
+    self.assertListEqual([(blb.position, blb.num_rows) for blb in blobs],
+                         [(2, 1)])
+    self.assertEqual(self.hook.get_next_watermark(), '8')
+
+  def test_events_blobs_generator_queries_again_after_results_expired(self):
+    self.hook.set_watermark('5')
+    response = mock.Mock(status=404, reason='Not found')
+    self.cursor.service.tables().get().execute.side_effect = (
+        googleapiclient_errors.HttpError(resp=response, content=b''))
+    processed_blobs = [
+        (self.location_prefix + '_anonymous.expired_table', '0',
+         '{"num_rows": 2, "next_watermark": "8"}')]
+
+    blobs = list(self.hook.events_blobs_generator(
+        processed_blobs_generator=iter(processed_blobs)))
+
+    self.assertEqual(self.cursor.run_query.call_count, 2)
+    self.assertListEqual([(blb.position, blb.num_rows) for blb in blobs],
+                         [(0, 2), (2, 1)])
+    self.assertEqual(self.hook.get_next_watermark(), '9')
+
+  def test_events_blobs_generator_without_watermark_reads_all_rows(self):
+    blobs = list(self.hook.events_blobs_generator())
+
+    max_query, rows_query = self.cursor.run_query.call_args_list
+    self.assertEqual(
+        max_query[1]['sql'],
+        'SELECT CAST(MAX(`seq`) AS STRING) '
+        'FROM `test_project.test_dataset.test_table`')
+    self.assertListEqual(max_query[1]['query_params'], [])
+    self.assertIn('WHERE `seq` <= @next_watermark', rows_query[1]['sql'])
+    self.assertEqual(sum(blb.num_rows for blb in blobs), 3)
+    self.assertEqual(self.hook.get_next_watermark(), '9')
+
+  def test_events_blobs_generator_without_rows_after_watermark(self):
+    self.hook.set_watermark('9')
+    self.cursor.fetchone.return_value = [None]
+
+    blobs = list(self.hook.events_blobs_generator())
+
+    self.assertListEqual(blobs, [])
+    self.cursor.run_query.assert_called_once()
+    self.assertIsNone(self.hook.get_next_watermark())
+
+  def test_events_blobs_generator_raises_error_on_unknown_column(self):
+    self.hook.watermark_column = 'missing'
+
+    with self.assertRaises(errors.DataInConnectorValueError) as error:
+      list(self.hook.events_blobs_generator())
+
+    self.assertEqual(
+        error.exception.error_num,
+        errors.ErrorNameIDMap.BQ_HOOK_ERROR_INVALID_WATERMARK_OPTIONS)
+
+  def test_get_monitored_location_prefix(self):
+    self.assertEqual(
+        self.hook.get_monitored_location_prefix(),
+        'bq://test_project.test_dataset.test_table#after-watermark//')
+    self.hook.set_watermark('5')
+    self.assertEqual(self.hook.get_monitored_location_prefix(),
+                     self.location_prefix)
+
+  def test_is_incremental(self):
+    self.assertTrue(self.hook.is_incremental())
+    self.hook.watermark_column = None
+    self.assertFalse(self.hook.is_incremental())
+
+  def test_set_shard_raises_error_on_multiple_shards(self):
+    with self.assertRaises(errors.DataInConnectorValueError):
+      self.hook.set_shard(0, 2)
+
+  def test_init_raises_error_with_extract_uri(self):
+    with mock.patch(MOCK_BQ_HOOK, return_value=None), self.assertRaises(
+        errors.DataInConnectorValueError):
+      bq_hook.BigQueryHook(bq_conn_id='test_conn',
+                           bq_dataset_id='test_dataset',
+                           bq_table_id='test_table',
+                           bq_watermark_column='seq',
+                           bq_extract_gcs_uri='gs://bucket/exports')
+
+
+class QueryResultsToMapsListTest(unittest.TestCase):
+
+  def test_converts_nested_and_repeated_fields(self):
+    query_results = {
+        'schema': {'fields': [
+            {'name': 'n', 'type': 'NUMERIC'},
+            {'name': 'd', 'type': 'DATE'},
+            {'name': 'tags', 'type': 'INTEGER', 'mode': 'REPEATED'},
+            {'name': 'r', 'type': 'RECORD', 'fields': [
+                {'name': 'x', 'type': 'FLOAT'},
+                {'name': 'y', 'type': 'BOOLEAN', 'mode': 'REPEATED'}]},
+            {'name': 'rs', 'type': 'RECORD', 'mode': 'REPEATED', 'fields': [
+                {'name': 'z', 'type': 'STRING'}]},
+        ]},
+        'rows': [
+            {'f': [{'v': '1.5'}, {'v': '2021-01-02'},
+                   {'v': [{'v': '1'}, {'v': '2'}]},
+                   {'v': {'f': [{'v': '0.5'}, {'v': [{'v': 'true'}]}]}},
+                   {'v': [{'v': {'f': [{'v': 'a'}]}}]}]},
+            {'f': [{'v': None}, {'v': None}, {'v': []}, {'v': None},
+                   {'v': []}]},
+        ],
+    }
+
+    rows = bq_hook._query_results_to_maps_list(query_results)
+
+    self.assertListEqual(rows, [
+        {'n': '1.5', 'd': '2021-01-02', 'tags': [1, 2],
+         'r': {'x': 0.5, 'y': [True]}, 'rs': [{'z': 'a'}]},
+        {'n': None, 'd': None, 'tags': [], 'r': None, 'rs': []},
+    ])
+
+  def test_keeps_numeric_and_date_cells_as_json_strings(self):
+    query_results = {
+        'schema': {'fields': [
+            {'name': 'n', 'type': 'NUMERIC'},
+            {'name': 'bn', 'type': 'BIGNUMERIC'},
+            {'name': 'd', 'type': 'DATE'},
+            {'name': 'dt', 'type': 'DATETIME'},
+        ]},
+        'rows': [{'f': [{'v': '0.1'}, {'v': '123456789012345678901234567890.5'},
+                        {'v': '2021-01-02'}, {'v': '2021-01-02T03:04:05'}]}],
+    }
+
+    rows = bq_hook._query_results_to_maps_list(query_results)
+
+    self.assertListEqual(rows, [
+        {'n': '0.1', 'bn': '123456789012345678901234567890.5',
+         'd': '2021-01-02', 'dt': '2021-01-02T03:04:05'}])
+    self.assertEqual(json.loads(json.dumps(rows)), rows)
+
+  def test_keeps_string_fields_except_records(self):
+    query_results = {
+        'schema': {'fields': [
+            {'name': 'a', 'type': 'INTEGER'},
+            {'name': 'r', 'type': 'RECORD', 'fields': [
+                {'name': 'x', 'type': 'INTEGER'}]},
+        ]},
+        'rows': [{'f': [{'v': '1'}, {'v': {'f': [{'v': '2'}]}}]}],
+    }
+
+    rows = bq_hook._query_results_to_maps_list(query_results,
+                                               string_fields=('a', 'r'))
+
+    self.assertListEqual(rows, [{'a': '1', 'r': {'x': 2}}])
+
+  def test_raises_error_on_invalid_boolean(self):
+    query_results = {'schema': {'fields': [{'name': 'a', 'type': 'BOOLEAN'}]},
+                     'rows': [{'f': [{'v': 'yes'}]}]}
+
+    with self.assertRaises(ValueError):
+      bq_hook._query_results_to_maps_list(query_results)
+
 
 if __name__ == '__main__':
   unittest.main()
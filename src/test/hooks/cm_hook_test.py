@@ -23,6 +23,7 @@ import unittest.mock as mock
 from gps_building_blocks.cloud.utils import cloud_auth
 from plugins.pipeline_plugins.hooks import cm_hook
 from plugins.pipeline_plugins.utils import blob
+from plugins.pipeline_plugins.utils import blob_batching
 from plugins.pipeline_plugins.utils import errors
 
 
@@ -277,5 +278,31 @@ class CampaignManagerHookTest(unittest.TestCase):
 
     self._execute_and_assert_num_of_failed_event(events, 0)
 
+  def test_get_event_validator_rejects_events_without_valid_payload(self):
+    is_valid_event = self.cm_hook.get_event_validator()
+
+    self.assertTrue(is_valid_event(self.event_test_conversion))
+    self.assertFalse(is_valid_event({}))
+
+  def test_send_events_of_coalesced_blobs_sends_full_batches(self):
+    """Validate invalid events don't leave batches of coalesced blobs short."""
+    batch_size = self.cm_hook.get_max_batch_size()
+    blobs = []
+    for position in range(0, 3 * batch_size, batch_size):
+      events = _get_conversion_events(batch_size - 10,
+                                      self.event_test_conversion)
+      blobs.append(blob.Blob(events=events + [{}] * 10, location='',
+                             position=position))
+    batch_sizes = []
+    self.cm_hook._send_batch = mock.Mock(
+        side_effect=lambda batch: batch_sizes.append(len(batch)) or [])
+
+    for coalesced_blob in blob_batching.coalesce_blobs(
+        blobs, batch_size=batch_size,
+        is_valid_event=self.cm_hook.get_event_validator()):
+      self.cm_hook.send_events(coalesced_blob)
+
+    self.assertListEqual(batch_sizes, [batch_size, batch_size, 970])
+
 if __name__ == '__main__':
   unittest.main()
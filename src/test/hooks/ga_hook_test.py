@@ -15,6 +15,7 @@
 
 """Tests for tcrm.hooks.ga_hook."""
 
+import pickle
 import re
 import unittest
 import unittest.mock as mock
@@ -213,6 +214,10 @@ class GoogleAnalyticsHookTest(unittest.TestCase):
     expected = self.test_tracking_id
     self.assertEqual(test_hook.tracking_id, expected)
 
+  def test_ga_hook_get_max_batch_size(self):
+    self.assertEqual(self.test_hook.get_max_batch_size(),
+                     ga_hook._BATCH_MAX_BATCH_LENGTH)
+
   def test_ga_hook_send_single_hit_with_dry_run(self):
     """Test GoogleAnalyticsHook sends single hit with dryrun."""
     self.test_hook.dry_run = True
@@ -376,6 +381,23 @@ class GoogleAnalyticsHookTest(unittest.TestCase):
       # 4 successful events and 2 unsuccessful event
       self.assertListEqual(blb.failed_events, expected)
 
+  def test_ga_hook_send_events_uses_payloads_of_payload_builder(self):
+    events = [self.small_event] * 4 + [
+        {**self.small_event, 'z': '1558517072202080' * 10000}]
+    blb = blob.Blob(events=events, location='')
+    blb.payloads = pickle.loads(
+        pickle.dumps(self.test_hook.get_payload_builder()))(events)
+
+    with mock.patch.object(self.test_hook, 'send_hit') as patched_send_hook:
+      with mock.patch.object(
+          ga_hook, 'PayloadBuilder') as patched_payload_builder:
+        blb = self.test_hook.send_events(blb)
+
+    patched_payload_builder.assert_not_called()
+    patched_send_hook.assert_called_once()
+    self.assertEqual(len(blb.failed_events), 1)
+    self.assertEqual(blb.failed_events[0][0], 4)
+
 
 if __name__ == '__main__':
   unittest.main()
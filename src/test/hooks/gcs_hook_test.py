@@ -15,16 +15,25 @@
 
 """Tests for plugins.pipeline_plugins.hooks.gcs_hook."""
 
+import concurrent.futures
+import gzip
+import io
 import json
+import time
 import unittest
 
 from unittest import mock
 from airflow.contrib.hooks import gcp_api_base_hook
 from airflow.contrib.hooks import gcs_hook as base_gcs_hook
+from google.api_core import exceptions as api_exceptions
 from google.api_core.exceptions import NotFound
+import pyarrow
+from pyarrow import parquet
 
 from plugins.pipeline_plugins.hooks import gcs_hook
+from plugins.pipeline_plugins.utils import blob_batching
 from plugins.pipeline_plugins.utils import errors
+from plugins.pipeline_plugins.utils import shard_utils
 
 
 def fake_generator(expected):
@@ -36,6 +45,16 @@ def fake_generator(expected):
       yield chunk.encode()  # encode as bytes
 
 
+def fake_listed_objects(names, sizes=None, generation=None):
+  """Fakes the objects listed by list_blobs."""
+  listed_objects = []
+  for name, size in zip(names, sizes or [0] * len(names)):
+    listed_object = mock.MagicMock(size=size, generation=generation)
+    listed_object.name = name
+    listed_objects.append(listed_object)
+  return listed_objects
+
+
 def get_expected(expected, content_type=gcs_hook.BlobContentTypes.JSON.name):
   """Transforms a list into the output expected from _load_blob_into_queue.
 
@@ -117,6 +136,141 @@ class GoogleCloudStorageHookTest(unittest.TestCase):
     with self.assertRaises(errors.DataInConnectorError):
       self.gcs_hook.get_blob_events('blob_name')
 
+  def _fake_blob_content(self, content):
+    self.mock_file_blob.size = len(content)
+
+    def download_to_file(outio, start, end, raw_download):
+      self.assertTrue(raw_download)
+      outio.write(content[start:end + 1])
+    self.mock_file_blob.download_to_file.side_effect = download_to_file
+
+  def test_download_byte_ranges_concurrently_in_order(self):
+    content = bytes(range(100))
+    self._fake_blob_content(content)
+    self.gcs_hook.download_workers = 4
+
+    chunks = list(self.gcs_hook._gcs_blob_chunk_generator('blob_name',
+                                                          chunk_size=9))
+
+    self.assertEqual(len(chunks), 10)
+    self.assertEqual(b''.join(chunks), content)
+
+  def test_download_retries_failed_byte_range(self):
+    content = bytes(range(30))
+    self._fake_blob_content(content)
+    download_to_file = self.mock_file_blob.download_to_file.side_effect
+    failed_starts = [10]
+
+    def download_to_file_failing_once(outio, start, end, raw_download):
+      if start in failed_starts:
+        failed_starts.remove(start)
+        raise api_exceptions.ServiceUnavailable('unavailable')
+      download_to_file(outio, start, end, raw_download)
+    self.mock_file_blob.download_to_file.side_effect = (
+        download_to_file_failing_once)
+
+    with mock.patch.object(time, 'sleep', autospec=True):
+      chunks = list(self.gcs_hook._gcs_blob_chunk_generator('blob_name',
+                                                            chunk_size=9))
+
+    self.assertEqual(b''.join(chunks), content)
+    self.assertListEqual(
+        [call[1]['start'] for call in
+         self.mock_file_blob.download_to_file.call_args_list], [0, 10, 10, 20])
+
+  def test_decompress_gzip_blob_by_extension(self):
+    content = b'{"a": 1}\n' * 1000
+    compressed = gzip.compress(content[:4000]) + gzip.compress(content[4000:])
+    self._fake_blob_content(compressed)
+    self.mock_file_blob.content_encoding = None
+
+    chunks = list(self.gcs_hook._gcs_blob_chunk_generator('blob_name.json.gz',
+                                                          chunk_size=99))
+
+    self.assertEqual(b''.join(chunks), content)
+
+  def test_decompress_gzip_blob_by_content_encoding_from_offset(self):
+    self._fake_blob_content(gzip.compress(b'0123456789'))
+    self.mock_file_blob.content_encoding = 'gzip'
+
+    chunks = list(self.gcs_hook._gcs_blob_chunk_generator('blob_name',
+                                                          start_byte=4,
+                                                          chunk_size=5))
+
+    self.assertEqual(b''.join(chunks), b'456789')
+    self.assertEqual(
+        self.mock_file_blob.download_to_file.call_args_list[0][1]['start'], 0)
+
+  def test_raise_error_when_failed_to_decompress_blob(self):
+    self._fake_blob_content(b'not gzip')
+    self.mock_file_blob.content_encoding = 'gzip'
+
+    with self.assertRaises(errors.DataInConnectorBlobParseError):
+      list(self.gcs_hook._gcs_blob_chunk_generator('blob_name'))
+
+  @unittest.skipIf(gcs_hook.zstandard is None, 'zstandard is not installed.')
+  def test_decompress_zstd_blob_by_extension(self):
+    content = b'{"a": 1}\n' * 1000
+    self._fake_blob_content(gcs_hook.zstandard.ZstdCompressor().compress(
+        content))
+    self.mock_file_blob.content_encoding = None
+
+    chunks = list(self.gcs_hook._gcs_blob_chunk_generator('blob_name.zst',
+                                                          chunk_size=99))
+
+    self.assertEqual(b''.join(chunks), content)
+
+  @unittest.skipIf(gcs_hook.zstandard is None, 'zstandard is not installed.')
+  def test_decompress_zstd_blob_of_frames_in_bounded_chunks(self):
+    compressor = gcs_hook.zstandard.ZstdCompressor()
+    content = b'\0' * (20 * 1024 * 1024) + b'{"a": 1}\n'
+    self._fake_blob_content(compressor.compress(content[:10]) +
+                            compressor.compress(content[10:]))
+    self.mock_file_blob.content_encoding = None
+
+    chunks = list(self.gcs_hook._gcs_blob_chunk_generator('blob_name.zst'))
+
+    self.assertEqual(b''.join(chunks), content)
+    self.assertLessEqual(max(len(chunk) for chunk in chunks),
+                         16 * 1024 * 1024)
+
+  def test_decompress_gzip_blob_in_bounded_chunks(self):
+    content = b'\0' * (20 * 1024 * 1024)
+    self._fake_blob_content(gzip.compress(content))
+    self.mock_file_blob.content_encoding = 'gzip'
+
+    chunks = list(self.gcs_hook._gcs_blob_chunk_generator('blob_name'))
+
+    self.assertEqual(b''.join(chunks), content)
+    self.assertLessEqual(max(len(chunk) for chunk in chunks),
+                         gcs_hook._DECOMPRESS_OUTPUT_SIZE)
+
+  def test_raise_error_when_gzip_blob_is_truncated(self):
+    self._fake_blob_content(gzip.compress(b'{"a": 1}\n' * 1000)[:-10])
+    self.mock_file_blob.content_encoding = 'gzip'
+
+    with self.assertRaises(errors.DataInConnectorValueError):
+      list(self.gcs_hook._gcs_blob_chunk_generator('blob_name'))
+
+  @unittest.skipIf(gcs_hook.zstandard is None, 'zstandard is not installed.')
+  def test_raise_error_when_zstd_blob_is_truncated(self):
+    compressed = gcs_hook.zstandard.ZstdCompressor().compress(
+        b'{"a": 1}\n' * 1000)
+    self._fake_blob_content(compressed[:-3])
+    self.mock_file_blob.content_encoding = None
+
+    with self.assertRaises(errors.DataInConnectorValueError):
+      list(self.gcs_hook._gcs_blob_chunk_generator('blob_name.zst'))
+
+  def test_raise_error_when_zstandard_is_not_installed(self):
+    self._fake_blob_content(b'')
+    self.mock_file_blob.size = 1
+    self.mock_file_blob.content_encoding = None
+
+    with mock.patch.object(gcs_hook, 'zstandard', None):
+      with self.assertRaises(errors.DataInConnectorValueError):
+        list(self.gcs_hook._gcs_blob_chunk_generator('blob_name.zst'))
+
   def test_get_location(self):
     loc = self.gcs_hook.get_location()
     self.assertEqual(loc, f'gs://{self.mock_bucket_name}/{self.mock_prefix}')
@@ -139,8 +293,8 @@ class JSONGoogleCloudStorageHookTest(unittest.TestCase):
                                          autospec=True).start()
     self.mocked_conn.return_value.objects = mock.MagicMock()
 
-    self.mocked_list = mock.patch.object(base_gcs_hook.GoogleCloudStorageHook,
-                                         'list', autospec=True).start()
+    self.mocked_list = (
+        self.mocked_conn.return_value.bucket.return_value.list_blobs)
 
     self.patched_chunk_generator = mock.patch.object(
         gcs_hook.GoogleCloudStorageHook, '_gcs_blob_chunk_generator',
@@ -217,7 +371,8 @@ class JSONGoogleCloudStorageHookTest(unittest.TestCase):
     self.assertListEqual(events, get_expected(long_list))
 
   def test_events_blobs_generator(self):
-    self.mocked_list.return_value = ['blob_1', 'blob_2', 'blob_3']
+    self.mocked_list.return_value = fake_listed_objects(
+        ['blob_1', 'blob_2', 'blob_3'])
     expected = [{'a': 1}]
     with mock.patch.object(gcs_hook.GoogleCloudStorageHook, 'get_blob_events',
                            autospec=True, return_value=expected):
@@ -228,8 +383,252 @@ class JSONGoogleCloudStorageHookTest(unittest.TestCase):
           [(expected, f'gs://bucket/blob_{i}', gcs_hook._START_POSITION_IN_BLOB,
            ) for i in range(1, 4)])
 
+  def test_events_blobs_generator_reads_objects_concurrently_largest_first(
+      self):
+    self.gcs_hook.object_workers = 2
+    self.mocked_list.return_value = fake_listed_objects(
+        ['small', 'large', 'dir/', 'medium'], sizes=[10, 300, 0, 20])
+
+    def get_blob_events(unused_self, blob_name):
+      return [{'name': blob_name}]
+    with mock.patch.object(gcs_hook.GoogleCloudStorageHook, 'get_blob_events',
+                           autospec=True, side_effect=get_blob_events):
+      blobs = list(self.gcs_hook.events_blobs_generator())
+
+    self.assertListEqual(
+        [(blb.location, blb.events) for blb in blobs],
+        [('gs://bucket/large', [{'name': 'large'}]),
+         ('gs://bucket/medium', [{'name': 'medium'}]),
+         ('gs://bucket/small', [{'name': 'small'}])])
+
+  def test_events_blobs_generator_reads_only_blobs_of_shard(self):
+    blob_names = [f'blob_{i}' for i in range(20)]
+    self.mocked_list.return_value = fake_listed_objects(blob_names)
+    with mock.patch.object(gcp_api_base_hook.GoogleCloudBaseHook, '__init__',
+                           autospec=True):
+      shard_hooks = [gcs_hook.GoogleCloudStorageHook(
+          gcs_bucket='bucket', gcs_content_type='JSON', gcs_prefix='',
+          shard_index=i, num_shards=3) for i in range(3)]
+
+    locations = []
+    with mock.patch.object(gcs_hook.GoogleCloudStorageHook, 'get_blob_events',
+                           autospec=True, return_value=[{'a': 1}]):
+      for shard_hook in shard_hooks:
+        locations.append(
+            [blb.location for blb in shard_hook.events_blobs_generator()])
+
+    self.assertCountEqual(
+        [location for shard in locations for location in shard],
+        [f'gs://bucket/{blob_name}' for blob_name in blob_names])
+    self.assertTrue(all(locations))
+
+  def test_events_blobs_generator_lists_matching_names_from_glob_prefixes(
+      self):
+    self.gcs_hook.prefix = 'p/'
+    self.gcs_hook.name_globs = ['dt=2021-05-0*/*.json', 'x/*']
+    self.mocked_list.side_effect = lambda prefix, **unused_kwargs: (
+        fake_listed_objects({
+            'p/dt=2021-05-0': ['p/dt=2021-05-01/a.json',
+                               'p/dt=2021-05-01/b.csv'],
+            'p/x/': ['p/x/c']}[prefix]))
+    with mock.patch.object(gcs_hook.GoogleCloudStorageHook, 'get_blob_events',
+                           autospec=True, return_value=[{'a': 1}]):
+      blobs = list(self.gcs_hook.events_blobs_generator())
+
+    self.assertListEqual([blb.location for blb in blobs],
+                         ['gs://bucket/p/dt=2021-05-01/a.json',
+                          'gs://bucket/p/x/c'])
+    self.assertListEqual(
+        [call.kwargs['prefix'] for call in self.mocked_list.call_args_list],
+        ['p/dt=2021-05-0', 'p/x/'])
+
+  def test_events_blobs_generator_lists_from_last_processed_name(self):
+    self.gcs_hook.list_from_last_processed = True
+    self.mocked_list.return_value = fake_listed_objects(['blob_2', 'blob_3'])
+    processed_blobs = iter([('gs://bucket/blob_1', '0', '1'),
+                            ('gs://bucket/blob_2', '0', '1')])
+    with mock.patch.object(gcs_hook.GoogleCloudStorageHook, 'get_blob_events',
+                           autospec=True, return_value=[{'a': 1}]):
+      blobs = list(self.gcs_hook.events_blobs_generator(
+          processed_blobs_generator=processed_blobs))
+
+    self.assertListEqual([blb.location for blb in blobs],
+                         ['gs://bucket/blob_3'])
+    self.assertEqual(self.mocked_list.call_args.kwargs['start_offset'],
+                     'blob_2')
+
+  def test_events_blobs_generator_lists_from_last_processed_name_of_shard(
+      self):
+    self.gcs_hook.list_from_last_processed = True
+    names = [f'blob_{i}' for i in range(20)]
+    self.gcs_hook.set_shard(0, 2)
+    shard_names = [name for name in names
+                   if shard_utils.is_name_in_shard(name, 0, 2)]
+    other_names = [name for name in names if name not in shard_names]
+    processed_blobs = iter(
+        [('gs://bucket/' + shard_names[0], '0', '1')] +
+        [('gs://bucket/' + name, '0', '1') for name in other_names])
+    self.mocked_list.return_value = []
+
+    list(self.gcs_hook.events_blobs_generator(
+        processed_blobs_generator=processed_blobs))
+
+    self.assertEqual(self.mocked_list.call_args.kwargs['start_offset'],
+                     shard_names[0])
+
+  def test_events_blobs_generator_reads_overwritten_objects_again(self):
+    self.mocked_list.return_value = fake_listed_objects(['blob_1', 'blob_2'],
+                                                        generation=8)
+    processed_blobs = iter([
+        ('gs://bucket/blob_1', '0', '{"num_rows": 1, "generation": 7}'),
+        ('gs://bucket/blob_2', '0', '{"num_rows": 1, "generation": 8}')])
+    with mock.patch.object(gcs_hook.GoogleCloudStorageHook, 'get_blob_events',
+                           autospec=True, return_value=[{'a': 1}]):
+      blobs = list(self.gcs_hook.events_blobs_generator(
+          processed_blobs_generator=processed_blobs))
+
+    self.assertListEqual([(blb.location, blb.checkpoint) for blb in blobs],
+                         [('gs://bucket/blob_1', {'generation': 8})])
+
+  def test_get_location_of_shard(self):
+    with mock.patch.object(gcp_api_base_hook.GoogleCloudBaseHook, '__init__',
+                           autospec=True):
+      shard_hook = gcs_hook.GoogleCloudStorageHook(
+          gcs_bucket='bucket', gcs_content_type='JSON', gcs_prefix='prefix',
+          shard_index=0, num_shards=2)
+
+    self.assertEqual(shard_hook.get_location(),
+                     'gs://bucket/prefix#shard-0-of-2')
+
+  def test_events_blobs_generator_coalesces_objects_by_rows(self):
+    self.mocked_list.return_value = fake_listed_objects(
+        [f'blob_{i}' for i in range(5)])
+    self.gcs_hook.coalesce_max_rows = 4
+    with mock.patch.object(gcs_hook.GoogleCloudStorageHook, 'get_blob_events',
+                           autospec=True, return_value=[{'a': 1}, {'a': 2}]):
+      blobs = list(self.gcs_hook.events_blobs_generator())
+
+    self.assertListEqual([len(blb.events) for blb in blobs], [4, 4, 2])
+    self.assertIsInstance(blobs[0], blob_batching.CoalescedBlob)
+    self.assertListEqual(
+        [piece.location for piece in blob_batching.flatten_pieces(blobs)],
+        [f'gs://bucket/blob_{i}' for i in range(5)])
+
+  def test_events_blobs_generator_coalesces_objects_by_bytes(self):
+    self.mocked_list.return_value = fake_listed_objects(
+        ['blob_1', 'blob_2', 'blob_3'])
+    self.gcs_hook.coalesce_max_bytes = 20
+    self.patched_chunk_generator.side_effect = (
+        lambda *unused_args, **unused_kwargs: fake_generator([b'{"a": 1}\n']))
+
+    blobs = list(self.gcs_hook.events_blobs_generator())
+
+    self.assertListEqual(
+        [[piece.location for piece in blob_batching.flatten_pieces([blb])]
+         for blb in blobs],
+        [['gs://bucket/blob_1', 'gs://bucket/blob_2'], ['gs://bucket/blob_3']])
+    self.assertListEqual(blobs[1].events, [{'a': 1}])
+
+  def test_events_blobs_generator_streams_blobs_with_positions(self):
+    self.mocked_list.return_value = fake_listed_objects(['blob_1'])
+    self.gcs_hook.stream_blob_rows = 2
+    self.patched_chunk_generator.return_value = fake_generator(
+        [b'{"a": 0}\n{"a": 1}\n{"a":', b' 2}\n{"a": 3}\n{"a": 4}'])
+
+    blobs = list(self.gcs_hook.events_blobs_generator())
+
+    self.assertListEqual(
+        [(blb.location, blb.position, blb.events) for blb in blobs],
+        [('gs://bucket/blob_1', 0, [{'a': 0}, {'a': 1}]),
+         ('gs://bucket/blob_1', 2, [{'a': 2}, {'a': 3}]),
+         ('gs://bucket/blob_1', 4, [{'a': 4}])])
+
+  def test_events_blobs_generator_streams_blobs_with_checkpoints(self):
+    self.mocked_list.return_value = fake_listed_objects(['blob_1'])
+    self.gcs_hook.stream_blob_rows = 2
+    self.patched_chunk_generator.return_value = fake_generator(
+        [b'{"a": 0}\n{"a": 1}\n{"a":', b' 2}\n{"a": 3}\n{"a": 4}'])
+
+    blobs = list(self.gcs_hook.events_blobs_generator())
+
+    self.assertListEqual([blb.checkpoint for blb in blobs],
+                         [{'end_byte': 18}, {'end_byte': 36}, {'end_byte': 44}])
+
+  def test_events_blobs_generator_resumes_streamed_blobs(self):
+    self.mocked_list.return_value = fake_listed_objects(['blob_1', 'blob_2'])
+    self.gcs_hook.stream_blob_rows = 2
+    self.patched_chunk_generator.return_value = fake_generator(
+        [b'{"a": 2}\n'])
+    processed_blobs = iter([
+        ('gs://bucket/blob_1', '0', '{"num_rows": 2, "end_byte": 18}'),
+        ('gs://bucket/blob_2', '0', '1000')])
+
+    blobs = list(self.gcs_hook.events_blobs_generator(
+        processed_blobs_generator=processed_blobs))
+
+    self.assertListEqual(
+        [(blb.location, blb.position, blb.events) for blb in blobs],
+        [('gs://bucket/blob_1', 2, [{'a': 2}])])
+    self.patched_chunk_generator.assert_called_once_with(
+        self.gcs_hook, blob_name='blob_1', start_byte=18)
+
+  def test_events_blobs_generator_skips_streamed_blobs_read_to_the_end(self):
+    self.mocked_list.return_value = fake_listed_objects(['blob_1'])
+    self.gcs_hook.stream_blob_rows = 2
+    self.patched_chunk_generator.return_value = fake_generator([])
+    processed_blobs = iter([
+        ('gs://bucket/blob_1', '0', '{"num_rows": 2, "end_byte": 18}')])
+
+    blobs = list(self.gcs_hook.events_blobs_generator(
+        processed_blobs_generator=processed_blobs))
+
+    self.assertListEqual(blobs, [])
+
+  def test_get_monitored_location_prefix(self):
+    self.gcs_hook.prefix = 'prefix'
+
+    self.assertEqual(self.gcs_hook.get_monitored_location_prefix(),
+                     'gs://bucket/prefix')
+
+  def test_events_blobs_generator_streams_before_download_completes(self):
+    self.mocked_list.return_value = fake_listed_objects(['blob_1'])
+    self.gcs_hook.stream_blob_rows = 1
+    downloaded_chunks = []
+
+    def chunk_generator(*unused_args, **unused_kwargs):
+      for chunk in (b'{"a": 0}\n', b'{"a": 1}\n'):
+        downloaded_chunks.append(chunk)
+        yield chunk
+    self.patched_chunk_generator.side_effect = chunk_generator
+
+    first_blob = next(self.gcs_hook.events_blobs_generator())
+
+    self.assertListEqual(first_blob.events, [{'a': 0}])
+    self.assertEqual(len(downloaded_chunks), 1)
+
+  def test_events_blobs_generator_streams_objects_of_object_workers(self):
+    self.mocked_list.return_value = fake_listed_objects(['blob_1', 'blob_2'])
+    self.gcs_hook.stream_blob_rows = 1
+    self.gcs_hook.object_workers = 2
+    downloaded_chunks = []
+
+    def chunk_generator(*unused_args, **unused_kwargs):
+      for i in range(20):
+        downloaded_chunks.append(i)
+        yield b'{"a": %d}\n' % i
+    self.patched_chunk_generator.side_effect = chunk_generator
+
+    blobs = self.gcs_hook.events_blobs_generator()
+    first_blob = next(blobs)
+    time.sleep(0.2)
+    blobs.close()
+
+    # Every object in flight only buffers a few blobs ahead of the consumer.
+    self.assertListEqual(first_blob.events, [{'a': 0}])
+    self.assertLess(len(downloaded_chunks), 10)
+
   def test_events_blobs_generator_with_erroneouse_blobs(self):
-    self.mocked_list.return_value = ['blob_1']
+    self.mocked_list.return_value = fake_listed_objects(['blob_1'])
     error = errors.DataInConnectorBlobParseError(msg='bad_blob')
     with mock.patch.object(gcs_hook.GoogleCloudStorageHook, 'get_blob_events',
                            autospec=True, side_effect=error):
@@ -238,7 +637,7 @@ class JSONGoogleCloudStorageHookTest(unittest.TestCase):
       self.assertListEqual(list(blobs_generator), [])
 
   def test_events_blobs_generator_raises_data_in_connector_error(self):
-    self.mocked_list.side_effect = errors.DataInConnectorError()
+    self.mocked_list.side_effect = api_exceptions.ServiceUnavailable('')
 
     with self.assertRaises(errors.DataInConnectorError):
       self.gcs_hook.events_blobs_generator().__next__()
@@ -262,8 +661,8 @@ class CSVGoogleCloudStorageHookTest(unittest.TestCase):
                                          autospec=True).start()
     self.mocked_conn.return_value.objects = mock.MagicMock()
 
-    self.mocked_list = mock.patch.object(base_gcs_hook.GoogleCloudStorageHook,
-                                         'list', autospec=True).start()
+    self.mocked_list = (
+        self.mocked_conn.return_value.bucket.return_value.list_blobs)
 
     self.patched_chunk_generator = mock.patch.object(
         gcs_hook.GoogleCloudStorageHook, '_gcs_blob_chunk_generator',
@@ -352,7 +751,8 @@ class CSVGoogleCloudStorageHookTest(unittest.TestCase):
                                               self.gcs_hook.content_type))
 
   def test_events_blobs_generator(self):
-    self.mocked_list.return_value = ['blob_1', 'blob_2', 'blob_3']
+    self.mocked_list.return_value = fake_listed_objects(
+        ['blob_1', 'blob_2', 'blob_3'])
     expected = [{'a': 1}]
     with mock.patch.object(gcs_hook.GoogleCloudStorageHook, 'get_blob_events',
                            autospec=True, return_value=expected):
@@ -364,7 +764,7 @@ class CSVGoogleCloudStorageHookTest(unittest.TestCase):
            ) for i in range(1, 4)])
 
   def test_events_blobs_generator_with_erroneous_blobs(self):
-    self.mocked_list.return_value = ['blob_1']
+    self.mocked_list.return_value = fake_listed_objects(['blob_1'])
     error = errors.DataInConnectorBlobParseError(msg='bad_blob')
     with mock.patch.object(gcs_hook.GoogleCloudStorageHook, 'get_blob_events',
                            autospec=True, side_effect=error):
@@ -373,13 +773,97 @@ class CSVGoogleCloudStorageHookTest(unittest.TestCase):
       self.assertListEqual(list(blobs_generator), [])
 
   def test_events_blobs_generator_raises_data_in_connector_error(self):
-    self.mocked_list.side_effect = errors.DataInConnectorError()
+    self.mocked_list.side_effect = api_exceptions.ServiceUnavailable('')
 
     with self.assertRaises(errors.DataInConnectorError):
       self.gcs_hook.events_blobs_generator().__next__()
 
+  def test_events_blobs_generator_streams_csv_blobs(self):
+    self.mocked_list.return_value = fake_listed_objects(['blob_1'])
+    self.gcs_hook.stream_blob_rows = 2
+    self.patched_chunk_generator.return_value = fake_generator(
+        [b'a,b\n1,2\n3,', b'4\n5,6\n'])
+
+    blobs = list(self.gcs_hook.events_blobs_generator())
+
+    self.assertListEqual(
+        [(blb.position, blb.events) for blb in blobs],
+        [(0, [{'a': '1', 'b': '2'}, {'a': '3', 'b': '4'}]),
+         (2, [{'a': '5', 'b': '6'}])])
+
+  def test_events_blobs_generator_resumes_streamed_csv_blobs(self):
+    self.mocked_list.return_value = fake_listed_objects(['blob_1'])
+    self.gcs_hook.stream_blob_rows = 2
+
+    def chunk_generator(unused_self, blob_name, start_byte=0,
+                        chunk_size=None):
+      del blob_name, chunk_size  # Unused.
+      yield b'a,b\n1,2\n3,4\n'[start_byte:]
+    self.patched_chunk_generator.side_effect = chunk_generator
+    processed_blobs = iter([
+        ('gs://bucket/blob_1', '0', '{"num_rows": 1, "end_byte": 8}')])
+
+    blobs = list(self.gcs_hook.events_blobs_generator(
+        processed_blobs_generator=processed_blobs))
+
+    self.assertListEqual(
+        [(blb.position, blb.events, blb.checkpoint) for blb in blobs],
+        [(1, [{'a': '3', 'b': '4'}], {'end_byte': 12})])
+
+  def test_parses_quoted_fields(self):
+    self.patched_chunk_generator.return_value = fake_generator(
+        [b'a,b\n"1,2","say ""hi"""\n'])
+
+    events = self.gcs_hook.get_blob_events(blob_name='blob')
+
+    self.assertListEqual(events, [{'a': '1,2', 'b': 'say "hi"'}])
+
+  def test_joins_quoted_line_breaks_across_chunks(self):
+    self.mocked_list.return_value = fake_listed_objects(['blob_1'])
+    self.gcs_hook.stream_blob_rows = 1
+    self.patched_chunk_generator.return_value = fake_generator(
+        [b'a,b\n1,"x\ny', b'\nz"\n2,w\n'])
+
+    blobs = list(self.gcs_hook.events_blobs_generator())
+
+    self.assertListEqual(
+        [(blb.position, blb.events, blb.checkpoint) for blb in blobs],
+        [(0, [{'a': '1', 'b': 'x\ny\nz'}], {'end_byte': 14}),
+         (1, [{'a': '2', 'b': 'w'}], {'end_byte': 18})])
+
+  def test_converts_typed_columns(self):
+    self.gcs_hook.csv_column_types = gcs_hook._parse_csv_schema(
+        '{"a": "integer", "b": "FLOAT", "c": "BOOL"}')
+    self.patched_chunk_generator.return_value = fake_generator(
+        [b'a,b,c,d\n1,2.5,true,x\n,,0,\n'])
+
+    events = self.gcs_hook.get_blob_events(blob_name='blob')
+
+    self.assertListEqual(events, [
+        {'a': 1, 'b': 2.5, 'c': True, 'd': 'x'},
+        {'a': None, 'b': None, 'c': False, 'd': ''}])
+
+  def test_raises_error_when_typed_column_is_invalid(self):
+    self.gcs_hook.csv_column_types = {'a': 'INTEGER'}
+    self.patched_chunk_generator.return_value = fake_generator(
+        [b'a,b\n1,2\nx,3\n'])
+
+    with self.assertRaises(errors.DataInConnectorBlobParseError):
+      self.gcs_hook.get_blob_events(blob_name='blob')
+
+  def test_raises_error_when_csv_schema_is_invalid(self):
+    with mock.patch.object(gcp_api_base_hook.GoogleCloudBaseHook, '__init__',
+                           autospec=True):
+      for csv_schema in ('[]', '{"a": "DATE"}', 'not json'):
+        with self.assertRaises(errors.DataInConnectorValueError):
+          gcs_hook.GoogleCloudStorageHook(
+              gcs_bucket='bucket',
+              gcs_content_type=gcs_hook.BlobContentTypes.CSV.name,
+              gcs_prefix='', gcs_csv_schema=csv_schema)
+
   def test_events_blobs_generator_read_once(self):
-    self.mocked_list.return_value = ['blob_1', 'blob_2', 'blob_3', 'blob_4']
+    self.mocked_list.return_value = fake_listed_objects(
+        ['blob_1', 'blob_2', 'blob_3', 'blob_4'])
     events = [{'a': 1}]
     expected = [
         ([{
@@ -391,7 +875,8 @@ class CSVGoogleCloudStorageHookTest(unittest.TestCase):
     ]
     with mock.patch.object(gcs_hook.GoogleCloudStorageHook, 'get_blob_events',
                            autospec=True, return_value=events):
-      processed_files = [('blob_2', '1000'), ('blob_3', '1000')]
+      processed_files = [('gs://bucket/blob_2', '0', '1000'),
+                         ('gs://bucket/blob_3', '0', '1000')]
       processed_generator = (
           processed_files[i] for i in range(0, len(processed_files)))
       blobs_generator = self.gcs_hook.events_blobs_generator(
@@ -403,6 +888,315 @@ class CSVGoogleCloudStorageHookTest(unittest.TestCase):
       self.assertListEqual(expected, actual)
 
 
+
+class JSONArrayGoogleCloudStorageHookTest(unittest.TestCase):
+
+  def setUp(self):
+    super(JSONArrayGoogleCloudStorageHookTest, self).setUp()
+    self.addCleanup(mock.patch.stopall)
+
+    with mock.patch.object(gcp_api_base_hook.GoogleCloudBaseHook, '__init__',
+                           autospec=True):
+      self.gcs_hook = gcs_hook.GoogleCloudStorageHook(
+          gcs_bucket='bucket',
+          gcs_content_type=gcs_hook.BlobContentTypes.JSON_ARRAY.name,
+          gcs_prefix='', gcs_json_array_path='data.rows')
+
+    self.mocked_conn = mock.patch.object(base_gcs_hook.GoogleCloudStorageHook,
+                                         'get_conn',
+                                         autospec=True).start()
+    self.mocked_list = (
+        self.mocked_conn.return_value.bucket.return_value.list_blobs)
+
+    self.patched_chunk_generator = mock.patch.object(
+        gcs_hook.GoogleCloudStorageHook, '_gcs_blob_chunk_generator',
+        autospec=True).start()
+
+  def test_blob_loaded_successfully(self):
+    self.patched_chunk_generator.return_value = fake_generator(
+        [b'{"data": {"rows": [{"a": 1}, {"a": ', b'"]"}]}}'])
+
+    events = self.gcs_hook.get_blob_events(blob_name='blob')
+
+    self.assertListEqual(events, [{'a': 1}, {'a': ']'}])
+
+  def test_stops_downloading_after_array(self):
+    chunks = fake_generator([b'{"data": {"rows": [1]}, ', b'"other": 1}'])
+    self.patched_chunk_generator.return_value = chunks
+
+    events = self.gcs_hook.get_blob_events(blob_name='blob')
+
+    self.assertListEqual(events, [1])
+    self.assertEqual(next(chunks), b'"other": 1}')
+
+  def test_events_blobs_generator_skips_blob_without_array(self):
+    self.mocked_list.return_value = fake_listed_objects(['blob_1', 'blob_2'])
+    self.patched_chunk_generator.side_effect = [
+        fake_generator([b'{"data": {"rows": [1, 2']),
+        fake_generator([b'{"data": {"rows": [3]}}'])]
+
+    blobs = list(self.gcs_hook.events_blobs_generator())
+
+    self.assertListEqual([(blb.location, blb.events) for blb in blobs],
+                         [('gs://bucket/blob_2', [3])])
+
+  def test_events_blobs_generator_resumes_streamed_blobs(self):
+    self.mocked_list.return_value = fake_listed_objects(['blob_1'])
+    self.gcs_hook.stream_blob_rows = 1
+    content = b'{"data": {"rows": [{"a": 1}, {"a": 2}]}}'
+
+    def chunk_generator(unused_self, blob_name, start_byte=0,
+                        chunk_size=None):
+      del blob_name, chunk_size  # Unused.
+      yield content[start_byte:]
+    self.patched_chunk_generator.side_effect = chunk_generator
+    processed_blobs = iter([
+        ('gs://bucket/blob_1', '0', '{"num_rows": 1, "end_byte": 27}')])
+
+    blobs = list(self.gcs_hook.events_blobs_generator(
+        processed_blobs_generator=processed_blobs))
+
+    self.assertListEqual(
+        [(blb.position, blb.events, blb.checkpoint) for blb in blobs],
+        [(1, [{'a': 2}], {'end_byte': 37})])
+
+
+def _make_parquet_content(num_rows):
+  table = pyarrow.table({'a': list(range(num_rows)),
+                         'b': [str(i) for i in range(num_rows)]})
+  sink = io.BytesIO()
+  parquet.write_table(table, sink, row_group_size=2)
+  return sink.getvalue()
+
+
+class ColumnarGoogleCloudStorageHookTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.addCleanup(mock.patch.stopall)
+
+    with mock.patch.object(gcp_api_base_hook.GoogleCloudBaseHook, '__init__',
+                           autospec=True):
+      self.parquet_hook = gcs_hook.GoogleCloudStorageHook(
+          gcs_bucket='bucket', gcs_content_type='PARQUET', gcs_prefix='')
+      if gcs_hook.fastavro is not None:
+        self.avro_hook = gcs_hook.GoogleCloudStorageHook(
+            gcs_bucket='bucket', gcs_content_type='AVRO', gcs_prefix='',
+            gcs_columns='a')
+
+    self.mocked_conn = mock.patch.object(base_gcs_hook.GoogleCloudStorageHook,
+                                         'get_conn',
+                                         autospec=True).start()
+    self.mocked_list = (
+        self.mocked_conn.return_value.bucket.return_value.list_blobs)
+    self.mocked_list.return_value = fake_listed_objects(['blob_1'])
+    self.patched_chunk_generator = mock.patch.object(
+        gcs_hook.GoogleCloudStorageHook, '_gcs_blob_chunk_generator',
+        autospec=True).start()
+    self.mock_file_blob = (
+        self.mocked_conn.return_value.bucket.return_value.get_blob.return_value)
+    self.mock_file_blob.content_encoding = None
+
+  def _fake_blob_content(self, content):
+    self.mock_file_blob.size = len(content)
+
+    def download_to_file(outio, start, end, raw_download):
+      self.assertTrue(raw_download)
+      outio.write(content[start:end + 1])
+    self.mock_file_blob.download_to_file.side_effect = download_to_file
+
+  def test_events_blobs_generator_reads_parquet_object_with_columns(self):
+    self.parquet_hook.columns = ['b']
+    self._fake_blob_content(_make_parquet_content(5))
+
+    blobs = list(self.parquet_hook.events_blobs_generator())
+
+    self.assertListEqual(
+        [(blb.location, blb.position, blb.events, blb.checkpoint)
+         for blb in blobs],
+        [('gs://bucket/blob_1', 0, [{'b': str(i)} for i in range(5)], None)])
+
+  def test_events_blobs_generator_streams_parquet_blobs_with_checkpoints(self):
+    self.parquet_hook.stream_blob_rows = 2
+    self._fake_blob_content(_make_parquet_content(5))
+
+    blobs = list(self.parquet_hook.events_blobs_generator())
+
+    self.assertListEqual(
+        [(blb.position, [event['a'] for event in blb.events], blb.checkpoint)
+         for blb in blobs],
+        [(0, [0, 1], {'end_row': 2}), (2, [2, 3], {'end_row': 4}),
+         (4, [4], {'end_row': 5})])
+
+  def test_events_blobs_generator_resumes_parquet_object_at_row(self):
+    self.parquet_hook.stream_blob_rows = 2
+    self._fake_blob_content(_make_parquet_content(5))
+    processed_blobs = iter([
+        ('gs://bucket/blob_1', '0', '{"num_rows": 3, "end_row": 3}')])
+
+    blobs = list(self.parquet_hook.events_blobs_generator(
+        processed_blobs_generator=processed_blobs))
+
+    self.assertListEqual(
+        [(blb.position, [event['a'] for event in blb.events]) for blb in blobs],
+        [(3, [3, 4])])
+
+  def test_events_blobs_generator_reads_parquet_row_groups_by_range(self):
+    sink = io.BytesIO()
+    parquet.write_table(
+        pyarrow.table({'a': list(range(1000)), 'b': ['x' * 1000] * 1000}),
+        sink, row_group_size=100, compression='NONE', use_dictionary=False)
+    content = sink.getvalue()
+    self._fake_blob_content(content)
+
+    blobs = list(self.parquet_hook.events_blobs_generator())
+
+    self.assertListEqual([event['a'] for event in blobs[0].events],
+                         list(range(1000)))
+    self.patched_chunk_generator.assert_not_called()
+    downloaded_sizes = [
+        call[1]['end'] - call[1]['start'] + 1
+        for call in self.mock_file_blob.download_to_file.call_args_list]
+    self.assertLess(max(downloaded_sizes), len(content) // 5)
+
+  def test_events_blobs_generator_reads_compressed_parquet_object(self):
+    self.mocked_list.return_value = fake_listed_objects(['blob_1.gz'])
+    self.patched_chunk_generator.return_value = fake_generator(
+        [_make_parquet_content(3)])
+
+    blobs = list(self.parquet_hook.events_blobs_generator())
+
+    self.assertListEqual([event['a'] for event in blobs[0].events], [0, 1, 2])
+    self.mock_file_blob.download_to_file.assert_not_called()
+
+  def test_events_blobs_generator_skips_bad_parquet_object(self):
+    self._fake_blob_content(b'not parquet')
+
+    self.assertListEqual(list(self.parquet_hook.events_blobs_generator()), [])
+
+  def test_events_blobs_generator_raises_error_on_bad_object_without_skip(self):
+    self.parquet_hook.skip_failed_objects = False
+    self._fake_blob_content(b'not parquet')
+
+    with self.assertRaises(errors.DataInConnectorBlobParseError):
+      list(self.parquet_hook.events_blobs_generator())
+
+  @unittest.skipIf(gcs_hook.fastavro is None, 'fastavro is not installed.')
+  def test_events_blobs_generator_streams_avro_blobs_with_columns(self):
+    self.avro_hook.stream_blob_rows = 2
+    schema = {'type': 'record', 'name': 'event',
+              'fields': [{'name': 'a', 'type': 'int'},
+                         {'name': 'b', 'type': 'string'}]}
+    sink = io.BytesIO()
+    gcs_hook.fastavro.writer(sink, schema,
+                             [{'a': i, 'b': str(i)} for i in range(3)])
+    content = sink.getvalue()
+    self.patched_chunk_generator.return_value = fake_generator(
+        [content[:7], content[7:]])
+
+    blobs = list(self.avro_hook.events_blobs_generator())
+
+    self.assertListEqual(
+        [(blb.position, blb.events) for blb in blobs],
+        [(0, [{'a': 0}, {'a': 1}]), (2, [{'a': 2}])])
+
+  def test_raise_error_for_avro_content_type_without_fastavro(self):
+    with mock.patch.object(gcs_hook, 'fastavro', None):
+      with self.assertRaises(errors.DataInConnectorValueError):
+        gcs_hook.GoogleCloudStorageHook(gcs_bucket='bucket',
+                                        gcs_content_type='AVRO',
+                                        gcs_prefix='')
+
+
+class ResumeOffsetsTest(unittest.TestCase):
+
+  def test_get_resume_offsets(self):
+    processed_blobs = [
+        ('gs://bucket/a', '2', '{"num_rows": 2, "end_byte": 30}'),
+        ('gs://bucket/a', '0', '{"num_rows": 2, "end_byte": 15}'),
+        ('gs://bucket/b', '0', '1000'),
+        ('gs://bucket/c', '0', '{"num_rows": 2}'),
+        ('gs://bucket/d', '0', '{"num_rows": 2, "end_row": 2}'),
+        ('gs://bucket/e', '0', '{"num_rows": 2, "generation": 7}'),
+        ('gs://bucket/e', '0',
+         '{"num_rows": 1, "end_byte": 5, "generation": 8}')]
+
+    self.assertDictEqual(
+        gcs_hook._get_resume_offsets(processed_blobs),
+        {('gs://bucket/a', None): (4, 30), ('gs://bucket/b', None): None,
+         ('gs://bucket/d', None): (2, 0), ('gs://bucket/e', 7): None,
+         ('gs://bucket/e', 8): (1, 5)})
+
+  def test_get_object_resume_offsets(self):
+    resume_offsets = {('gs://bucket/a', None): None,
+                      ('gs://bucket/b', 7): None,
+                      ('gs://bucket/b', 8): (1, 5)}
+
+    self.assertIsNone(gcs_hook._get_object_resume_offsets(
+        resume_offsets, 'gs://bucket/a', 3))
+    self.assertIsNone(gcs_hook._get_object_resume_offsets(
+        resume_offsets, 'gs://bucket/b', 7))
+    self.assertEqual(gcs_hook._get_object_resume_offsets(
+        resume_offsets, 'gs://bucket/b', 8), (1, 5))
+    self.assertEqual(gcs_hook._get_object_resume_offsets(
+        resume_offsets, 'gs://bucket/b', 9), (0, 0))
+
+  def test_get_listing_prefixes(self):
+    self.assertListEqual(gcs_hook._get_listing_prefixes('p/', []), ['p/'])
+    self.assertListEqual(
+        gcs_hook._get_listing_prefixes(
+            'p/', ['dt=2021-05-*/*.json', 'dt=2021-05-0?/x', 'dt=2021-04-30/*',
+                   'a[0-9]*']),
+        ['p/a', 'p/dt=2021-04-30/', 'p/dt=2021-05-'])
+
+
+class GoogleCloudStorageHookParseTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.addCleanup(mock.patch.stopall)
+    mock.patch.object(gcs_hook, '_PARSE_CHUNK_SIZE', 2).start()
+
+    with mock.patch.object(gcp_api_base_hook.GoogleCloudBaseHook, '__init__',
+                           autospec=True):
+      self.json_hook = gcs_hook.GoogleCloudStorageHook(
+          gcs_bucket='bucket', gcs_content_type='JSON', gcs_prefix='prefix')
+      self.csv_hook = gcs_hook.GoogleCloudStorageHook(
+          gcs_bucket='bucket', gcs_content_type='CSV', gcs_prefix='prefix')
+
+  def test_parse_json_events_in_parse_executor(self):
+    lines = [json.dumps({'a': i}).encode() for i in range(7)]
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=2) as executor:
+      self.json_hook.set_parse_executor(executor, max_pending=2)
+      events = self.json_hook._parse_events_by_content_type(lines)
+
+    self.assertListEqual(events, [{'a': i} for i in range(7)])
+
+  def test_parse_csv_events_in_parse_executor(self):
+    lines = [b'a,b'] + [f'{i},{i + 1}'.encode() for i in range(5)]
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=2) as executor:
+      self.csv_hook.set_parse_executor(executor, max_pending=2)
+      events = self.csv_hook._parse_events_by_content_type(lines)
+
+    self.assertListEqual(
+        events, [{'a': str(i), 'b': str(i + 1)} for i in range(5)])
+
+  def test_parse_events_in_parse_executor_raises_parse_error(self):
+    lines = [b'{"a": 1}', b'{"a": 2}', b'not json']
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=2) as executor:
+      self.json_hook.set_parse_executor(executor, max_pending=2)
+      with self.assertRaises(errors.DataInConnectorBlobParseError):
+        self.json_hook._parse_events_by_content_type(lines)
+
+  def test_parse_events_without_parse_executor(self):
+    lines = [b'a,b', b'1,2', b'3']
+
+    with self.assertRaises(errors.DataInConnectorBlobParseError):
+      self.csv_hook._parse_events_by_content_type(lines)
+
+
 if __name__ == '__main__':
   unittest.main()
-
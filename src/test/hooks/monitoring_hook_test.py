@@ -204,6 +204,17 @@ class MonitoringHookTest(unittest.TestCase):
         project_id=self.project_id, dataset_id=self.dataset_id,
         table_id=self.table_id, rows=[{'json': self.expected_blob_row}])
 
+  def test_store_blob_with_checkpoint(self):
+    self.hook.store_blob(dag_name=self.expected_blob_row['dag_name'],
+                         timestamp=self.expected_blob_row['timestamp'],
+                         location=self.expected_blob_row['location'],
+                         position=self.expected_blob_row['position'],
+                         num_rows=20, checkpoint={'end_byte': 300})
+
+    row = self.mock_cursor_obj.insert_all.call_args[1]['rows'][0]['json']
+    self.assertDictEqual(json.loads(row['info']),
+                         {'num_rows': 20, 'end_byte': 300})
+
   def test_store_blobs_creates_timestamp_when_none_provided(self):
     self.expected_blob_row['timestamp'] = (monitoring_hook.
                                            _generate_zone_aware_timestamp())
@@ -300,6 +311,50 @@ class MonitoringHookTest(unittest.TestCase):
       self.hook.store_retry(dag_name=self.expected_retry_row['dag_name'],
                             location=self.expected_retry_row['location'])
 
+  def test_store_watermark(self):
+    expected_watermark_row = {
+        'dag_name': self.dag_name,
+        'timestamp': '20201103180000',
+        'type_id': monitoring_hook.MonitoringEntityMap.WATERMARK.value,
+        'location': 'https://input/resource',
+        'position': '',
+        'info': '2021-01-02 03:04:05+00'}
+
+    self.hook.store_watermark(dag_name=self.dag_name,
+                              timestamp='20201103180000',
+                              location='https://input/resource',
+                              watermark='2021-01-02 03:04:05+00')
+
+    self.mock_cursor_obj.insert_all.assert_called_once_with(
+        project_id=self.project_id, dataset_id=self.dataset_id,
+        table_id=self.table_id, rows=[{'json': expected_watermark_row}])
+
+  def test_store_watermark_handles_storing_error(self):
+    self.mock_cursor_obj.insert_all.side_effect = exceptions.AirflowException()
+
+    with self.assertRaises(errors.MonitoringAppendLogError):
+      self.hook.store_watermark(dag_name=self.dag_name,
+                                location='https://input/resource',
+                                watermark='10')
+
+  def test_get_watermark_returns_last_stored_watermark(self):
+    self.hook.dag_name = self.dag_name
+    self.hook.input_location = 'https://input/resource'
+    self.mock_cursor_obj.execute = mock.MagicMock()
+    self.mock_cursor_obj.fetchone.side_effect = [('10',), None]
+
+    self.assertEqual(self.hook.get_watermark(), '10')
+    self.assertDictEqual(
+        self.mock_cursor_obj.execute.call_args[0][1],
+        {'dag_name': self.dag_name, 'location': 'https://input/resource',
+         'type_id': monitoring_hook.MonitoringEntityMap.WATERMARK.value})
+
+  def test_get_watermark_returns_none_without_stored_watermark(self):
+    self.mock_cursor_obj.execute = mock.MagicMock()
+    self.mock_cursor_obj.fetchone.side_effect = [None]
+
+    self.assertIsNone(self.hook.get_watermark())
+
   def test_generate_processed_blobs_position_ranges(self):
     self.mock_cursor_obj.execute = mock.MagicMock()
     self.mock_cursor_obj.fetchone.side_effect = [('0', '1000'),
@@ -311,6 +366,23 @@ class MonitoringHookTest(unittest.TestCase):
     with self.assertRaises(StopIteration):
       next(gen)
     self.mock_cursor_obj.execute.assert_called_once()
+    self.assertIn('ORDER BY SAFE_CAST(`position` AS INT64)',
+                  self.mock_cursor_obj.execute.call_args[0][0])
+
+  def test_generate_processed_blobs_checkpoints(self):
+    self.mock_cursor_obj.execute = mock.MagicMock()
+    self.mock_cursor_obj.fetchone.side_effect = [
+        ('gs://bucket/prefix/a', '0', '{"num_rows": 2, "end_byte": 20}'),
+        ('gs://bucket/prefix/b', '0', '1000'), None]
+    gen = self.hook.generate_processed_blobs_checkpoints('gs://bucket/prefix')
+
+    self.assertListEqual(
+        list(gen),
+        [('gs://bucket/prefix/a', '0', '{"num_rows": 2, "end_byte": 20}'),
+         ('gs://bucket/prefix/b', '0', '1000')])
+    self.assertEqual(
+        self.mock_cursor_obj.execute.call_args[0][1]['location_prefix'],
+        'gs://bucket/prefix')
 
   def test_events_blobs_generator(self):
     self.mock_cursor_obj.execute = mock.MagicMock()
@@ -372,15 +444,26 @@ class MonitoringHookTest(unittest.TestCase):
 
       self.hook.store_retry.assert_not_called()
 
+  def _cleanup_condition(self):
+    """Returns the condition of cleanups, which keeps the newest watermarks."""
+    return ('`timestamp`<%(cutoff_timestamp)s AND '
+            '(`type_id`!=%(watermark_type_id)s OR EXISTS(SELECT 1 '
+            f'FROM `{self.dataset_id}.{self.table_id}` AS newer '
+            'WHERE newer.`type_id`=%(watermark_type_id)s '
+            ' AND newer.`dag_name`=monitoring.`dag_name` '
+            ' AND newer.`location`=monitoring.`location` '
+            ' AND newer.`timestamp`>monitoring.`timestamp`))')
+
   def test_cleanup_by_days_to_live(self):
     time_to_live = 1
     self.hook.dag_name = 'bq_to_cm_dag'
     cutoff_timestamp = (datetime.datetime.utcnow() - datetime.timedelta(
         days=time_to_live)).isoformat() + 'Z'
-    cleanup_sql = (f'DELETE FROM `{self.dataset_id}.{self.table_id}` WHERE '
-                   f'`timestamp`<%(cutoff_timestamp)s AND '
+    cleanup_sql = (f'DELETE FROM `{self.dataset_id}.{self.table_id}` '
+                   f'AS monitoring WHERE {self._cleanup_condition()} AND '
                    'dag_name="bq_to_cm_dag"')
-    params = {'cutoff_timestamp': cutoff_timestamp}
+    params = {'cutoff_timestamp': cutoff_timestamp,
+              'watermark_type_id': -5}
 
     self.mock_cursor_obj.execute = mock.MagicMock()
 
@@ -394,9 +477,10 @@ class MonitoringHookTest(unittest.TestCase):
     self.hook.dag_name = 'tcrm_monitoring_cleanup'
     cutoff_timestamp = (datetime.datetime.utcnow() - datetime.timedelta(
         days=time_to_live)).isoformat() + 'Z'
-    cleanup_sql = (f'DELETE FROM `{self.dataset_id}.{self.table_id}` WHERE '
-                   f'`timestamp`<%(cutoff_timestamp)s')
-    params = {'cutoff_timestamp': cutoff_timestamp}
+    cleanup_sql = (f'DELETE FROM `{self.dataset_id}.{self.table_id}` '
+                   f'AS monitoring WHERE {self._cleanup_condition()}')
+    params = {'cutoff_timestamp': cutoff_timestamp,
+              'watermark_type_id': -5}
 
     self.mock_cursor_obj.execute = mock.MagicMock()
 
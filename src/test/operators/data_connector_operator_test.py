@@ -15,6 +15,9 @@
 
 """Tests for tcrm.operators.datastore_operator."""
 
+import concurrent.futures
+import os
+import tempfile
 import unittest
 from unittest import mock
 
@@ -22,7 +25,9 @@ from airflow.contrib.hooks import gcp_api_base_hook
 
 from plugins.pipeline_plugins.hooks import monitoring_hook
 from plugins.pipeline_plugins.operators import data_connector_operator
+from plugins.pipeline_plugins.utils import adaptive_sizing
 from plugins.pipeline_plugins.utils import blob
+from plugins.pipeline_plugins.utils import blob_batching
 from plugins.pipeline_plugins.utils import errors
 from plugins.pipeline_plugins.utils import hook_factory
 
@@ -38,6 +43,8 @@ class DataConnectorOperatorTest(unittest.TestCase):
   def setUp(self):
     super().setUp()
     self.addCleanup(mock.patch.stopall)
+    self.temp_dir = tempfile.TemporaryDirectory()
+    self.addCleanup(self.temp_dir.cleanup)
 
     self.test_operator_kwargs = {'task_id': 'test_task_id',
                                  'tcrm_gcs_to_ga_schedule': '@once',
@@ -51,6 +58,14 @@ class DataConnectorOperatorTest(unittest.TestCase):
         hook_factory, 'get_input_hook', autospec=True).start()
     self.mock_hook_factory_output = mock.patch.object(
         hook_factory, 'get_output_hook', autospec=True).start()
+    (self.mock_hook_factory_input.return_value.get_monitored_location_prefix
+     .return_value) = None
+    (self.mock_hook_factory_output.return_value.get_payload_builder
+     .return_value) = None
+    (self.mock_hook_factory_output.return_value.get_event_validator
+     .return_value) = None
+    self.mock_hook_factory_input.return_value.is_incremental.return_value = (
+        False)
 
     self.original_gcp_hook_init = gcp_api_base_hook.GoogleCloudBaseHook.__init__
     gcp_api_base_hook.GoogleCloudBaseHook.__init__ = mock.MagicMock()
@@ -151,6 +166,97 @@ class DataConnectorOperatorTest(unittest.TestCase):
     self.mock_monitoring_hook.return_value.store_blob.assert_called()
     self.mock_monitoring_hook.return_value.store_events.assert_called()
 
+  def test_execute_resumes_from_checkpoints_of_monitored_location_prefix(self):
+    input_hook = self.dc_operator.input_hook
+    input_hook.get_monitored_location_prefix.return_value = 'gs://bucket/pre'
+    blb = blob.Blob(events=[self.event], location='gs://bucket/pre/a',
+                    position=2, checkpoint={'end_byte': 30})
+    input_hook.events_blobs_generator.return_value = fake_events_generator(
+        [blb])
+    self.dc_operator.output_hook.send_events.side_effect = lambda blb: blb
+
+    self.dc_operator.execute({})
+
+    monitor = self.mock_monitoring_hook.return_value
+    monitor.generate_processed_blobs_checkpoints.assert_called_once_with(
+        'gs://bucket/pre')
+    input_hook.events_blobs_generator.assert_called_with(
+        processed_blobs_generator=(
+            monitor.generate_processed_blobs_checkpoints.return_value))
+    self.assertEqual(monitor.store_blob.call_args[1]['checkpoint'],
+                     {'end_byte': 30})
+
+  def test_execute_reads_incremental_input_after_stored_watermark(self):
+    input_hook = self.dc_operator.input_hook
+    input_hook.is_incremental.return_value = True
+    input_hook.get_next_watermark.return_value = '9'
+    input_hook.events_blobs_generator.return_value = fake_events_generator(
+        [self.blob] * 2)
+    self.dc_operator.output_hook.send_events.side_effect = lambda blb: blb
+    monitor = self.mock_monitoring_hook.return_value
+    monitor.get_watermark.return_value = '5'
+    input_hook.get_monitored_location_prefix.return_value = 'bq://t#w/5/'
+
+    self.dc_operator.execute({})
+
+    input_hook.set_watermark.assert_called_once_with('5')
+    monitor.generate_processed_blobs_checkpoints.assert_called_once_with(
+        'bq://t#w/5/')
+    input_hook.events_blobs_generator.assert_called_once_with(
+        processed_blobs_generator=(
+            monitor.generate_processed_blobs_checkpoints.return_value))
+    monitor.generate_processed_blobs_ranges.assert_not_called()
+    self.assertEqual(monitor.store_blob.call_count, 2)
+    monitor.store_watermark.assert_called_once_with(
+        dag_name='dag_name', location=input_hook.get_location.return_value,
+        watermark='9')
+
+  def test_execute_does_not_store_watermark_when_sending_fails(self):
+    input_hook = self.dc_operator.input_hook
+    input_hook.is_incremental.return_value = True
+    input_hook.get_next_watermark.return_value = '9'
+    input_hook.events_blobs_generator.return_value = fake_events_generator(
+        [self.blob] * 2)
+    self.dc_operator.output_hook.send_events.side_effect = (
+        errors.DataOutConnectorError())
+
+    with self.assertRaises(errors.DataOutConnectorError):
+      self.dc_operator.execute({})
+
+    self.mock_monitoring_hook.return_value.store_watermark.assert_not_called()
+
+  def test_execute_does_not_store_watermark_without_new_events(self):
+    input_hook = self.dc_operator.input_hook
+    input_hook.is_incremental.return_value = True
+    input_hook.get_next_watermark.return_value = None
+    input_hook.events_blobs_generator.return_value = fake_events_generator([])
+
+    self.dc_operator.execute({})
+
+    self.mock_monitoring_hook.return_value.store_watermark.assert_not_called()
+
+  def test_execute_completes_transfer_of_input_after_all_blobs(self):
+    input_hook = self.dc_operator.input_hook
+    input_hook.events_blobs_generator.return_value = fake_events_generator(
+        [self.blob] * 2)
+    self.dc_operator.output_hook.send_events.side_effect = lambda blb: blb
+
+    self.dc_operator.execute({})
+
+    input_hook.complete_transfer.assert_called_once_with()
+
+  def test_execute_does_not_complete_transfer_when_sending_fails(self):
+    input_hook = self.dc_operator.input_hook
+    input_hook.events_blobs_generator.return_value = fake_events_generator(
+        [self.blob] * 2)
+    self.dc_operator.output_hook.send_events.side_effect = (
+        errors.DataOutConnectorError())
+
+    with self.assertRaises(errors.DataOutConnectorError):
+      self.dc_operator.execute({})
+
+    input_hook.complete_transfer.assert_not_called()
+
   def test_execute_when_monitoring_is_disabled(self):
     (self.dc_operator.input_hook.events_blobs_generator.
      return_value) = fake_events_generator([self.blob] * 2)
@@ -162,6 +268,158 @@ class DataConnectorOperatorTest(unittest.TestCase):
     self.mock_monitoring_hook.return_value.store_blob.assert_not_called()
     self.mock_monitoring_hook.return_value.store_events.assert_not_called()
 
+  def test_execute_with_pipeline_keeps_monitoring_order(self):
+    self.dc_operator.enable_pipeline = True
+    blobs = [blob.Blob(events=[self.event], location='blob', position=i)
+             for i in range(5)]
+    (self.dc_operator.input_hook.events_blobs_generator.
+     return_value) = fake_events_generator(blobs)
+    self.dc_operator.output_hook.send_events.side_effect = lambda blb: blb
+
+    self.dc_operator.execute({})
+
+    self.assertListEqual(
+        [call[1]['position'] for call in
+         self.mock_monitoring_hook.return_value.store_blob.call_args_list],
+        list(range(5)))
+
+  def test_execute_with_pipeline_raises_output_hook_error(self):
+    self.dc_operator.enable_pipeline = True
+    (self.dc_operator.input_hook.events_blobs_generator.
+     return_value) = fake_events_generator([self.blob] * 2)
+    self.dc_operator.output_hook.send_events.side_effect = (
+        errors.DataOutConnectorError())
+
+    with self.assertRaises(errors.DataOutConnectorError):
+      self.dc_operator.execute({})
+
+    self.mock_monitoring_hook.return_value.store_blob.assert_not_called()
+
+  def test_execute_with_max_inflight_blobs_keeps_monitoring_order(self):
+    self.dc_operator.max_inflight_blobs = 3
+    blobs = [blob.Blob(events=[self.event], location='blob', position=i)
+             for i in range(10)]
+    (self.dc_operator.input_hook.events_blobs_generator.
+     return_value) = fake_events_generator(blobs)
+    self.mock_hook_factory_output.return_value.send_events.side_effect = (
+        lambda blb: blb)
+
+    self.dc_operator.execute({})
+
+    self.assertListEqual(
+        [call[1]['position'] for call in
+         self.mock_monitoring_hook.return_value.store_blob.call_args_list],
+        list(range(10)))
+
+  def test_execute_with_max_inflight_blobs_and_pipeline(self):
+    self.dc_operator.max_inflight_blobs = 2
+    self.dc_operator.enable_pipeline = True
+    (self.dc_operator.input_hook.events_blobs_generator.
+     return_value) = fake_events_generator([self.blob] * 3)
+    self.mock_hook_factory_output.return_value.send_events.return_value = (
+        blob.Blob(events=[], location='', reports=([0], [1])))
+
+    reports = self.dc_operator.execute({})
+
+    self.assertListEqual(reports, [([0], [1])] * 3)
+
+  def test_execute_with_coalesce_batches_monitors_input_blobs(self):
+    self.dc_operator.coalesce_batches = 1
+    blobs = [blob.Blob(events=[self.event] * 3, location='blob', position=i)
+             for i in (0, 3)]
+    (self.dc_operator.input_hook.events_blobs_generator.
+     return_value) = fake_events_generator(blobs)
+    self.dc_operator.output_hook.get_max_batch_size.return_value = 4
+
+    def send_events(blb):
+      if blb.num_rows == 4:
+        blb.append_failed_event(3, blb.events[3], 10)
+      return blb
+    self.dc_operator.output_hook.send_events.side_effect = send_events
+
+    self.dc_operator.execute({})
+
+    self.assertListEqual(
+        [len(call[0][0].events) for call in
+         self.dc_operator.output_hook.send_events.call_args_list], [4, 2])
+    monitor = self.mock_monitoring_hook.return_value
+    self.assertListEqual(
+        [(call[1]['position'], call[1]['num_rows'])
+         for call in monitor.store_blob.call_args_list],
+        [(0, 3), (3, 1), (4, 2)])
+    self.assertListEqual(
+        [call[1]['id_event_error_tuple_list']
+         for call in monitor.store_events.call_args_list],
+        [[], [(3, self.event, 10)], []])
+
+  def test_execute_monitors_pieces_of_coalesced_input_blobs(self):
+    pieces = [blob.Blob(events=[self.event], location=f'blob_{i}')
+              for i in range(2)]
+    (self.dc_operator.input_hook.events_blobs_generator.
+     return_value) = fake_events_generator(
+         [blob_batching.CoalescedBlob(pieces)])
+    self.dc_operator.output_hook.send_events.side_effect = lambda blb: blb
+
+    self.dc_operator.execute({})
+
+    self.dc_operator.output_hook.send_events.assert_called_once()
+    self.assertListEqual(
+        [call[1]['location'] for call in
+         self.mock_monitoring_hook.return_value.store_blob.call_args_list],
+        ['blob_0', 'blob_1'])
+
+  def test_execute_with_max_memory_bytes_spills_and_reports_peak(self):
+    self.dc_operator.max_memory_bytes = 1
+    self.dc_operator.enable_pipeline = True
+    self.dc_operator.pipeline_queue_depth = 4
+    blobs = [blob.Blob(events=[self.event] * 2, location='blob', position=i)
+             for i in range(0, 10, 2)]
+    (self.dc_operator.input_hook.events_blobs_generator.
+     return_value) = fake_events_generator(blobs)
+    sent_events = []
+
+    def send_events(blb):
+      sent_events.extend(blb.events)
+      blb.append_failed_event(blb.position, blb.events[0], 10)
+      return blb
+    self.dc_operator.output_hook.send_events.side_effect = send_events
+
+    self.dc_operator.execute({})
+
+    self.assertListEqual(sent_events, [self.event] * 10)
+    monitor = self.mock_monitoring_hook.return_value
+    self.assertListEqual(
+        [call[1]['position'] for call in monitor.store_blob.call_args_list],
+        [0, 2, 4, 6, 8])
+    self.assertListEqual(
+        [call[1]['id_event_error_tuple_list'] for call in
+         monitor.store_events.call_args_list],
+        [[(i, self.event, 10)] for i in range(0, 10, 2)])
+    monitor.store_run.assert_called_once()
+    self.assertIn('peak_resident_event_bytes',
+                  monitor.store_run.call_args[1]['json_report_1'])
+    self.assertIsNone(self.dc_operator.memory_budget)
+
+  def test_execute_with_max_memory_bytes_removes_spill_files_on_error(self):
+    self.dc_operator.max_memory_bytes = 1
+    self.dc_operator.enable_pipeline = True
+    self.dc_operator.pipeline_queue_depth = 4
+    blobs = [blob.Blob(events=[self.event] * 2, location='blob', position=i)
+             for i in range(0, 10, 2)]
+    (self.dc_operator.input_hook.events_blobs_generator.
+     return_value) = fake_events_generator(blobs)
+    self.dc_operator.output_hook.send_events.side_effect = (
+        errors.DataOutConnectorError())
+    spill_dir = os.path.join(self.temp_dir.name, 'spill')
+    os.mkdir(spill_dir)
+
+    with mock.patch.object(tempfile, 'tempdir', spill_dir):
+      with self.assertRaises(errors.DataOutConnectorError):
+        self.dc_operator.execute({})
+
+    self.assertListEqual(os.listdir(spill_dir), [])
+    self.mock_monitoring_hook.return_value.store_run.assert_not_called()
+
   def test_execute_when_is_retry_true(self):
     self.dc_operator_no_report.is_retry = True
 
@@ -172,6 +430,123 @@ class DataConnectorOperatorTest(unittest.TestCase):
     (self.dc_operator_no_report.input_hook.events_blobs_generator.
      return_value.assert_not_called())
 
+  def test_execute_with_work_units_claims_every_unit_once(self):
+    database_path = os.path.join(self.temp_dir.name, 'work_units.db')
+    operators = [data_connector_operator.DataConnectorOperator(
+        dag_name='dag_name',
+        input_hook=hook_factory.InputHookType.GOOGLE_CLOUD_STORAGE,
+        output_hook=hook_factory.OutputHookType.GOOGLE_ANALYTICS,
+        return_report=True,
+        monitoring_dataset='test_dataset',
+        monitoring_table='test_table',
+        monitoring_bq_conn_id='test_monitoring_bq_conn_id',
+        num_work_units=3,
+        work_queue_path=database_path,
+        **self.test_operator_kwargs) for _ in range(2)]
+    input_hook = self.mock_hook_factory_input.return_value
+    input_hook.events_blobs_generator.side_effect = (
+        lambda **kwargs: fake_events_generator([self.blob]))
+    (self.mock_hook_factory_output.return_value.send_events.
+     return_value) = blob.Blob(events=[], location='', reports=([0], [1]))
+
+    reports = [operator.execute({'run_id': 'test_run'})
+               for operator in operators]
+
+    self.assertListEqual(reports, [[([0], [1])] * 3, []])
+    input_hook.set_shard.assert_has_calls(
+        [mock.call(0, 3), mock.call(1, 3), mock.call(2, 3)])
+    self.assertEqual(input_hook.set_shard.call_count, 3)
+
+  def test_execute_with_work_units_plans_retry_separately(self):
+    database_path = os.path.join(self.temp_dir.name, 'work_units.db')
+    operator = data_connector_operator.DataConnectorOperator(
+        dag_name='dag_name',
+        input_hook=hook_factory.InputHookType.GOOGLE_CLOUD_STORAGE,
+        output_hook=hook_factory.OutputHookType.GOOGLE_ANALYTICS,
+        monitoring_dataset='test_dataset',
+        monitoring_table='test_table',
+        monitoring_bq_conn_id='test_monitoring_bq_conn_id',
+        num_work_units=2,
+        work_queue_path=database_path,
+        **self.test_operator_kwargs)
+    input_hook = self.mock_hook_factory_input.return_value
+    input_hook.events_blobs_generator.side_effect = (
+        lambda **kwargs: fake_events_generator([]))
+    (self.mock_monitoring_hook.return_value.events_blobs_generator.
+     side_effect) = lambda: fake_events_generator([])
+
+    operator.execute({'run_id': 'test_run'})
+    operator.is_retry = True
+    operator.execute({'run_id': 'test_run'})
+
+    self.assertEqual(input_hook.set_shard.call_count, 4)
+    self.assertEqual(self.mock_monitoring_hook.return_value.
+                     events_blobs_generator.call_count, 2)
+
+  def test_init_with_work_units_raises_error_without_work_queue(self):
+    with self.assertRaises(errors.MonitoringValueError):
+      data_connector_operator.DataConnectorOperator(
+          dag_name='dag_name',
+          input_hook=hook_factory.InputHookType.GOOGLE_CLOUD_STORAGE,
+          output_hook=hook_factory.OutputHookType.GOOGLE_ANALYTICS,
+          enable_monitoring=False,
+          num_work_units=2,
+          **self.test_operator_kwargs)
+
+  def test_execute_with_parse_processes_sets_parse_executor(self):
+    self.dc_operator.parse_processes = 2
+    input_hook = self.dc_operator.input_hook
+    input_hook.events_blobs_generator.return_value = fake_events_generator(
+        [self.blob])
+    (self.dc_operator.output_hook.send_events.
+     return_value) = blob.Blob(events=[], location='', reports=([0], [1]))
+
+    reports = self.dc_operator.execute({})
+
+    self.assertListEqual(reports, [([0], [1])])
+    input_hook.set_parse_executor.assert_has_calls([
+        mock.call(mock.ANY, max_pending=2), mock.call(None)])
+    self.assertIsInstance(input_hook.set_parse_executor.call_args_list[0][0][0],
+                          concurrent.futures.ProcessPoolExecutor)
+
+  def test_execute_with_parse_processes_builds_payloads_in_order(self):
+    self.dc_operator.parse_processes = 2
+    blobs = [blob.Blob(events=[self.event] * i, location='blob', position=i)
+             for i in range(5)]
+    (self.dc_operator.input_hook.events_blobs_generator.
+     return_value) = fake_events_generator(blobs)
+    output_hook = self.dc_operator.output_hook
+    output_hook.get_payload_builder.return_value = len
+    sent_payloads = []
+    output_hook.send_events.side_effect = (
+        lambda blb: sent_payloads.append(blb.payloads) or blb)
+
+    self.dc_operator.execute({})
+
+    self.assertListEqual(sent_payloads, list(range(5)))
+
+  def test_execute_with_adaptive_page_size_records_sends(self):
+    self.dc_operator.adaptive_page_size = True
+    mock_controller_class = mock.patch.object(
+        adaptive_sizing, 'PageSizeController', autospec=True).start()
+    controller = mock_controller_class.return_value
+    controller.page_size = 100
+    input_hook = self.dc_operator.input_hook
+    input_hook.events_blobs_generator.return_value = fake_events_generator(
+        [self.blob] * 2)
+    self.dc_operator.output_hook.get_max_batch_size.return_value = 20
+    (self.dc_operator.output_hook.send_events.
+     return_value) = blob.Blob(events=[], location='', reports=([0], [1]))
+
+    self.dc_operator.execute({})
+
+    mock_controller_class.assert_called_once_with(batch_size=20)
+    input_hook.set_page_size_controller.assert_has_calls([
+        mock.call(controller), mock.call(None)])
+    controller.record_send.assert_has_calls([
+        mock.call(2, mock.ANY), mock.call(2, mock.ANY)])
+    self.assertIsNone(self.dc_operator.page_size_controller)
+
   def test_execute_monitoring_does_not_use_default_bq_conn_id(self):
     self.test_operator_kwargs['bq_conn_id'] = 'test_bq_conn_id'
     data_connector_operator.DataConnectorOperator(
@@ -0,0 +1,100 @@
+# coding=utf-8
+# Copyright 2020 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for plugins.pipeline_plugins.utils.adaptive_sizing."""
+
+import unittest
+
+from plugins.pipeline_plugins.utils import adaptive_sizing
+
+
+class PageSizeControllerTest(unittest.TestCase):
+
+  def test_page_size_starts_at_initial_page_size(self):
+    controller = adaptive_sizing.PageSizeController(initial_page_size=500)
+
+    self.assertEqual(controller.page_size, 500)
+
+  def test_record_send_grows_page_size_of_fast_output(self):
+    controller = adaptive_sizing.PageSizeController(
+        initial_page_size=1000, target_send_seconds=10.0)
+
+    controller.record_send(num_rows=1000, seconds=1.0)
+
+    self.assertEqual(controller.page_size, 2000)
+
+  def test_record_send_shrinks_page_size_of_slow_output(self):
+    controller = adaptive_sizing.PageSizeController(
+        initial_page_size=1000, target_send_seconds=10.0)
+
+    controller.record_send(num_rows=1000, seconds=16.0)
+
+    self.assertEqual(controller.page_size, 625)
+
+  def test_record_send_limits_page_size_change(self):
+    controller = adaptive_sizing.PageSizeController(
+        initial_page_size=1000, target_send_seconds=10.0)
+
+    controller.record_send(num_rows=1000, seconds=100.0)
+
+    self.assertEqual(controller.page_size, 500)
+
+  def test_page_size_stays_within_bounds(self):
+    controller = adaptive_sizing.PageSizeController(
+        initial_page_size=100, min_page_size=50, max_page_size=150)
+
+    controller.record_send(num_rows=100, seconds=0.001)
+    self.assertEqual(controller.page_size, 150)
+
+    for _ in range(5):
+      controller.record_send(num_rows=100, seconds=1000.0)
+    self.assertEqual(controller.page_size, 50)
+
+  def test_record_payload_caps_page_size(self):
+    controller = adaptive_sizing.PageSizeController(
+        initial_page_size=1000, max_payload_bytes=100 * 1024)
+
+    controller.record_payload(num_rows=100, num_bytes=1024 * 1024)
+
+    self.assertEqual(controller.page_size, 10)
+
+  def test_page_size_is_multiple_of_batch_size(self):
+    controller = adaptive_sizing.PageSizeController(
+        initial_page_size=1000, batch_size=300)
+
+    self.assertEqual(controller.page_size, 900)
+
+  def test_page_size_smaller_than_batch_size_is_kept(self):
+    controller = adaptive_sizing.PageSizeController(
+        initial_page_size=1000, batch_size=2000)
+
+    self.assertEqual(controller.page_size, 1000)
+
+  def test_record_ignores_empty_measurements(self):
+    controller = adaptive_sizing.PageSizeController(initial_page_size=1000)
+
+    controller.record_send(num_rows=0, seconds=1.0)
+    controller.record_payload(num_rows=10, num_bytes=0)
+
+    self.assertEqual(controller.page_size, 1000)
+
+  def test_init_raises_error_on_invalid_bounds(self):
+    with self.assertRaises(ValueError):
+      adaptive_sizing.PageSizeController(
+          initial_page_size=10, min_page_size=20, max_page_size=30)
+
+
+if __name__ == '__main__':
+  unittest.main()
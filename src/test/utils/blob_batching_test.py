@@ -0,0 +1,130 @@
+# coding=utf-8
+# Copyright 2020 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for plugins.pipeline_plugins.utils.blob_batching."""
+
+import unittest
+from unittest import mock
+
+from plugins.pipeline_plugins.utils import blob
+from plugins.pipeline_plugins.utils import blob_batching
+
+
+def _make_blob(location, position, num_events):
+  return blob.Blob(events=[{'id': f'{location}-{position + i}'}
+                           for i in range(num_events)],
+                   location=location, position=position)
+
+
+class CoalesceBlobsTest(unittest.TestCase):
+
+  def test_coalesce_blobs_generates_full_batches(self):
+    blobs = [_make_blob('a', 0, 990), _make_blob('a', 990, 990),
+             _make_blob('b', 0, 990)]
+
+    coalesced = list(blob_batching.coalesce_blobs(blobs, batch_size=1000))
+
+    self.assertListEqual([len(blb.events) for blb in coalesced],
+                         [1000, 1000, 970])
+    self.assertListEqual(
+        [event for blb in coalesced for event in blb.events],
+        [event for blb in blobs for event in blb.events])
+
+  def test_coalesce_blobs_counts_valid_events_towards_batches(self):
+    blobs = [blob.Blob(events=[{'valid': True}] * 990 + [{}] * 10,
+                       location='a', position=position)
+             for position in (0, 1000, 2000)]
+
+    coalesced = list(blob_batching.coalesce_blobs(
+        blobs, batch_size=1000, is_valid_event=lambda event: 'valid' in event))
+
+    self.assertListEqual(
+        [sum(1 for event in blb.events if event) for blb in coalesced],
+        [1000, 1000, 970])
+    self.assertListEqual(
+        [[(p.position, p.num_rows) for p in blb.pieces] for blb in coalesced],
+        [[(0, 1000), (1000, 10)], [(1010, 990), (2000, 20)],
+         [(2020, 980)]])
+
+  def test_coalesce_blobs_splits_blobs_into_pieces(self):
+    blobs = [_make_blob('a', 0, 3), _make_blob('a', 3, 3)]
+
+    coalesced = list(blob_batching.coalesce_blobs(blobs, batch_size=4))
+
+    self.assertListEqual(
+        [[(p.location, p.position, p.num_rows) for p in blb.pieces]
+         for blb in coalesced],
+        [[('a', 0, 3), ('a', 3, 1)], [('a', 4, 2)]])
+
+  def test_coalesce_blobs_keeps_checkpoint_on_tail_of_split_blob(self):
+    blobs = [blob.Blob(events=[{}] * 3, location='a',
+                       checkpoint={'end_byte': 30})]
+
+    coalesced = list(blob_batching.coalesce_blobs(blobs, batch_size=2))
+
+    self.assertListEqual(
+        [[p.checkpoint for p in blb.pieces] for blb in coalesced],
+        [[{}], [{'end_byte': 30}]])
+
+  def test_coalesce_blobs_with_max_batches(self):
+    blobs = [_make_blob('a', i * 5, 5) for i in range(5)]
+
+    coalesced = list(blob_batching.coalesce_blobs(blobs, batch_size=4,
+                                                  max_batches=3))
+
+    self.assertListEqual([len(blb.events) for blb in coalesced], [12, 12, 1])
+
+  def test_coalesce_blobs_keeps_empty_blobs(self):
+    blobs = [_make_blob('a', 0, 2), _make_blob('b', 0, 0),
+             _make_blob('c', 0, 2)]
+
+    coalesced = list(blob_batching.coalesce_blobs(blobs, batch_size=3))
+
+    self.assertListEqual(
+        [[p.location for p in blb.pieces] for blb in coalesced],
+        [['a', 'b', 'c'], ['c']])
+
+  def test_coalesce_blobs_flushes_after_max_wait_seconds(self):
+    blobs = [_make_blob('a', 0, 1), _make_blob('a', 1, 1)]
+
+    with mock.patch.object(blob_batching.time, 'monotonic',
+                           side_effect=[0.0, 100.0, 100.0, 100.0]):
+      coalesced = list(blob_batching.coalesce_blobs(
+          blobs, batch_size=10, max_wait_seconds=60.0))
+
+    self.assertListEqual([len(blb.events) for blb in coalesced], [1, 1])
+
+  def test_coalesce_blobs_raises_error_on_invalid_batch_size(self):
+    with self.assertRaises(ValueError):
+      list(blob_batching.coalesce_blobs([], batch_size=0))
+
+  def test_split_maps_failed_events_to_input_blobs(self):
+    blobs = [_make_blob('a', 100, 2), _make_blob('b', 0, 0),
+             _make_blob('c', 50, 3)]
+    coalesced_blob = next(blob_batching.coalesce_blobs(blobs, batch_size=5))
+    coalesced_blob.append_failed_event(1, coalesced_blob.events[1], 10)
+    coalesced_blob.append_failed_event(2, coalesced_blob.events[2], 11)
+    coalesced_blob.extend_reports([('report',)])
+
+    pieces = coalesced_blob.split(coalesced_blob)
+
+    self.assertListEqual(
+        [piece.failed_events for piece in pieces],
+        [[(101, {'id': 'a-101'}, 10)], [], [(50, {'id': 'c-50'}, 11)]])
+    self.assertListEqual(pieces[-1].reports, [('report',)])
+
+
+if __name__ == '__main__':
+  unittest.main()
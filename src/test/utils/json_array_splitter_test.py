@@ -0,0 +1,90 @@
+# coding=utf-8
+# Copyright 2020 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for plugins.pipeline_plugins.utils.json_array_splitter."""
+
+import json
+import unittest
+
+from plugins.pipeline_plugins.utils import json_array_splitter
+
+_NESTED_CONTENT = (b'{"meta": {"data": [0]}, "d\\"ata": 1, "data": '
+                   b'[{"a": "b,]\\\\"}, [1, {"c": 2}], 3 ,"s\\"}"], "x": [4]}')
+
+
+def _split_all(splitter, chunks):
+  elements = []
+  end_offsets = []
+  for chunk in chunks:
+    chunk_elements, chunk_end_offsets = splitter.split(chunk)
+    elements.extend(chunk_elements)
+    end_offsets.extend(chunk_end_offsets)
+  splitter.flush()
+  return elements, end_offsets
+
+
+def _chunks(content, chunk_size):
+  return [content[i:i + chunk_size]
+          for i in range(0, len(content), chunk_size)]
+
+
+class JsonArraySplitterTest(unittest.TestCase):
+
+  def test_split_top_level_array_with_offsets(self):
+    splitter = json_array_splitter.JsonArraySplitter()
+
+    elements, end_offsets = _split_all(splitter, [b' [{"a": 1},\n 2 ]\n'])
+
+    self.assertListEqual(elements, [b'{"a": 1}', b'2'])
+    self.assertListEqual(end_offsets, [10, 15])
+    self.assertTrue(splitter.closed)
+
+  def test_split_array_at_path_across_chunks(self):
+    expected = json.loads(_NESTED_CONTENT)['data']
+    for chunk_size in range(1, len(_NESTED_CONTENT) + 1):
+      splitter = json_array_splitter.JsonArraySplitter(path=['data'])
+
+      elements, _ = _split_all(splitter,
+                               _chunks(_NESTED_CONTENT, chunk_size))
+
+      self.assertListEqual([json.loads(element) for element in elements],
+                           expected, f'chunk size {chunk_size}')
+
+  def test_split_resumes_after_element(self):
+    content = b'[{"a": 1}, {"a": 2}, {"a": 3}]'
+    splitter = json_array_splitter.JsonArraySplitter(start_offset=9)
+
+    elements, end_offsets = _split_all(splitter, _chunks(content[9:], 4))
+
+    self.assertListEqual(elements, [b'{"a": 2}', b'{"a": 3}'])
+    self.assertListEqual(end_offsets, [19, 29])
+
+  def test_split_empty_content_and_array(self):
+    for content in (b'', b' \n', b'[]', b'[ ]'):
+      elements, _ = _split_all(json_array_splitter.JsonArraySplitter(),
+                               [content])
+
+      self.assertListEqual(elements, [])
+
+  def test_split_raises_value_error_when_content_is_no_array(self):
+    for path, content in (([], b'{"a": [1]}'), ([], b'[1, 2'),
+                          (['data'], b'{"data": 1}'),
+                          (['data'], b'{"other": [1]}')):
+      with self.assertRaises(ValueError):
+        _split_all(json_array_splitter.JsonArraySplitter(path=path), [content])
+
+
+if __name__ == '__main__':
+  unittest.main()
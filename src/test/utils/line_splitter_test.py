@@ -0,0 +1,99 @@
+# coding=utf-8
+# Copyright 2020 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for plugins.pipeline_plugins.utils.line_splitter."""
+
+import unittest
+
+from plugins.pipeline_plugins.utils import line_splitter
+
+
+def _split_all(splitter, chunks):
+  lines = []
+  end_offsets = []
+  for chunk in chunks + [None]:
+    chunk_lines, chunk_end_offsets = (
+        splitter.split(chunk) if chunk is not None else splitter.flush())
+    lines.extend(bytes(line) for line in chunk_lines)
+    end_offsets.extend(chunk_end_offsets)
+  return lines, end_offsets
+
+
+class LineSplitterTest(unittest.TestCase):
+
+  def test_split_lines_with_offsets(self):
+    splitter = line_splitter.LineSplitter(start_offset=10)
+
+    lines, end_offsets = _split_all(splitter, [b'a\nbc\nd'])
+
+    self.assertListEqual(lines, [b'a', b'bc', b'd'])
+    self.assertListEqual(end_offsets, [12, 15, 16])
+
+  def test_split_handles_carriage_returns(self):
+    splitter = line_splitter.LineSplitter()
+
+    lines, end_offsets = _split_all(splitter, [b'a\r\nbc\n'])
+
+    self.assertListEqual(lines, [b'a', b'bc'])
+    self.assertListEqual(end_offsets, [3, 6])
+
+  def test_split_stitches_lines_across_chunks(self):
+    splitter = line_splitter.LineSplitter()
+
+    lines, end_offsets = _split_all(
+        splitter, [b'ab', b'c', b'd\ne\r', b'\n\nf', b'g\n'])
+
+    self.assertListEqual(lines, [b'abcd', b'e', b'', b'fg'])
+    self.assertListEqual(end_offsets, [5, 8, 9, 12])
+
+  def test_split_copies_chunks_once(self):
+    splitter = line_splitter.LineSplitter()
+
+    _split_all(splitter, [b'aaaa\nbb', b'b\ncccc\n'])
+
+    # Both chunks are split once, and the line across the chunks is joined.
+    self.assertEqual(splitter.bytes_copied, 14 + 3)
+
+
+class QuotedRecordJoinerTest(unittest.TestCase):
+
+  def test_join_keeps_lines_without_quoted_line_breaks(self):
+    joiner = line_splitter.QuotedRecordJoiner()
+
+    lines, end_offsets = joiner.join([b'a,"b"', b'"c""d",e'], [6, 15])
+
+    self.assertListEqual(lines, [b'a,"b"', b'"c""d",e'])
+    self.assertListEqual(end_offsets, [6, 15])
+
+  def test_join_joins_quoted_line_breaks_across_calls(self):
+    joiner = line_splitter.QuotedRecordJoiner()
+
+    first = joiner.join([b'a', b'"b', b'c'], [2, 5, 7])
+    second = joiner.join([b'd",e', b'f'], [12, 14])
+
+    self.assertEqual(first, ([b'a'], [2]))
+    self.assertEqual(second, ([b'"b\nc\nd",e', b'f'], [12, 14]))
+    self.assertEqual(joiner.flush(), ([], []))
+
+  def test_flush_returns_unterminated_record(self):
+    joiner = line_splitter.QuotedRecordJoiner()
+
+    joiner.join([b'"a', b'b'], [3, 5])
+
+    self.assertEqual(joiner.flush(), ([b'"a\nb'], [5]))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,102 @@
+# coding=utf-8
+# Copyright 2020 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for plugins.pipeline_plugins.utils.memory_budget."""
+
+import os
+import tempfile
+import unittest
+
+from plugins.pipeline_plugins.utils import blob
+from plugins.pipeline_plugins.utils import memory_budget
+
+
+def _make_blob(num_events):
+  return blob.Blob(events=[{'id': i, 'value': 'x' * 20}
+                           for i in range(num_events)], location='blob')
+
+
+class MemoryBudgetTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.temp_dir = tempfile.TemporaryDirectory()
+    self.addCleanup(self.temp_dir.cleanup)
+    self.blob_bytes = memory_budget.estimate_blob_bytes(_make_blob(10))
+
+  def test_estimate_blob_bytes_counts_failed_events(self):
+    blb = _make_blob(10)
+    blb.events = []
+    blb.append_failed_event(0, {'id': 0, 'value': 'x' * 20}, 10)
+
+    self.assertGreater(memory_budget.estimate_blob_bytes(blb), 0)
+
+  def test_admit_keeps_blobs_within_budget_in_memory(self):
+    budget = memory_budget.MemoryBudget(max_bytes=2 * self.blob_bytes)
+    blobs = [_make_blob(10), _make_blob(10)]
+
+    items = [budget.admit(blb) for blb in blobs]
+
+    self.assertListEqual(items, blobs)
+    self.assertEqual(budget.resident_bytes, 2 * self.blob_bytes)
+    self.assertEqual(budget.num_spilled_blobs, 0)
+
+  def test_admit_spills_blobs_over_budget(self):
+    budget = memory_budget.MemoryBudget(max_bytes=self.blob_bytes,
+                                        spill_dir=self.temp_dir.name)
+    blobs = [_make_blob(10), _make_blob(10)]
+
+    items = [budget.admit(blb) for blb in blobs]
+
+    self.assertIs(items[0], blobs[0])
+    self.assertIsInstance(items[1], memory_budget.SpilledBlob)
+    self.assertTrue(os.path.exists(items[1].path))
+    self.assertEqual(budget.resident_bytes, self.blob_bytes)
+    self.assertEqual(budget.num_spilled_blobs, 1)
+
+  def test_take_loads_spilled_blobs(self):
+    budget = memory_budget.MemoryBudget(max_bytes=self.blob_bytes,
+                                        spill_dir=self.temp_dir.name)
+    blobs = [_make_blob(10), _make_blob(10)]
+    items = [budget.admit(blb) for blb in blobs]
+
+    taken = [budget.take(item) for item in reversed(items)]
+
+    self.assertListEqual([blb.events for blb in reversed(taken)],
+                         [blb.events for blb in blobs])
+    self.assertFalse(os.path.exists(items[1].path))
+    self.assertEqual(budget.resident_bytes, 0)
+    self.assertEqual(budget.peak_bytes, 2 * self.blob_bytes)
+
+  def test_admit_keeps_single_large_blob_in_memory(self):
+    budget = memory_budget.MemoryBudget(max_bytes=1)
+    blb = _make_blob(10)
+
+    self.assertIs(budget.admit(blb), blb)
+    self.assertEqual(budget.peak_bytes, self.blob_bytes)
+
+  def test_close_removes_spill_files(self):
+    budget = memory_budget.MemoryBudget(max_bytes=1,
+                                        spill_dir=self.temp_dir.name)
+    budget.admit(_make_blob(10))
+    spilled_blob = budget.admit(_make_blob(10))
+
+    budget.close()
+
+    self.assertFalse(os.path.exists(spilled_blob.path))
+
+
+if __name__ == '__main__':
+  unittest.main()
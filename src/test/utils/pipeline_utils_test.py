@@ -0,0 +1,265 @@
+# coding=utf-8
+# Copyright 2020 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for plugins.pipeline_plugins.utils.pipeline_utils."""
+
+import concurrent.futures
+import threading
+import time
+import unittest
+
+from plugins.pipeline_plugins.utils import pipeline_utils
+
+
+def fake_source(items, delay=0.0):
+  """Fake source generator for testing."""
+  for item in items:
+    time.sleep(delay)
+    yield item
+
+
+class PipelineUtilsTest(unittest.TestCase):
+
+  def test_run_pipelined_stages_keeps_order(self):
+    results = pipeline_utils.run_pipelined_stages(
+        fake_source(range(20)), stages=[lambda x: x * 2, lambda x: x + 1])
+
+    self.assertListEqual(list(results), [x * 2 + 1 for x in range(20)])
+
+  def test_run_pipelined_stages_without_stages(self):
+    results = pipeline_utils.run_pipelined_stages(fake_source(range(3)), [])
+
+    self.assertListEqual(list(results), [0, 1, 2])
+
+  def test_run_pipelined_stages_overlaps_stages(self):
+    def slow_stage(item):
+      time.sleep(0.1)
+      return item
+
+    start = time.time()
+    results = list(pipeline_utils.run_pipelined_stages(
+        fake_source(range(5), delay=0.1), stages=[slow_stage]))
+    elapsed = time.time() - start
+
+    self.assertListEqual(results, list(range(5)))
+    self.assertLess(elapsed, 0.9)
+
+  def test_run_pipelined_stages_calls_each_stage_from_one_thread(self):
+    thread_ids = set()
+
+    def stage(item):
+      thread_ids.add(threading.get_ident())
+      return item
+
+    list(pipeline_utils.run_pipelined_stages(fake_source(range(10)), [stage]))
+
+    self.assertEqual(len(thread_ids), 1)
+    self.assertNotIn(threading.get_ident(), thread_ids)
+
+  def test_run_pipelined_stages_raises_stage_error_after_prior_items(self):
+    def stage(item):
+      if item == 2:
+        raise ValueError('bad item')
+      return item
+
+    results = []
+    with self.assertRaises(ValueError):
+      for item in pipeline_utils.run_pipelined_stages(
+          fake_source(range(5)), [stage]):
+        results.append(item)
+
+    self.assertListEqual(results, [0, 1])
+
+  def test_run_pipelined_stages_raises_source_error(self):
+    def bad_source():
+      yield 1
+      raise KeyError('bad source')
+
+    with self.assertRaises(KeyError):
+      list(pipeline_utils.run_pipelined_stages(bad_source(), [lambda x: x]))
+
+  def test_run_pipelined_stages_stops_when_consumer_stops(self):
+    consumed = []
+
+    def endless_source():
+      i = 0
+      while True:
+        consumed.append(i)
+        yield i
+        i += 1
+
+    results = pipeline_utils.run_pipelined_stages(
+        endless_source(), [lambda x: x], queue_depth=1)
+    self.assertEqual(next(results), 0)
+    results.close()
+
+    self.assertLess(len(consumed), 10)
+
+  def test_run_pipelined_stages_raises_error_on_bad_queue_depth(self):
+    with self.assertRaises(ValueError):
+      next(pipeline_utils.run_pipelined_stages(
+          fake_source(range(3)), [], queue_depth=0))
+
+  def test_run_concurrently_in_order_keeps_order(self):
+    def function(item):
+      time.sleep(0.05 * (5 - item))
+      return item * 2
+
+    results = pipeline_utils.run_concurrently_in_order(
+        function, range(5), max_workers=3)
+
+    self.assertListEqual(list(results), [0, 2, 4, 6, 8])
+
+  def test_run_concurrently_in_order_limits_inflight_items(self):
+    lock = threading.Lock()
+    inflight = [0]
+    max_inflight = [0]
+
+    def function(item):
+      with lock:
+        inflight[0] += 1
+        max_inflight[0] = max(max_inflight[0], inflight[0])
+      time.sleep(0.02)
+      with lock:
+        inflight[0] -= 1
+      return item
+
+    list(pipeline_utils.run_concurrently_in_order(
+        function, range(20), max_workers=4))
+
+    self.assertGreater(max_inflight[0], 1)
+    self.assertLessEqual(max_inflight[0], 4)
+
+  def test_run_concurrently_in_order_raises_function_error(self):
+    def function(item):
+      if item == 1:
+        raise ValueError('bad item')
+      return item
+
+    results = pipeline_utils.run_concurrently_in_order(
+        function, range(3), max_workers=2)
+
+    self.assertEqual(next(results), 0)
+    with self.assertRaises(ValueError):
+      next(results)
+
+  def test_run_concurrently_in_order_raises_error_on_bad_max_workers(self):
+    with self.assertRaises(ValueError):
+      next(pipeline_utils.run_concurrently_in_order(
+          lambda x: x, range(3), max_workers=0))
+
+  def test_map_in_order_limits_pending_items(self):
+    pulled = []
+
+    def source():
+      for i in range(10):
+        pulled.append(i)
+        yield i
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+      results = pipeline_utils.map_in_order(executor, lambda x: x * 2,
+                                            source(), max_pending=3)
+      first_result = next(results)
+      pulled_before_rest = len(pulled)
+      rest = list(results)
+
+    self.assertEqual(first_result, 0)
+    self.assertEqual(pulled_before_rest, 3)
+    self.assertListEqual(rest, [x * 2 for x in range(1, 10)])
+
+  def test_map_in_order_raises_error_on_bad_max_pending(self):
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+      with self.assertRaises(ValueError):
+        list(pipeline_utils.map_in_order(executor, abs, [1], max_pending=0))
+
+  def test_interleave_concurrently_round_robin_regardless_of_speed(self):
+    results = pipeline_utils.interleave_concurrently(
+        [fake_source('abc', delay=0.05), fake_source([1, 2]),
+         fake_source('xyzw')])
+
+    self.assertListEqual(list(results),
+                         ['a', 1, 'x', 'b', 2, 'y', 'c', 'z', 'w'])
+
+  def test_interleave_concurrently_consumes_sources_concurrently(self):
+    start = time.time()
+    results = list(pipeline_utils.interleave_concurrently(
+        [fake_source(range(5), delay=0.1) for _ in range(3)]))
+    elapsed = time.time() - start
+
+    self.assertEqual(len(results), 15)
+    self.assertLess(elapsed, 1.0)
+
+  def test_interleave_concurrently_raises_source_error(self):
+    def bad_source():
+      yield 1
+      raise KeyError('bad source')
+
+    results = []
+    with self.assertRaises(KeyError):
+      for item in pipeline_utils.interleave_concurrently(
+          [bad_source(), fake_source([2, 3])]):
+        results.append(item)
+
+    self.assertListEqual(results, [1, 2])
+
+  def test_chain_concurrently_keeps_items_of_sources_together(self):
+    results = pipeline_utils.chain_concurrently(
+        [fake_source('abc', delay=0.05), fake_source([1, 2]),
+         fake_source('xyzw')], max_workers=2)
+
+    self.assertListEqual(list(results),
+                         ['a', 'b', 'c', 1, 2, 'x', 'y', 'z', 'w'])
+
+  def test_chain_concurrently_limits_buffered_items(self):
+    pulled = []
+
+    def source(name):
+      for i in range(10):
+        pulled.append(name)
+        yield i
+
+    results = pipeline_utils.chain_concurrently(
+        (source(name) for name in 'abc'), max_workers=2, queue_depth=1)
+    next(results)
+    time.sleep(0.2)
+    results.close()
+
+    # Every running source buffers one item, and holds one more while
+    # blocked putting it.
+    self.assertLessEqual(pulled.count('a'), 3)
+    self.assertLessEqual(pulled.count('b'), 2)
+    self.assertNotIn('c', pulled)
+
+  def test_chain_concurrently_raises_source_error(self):
+    def bad_source():
+      yield 1
+      raise KeyError('bad source')
+
+    results = []
+    with self.assertRaises(KeyError):
+      for item in pipeline_utils.chain_concurrently(
+          [fake_source([0]), bad_source(), fake_source([2, 3])],
+          max_workers=3):
+        results.append(item)
+
+    self.assertListEqual(results, [0, 1])
+
+  def test_chain_concurrently_raises_error_on_bad_max_workers(self):
+    with self.assertRaises(ValueError):
+      next(pipeline_utils.chain_concurrently([[1]], max_workers=0))
+
+
+if __name__ == '__main__':
+  unittest.main()
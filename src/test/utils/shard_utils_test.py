@@ -0,0 +1,73 @@
+# coding=utf-8
+# Copyright 2020 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for plugins.pipeline_plugins.utils.shard_utils."""
+
+import unittest
+
+from plugins.pipeline_plugins.utils import errors
+from plugins.pipeline_plugins.utils import shard_utils
+
+
+class ShardUtilsTest(unittest.TestCase):
+
+  def test_validate_shard_accepts_valid_shard(self):
+    shard_utils.validate_shard(shard_index=2, num_shards=3)
+
+  def test_validate_shard_raises_error_on_invalid_shard(self):
+    for shard_index, num_shards in ((3, 3), (-1, 3), (0, 0)):
+      with self.assertRaises(errors.DataInConnectorValueError):
+        shard_utils.validate_shard(shard_index, num_shards)
+
+  def test_get_shard_location_of_unsharded_input(self):
+    self.assertEqual(shard_utils.get_shard_location('bq://p.d.t', 0, 1),
+                     'bq://p.d.t')
+
+  def test_get_shard_location_of_sharded_input(self):
+    self.assertEqual(shard_utils.get_shard_location('bq://p.d.t', 1, 4),
+                     'bq://p.d.t#shard-1-of-4')
+
+  def test_get_shard_row_range_covers_all_rows(self):
+    ranges = [shard_utils.get_shard_row_range(10, i, 3) for i in range(3)]
+
+    self.assertListEqual(ranges, [(0, 3), (3, 6), (6, 10)])
+
+  def test_get_shard_row_ranges_splits_every_segment(self):
+    ranges = [shard_utils.get_shard_row_ranges([10, 16], i, 3)
+              for i in range(3)]
+
+    self.assertListEqual(ranges, [[(0, 3), (10, 12)], [(3, 6), (12, 14)],
+                                  [(6, 10), (14, 16)]])
+
+  def test_is_location_of_num_shards(self):
+    location = shard_utils.get_shard_location('bq://p.d.t', 1, 3)
+
+    self.assertTrue(location.startswith(
+        shard_utils.get_shard_location_prefix('bq://p.d.t')))
+    self.assertTrue(shard_utils.is_location_of_num_shards(location, 3))
+    self.assertFalse(shard_utils.is_location_of_num_shards(location, 13))
+    self.assertFalse(shard_utils.is_location_of_num_shards(
+        'bq://p.d.t#shard-1-of-13', 3))
+
+  def test_is_name_in_shard_assigns_every_name_to_one_shard(self):
+    names = [f'blob_{i}' for i in range(100)]
+
+    for name in names:
+      self.assertEqual(
+          sum(shard_utils.is_name_in_shard(name, i, 4) for i in range(4)), 1)
+
+
+if __name__ == '__main__':
+  unittest.main()
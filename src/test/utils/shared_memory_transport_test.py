@@ -0,0 +1,146 @@
+# coding=utf-8
+# Copyright 2020 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for plugins.pipeline_plugins.utils.shared_memory_transport."""
+
+import concurrent.futures
+from multiprocessing import shared_memory
+import os
+import pickle
+import subprocess
+import sys
+import textwrap
+import time
+import unittest
+
+from plugins.pipeline_plugins.utils import blob
+from plugins.pipeline_plugins.utils import shared_memory_transport
+
+
+def _make_blob(position):
+  """Makes a test blob in a worker process."""
+  return blob.Blob(events=[{'a': position}] * 3, location='bq://p.d.t',
+                   position=position, num_rows=3)
+
+
+class SharedMemoryTransportTest(unittest.TestCase):
+
+  def assert_segment_freed(self, name):
+    with self.assertRaises(FileNotFoundError):
+      shared_memory.SharedMemory(name=name)
+
+  def test_publish_and_consume_value(self):
+    events = [{'a': 1, 'b': 'text'}, {'a': 2, 'b': None}]
+
+    handle = shared_memory_transport.publish(events)
+
+    self.assertListEqual(shared_memory_transport.consume(handle), events)
+    self.assert_segment_freed(handle.name)
+
+  def test_publish_blob_keeps_metadata_in_handle(self):
+    blb = blob.Blob(events=[{'a': 1}], location='gs://bucket/blob',
+                    position=10, num_rows=1)
+
+    handle = shared_memory_transport.publish(blb)
+    consumed = shared_memory_transport.consume(handle)
+
+    self.assertIsInstance(handle, shared_memory_transport.BlobHandle)
+    self.assertEqual((handle.location, handle.position, handle.num_rows),
+                     ('gs://bucket/blob', 10, 1))
+    self.assertLess(len(pickle.dumps(handle)), 500)
+    self.assertListEqual(consumed.events, [{'a': 1}])
+    self.assertEqual((consumed.location, consumed.position, consumed.num_rows),
+                     ('gs://bucket/blob', 10, 1))
+    self.assert_segment_freed(handle.events_handle.name)
+
+  def test_publish_and_consume_none(self):
+    self.assertIsNone(shared_memory_transport.publish(None))
+    self.assertIsNone(shared_memory_transport.consume(None))
+
+  def test_discard_frees_segment(self):
+    handle = shared_memory_transport.publish(['event'])
+
+    handle.discard()
+
+    self.assert_segment_freed(handle.name)
+
+  def test_map_in_order_transports_results_from_processes(self):
+    with concurrent.futures.ProcessPoolExecutor(max_workers=2) as executor:
+      blobs = list(shared_memory_transport.map_in_order(
+          executor, _make_blob, range(5), max_pending=2))
+
+    self.assertListEqual([blb.position for blb in blobs], list(range(5)))
+    self.assertListEqual([blb.events for blb in blobs],
+                         [[{'a': i}] * 3 for i in range(5)])
+
+  def test_map_in_order_frees_results_that_are_not_consumed(self):
+    published = []
+
+    def make_events(i):
+      return [i]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+      original_publish = shared_memory_transport.publish
+
+      def tracking_publish(value):
+        handle = original_publish(value)
+        published.append(handle.name)
+        return handle
+
+      shared_memory_transport.publish = tracking_publish
+      try:
+        results = shared_memory_transport.map_in_order(
+            executor, make_events, range(10), max_pending=3)
+        self.assertListEqual(next(results), [0])
+        results.close()
+      finally:
+        shared_memory_transport.publish = original_publish
+
+    for name in published:
+      self.assert_segment_freed(name)
+
+  def test_segments_not_consumed_are_freed_when_processes_exit(self):
+    script = textwrap.dedent("""
+        import concurrent.futures
+        from plugins.pipeline_plugins.utils import shared_memory_transport
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1) as executor:
+          results = shared_memory_transport.map_in_order(
+              executor, list, ['a', 'b'], max_pending=1)
+          next(results)
+          handle = executor.submit(shared_memory_transport.publish,
+                                   ['c']).result()
+        print(handle.name)
+        """)
+    src_dir = os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+
+    name = subprocess.run(
+        [sys.executable, '-c', script], cwd=src_dir, check=True,
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        env={**os.environ, 'PYTHONPATH': src_dir},
+        universal_newlines=True).stdout.strip()
+
+    # The resource tracker frees the segment shortly after the processes exit.
+    for _ in range(50):
+      try:
+        shared_memory.SharedMemory(name=name).close()
+      except FileNotFoundError:
+        break
+      time.sleep(0.1)
+    self.assert_segment_freed(name)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,197 @@
+# coding=utf-8
+# Copyright 2020 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for plugins.pipeline_plugins.utils.work_queue."""
+
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from airflow import exceptions
+
+from plugins.pipeline_plugins.utils import errors
+from plugins.pipeline_plugins.utils import work_queue
+
+_RUN_ID = 'dag_name/test_run'
+
+
+class SqliteWorkQueueTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.temp_dir = tempfile.TemporaryDirectory()
+    self.addCleanup(self.temp_dir.cleanup)
+    self.queue = work_queue.SqliteWorkQueue(
+        os.path.join(self.temp_dir.name, 'work_units.db'))
+
+  def test_plan_units_is_idempotent(self):
+    self.queue.plan_units(_RUN_ID, num_units=2)
+    self.queue.plan_units(_RUN_ID, num_units=2)
+
+    claimed = [self.queue.claim_unit(_RUN_ID, 'worker', 60) for _ in range(3)]
+
+    self.assertListEqual(claimed, [0, 1, None])
+
+  def test_claim_unit_skips_units_of_other_runs(self):
+    self.queue.plan_units('other_run', num_units=2)
+
+    self.assertIsNone(self.queue.claim_unit(_RUN_ID, 'worker', 60))
+
+  def test_claim_unit_steals_expired_lease(self):
+    self.queue.plan_units(_RUN_ID, num_units=1)
+    self.queue.claim_unit(_RUN_ID, 'crashed_worker', lease_seconds=-1)
+
+    self.assertEqual(self.queue.claim_unit(_RUN_ID, 'worker', 60), 0)
+    self.assertFalse(
+        self.queue.renew_lease(_RUN_ID, 0, 'crashed_worker', 60))
+
+  def test_claim_unit_does_not_claim_completed_unit(self):
+    self.queue.plan_units(_RUN_ID, num_units=1)
+    self.queue.claim_unit(_RUN_ID, 'worker', lease_seconds=-1)
+    self.queue.complete_unit(_RUN_ID, 0)
+
+    self.assertIsNone(self.queue.claim_unit(_RUN_ID, 'other_worker', 60))
+
+  def test_renew_lease_of_lease_owner(self):
+    self.queue.plan_units(_RUN_ID, num_units=1)
+    self.queue.claim_unit(_RUN_ID, 'worker', 60)
+
+    self.assertTrue(self.queue.renew_lease(_RUN_ID, 0, 'worker', 60))
+
+  def test_init_raises_error_on_inaccessible_database(self):
+    with self.assertRaises(errors.WorkQueueError):
+      work_queue.SqliteWorkQueue(
+          os.path.join(self.temp_dir.name, 'missing_dir', 'work_units.db'))
+
+
+class BigQueryWorkQueueTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.bq_hook = mock.MagicMock()
+    self.bq_cursor = self.bq_hook.get_conn.return_value.cursor.return_value
+    self.bq_cursor.project_id = 'test_project'
+    self.queue = work_queue.BigQueryWorkQueue(
+        self.bq_hook, dataset_id='test_dataset', table_id='test_work_units')
+
+  def test_init_does_not_create_existing_table(self):
+    self.bq_cursor.create_empty_table.assert_not_called()
+
+  def test_init_creates_missing_table(self):
+    self.bq_hook.table_exists.return_value = False
+
+    work_queue.BigQueryWorkQueue(
+        self.bq_hook, dataset_id='test_dataset', table_id='test_work_units')
+
+    self.bq_cursor.create_empty_table.assert_called_once_with(
+        project_id='test_project', dataset_id='test_dataset',
+        table_id='test_work_units', schema_fields=mock.ANY)
+
+  def test_plan_units_merges_units(self):
+    self.queue.plan_units(_RUN_ID, num_units=4)
+
+    sql, parameters = self.bq_cursor.execute.call_args[0]
+    self.assertTrue(sql.startswith('MERGE'))
+    self.assertEqual(parameters['num_units'], 4)
+    self.assertEqual(parameters['run_id'], _RUN_ID)
+
+  def test_claim_unit_returns_claimed_unit(self):
+    self.bq_cursor.fetchone.return_value = (3,)
+
+    self.assertEqual(self.queue.claim_unit(_RUN_ID, 'worker', 60), 3)
+    self.assertEqual(self.bq_cursor.execute.call_count, 2)
+
+  def test_claim_unit_returns_none_when_no_unit_left(self):
+    self.bq_cursor.fetchone.return_value = None
+
+    self.assertIsNone(self.queue.claim_unit(_RUN_ID, 'worker', 60))
+
+  def test_complete_unit_raises_error_on_failed_update(self):
+    self.bq_cursor.execute.side_effect = exceptions.AirflowException('error')
+
+    with self.assertRaises(errors.WorkQueueError):
+      self.queue.complete_unit(_RUN_ID, 0)
+
+
+class WorkUnitLeaseTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.queue = mock.create_autospec(work_queue.WorkQueue)
+    self.mock_monotonic = mock.patch.object(
+        work_queue.time, 'monotonic', autospec=True).start()
+    self.addCleanup(mock.patch.stopall)
+    self.mock_monotonic.return_value = 100.0
+    self.lease = work_queue.WorkUnitLease(self.queue, _RUN_ID, 0, 'worker',
+                                          lease_seconds=60)
+
+  def test_keep_alive_does_not_renew_fresh_lease(self):
+    self.mock_monotonic.return_value = 120.0
+
+    self.assertTrue(self.lease.keep_alive())
+    self.queue.renew_lease.assert_not_called()
+
+  def test_keep_alive_renews_half_elapsed_lease(self):
+    self.mock_monotonic.return_value = 131.0
+    self.queue.renew_lease.return_value = True
+
+    self.assertTrue(self.lease.keep_alive())
+    self.queue.renew_lease.assert_called_once_with(_RUN_ID, 0, 'worker', 60)
+
+  def test_keep_alive_reports_lost_lease(self):
+    self.mock_monotonic.return_value = 131.0
+    self.queue.renew_lease.return_value = False
+
+    self.assertFalse(self.lease.keep_alive())
+    self.assertTrue(self.lease.is_lost)
+
+  def test_keep_alive_reports_expired_lease(self):
+    self.mock_monotonic.return_value = 160.0
+
+    self.assertFalse(self.lease.keep_alive())
+    self.queue.renew_lease.assert_not_called()
+
+  def test_lease_is_renewed_in_background_while_entered(self):
+    mock.patch.stopall()
+    self.queue.renew_lease.return_value = True
+    lease = work_queue.WorkUnitLease(self.queue, _RUN_ID, 0, 'worker',
+                                     lease_seconds=0.2)
+
+    with lease:
+      time.sleep(0.5)
+    num_renewals = self.queue.renew_lease.call_count
+    time.sleep(0.2)
+
+    self.assertGreaterEqual(num_renewals, 2)
+    self.assertEqual(self.queue.renew_lease.call_count, num_renewals)
+    self.assertFalse(lease.is_lost)
+
+  def test_lease_is_lost_when_background_renewal_fails(self):
+    mock.patch.stopall()
+    self.queue.renew_lease.return_value = False
+    lease = work_queue.WorkUnitLease(self.queue, _RUN_ID, 0, 'worker',
+                                     lease_seconds=0.2)
+
+    with lease:
+      time.sleep(0.3)
+
+    self.queue.renew_lease.assert_called_once()
+    self.assertTrue(lease.is_lost)
+
+
+if __name__ == '__main__':
+  unittest.main()